@@ -1,10 +1,28 @@
+import time
+_T0 = time.perf_counter()  # Origine du profilage (--profile), avant les imports
 
 from typing import Dict, Any, List, Optional, Union
+from urllib.parse import quote
 import asyncio
+import json
+import os
 import sys
+import urllib.error
+import urllib.request
 import yaml
-from tapo import ApiClient
 from pydantic import BaseModel, EmailStr, ValidationError, field_validator
+from tapo_backend import make_backend
+from tapo_discovery import AddressTable
+from tapo_resilience import CircuitOpenError, ResiliencePolicy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "COMMON"))
+from profiling import NULL_PROFILER, PhaseProfiler, pop_profile_flags
+
+CONFIG_PATH = os.environ.get("TAPO_CONFIG", "E:/Nicolas/Workspace/MarkIO/Scripts/BT_TAPO/config.yaml")
+# Passerelle en cours d'exécution (GATEWAY/gateway.py): ses sessions restent ouvertes
+GATEWAY_URL = os.environ.get("TAPO_GATEWAY")  # ex: http://127.0.0.1:8080
+GATEWAY_TOKEN = os.environ.get("TAPO_GATEWAY_TOKEN")
+GATEWAY_TIMEOUT = 15.0
 
 # Modèles Pydantic
 class CredentialsModel(BaseModel):
@@ -14,6 +32,8 @@ class CredentialsModel(BaseModel):
 class DeviceBaseModel(BaseModel):
     type: str
     ip: str
+    mac: Optional[str] = None
+    device_id: Optional[str] = None
 
 class DeviceP110Model(DeviceBaseModel):
     type: str = "P110"
@@ -99,111 +119,218 @@ def load_config(path: str = "config.yaml") -> ConfigModel:
         data = yaml.safe_load(f)
     return ConfigModel(**data)
 
+class CommandError(Exception):
+    """Commande ou paramètres refusés pour un type d'appareil"""
+
+
+ActionModel = Union[ActionOnOffModel, ActionBrightnessModel, ActionColorModel]
+
+
+def parse_action(device_type: str, command: str, args: List[str]) -> ActionModel:
+    """
+    Validation stricte d'une commande et de ses paramètres
+
+    Args:
+        device_type: Type de l'appareil (P110, L530, ...)
+        command: Nom de la commande
+        args: Arguments bruts de la ligne de commande
+
+    Returns:
+        Modèle d'action validé
+
+    Raises:
+        CommandError: Commande non autorisée ou paramètres invalides
+    """
+    if device_type in ["P110", "P110M"]:
+        try:
+            return ActionOnOffModel(action=command)
+        except ValidationError as e:
+            raise CommandError(f"Commande non valide: {e}")
+    elif device_type in ["L510", "L520", "L530"]:
+        if command in ["on", "off"]:
+            try:
+                return ActionOnOffModel(action=command)
+            except ValidationError as e:
+                raise CommandError(f"Commande non valide: {e}")
+        elif command == "set_brightness":
+            if len(args) != 1:
+                raise CommandError("set_brightness requiert 1 argument (valeur)")
+            try:
+                return ActionBrightnessModel(action=command, value=int(args[0]))
+            except (ValidationError, ValueError) as e:
+                raise CommandError(f"Paramètre brightness non valide: {e}")
+        elif command == "set_color" and device_type == "L530":
+            if len(args) != 3:
+                raise CommandError("set_color requiert 3 arguments (r g b)")
+            try:
+                return ActionColorModel(action=command, r=int(args[0]), g=int(args[1]), b=int(args[2]))
+            except (ValidationError, ValueError) as e:
+                raise CommandError(f"Paramètres couleur non valides: {e}")
+        else:
+            raise CommandError(f"Commande {command} non autorisée pour {device_type}")
+    else:
+        raise CommandError(f"Type de device {device_type} non géré")
+
+
+class GatewayUnavailable(Exception):
+    """Passerelle injoignable: la commande n'a pas été transmise"""
+
+
+def forward_to_gateway(url: str, device_name: str, command: str, args: List[str],
+                       token: Optional[str] = None,
+                       timeout: float = GATEWAY_TIMEOUT) -> Dict[str, Any]:
+    """
+    Transmet une commande à la passerelle, qui la joue sur sa session ouverte
+
+    La bibliothèque tapo ne permet pas d'exporter une session (clé KLAP et
+    cookie restent dans le client natif): seul un processus résident peut
+    réutiliser un handshake d'une commande à l'autre.
+
+    Returns:
+        Réponse de la passerelle ({"ok": ..., "result"/"error": ...})
+
+    Raises:
+        GatewayUnavailable: Connexion impossible (rien n'a été exécuté)
+    """
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/tapo/{quote(device_name)}/{quote(command)}",
+        data=json.dumps({"args": args}).encode(), method="POST",
+        headers={"Content-Type": "application/json"})
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        # La passerelle a répondu (commande refusée ou appareil en échec)
+        try:
+            return json.load(e)
+        except ValueError:
+            return {"ok": False, "error": f"HTTP {e.code}"}
+    except urllib.error.URLError as e:
+        raise GatewayUnavailable(str(e.reason))
+
+
+async def execute_action(tapo_device: Any, action_model: ActionModel) -> Any:
+    """Exécute une action validée sur un handle d'appareil"""
+    func = getattr(tapo_device, action_model.action)
+    if isinstance(action_model, ActionOnOffModel):
+        return await func()
+    elif isinstance(action_model, ActionBrightnessModel):
+        return await func(action_model.value)
+    elif isinstance(action_model, ActionColorModel):
+        return await func(action_model.r, action_model.g, action_model.b)
+    raise CommandError("Action non reconnue")
+
+
 async def main():
-    if len(sys.argv) < 3:
+    try:
+        profile_format, trace_path, argv = pop_profile_flags(sys.argv[1:])
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    profiler = PhaseProfiler(origin=_T0) if profile_format else NULL_PROFILER
+    profiler.mark("imports (pydantic, yaml, backend)")
+    try:
+        await run_command(argv, profiler)
+    finally:
+        profiler.output(profile_format, trace_path)
+
+
+async def run_command(argv: List[str], profiler=NULL_PROFILER):
+    if len(argv) < 2:
         print("Usage: python tapo_remote.py <nom_appareil> <commande> [options]")
         print("Exemples:")
         print("  python tapo_remote.py salon_lampe on")
         print("  python tapo_remote.py salon_lampe set_brightness 50")
         print("  python tapo_remote.py salon_lampe set_color 255 0 0")
+        print("  python tapo_remote.py salon_lampe on --profile[=json] [--profile-trace trace.json]")
+        print("  TAPO_GATEWAY=http://127.0.0.1:8080 python tapo_remote.py salon_lampe on"
+              "   # via la passerelle (session déjà ouverte)")
         sys.exit(1)
 
-    device_name: str = sys.argv[1]
-    command: str = sys.argv[2]
-    args: List[str] = sys.argv[3:]
+    device_name: str = argv[0]
+    command: str = argv[1]
+    args: List[str] = argv[2:]
 
     try:
-        config = load_config(path="E:/Nicolas/Workspace/MarkIO/Scripts/BT_TAPO/config.yaml")
+        with profiler.phase("config (YAML + pydantic)"):
+            config = load_config(path=CONFIG_PATH)
     except ValidationError as e:
         print("Erreur de validation de la configuration:", e)
         sys.exit(1)
 
-    email = config.credentials.email
-    password = config.credentials.password
-
     if device_name not in config.devices:
         print(f"Appareil {device_name} introuvable dans config.yaml")
         sys.exit(1)
 
     device = config.devices[device_name]
-    device_type = device.type
-    ip = device.ip
 
     # Validation stricte des commandes et paramètres
-    action_model = None
-    if device_type in ["P110", "P110M"]:
+    try:
+        with profiler.phase("validation commande"):
+            action_model = parse_action(device.type, command, args)
+    except CommandError as e:
+        print(e)
+        sys.exit(1)
+
+    if GATEWAY_URL:
+        # Session chaude de la passerelle; handshake direct seulement si elle est absente
         try:
-            action_model = ActionOnOffModel(action=command)
-        except ValidationError as e:
-            print("Commande non valide:", e)
+            with profiler.phase("passerelle"):
+                reply = await asyncio.to_thread(forward_to_gateway, GATEWAY_URL, device_name,
+                                                command, args, GATEWAY_TOKEN)
+        except GatewayUnavailable as e:
+            print(f"Passerelle injoignable ({e}): connexion directe")
+        except TimeoutError:
+            print(f"Passerelle sans réponse après {GATEWAY_TIMEOUT:.0f}s")
             sys.exit(1)
-    elif device_type in ["L510", "L520"]:
-        if command in ["on", "off"]:
-            try:
-                action_model = ActionOnOffModel(action=command)
-            except ValidationError as e:
-                print("Commande non valide:", e)
-                sys.exit(1)
-        elif command == "set_brightness":
-            if len(args) != 1:
-                print("set_brightness requiert 1 argument (valeur)")
-                sys.exit(1)
-            try:
-                action_model = ActionBrightnessModel(action=command, value=int(args[0]))
-            except ValidationError as e:
-                print("Paramètre brightness non valide:", e)
-                sys.exit(1)
         else:
-            print(f"Commande {command} non autorisée pour {device_type}")
-            sys.exit(1)
-    elif device_type == "L530":
-        if command in ["on", "off"]:
-            try:
-                action_model = ActionOnOffModel(action=command)
-            except ValidationError as e:
-                print("Commande non valide:", e)
-                sys.exit(1)
-        elif command == "set_brightness":
-            if len(args) != 1:
-                print("set_brightness requiert 1 argument (valeur)")
-                sys.exit(1)
-            try:
-                action_model = ActionBrightnessModel(action=command, value=int(args[0]))
-            except ValidationError as e:
-                print("Paramètre brightness non valide:", e)
-                sys.exit(1)
-        elif command == "set_color":
-            if len(args) != 3:
-                print("set_color requiert 3 arguments (r g b)")
+            if not reply.get("ok"):
+                print("Erreur de la passerelle:", reply.get("error"))
                 sys.exit(1)
-            try:
-                action_model = ActionColorModel(action=command, r=int(args[0]), g=int(args[1]), b=int(args[2]))
-            except ValidationError as e:
-                print("Paramètres couleur non valides:", e)
-                sys.exit(1)
-        else:
-            print(f"Commande {command} non autorisée pour {device_type}")
-            sys.exit(1)
-    else:
-        print(f"Type de device {device_type} non géré")
-        sys.exit(1)
+            print("Commande exécutée:", reply.get("result"))
+            return
 
-    client = ApiClient(email, password)
-    tapo_device = await getattr(client, device_type.lower())(ip)
+    with profiler.phase("backend (ApiClient)"):
+        backend = make_backend(config)
 
-    # Exécution de la commande
-    if isinstance(action_model, ActionOnOffModel):
-        func = getattr(tapo_device, action_model.action)
-        result = await func()
-    elif isinstance(action_model, ActionBrightnessModel):
-        func = getattr(tapo_device, action_model.action)
-        result = await func(action_model.value)
-    elif isinstance(action_model, ActionColorModel):
-        func = getattr(tapo_device, action_model.action)
-        result = await func(action_model.r, action_model.g, action_model.b)
-    else:
-        print("Action non reconnue")
+    with profiler.phase("état local (adresses, résilience)"):
+        # Adresse découverte par tapo_discovery.py si l'appareil a changé d'IP
+        ip = AddressTable.load().ip(device_name, device.ip)
+        policy = ResiliencePolicy.load()
+
+    tapo_device = None
+
+    async def attempt():
+        nonlocal tapo_device
+        try:
+            if tapo_device is None:
+                with profiler.phase("handshake"):
+                    tapo_device = await backend.connect(device.type, ip)
+            with profiler.phase("requête"):
+                return await execute_action(tapo_device, action_model)
+        except BaseException:
+            tapo_device = None
+            raise
+
+    def operation() -> str:
+        # Comme TapoController.call: latences handshake et commande suivies à part
+        return "command" if tapo_device is not None else "session"
+
+    # Exécution de la commande (timeout, reprises et disjoncteur partagés entre exécutions)
+    try:
+        with profiler.phase("appel appareil"):
+            result = await policy.call(device_name, attempt, operation)
+    except CircuitOpenError as e:
+        print(e)
+        sys.exit(1)
+    except asyncio.TimeoutError:
+        print(f"Appareil {device_name} injoignable: délai dépassé")
         sys.exit(1)
+    finally:
+        with profiler.phase("sauvegarde état"):
+            policy.save()
     print("Commande exécutée:", result)
 
 if __name__ == "__main__":
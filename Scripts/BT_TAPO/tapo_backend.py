@@ -0,0 +1,363 @@
+"""
+Backends d'accès aux appareils Tapo
+
+- ApiClientBackend: appareils réels via tapo.ApiClient (handles p110/l530/l510/l520)
+- SimulatedBackend: appareils simulés en mémoire (latence, taux d'échec et état
+  configurables) pour tester le chemin de commande à l'échelle d'une flotte
+
+Sélection depuis le CLI avec la variable d'environnement TAPO_BACKEND=api|sim;
+le simulateur se règle via TAPO_SIM_LATENCY_MS, TAPO_SIM_JITTER_MS,
+TAPO_SIM_HANDSHAKE_MS, TAPO_SIM_FAILURE_RATE et TAPO_SIM_SEED.
+"""
+
+from typing import Any, Dict, NamedTuple, Optional
+from datetime import date, datetime, timedelta, timezone
+from abc import ABC, abstractmethod
+import asyncio
+import calendar
+import colorsys
+import os
+import random
+import zlib
+
+
+class TapoBackend(ABC):
+    """Interface commune: ouvre un handle d'appareil (handshake compris)"""
+
+    name = "abstract"
+
+    @abstractmethod
+    async def connect(self, device_type: str, ip: str) -> Any:
+        """
+        Ouvre une session avec un appareil
+
+        Args:
+            device_type: Type de l'appareil (P110, P110M, L530, L510, L520)
+            ip: Adresse IP de l'appareil
+
+        Returns:
+            Handle exposant les coroutines on/off/set_brightness/... du type
+        """
+
+    @abstractmethod
+    async def probe(self, ip: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Identifie l'appareil Tapo présent à une adresse (découverte réseau)
+
+        Args:
+            ip: Adresse à sonder
+            timeout: Délai max (s) pour détecter un hôte qui répond
+
+        Returns:
+            Informations brutes de l'appareil (device_id, mac, model, ...),
+            None si aucun appareil Tapo ne répond
+        """
+
+    def energy_interval(self, name: str) -> Any:
+        """Intervalle accepté par get_energy_data des handles ("hourly", "daily", "monthly")"""
+        return name
+
+
+class ApiClientBackend(TapoBackend):
+    """Appareils réels via la bibliothèque tapo"""
+
+    name = "api"
+
+    def __init__(self, email: str, password: str, timeout_s: Optional[int] = None):
+        from tapo import ApiClient
+
+        self.client = ApiClient(email, password, timeout_s)
+
+    async def connect(self, device_type: str, ip: str) -> Any:
+        return await getattr(self.client, device_type.lower())(ip)
+
+    async def probe(self, ip: str, timeout: float) -> Optional[Dict[str, Any]]:
+        # Connexion TCP sur le port HTTP local: élimine vite les hôtes muets
+        try:
+            _reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, 80), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        writer.close()
+        # Le handshake et get_device_info sont communs à tous les modèles
+        handle = await self.client.p100(ip)
+        return await handle.get_device_info_json()
+
+    def energy_interval(self, name: str) -> Any:
+        from tapo.requests import EnergyDataInterval
+
+        return getattr(EnergyDataInterval, name.capitalize())
+
+
+class SimulatedDeviceError(Exception):
+    """Échec simulé (timeout, appareil injoignable, ...)"""
+
+
+class SimProfile(NamedTuple):
+    """Comportement réseau d'un appareil simulé"""
+    latency_ms: float = 20.0
+    jitter_ms: float = 5.0
+    handshake_ms: float = 150.0
+    failure_rate: float = 0.0
+
+
+class _Result:
+    """Réponse simulée, avec to_dict() comme les résultats de tapo"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.__dict__})"
+
+
+class SimulatedDevice:
+    """Handle d'un appareil simulé: état en mémoire, latence et échecs tirés au hasard"""
+
+    def __init__(self, backend: "SimulatedBackend", device_type: str, ip: str,
+                 profile: SimProfile):
+        self.backend = backend
+        self.device_type = device_type
+        self.ip = ip
+        self.profile = profile
+        digest = zlib.crc32(ip.encode())
+        self.state: Dict[str, Any] = {
+            "device_on": False,
+            "device_id": f"SIM{digest:08X}",
+            "mac": "AC-15-A2-%02X-%02X-%02X" % ((digest >> 16) & 0xFF, (digest >> 8) & 0xFF,
+                                                digest & 0xFF),
+            "model": device_type,
+            "ip": ip,
+        }
+        self.calls = 0
+
+    async def _round_trip(self, delay_ms: Optional[float] = None):
+        self.calls += 1
+        self.backend.calls += 1
+        rng = self.backend.rng
+        profile = self.profile
+        if delay_ms is None:
+            delay_ms = profile.latency_ms
+            if profile.jitter_ms > 0:
+                # Queue exponentielle: quelques requêtes nettement plus lentes
+                delay_ms += rng.expovariate(1.0 / profile.jitter_ms)
+        await asyncio.sleep(delay_ms / 1000)
+        if profile.failure_rate > 0 and rng.random() < profile.failure_rate:
+            self.backend.failures += 1
+            raise SimulatedDeviceError(f"{self.ip}: pas de réponse (simulé)")
+
+    async def on(self) -> None:
+        await self._round_trip()
+        self.state["device_on"] = True
+
+    async def off(self) -> None:
+        await self._round_trip()
+        self.state["device_on"] = False
+
+    async def refresh_session(self) -> None:
+        await self._round_trip(self.profile.handshake_ms)
+
+    async def get_device_info(self) -> _Result:
+        await self._round_trip()
+        return _Result(**self.state)
+
+    async def get_device_info_json(self) -> Dict[str, Any]:
+        await self._round_trip()
+        return dict(self.state)
+
+
+class SimulatedPlug(SimulatedDevice):
+    """P110/P110M: on/off + mesures de puissance"""
+
+    def __init__(self, backend, device_type, ip, profile):
+        super().__init__(backend, device_type, ip, profile)
+        self.state.update(current_power=0.0, today_energy=0.0)
+
+    def _power(self) -> float:
+        if not self.state["device_on"]:
+            return 0.0
+        return 40.0 + self.backend.rng.uniform(-5.0, 5.0)
+
+    async def get_current_power(self) -> _Result:
+        await self._round_trip()
+        self.state["current_power"] = self._power()
+        return _Result(current_power=self.state["current_power"])
+
+    async def get_energy_usage(self) -> _Result:
+        await self._round_trip()
+        self.state["today_energy"] += self.state["current_power"] / 360.0
+        return _Result(today_energy=self.state["today_energy"],
+                       month_energy=self.state["today_energy"],
+                       current_power=self.state["current_power"] * 1000)
+
+    def _hour_energy(self, hour: datetime) -> int:
+        """Consommation (Wh) d'une heure passée, déterministe par adresse et par heure"""
+        return zlib.crc32(f"{self.ip}|{hour:%Y%m%d%H}".encode()) % 60
+
+    async def get_energy_data(self, interval: str, start_date: date,
+                              end_date: Optional[date] = None) -> _Result:
+        """
+        Historique comme PlugEnergyMonitoringHandler.get_energy_data (dates UTC)
+
+        hourly: jours [start_date, end_date] (8 jours max); daily: trimestre
+        commençant à start_date; monthly: année commençant à start_date.
+        """
+        await self._round_trip()
+        now = datetime.now(timezone.utc)
+        start = datetime(start_date.year, start_date.month, start_date.day, tzinfo=timezone.utc)
+        if interval == "hourly":
+            last = end_date or start_date
+            if (last - start_date).days > 7:
+                raise ValueError("hourly: 8 jours max par requête")
+            stamps = [start + timedelta(hours=h) for h in range(((last - start_date).days + 1) * 24)]
+            length, hours = 60, 1
+        elif interval == "daily":
+            month = start_date.month + 3
+            stop = datetime(start_date.year + (month > 12), (month - 1) % 12 + 1, 1, tzinfo=timezone.utc)
+            stamps = [start + timedelta(days=d) for d in range((stop - start).days)]
+            length, hours = 1440, 24
+        elif interval == "monthly":
+            stamps = [datetime(start_date.year, m, 1, tzinfo=timezone.utc) for m in range(1, 13)]
+            length, hours = 43200, None
+        else:
+            raise ValueError(f"Intervalle inconnu: {interval}")
+        entries = []
+        for stamp in stamps:
+            if stamp >= now:
+                break
+            span = hours or 24 * calendar.monthrange(stamp.year, stamp.month)[1]
+            energy = sum(self._hour_energy(stamp + timedelta(hours=h)) for h in range(span))
+            entries.append(_Result(start_date_time=stamp, energy=energy))
+        return _Result(local_time=now, start_date_time=start, entries=entries,
+                       interval_length=length)
+
+
+class SimulatedLight(SimulatedDevice):
+    """L510/L520: on/off + luminosité"""
+
+    def __init__(self, backend, device_type, ip, profile):
+        super().__init__(backend, device_type, ip, profile)
+        self.state.update(brightness=100)
+
+    async def set_brightness(self, brightness: int) -> None:
+        if not 1 <= brightness <= 100:
+            raise ValueError("brightness doit être entre 1 et 100")
+        await self._round_trip()
+        self.state["brightness"] = brightness
+        self.state["device_on"] = True
+
+
+class SimulatedColorLight(SimulatedLight):
+    """L530: luminosité + couleur (RGB, teinte/saturation, température)"""
+
+    def __init__(self, backend, device_type, ip, profile):
+        super().__init__(backend, device_type, ip, profile)
+        self.state.update(hue=0, saturation=0, color_temp=2700)
+
+    async def set_color(self, r: int, g: int, b: int) -> None:
+        await self._round_trip()
+        h, s, v = colorsys.rgb_to_hsv(r / 255, g / 255, b / 255)
+        self.state.update(hue=round(h * 360), saturation=round(s * 100), color_temp=0,
+                          device_on=True)
+
+    async def set_hue_saturation(self, hue: int, saturation: int) -> None:
+        await self._round_trip()
+        self.state.update(hue=hue, saturation=saturation, color_temp=0, device_on=True)
+
+    async def set_color_temperature(self, color_temperature: int) -> None:
+        await self._round_trip()
+        self.state.update(color_temp=color_temperature, device_on=True)
+
+
+SIMULATED_TYPES = {
+    "P110": SimulatedPlug,
+    "P110M": SimulatedPlug,
+    "L510": SimulatedLight,
+    "L520": SimulatedLight,
+    "L530": SimulatedColorLight,
+}
+
+
+class SimulatedBackend(TapoBackend):
+    """
+    Flotte d'appareils simulés
+
+    L'état de chaque appareil est conservé par adresse IP entre deux
+    connexions, comme pour un appareil réel.
+    """
+
+    name = "sim"
+
+    def __init__(self, default: SimProfile = SimProfile(),
+                 profiles: Optional[Dict[str, SimProfile]] = None,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            default: Profil appliqué aux appareils sans profil spécifique
+            profiles: Profils par adresse IP (appareils lents ou défaillants)
+            seed: Graine du générateur aléatoire
+        """
+        self.default = default
+        self.profiles = profiles or {}
+        self.rng = random.Random(seed)
+        self.devices: Dict[str, SimulatedDevice] = {}
+        self.handshakes = 0
+        self.calls = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls) -> "SimulatedBackend":
+        """Construit le simulateur à partir des variables TAPO_SIM_*"""
+        env = os.environ
+        seed = env.get("TAPO_SIM_SEED")
+        return cls(SimProfile(
+            latency_ms=float(env.get("TAPO_SIM_LATENCY_MS", 20.0)),
+            jitter_ms=float(env.get("TAPO_SIM_JITTER_MS", 5.0)),
+            handshake_ms=float(env.get("TAPO_SIM_HANDSHAKE_MS", 150.0)),
+            failure_rate=float(env.get("TAPO_SIM_FAILURE_RATE", 0.0)),
+        ), seed=int(seed) if seed is not None else None)
+
+    def device(self, device_type: str, ip: str) -> SimulatedDevice:
+        """Retourne (en le créant si besoin) l'appareil simulé d'une adresse"""
+        dev = self.devices.get(ip)
+        if dev is None:
+            if device_type not in SIMULATED_TYPES:
+                raise ValueError(f"Type de device inconnu: {device_type}")
+            profile = self.profiles.get(ip, self.default)
+            dev = SIMULATED_TYPES[device_type](self, device_type, ip, profile)
+            self.devices[ip] = dev
+        return dev
+
+    async def connect(self, device_type: str, ip: str) -> SimulatedDevice:
+        dev = self.device(device_type, ip)
+        self.handshakes += 1
+        await dev._round_trip(dev.profile.handshake_ms)
+        return dev
+
+    def move(self, old_ip: str, new_ip: str):
+        """Simule une nouvelle adresse DHCP pour un appareil existant"""
+        dev = self.devices.pop(old_ip)
+        dev.ip = dev.state["ip"] = new_ip
+        self.devices[new_ip] = dev
+
+    async def probe(self, ip: str, timeout: float) -> Optional[Dict[str, Any]]:
+        dev = self.devices.get(ip)
+        if dev is None:
+            # Hôte absent: seul le délai de connexion est consommé
+            await asyncio.sleep(min(timeout, self.default.latency_ms * 5 / 1000))
+            return None
+        self.handshakes += 1
+        await dev._round_trip(dev.profile.handshake_ms)
+        return await dev.get_device_info_json()
+
+
+def make_backend(config) -> TapoBackend:
+    """Backend choisi par TAPO_BACKEND (défaut: appareils réels)"""
+    kind = os.environ.get("TAPO_BACKEND", ApiClientBackend.name)
+    if kind == SimulatedBackend.name:
+        return SimulatedBackend.from_env()
+    if kind != ApiClientBackend.name:
+        raise ValueError(f"Backend Tapo inconnu: {kind}")
+    return ApiClientBackend(config.credentials.email, config.credentials.password)
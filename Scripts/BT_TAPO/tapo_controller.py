@@ -0,0 +1,197 @@
+"""
+Contrôleur Tapo à sessions persistantes (chemin "démon")
+
+Contrairement au CLI bt_tapo_strict_2.py qui refait un handshake à chaque
+exécution, le contrôleur garde un handle ouvert par appareil et le réutilise
+pour toutes les commandes suivantes.
+"""
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import os
+import sys
+import time
+
+_COMMON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "COMMON")
+if _COMMON not in sys.path:
+    sys.path.insert(0, _COMMON)
+
+from metrics import REGISTRY
+from bt_tapo_strict_2 import CommandError, ConfigModel, execute_action, parse_action
+from tapo_backend import TapoBackend
+from tapo_discovery import AddressTable
+from tapo_resilience import ResiliencePolicy
+
+HANDSHAKE_SECONDS = REGISTRY.histogram(
+    "tapo_handshake_seconds", "Durée d'ouverture de session Tapo", ["device"])
+COMMAND_SECONDS = REGISTRY.histogram(
+    "tapo_command_seconds", "Latence des commandes Tapo (reprises comprises)", ["device", "command"])
+COMMANDS_TOTAL = REGISTRY.counter(
+    "tapo_commands_total", "Commandes Tapo par résultat", ["device", "command", "status"])
+
+
+class RoutedHandle:
+    """
+    Handle dont chaque requête passe par TapoController.call (session,
+    résilience, métriques); obtenu par TapoController.exclusive
+    """
+
+    REQUESTS = ("on", "off", "set_brightness", "set_hue_saturation", "set_color",
+                "get_device_info")
+
+    def __init__(self, controller: "TapoController", device_name: str, label: str):
+        self.controller = controller
+        self.device_name = device_name
+        self.label = label
+
+    def __getattr__(self, name: str):
+        if name not in self.REQUESTS:
+            raise AttributeError(name)
+
+        async def request(*args):
+            return await self.controller.call(self.device_name, self.label,
+                                              lambda handle: getattr(handle, name)(*args))
+        return request
+
+
+class TapoController:
+    """Exécute les commandes validées en réutilisant une session par appareil"""
+
+    def __init__(self, config: ConfigModel, backend: TapoBackend,
+                 policy: Optional[ResiliencePolicy] = None,
+                 addresses: Optional[AddressTable] = None):
+        """
+        Args:
+            config: Configuration validée (appareils et identifiants)
+            backend: Backend d'accès aux appareils
+            policy: Politique de timeout/reprises/disjoncteur (None = appel direct)
+            addresses: Table d'adresses découvertes (None = IP de config.yaml)
+        """
+        self.config = config
+        self.backend = backend
+        self.policy = policy
+        self.addresses = addresses
+        if policy is not None:
+            REGISTRY.register_collector(policy.collect)
+        self._handles: Dict[str, Any] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._holders: Dict[str, asyncio.Task] = {}
+
+    def _lock(self, device_name: str) -> asyncio.Lock:
+        lock = self._locks.get(device_name)
+        if lock is None:
+            lock = self._locks[device_name] = asyncio.Lock()
+        return lock
+
+    def device(self, device_name: str):
+        """Configuration d'un appareil; CommandError s'il est inconnu"""
+        if device_name not in self.config.devices:
+            raise CommandError(f"Appareil {device_name} introuvable dans config.yaml")
+        return self.config.devices[device_name]
+
+    async def handle(self, device_name: str) -> Any:
+        """Handle de session de l'appareil (handshake au premier appel uniquement)"""
+        handle = self._handles.get(device_name)
+        if handle is None:
+            device = self.device(device_name)
+            ip = device.ip
+            if self.addresses is not None:
+                ip = self.addresses.ip(device_name, ip)
+            start = time.perf_counter()
+            handle = await self.backend.connect(device.type, ip)
+            HANDSHAKE_SECONDS.labels(device_name).observe(time.perf_counter() - start)
+            self._handles[device_name] = handle
+        return handle
+
+    @asynccontextmanager
+    async def exclusive(self, device_name: str, label: str) -> AsyncIterator[RoutedHandle]:
+        """
+        Réserve un appareil pour une suite de requêtes (fondu)
+
+        Les commandes des autres tâches (file, passerelle) attendent la fin;
+        les requêtes du handle fourni passent chacune par call().
+
+        Args:
+            device_name: Nom de l'appareil
+            label: Nom des requêtes pour les métriques
+
+        Raises:
+            CommandError: Appareil inconnu
+        """
+        self.device(device_name)
+        async with self._lock(device_name):
+            self._holders[device_name] = asyncio.current_task()
+            try:
+                yield RoutedHandle(self, device_name, label)
+            finally:
+                del self._holders[device_name]
+
+    def invalidate(self, device_name: str):
+        """Oublie la session d'un appareil (nouveau handshake à la prochaine commande)"""
+        self._handles.pop(device_name, None)
+
+    async def execute(self, device_name: str, command: str, args: List[str]) -> Any:
+        """
+        Valide puis exécute une commande
+
+        Les commandes d'un même appareil sont sérialisées; en cas d'échec la
+        session est abandonnée pour forcer un nouveau handshake. Avec une
+        politique de résilience, chaque tentative est bornée dans le temps et
+        retentée, et un appareil en échec répété est refusé immédiatement.
+
+        Raises:
+            CommandError: Appareil inconnu ou commande refusée
+            CircuitOpenError: Disjoncteur ouvert pour cet appareil
+        """
+        device = self.device(device_name)
+        action_model = parse_action(device.type, command, args)
+        return await self.call(device_name, command,
+                               lambda handle: execute_action(handle, action_model))
+
+    async def call(self, device_name: str, label: str,
+                   request: Callable[[Any], Awaitable[Any]]) -> Any:
+        """
+        Exécute une requête sur la session de l'appareil (même chemin que execute)
+
+        Args:
+            device_name: Nom de l'appareil
+            label: Nom de la requête pour les métriques (commande, get_energy_data, ...)
+            request: Fonction créant la coroutine de la requête à partir du handle
+
+        Raises:
+            CommandError: Appareil inconnu
+            CircuitOpenError: Disjoncteur ouvert pour cet appareil
+        """
+        self.device(device_name)
+
+        async def attempt():
+            try:
+                handle = await self.handle(device_name)
+                return await request(handle)
+            except BaseException:
+                self.invalidate(device_name)
+                raise
+
+        def operation() -> str:
+            # Le handshake éventuel fait partie de la tentative: latences suivies à part
+            return "command" if device_name in self._handles else "session"
+
+        async def measured():
+            start = time.perf_counter()
+            try:
+                if self.policy is None:
+                    result = await attempt()
+                else:
+                    result = await self.policy.call(device_name, attempt, operation)
+            except Exception as e:
+                COMMANDS_TOTAL.labels(device_name, label, type(e).__name__).inc()
+                raise
+            COMMAND_SECONDS.labels(device_name, label).observe(time.perf_counter() - start)
+            COMMANDS_TOTAL.labels(device_name, label, "ok").inc()
+            return result
+
+        if self._holders.get(device_name) is asyncio.current_task():
+            return await measured()  # appareil déjà réservé par cette tâche (exclusive)
+        async with self._lock(device_name):
+            return await measured()
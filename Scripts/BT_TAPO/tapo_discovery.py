@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Découverte réseau des appareils Tapo et table d'adresses en cache
+
+Balayage asyncio du sous-réseau local (parallélisme borné, timeouts courts):
+chaque hôte qui répond est identifié (device_id, MAC, modèle) puis rattaché
+au nom configuré dans config.yaml, par MAC ou device_id. Les adresses
+trouvées sont enregistrées dans une table JSON que le CLI et le contrôleur
+consultent avant l'IP statique de config.yaml: une réattribution DHCP ne
+demande plus d'éditer la configuration.
+
+Sans `mac`/`device_id` dans config.yaml, l'identité d'un appareil est
+apprise lors du premier balayage qui le trouve à son adresse configurée.
+
+Exemples:
+    python tapo_discovery.py                       # sous-réseaux /24 des IP configurées
+    python tapo_discovery.py --subnet 192.168.1.0/24 --concurrency 256
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import time
+
+DEFAULT_TABLE_PATH = os.environ.get(
+    "TAPO_ADDRESS_TABLE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "addresses.json"))
+
+
+def normalize_mac(mac: Optional[str]) -> Optional[str]:
+    """AC-15-A2-01-02-03, ac:15:a2:01:02:03 -> AC15A2010203"""
+    if not mac:
+        return None
+    return "".join(c for c in mac.upper() if c in "0123456789ABCDEF")
+
+
+class AddressTable:
+    """Table nom -> adresse courante et identité (device_id, MAC) des appareils"""
+
+    def __init__(self, path: str = DEFAULT_TABLE_PATH):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_TABLE_PATH) -> "AddressTable":
+        """Table persistée (vide si absente ou illisible)"""
+        table = cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                table.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+        return table
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def ip(self, device_name: str, default: str) -> str:
+        """Adresse découverte d'un appareil, sinon l'adresse configurée"""
+        entry = self.entries.get(device_name)
+        return entry["ip"] if entry else default
+
+    def identity(self, device_name: str, device) -> Dict[str, Optional[str]]:
+        """Identité connue: config.yaml en priorité, puis la table"""
+        entry = self.entries.get(device_name, {})
+        return {
+            "mac": normalize_mac(device.mac or entry.get("mac")),
+            "device_id": device.device_id or entry.get("device_id"),
+        }
+
+
+def expand_hosts(subnets: Iterable[str]) -> List[str]:
+    """Adresses hôtes des sous-réseaux (CIDR), sans doublons, dans l'ordre"""
+    hosts: Dict[str, None] = {}
+    for subnet in subnets:
+        for host in ipaddress.ip_network(subnet, strict=False).hosts():
+            hosts[str(host)] = None
+    return list(hosts)
+
+
+def default_subnets(config) -> List[str]:
+    """Sous-réseaux /24 des adresses configurées"""
+    subnets: Dict[str, None] = {}
+    for device in config.devices.values():
+        subnets[str(ipaddress.ip_network(f"{device.ip}/24", strict=False))] = None
+    return list(subnets)
+
+
+async def sweep(backend, hosts: List[str], concurrency: int = 128,
+                timeout: float = 0.5, identify_timeout: float = 3.0) -> Dict[str, Dict[str, Any]]:
+    """
+    Sonde des adresses en parallèle
+
+    Args:
+        backend: Backend Tapo (probe)
+        hosts: Adresses à sonder
+        concurrency: Nombre max de sondes simultanées
+        timeout: Délai de connexion par hôte (s)
+        identify_timeout: Délai max (s) d'identification d'un hôte qui répond
+
+    Returns:
+        Adresse -> informations brutes des appareils Tapo trouvés
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    found: Dict[str, Dict[str, Any]] = {}
+
+    async def probe(ip: str):
+        async with semaphore:
+            try:
+                info = await asyncio.wait_for(backend.probe(ip, timeout),
+                                              timeout + identify_timeout)
+            except Exception:
+                # Hôte qui répond mais n'est pas un appareil Tapo (ou identifiants refusés)
+                return
+        if info:
+            found[ip] = info
+
+    await asyncio.gather(*(probe(ip) for ip in hosts))
+    return found
+
+
+def match_devices(config, table: AddressTable,
+                  found: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Rattache les appareils trouvés aux noms configurés et met à jour la table
+
+    Returns:
+        Rapport: appareils trouvés, déplacés, absents, et appareils inconnus
+    """
+    by_mac: Dict[str, str] = {}
+    by_id: Dict[str, str] = {}
+    for name, device in config.devices.items():
+        identity = table.identity(name, device)
+        if identity["mac"]:
+            by_mac[identity["mac"]] = name
+        if identity["device_id"]:
+            by_id[identity["device_id"]] = name
+    by_ip = {device.ip: name for name, device in config.devices.items()}
+
+    report: Dict[str, Any] = {"found": {}, "moved": {}, "missing": [], "unknown": {}}
+    now = time.time()
+    for ip, info in found.items():
+        mac = normalize_mac(info.get("mac"))
+        device_id = info.get("device_id")
+        name = by_mac.get(mac) or by_id.get(device_id)
+        if name is None and ip in by_ip:
+            name = by_ip[ip]
+            known = table.identity(name, config.devices[name])
+            if known["mac"] or known["device_id"]:
+                # Un autre appareil a repris l'adresse configurée
+                name = None
+        if name is None:
+            report["unknown"][ip] = {"model": info.get("model"), "mac": info.get("mac"),
+                                     "device_id": device_id}
+            continue
+        previous = table.ip(name, config.devices[name].ip)
+        if previous != ip:
+            report["moved"][name] = {"from": previous, "to": ip}
+        table.entries[name] = {"ip": ip, "mac": mac, "device_id": device_id,
+                               "model": info.get("model"), "seen": now}
+        report["found"][name] = ip
+    report["missing"] = sorted(set(config.devices) - set(report["found"]))
+    return report
+
+
+async def discover(config, backend, table: AddressTable, subnets: Optional[List[str]] = None,
+                   concurrency: int = 128, timeout: float = 0.5) -> Dict[str, Any]:
+    """Balayage complet + rattachement; la table est enregistrée"""
+    hosts = expand_hosts(subnets or default_subnets(config))
+    start = time.perf_counter()
+    found = await sweep(backend, hosts, concurrency, timeout)
+    report = match_devices(config, table, found)
+    report["hosts"] = len(hosts)
+    report["elapsed_s"] = round(time.perf_counter() - start, 2)
+    table.save()
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"=== DÉCOUVERTE: {report['hosts']} adresses en {report['elapsed_s']}s ===")
+    for name, ip in sorted(report["found"].items()):
+        moved = report["moved"].get(name)
+        suffix = f"  (ancienne adresse {moved['from']})" if moved else ""
+        print(f"  {name:<20} {ip}{suffix}")
+    for ip, info in sorted(report["unknown"].items()):
+        print(f"  {'?':<20} {ip}  {info['model']} {info['mac']} (non configuré)")
+    if report["missing"]:
+        print(f"Introuvables: {', '.join(report['missing'])}")
+
+
+async def discovery_main(args):
+    from bt_tapo_strict_2 import CONFIG_PATH, load_config
+    from tapo_backend import make_backend
+
+    config = load_config(path=args.config or CONFIG_PATH)
+    table = AddressTable.load(args.table)
+    report = await discover(config, make_backend(config), table, args.subnet,
+                            args.concurrency, args.timeout)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Découverte des appareils Tapo sur le réseau local")
+    parser.add_argument("--subnet", action="append", default=None,
+                        help="Sous-réseau CIDR à balayer (répétable; défaut: /24 des IP configurées)")
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--timeout", type=float, default=0.5, help="Délai de connexion par hôte (s)")
+    parser.add_argument("--table", default=DEFAULT_TABLE_PATH, help="Table d'adresses JSON")
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--json", action="store_true", help="Rapport au format JSON")
+    asyncio.run(discovery_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
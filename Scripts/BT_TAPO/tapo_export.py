@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Export en flux de l'historique d'énergie des prises P110/P110M
+
+L'historique est lu sur les appareils (get_energy_data) page par page: 8
+jours par requête en horaire, un trimestre en journalier, une année en
+mensuel. Les prises sont interrogées en parallèle (concurrence bornée);
+chaque page passe par une file bornée vers un unique écrivain qui l'ajoute
+au fichier de sortie puis enregistre le point de reprise. La mémoire reste
+bornée (taille de file x taille de page) quelle que soit la période.
+
+Sorties:
+    csv       ts_ms,timestamp_utc,device,energy_wh (+ FICHIER.state.json)
+    columnar  table colonne append-only (ts, device, energy), même format que
+              le stockage de télémétrie (tapo_telemetry.ColumnTable)
+
+Les lignes d'une même prise sont écrites dans l'ordre chronologique; les
+prises sont entrelacées page par page. Avec --resume, l'export reprend pour
+chaque prise après le dernier horodatage écrit (CSV tronqué au dernier point
+de reprise: pas de doublon après un arrêt brutal). Un export existant n'est
+jamais écrasé: sans --resume, ou sans point de reprise, l'export est refusé.
+
+Exemples:
+    python tapo_export.py energy.csv --start 2024-01-01
+    python tapo_export.py energy.csv --start 2024-01-01 --resume
+    python tapo_export.py history/ --format columnar --interval daily --start 2023-01-01
+"""
+
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from datetime import date, datetime, timedelta, timezone
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+
+from tapo_telemetry import DEFAULT_CONFIG_PATH, TelemetryStore, energy_devices
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Nom de colonne -> code de type du module array
+HISTORY_COLUMNS = {
+    "ts": "q",
+    "device": "H",
+    "energy": "f",
+}
+
+INTERVALS = ("hourly", "daily", "monthly")
+
+Row = Tuple[int, str, float]
+
+
+class EnergyHistoryStore(TelemetryStore):
+    """Historique d'énergie par intervalle (timestamp, appareil, Wh)"""
+
+    LAYOUT = HISTORY_COLUMNS
+
+    def add_entry(self, ts_ms: int, device: str, energy_wh: float):
+        self.append((ts_ms, self.device_id(device), energy_wh))
+
+    def entries(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                devices: Optional[List[str]] = None) -> Iterator[Row]:
+        names = self._device_names
+        for ts, dev, energy in self.scan(start_ms, end_ms, self.device_filter(devices)):
+            yield ts, names[dev], energy
+
+    def last_timestamps(self) -> Dict[str, int]:
+        """Dernier horodatage écrit par appareil (parcours en flux des colonnes)"""
+        last: Dict[str, int] = {}
+        for ts, name, _energy in self.entries():
+            if ts > last.get(name, -1):
+                last[name] = ts
+        return last
+
+
+class CsvExportWriter:
+    """CSV ajouté au fil de l'eau; point de reprise (taille + horodatages) à côté"""
+
+    HEADER = ["ts_ms", "timestamp_utc", "device", "energy_wh"]
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.state_path = path + ".state.json"
+        self.state: Dict[str, Any] = {"offset": 0, "devices": {}}
+        has_rows = os.path.exists(path) and os.path.getsize(path) > 0
+        if has_rows and not os.path.exists(self.state_path):
+            # Sans point de reprise, impossible de savoir où reprendre: ne rien écraser
+            raise ValueError(f"{path} existe sans {os.path.basename(self.state_path)}: "
+                             "choisir un autre fichier")
+        if has_rows and not resume:
+            raise ValueError(f"{path} contient déjà un export: --resume pour compléter")
+        if resume and os.path.exists(self.state_path) and not os.path.exists(path):
+            raise ValueError(f"{path} introuvable: point de reprise sans export")
+        if resume and os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+            self.file = open(path, "a+", newline="", encoding="utf-8")
+            # Lignes écrites après le dernier point de reprise: réécrites
+            self.file.truncate(self.state["offset"])
+            self.file.seek(self.state["offset"])
+        else:
+            self.file = open(path, "w", newline="", encoding="utf-8")
+            csv.writer(self.file).writerow(self.HEADER)
+            self.commit()
+        self.writer = csv.writer(self.file)
+
+    def resume_points(self) -> Dict[str, int]:
+        return dict(self.state["devices"])
+
+    def write(self, rows: List[Row]):
+        self.writer.writerows(
+            (ts, datetime.fromtimestamp(ts / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+             device, energy)
+            for ts, device, energy in rows)
+
+    def commit(self, device: Optional[str] = None, last_ts: Optional[int] = None):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.state["offset"] = self.file.tell()
+        if device is not None:
+            self.state["devices"][device] = last_ts
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_path)
+
+    def close(self):
+        self.file.close()
+
+
+class ColumnarExportWriter:
+    """Table colonne (EnergyHistoryStore): le contenu fait office de point de reprise"""
+
+    def __init__(self, path: str, resume: bool = False):
+        self.store = EnergyHistoryStore(path)
+        if self.store.end and not resume:
+            self.store.close()
+            raise ValueError(f"{path} contient déjà {self.store.end} lignes: --resume pour compléter")
+
+    def resume_points(self) -> Dict[str, int]:
+        return self.store.last_timestamps()
+
+    def write(self, rows: List[Row]):
+        for ts, device, energy in rows:
+            self.store.add_entry(ts, device, energy)
+
+    def commit(self, device: Optional[str] = None, last_ts: Optional[int] = None):
+        self.store.flush()
+
+    def close(self):
+        self.store.close()
+
+
+WRITERS = {"csv": CsvExportWriter, "columnar": ColumnarExportWriter}
+
+
+def _utc_ms(day: date) -> int:
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def pages(interval: str, first: date, last: date) -> Iterator[Tuple[date, Optional[date]]]:
+    """
+    Pages (start_date, end_date) de get_energy_data couvrant [first, last]
+
+    hourly: 8 jours max par requête; daily: début de trimestre; monthly: début d'année
+    """
+    if interval == "hourly":
+        day = first
+        while day <= last:
+            yield day, min(day + timedelta(days=7), last)
+            day += timedelta(days=8)
+    elif interval == "daily":
+        month = 3 * ((first.month - 1) // 3) + 1
+        quarter = date(first.year, month, 1)
+        while quarter <= last:
+            yield quarter, None
+            month = quarter.month + 3
+            quarter = date(quarter.year + (month > 12), (month - 1) % 12 + 1, 1)
+    elif interval == "monthly":
+        for year in range(first.year, last.year + 1):
+            yield date(year, 1, 1), None
+    else:
+        raise ValueError(f"Intervalle inconnu: {interval}")
+
+
+async def device_history(controller, name: str, interval: str, start: date, end: date,
+                         after_ms: Optional[int] = None) -> AsyncIterator[List[Row]]:
+    """
+    Historique d'une prise, page par page
+
+    Args:
+        controller: TapoController (session, timeouts et reprises par appareil)
+        name: Nom de la prise
+        interval: hourly, daily ou monthly
+        start: Premier jour (UTC)
+        end: Jour de fin exclu (UTC)
+        after_ms: Dernier horodatage déjà exporté (reprise)
+
+    Yields:
+        Lignes (ts_ms, appareil, Wh) d'une page, dans l'ordre chronologique
+    """
+    lo = _utc_ms(start)
+    if after_ms is not None:
+        lo = max(lo, after_ms + 1)
+    hi = _utc_ms(end)
+    first = datetime.fromtimestamp(lo / 1000, timezone.utc).date()
+    energy_interval = controller.backend.energy_interval(interval)
+    for page_start, page_end in pages(interval, first, end - timedelta(days=1)):
+        result = await controller.call(
+            name, "get_energy_data",
+            lambda handle, s=page_start, e=page_end: handle.get_energy_data(energy_interval, s, e))
+        rows = []
+        for entry in result.entries:
+            stamp = entry.start_date_time
+            if stamp.tzinfo is None:
+                stamp = stamp.replace(tzinfo=timezone.utc)
+            ts = int(stamp.timestamp() * 1000)
+            if entry.energy is None or ts < lo or ts >= hi:
+                continue
+            rows.append((ts, name, float(entry.energy)))
+        if rows:
+            yield rows
+
+
+async def export(controller, devices: List[str], writer, interval: str, start: date, end: date,
+                 concurrency: int = 8, queue_pages: int = 16) -> Dict[str, Any]:
+    """
+    Exporte l'historique de plusieurs prises vers un écrivain
+
+    Args:
+        controller: TapoController
+        devices: Noms des prises
+        writer: CsvExportWriter ou ColumnarExportWriter
+        interval: hourly, daily ou monthly
+        start: Premier jour (UTC)
+        end: Jour de fin exclu (UTC)
+        concurrency: Prises interrogées simultanément
+        queue_pages: Pages en attente d'écriture au plus (borne mémoire)
+
+    Returns:
+        Statistiques: lignes et pages écrites, erreurs par prise, durée
+    """
+    resume = writer.resume_points()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_pages)
+    semaphore = asyncio.Semaphore(concurrency)
+    stats: Dict[str, Any] = {"rows": 0, "pages": 0, "devices": {name: 0 for name in devices},
+                             "errors": {}, "max_queue": 0}
+    start_time = time.perf_counter()
+
+    async def produce(name: str):
+        async with semaphore:
+            try:
+                async for rows in device_history(controller, name, interval, start, end,
+                                                 resume.get(name)):
+                    await queue.put((name, rows))
+            except Exception as e:
+                stats["errors"][name] = f"{type(e).__name__}: {e}"
+
+    async def producers_done():
+        await asyncio.gather(*(produce(name) for name in devices))
+        await queue.put(None)
+
+    feeder = asyncio.create_task(producers_done())
+    try:
+        while True:
+            stats["max_queue"] = max(stats["max_queue"], queue.qsize())
+            item = await queue.get()
+            if item is None:
+                break
+            name, rows = item
+            writer.write(rows)
+            writer.commit(name, rows[-1][0])
+            stats["rows"] += len(rows)
+            stats["pages"] += 1
+            stats["devices"][name] += len(rows)
+    finally:
+        feeder.cancel()
+        await asyncio.gather(feeder, return_exceptions=True)
+    stats["elapsed_s"] = round(time.perf_counter() - start_time, 2)
+    if resource is not None:
+        # ru_maxrss: Ko sous Linux
+        stats["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return stats
+
+
+def print_stats(stats: Dict[str, Any]):
+    print(f"=== EXPORT: {stats['rows']} lignes, {stats['pages']} pages "
+          f"en {stats['elapsed_s']}s ===")
+    for name, rows in sorted(stats["devices"].items()):
+        error = stats["errors"].get(name)
+        print(f"  {name:<20} {rows:>8} lignes" + (f"  ERREUR {error}" if error else ""))
+    extra = f", mémoire max {stats['max_rss_mb']} Mo" if "max_rss_mb" in stats else ""
+    print(f"File d'écriture: {stats['max_queue']} pages max{extra}")
+
+
+async def export_main(args):
+    from bt_tapo_strict_2 import load_config
+    from tapo_backend import make_backend
+    from tapo_controller import TapoController
+    from tapo_discovery import AddressTable
+    from tapo_resilience import ResiliencePolicy
+
+    config = load_config(path=args.config)
+    devices = list(energy_devices(config))
+    if args.device:
+        devices = [name for name in devices if name in args.device]
+    if not devices:
+        print("Aucune prise P110/P110M à exporter")
+        sys.exit(1)
+
+    start = date.fromisoformat(args.start)
+    end = date.fromisoformat(args.end) if args.end else datetime.now(timezone.utc).date() + timedelta(days=1)
+    try:
+        writer = WRITERS[args.format](args.output, resume=args.resume)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    policy = ResiliencePolicy.load()
+    controller = TapoController(config, make_backend(config), policy, AddressTable.load())
+    try:
+        stats = await export(controller, devices, writer, args.interval, start, end,
+                             args.concurrency, args.queue_pages)
+    finally:
+        writer.close()
+        policy.save()
+    if args.json:
+        print(json.dumps(stats, indent=2, ensure_ascii=False))
+    else:
+        print_stats(stats)
+    if stats["errors"]:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export de l'historique d'énergie des prises P110")
+    parser.add_argument("output", help="Fichier CSV ou répertoire de la table colonne")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="csv")
+    parser.add_argument("--interval", choices=INTERVALS, default="hourly")
+    parser.add_argument("--start", required=True, help="Premier jour UTC (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Jour de fin exclu (défaut: demain)")
+    parser.add_argument("--device", action="append", help="Prise à exporter (répétable; défaut: toutes)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reprend après le dernier horodatage exporté par prise")
+    parser.add_argument("--concurrency", type=int, default=8, help="Prises interrogées simultanément")
+    parser.add_argument("--queue-pages", type=int, default=16,
+                        help="Pages en attente d'écriture au plus (borne mémoire)")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH)
+    parser.add_argument("--json", action="store_true", help="Statistiques au format JSON")
+    asyncio.run(export_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Test de charge du chemin de commande Tapo sur une flotte simulée
+
+Modes:
+    daemon   contrôleur partagé, une session persistante par appareil
+    oneshot  validation + handshake + commande à chaque appel (chemin du CLI, en processus)
+    cli      un processus bt_tapo_strict_2.py par commande (TAPO_BACKEND=sim)
+    gateway  idem, mais le CLI relaie à une passerelle locale (TAPO_GATEWAY)
+             qui garde les sessions ouvertes: cli = à froid, gateway = à chaud
+
+Exemples:
+    python tapo_loadtest.py --devices 500 --commands 5000 --concurrency 64 --mode daemon
+    python tapo_loadtest.py --devices 5 --commands 50 --concurrency 1 --mode cli
+    python tapo_loadtest.py --devices 5 --commands 50 --concurrency 1 --mode gateway
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import yaml
+
+from bt_tapo_strict_2 import ConfigModel, execute_action, parse_action
+from tapo_backend import SimProfile, SimulatedBackend
+from tapo_controller import TapoController
+from tapo_queue import CommandQueue
+from tapo_resilience import ResiliencePolicy
+
+DEVICE_TYPES = ["L530", "L510", "L520", "P110", "P110M"]
+STRICT_CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bt_tapo_strict_2.py")
+GATEWAY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "GATEWAY")
+CLI_MODES = ("cli", "gateway")
+
+
+def fleet_config(count: int) -> Dict[str, Any]:
+    """Configuration synthétique de `count` appareils (types en alternance)"""
+    devices = {}
+    for i in range(count):
+        devices[f"dev{i:04d}"] = {
+            "type": DEVICE_TYPES[i % len(DEVICE_TYPES)],
+            "ip": f"10.{(i >> 16) & 0xFF}.{(i >> 8) & 0xFF}.{i & 0xFF}",
+        }
+    return {
+        "credentials": {"email": "loadtest@example.com", "password": "loadtest"},
+        "devices": devices,
+    }
+
+
+def random_command(rng: random.Random, device_type: str) -> Tuple[str, List[str]]:
+    """Commande valide tirée au hasard pour un type d'appareil"""
+    choices = ["on", "off"]
+    if device_type in ("L510", "L520", "L530"):
+        choices.append("set_brightness")
+    if device_type == "L530":
+        choices.append("set_color")
+    command = rng.choice(choices)
+    if command == "set_brightness":
+        return command, [str(rng.randint(1, 100))]
+    if command == "set_color":
+        return command, [str(rng.randint(0, 255)) for _ in range(3)]
+    return command, []
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+class LoadTest:
+    """Génère les commandes, les exécute avec une concurrence bornée et mesure"""
+
+    def __init__(self, config: Dict[str, Any], backend: SimulatedBackend, mode: str,
+                 commands: int, concurrency: int, seed: Optional[int] = None,
+                 policy: Optional[ResiliencePolicy] = None,
+                 queue_rate: Optional[float] = None, queue_burst: float = 4.0):
+        self.raw_config = config
+        self.config = ConfigModel(**config)
+        self.backend = backend
+        self.mode = mode
+        self.commands = commands
+        self.concurrency = concurrency
+        self.rng = random.Random(seed)
+        self.policy = policy
+        self.controller = TapoController(self.config, backend, policy)
+        self.queue_rate = queue_rate
+        self.queue_burst = queue_burst
+        self.queue: Optional[CommandQueue] = None
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self._workdir: Optional[tempfile.TemporaryDirectory] = None
+        self._gateway_url: Optional[str] = None
+
+    def _plan(self) -> List[Tuple[str, str, List[str]]]:
+        names = list(self.config.devices)
+        plan = []
+        for _ in range(self.commands):
+            name = self.rng.choice(names)
+            command, args = random_command(self.rng, self.config.devices[name].type)
+            plan.append((name, command, args))
+        return plan
+
+    async def _oneshot(self, name: str, command: str, args: List[str]) -> Any:
+        device = self.config.devices[name]
+        action_model = parse_action(device.type, command, args)
+        handle = await self.backend.connect(device.type, device.ip)
+        return await execute_action(handle, action_model)
+
+    async def _cli(self, name: str, command: str, args: List[str]) -> Any:
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, STRICT_CLI, name, command, *args,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            env=self._cli_env(),
+        )
+        output, _ = await proc.communicate()
+        if proc.returncode != 0:
+            lines = output.decode(errors="replace").strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else f"code {proc.returncode}")
+        return output
+
+    def _cli_env(self) -> Dict[str, str]:
+        profile = self.backend.default
+        workdir = self._workdir.name
+        env = dict(os.environ)
+        env.update({
+            "TAPO_BACKEND": "sim",
+            "TAPO_CONFIG": os.path.join(workdir, "config.yaml"),
+            # État local des processus dans le répertoire temporaire: celui de
+            # l'opérateur (disjoncteurs, adresses) n'est ni lu ni écrasé
+            "TAPO_RESILIENCE_STATE": os.path.join(workdir, "resilience.json"),
+            "TAPO_ADDRESS_TABLE": os.path.join(workdir, "addresses.json"),
+            "TAPO_SIM_LATENCY_MS": str(profile.latency_ms),
+            "TAPO_SIM_JITTER_MS": str(profile.jitter_ms),
+            "TAPO_SIM_HANDSHAKE_MS": str(profile.handshake_ms),
+            "TAPO_SIM_FAILURE_RATE": str(profile.failure_rate),
+        })
+        env.pop("TAPO_GATEWAY", None)
+        if self._gateway_url is not None:
+            env["TAPO_GATEWAY"] = self._gateway_url
+        return env
+
+    async def _start_gateway(self):
+        """Passerelle sur la boucle locale, adossée au contrôleur (et au simulateur) du test"""
+        if GATEWAY_DIR not in sys.path:
+            sys.path.insert(0, GATEWAY_DIR)
+        from aiohttp import web
+        from gateway import Gateway, make_app
+
+        gateway = Gateway(self.controller, queue=self.queue)
+        runner = web.AppRunner(make_app(gateway))
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        host, port = runner.addresses[0][:2]
+        self._gateway_url = f"http://{host}:{port}"
+        return runner, gateway
+
+    async def _run_one(self, semaphore: asyncio.Semaphore, name: str, command: str,
+                       args: List[str]):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if self.mode == "daemon":
+                    executor = self.queue if self.queue is not None else self.controller
+                    await executor.execute(name, command, args)
+                elif self.mode == "oneshot":
+                    await self._oneshot(name, command, args)
+                else:
+                    await self._cli(name, command, args)
+            except Exception as e:
+                key = type(e).__name__
+                self.errors[key] = self.errors.get(key, 0) + 1
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+    async def run(self) -> Dict[str, Any]:
+        plan = self._plan()
+        if self.mode in CLI_MODES:
+            self._workdir = tempfile.TemporaryDirectory(prefix="tapo_loadtest_")
+            with open(os.path.join(self._workdir.name, "config.yaml"), "w", encoding="utf-8") as f:
+                yaml.safe_dump(self.raw_config, f)
+        if self.queue_rate is not None:
+            self.queue = CommandQueue(self.controller, self.queue_rate, self.queue_burst)
+        server = None
+        if self.mode == "gateway":
+            server = await self._start_gateway()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(self._run_one(semaphore, *item) for item in plan))
+        finally:
+            if server is not None:
+                runner, gateway = server
+                await runner.cleanup()
+                gateway.close()
+            if self._workdir is not None:
+                self._workdir.cleanup()
+            if self.queue is not None:
+                await self.queue.close()
+        elapsed = time.perf_counter() - start
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        lat = sorted(self.latencies)
+        failed = sum(self.errors.values())
+        return {
+            "mode": self.mode,
+            "devices": len(self.config.devices),
+            "commands": len(lat),
+            "succeeded": len(lat) - failed,
+            "errors": self.errors,
+            "concurrency": self.concurrency,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_cmd_s": round(len(lat) / elapsed, 1) if elapsed > 0 else 0.0,
+            # Mode cli: handshakes faits dans les processus enfants, non comptés ici;
+            # mode gateway: faits par la passerelle du test, donc comptés
+            "handshakes": None if self.mode == "cli" else self.backend.handshakes,
+            "latency_ms": {
+                "p50": round(percentile(lat, 0.50) * 1000, 2),
+                "p90": round(percentile(lat, 0.90) * 1000, 2),
+                "p99": round(percentile(lat, 0.99) * 1000, 2),
+                "p999": round(percentile(lat, 0.999) * 1000, 2),
+                "max": round(lat[-1] * 1000, 2) if lat else 0.0,
+            },
+            "resilience": self.resilience_summary(),
+            "queue": self.queue_summary(),
+        }
+
+    def queue_summary(self) -> Optional[Dict[str, int]]:
+        """Fusions et profondeur max des files par appareil (mode daemon)"""
+        if self.queue is None:
+            return None
+        stats = self.queue.stats().values()
+        return {
+            "coalesced": sum(s["coalesced"] for s in stats),
+            "executed": sum(s["executed"] for s in stats),
+            "max_depth": max((s["max_depth"] for s in stats), default=0),
+        }
+
+    def resilience_summary(self) -> Optional[Dict[str, int]]:
+        """Compteurs agrégés de la politique de résilience (mode daemon)"""
+        if self.policy is None:
+            return None
+        metrics = self.policy.metrics().values()
+        summary = {key: sum(m[key] for m in metrics)
+                   for key in ("retries", "timeouts", "short_circuits", "trips")}
+        summary["open_breakers"] = sum(1 for m in metrics if m["breaker"] != "closed")
+        return summary
+
+
+def print_report(report: Dict[str, Any]):
+    lat = report["latency_ms"]
+    print(f"=== TEST DE CHARGE ({report['mode']}) ===")
+    print(f"Appareils: {report['devices']}  concurrence: {report['concurrency']}")
+    print(f"Commandes: {report['commands']}  réussies: {report['succeeded']}  "
+          f"erreurs: {report['errors'] or 0}")
+    if report["handshakes"] is not None:
+        print(f"Handshakes: {report['handshakes']}")
+    print(f"Durée: {report['elapsed_s']}s  débit: {report['throughput_cmd_s']} cmd/s")
+    print(f"Latence (ms): p50 {lat['p50']}  p90 {lat['p90']}  p99 {lat['p99']}  "
+          f"p99.9 {lat['p999']}  max {lat['max']}")
+    queue = report.get("queue")
+    if queue:
+        print(f"Files: {queue['executed']} envoyées, {queue['coalesced']} fusionnées, "
+              f"profondeur max {queue['max_depth']}")
+    res = report.get("resilience")
+    if res:
+        print(f"Résilience: {res['retries']} reprises, {res['timeouts']} timeouts, "
+              f"{res['short_circuits']} refus immédiats, {res['trips']} ouvertures "
+              f"({res['open_breakers']} disjoncteurs ouverts)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge Tapo sur flotte simulée")
+    parser.add_argument("--mode", choices=["daemon", "oneshot", *CLI_MODES], default="daemon")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--commands", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--handshake-ms", type=float, default=150.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--slow-fraction", type=float, default=0.0,
+                        help="Part des appareils lents/défaillants")
+    parser.add_argument("--slow-latency-ms", type=float, default=1000.0)
+    parser.add_argument("--slow-failure-rate", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--resilience", action="store_true",
+                        help="Timeouts, reprises et disjoncteur (mode daemon)")
+    parser.add_argument("--queue-rate", type=float, default=None,
+                        help="File par appareil: commandes/s (mode daemon)")
+    parser.add_argument("--queue-burst", type=float, default=4.0)
+    parser.add_argument("--json", action="store_true", help="Rapport au format JSON")
+    args = parser.parse_args()
+
+    config = fleet_config(args.devices)
+    rng = random.Random(args.seed)
+    default = SimProfile(args.latency_ms, args.jitter_ms, args.handshake_ms, args.failure_rate)
+    slow = SimProfile(args.slow_latency_ms, args.jitter_ms, args.handshake_ms,
+                      args.slow_failure_rate)
+    profiles = {
+        dev["ip"]: slow
+        for dev in config["devices"].values()
+        if rng.random() < args.slow_fraction
+    }
+    if args.mode == "cli" and profiles:
+        print("--slow-fraction n'est pas transmis aux processus CLI (profil par défaut seul)")
+
+    backend = SimulatedBackend(default, profiles, seed=args.seed)
+    policy = None
+    if args.resilience:
+        if args.mode != "daemon":
+            print("--resilience n'est appliqué qu'en mode daemon")
+        policy = ResiliencePolicy(rng=random.Random(args.seed))
+    if args.queue_rate is not None and args.mode != "daemon":
+        print("--queue-rate n'est appliqué qu'en mode daemon")
+    test = LoadTest(config, backend, args.mode, args.commands, args.concurrency, args.seed,
+                    policy, args.queue_rate if args.mode == "daemon" else None,
+                    args.queue_burst)
+    report = asyncio.run(test.run())
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
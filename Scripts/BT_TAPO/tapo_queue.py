@@ -0,0 +1,198 @@
+"""
+File de commandes par appareil Tapo: limitation de débit et fusion
+
+Chaque appareil a sa propre file, vidée par une tâche dédiée au rythme d'un
+seau à jetons (token bucket). Les commandes en attente qui portent sur le
+même attribut (alimentation, luminosité, couleur) sont fusionnées: seule la
+dernière valeur est envoyée, les commandes remplacées reçoivent le résultat
+de celle qui les remplace. Utile pour les curseurs et les automatisations
+qui se déclenchent ensemble.
+"""
+
+from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+import asyncio
+import time
+
+from bt_tapo_strict_2 import parse_action
+
+# Commande -> attribut modifié (clé de fusion)
+COMMAND_ATTRIBUTES = {
+    "on": "power",
+    "off": "power",
+    "set_brightness": "brightness",
+    "set_color": "color",
+}
+
+
+class TokenBucket:
+    """Seau à jetons: `rate` jetons par seconde, au plus `burst` en réserve"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Attente nécessaire (s) avant de disposer d'un jeton"""
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self.delay()
+            if wait <= 0:
+                self.tokens -= 1
+                return
+            await asyncio.sleep(wait)
+
+
+class _Pending:
+    def __init__(self, command: str, args: List[str]):
+        self.command = command
+        self.args = args
+        self.futures: List[asyncio.Future] = [asyncio.get_running_loop().create_future()]
+        self.queued_at = time.monotonic()
+
+
+class DeviceQueue:
+    """File d'un appareil: une commande en attente au plus par attribut"""
+
+    def __init__(self, rate: float, burst: float):
+        self.bucket = TokenBucket(rate, burst)
+        self.pending: "OrderedDict[str, _Pending]" = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.submitted = 0
+        self.coalesced = 0
+        self.executed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+
+
+class CommandQueue:
+    """Files par appareil devant un TapoController"""
+
+    def __init__(self, controller, rate: float = 2.0, burst: float = 4.0):
+        """
+        Args:
+            controller: TapoController exécutant les commandes
+            rate: Commandes par seconde et par appareil (régime établi)
+            burst: Commandes envoyables immédiatement après une période calme
+        """
+        self.controller = controller
+        self.rate = rate
+        self.burst = burst
+        self._queues: Dict[str, DeviceQueue] = {}
+
+    def _queue(self, device_name: str) -> DeviceQueue:
+        queue = self._queues.get(device_name)
+        if queue is None:
+            queue = self._queues[device_name] = DeviceQueue(self.rate, self.burst)
+        if queue.task is None or queue.task.done():
+            queue.task = asyncio.create_task(self._drain(device_name, queue))
+        return queue
+
+    def submit(self, device_name: str, command: str, args: List[str]) -> asyncio.Future:
+        """
+        Met une commande en file
+
+        Une commande en attente sur le même attribut est remplacée: elle quitte
+        sa place et la nouvelle valeur passe en fin de file, ce qui préserve
+        l'ordre relatif des attributs (ex: set_brightness puis off).
+
+        Returns:
+            Future résolu avec le résultat de l'exécution (ou de la commande
+            qui l'a remplacée)
+
+        Raises:
+            CommandError: Appareil inconnu ou commande refusée (validée immédiatement)
+        """
+        device = self.controller.device(device_name)
+        parse_action(device.type, command, args)
+        queue = self._queue(device_name)
+        key = COMMAND_ATTRIBUTES.get(command, command)
+        entry = _Pending(command, args)
+        previous = queue.pending.pop(key, None)
+        if previous is not None:
+            queue.coalesced += 1
+            entry.futures[:0] = previous.futures
+            entry.queued_at = previous.queued_at
+        queue.pending[key] = entry
+        queue.submitted += 1
+        queue.max_depth = max(queue.max_depth, len(queue.pending))
+        queue.wakeup.set()
+        return entry.futures[-1]
+
+    async def execute(self, device_name: str, command: str, args: List[str]) -> Any:
+        """Comme TapoController.execute, en passant par la file de l'appareil"""
+        return await self.submit(device_name, command, args)
+
+    async def _drain(self, device_name: str, queue: DeviceQueue):
+        while True:
+            if not queue.pending:
+                queue.wakeup.clear()
+                await queue.wakeup.wait()
+                continue
+            # Le jeton est pris avant de choisir la commande: les valeurs
+            # arrivées pendant l'attente remplacent encore celles en file
+            await queue.bucket.acquire()
+            _key, entry = queue.pending.popitem(last=False)
+            queue.wait_total += time.monotonic() - entry.queued_at
+            try:
+                result = await self.controller.execute(device_name, entry.command, entry.args)
+            except asyncio.CancelledError:
+                for future in entry.futures:
+                    future.cancel()
+                raise
+            except Exception as e:
+                queue.failed += 1
+                for future in entry.futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            queue.executed += 1
+            for future in entry.futures:
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Profondeur de file, fusions et attente moyenne par appareil"""
+        out = {}
+        for name, queue in self._queues.items():
+            sent = queue.executed + queue.failed
+            out[name] = {
+                "depth": len(queue.pending),
+                "max_depth": queue.max_depth,
+                "submitted": queue.submitted,
+                "coalesced": queue.coalesced,
+                "executed": queue.executed,
+                "failed": queue.failed,
+                "wait_ms_avg": round(queue.wait_total / sent * 1000, 1) if sent else 0.0,
+            }
+        return out
+
+    def collect(self):
+        """Collecteur pour le registre de métriques (COMMON/metrics.py)"""
+        stats = self.stats()
+        yield ("tapo_queue_depth", "gauge", "Commandes en attente par appareil",
+               [({"device": name}, s["depth"]) for name, s in stats.items()])
+        yield ("tapo_queue_coalesced_total", "counter", "Commandes remplacées avant envoi",
+               [({"device": name}, s["coalesced"]) for name, s in stats.items()])
+
+    async def close(self):
+        tasks = [q.task for q in self._queues.values() if q.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for queue in self._queues.values():
+            for entry in queue.pending.values():
+                for future in entry.futures:
+                    future.cancel()
+            queue.pending.clear()
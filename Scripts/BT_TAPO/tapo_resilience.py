@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Politique de résilience des appels Tapo: timeout, reprises et disjoncteur
+
+- timeout dérivé de la latence observée (multiple du p99 par appareil et par
+  opération), borné, avec une valeur par défaut tant que l'historique est court
+- reprises bornées avec backoff exponentiel et jitter complet
+- disjoncteur par appareil: après plusieurs échecs consécutifs, les appels
+  échouent immédiatement pendant un délai de refroidissement, puis un seul
+  appel d'essai (half-open) décide de la fermeture ou d'une nouvelle ouverture
+- métriques par appareil (état du disjoncteur, compteurs, latences)
+
+L'état peut être persisté en JSON pour que les exécutions successives du CLI
+partagent les latences observées et les disjoncteurs ouverts.
+
+Exemples:
+    python tapo_resilience.py               # métriques de l'état persisté
+    python tapo_resilience.py --reset salon_lampe
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+from collections import deque
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+DEFAULT_STATE_PATH = os.environ.get(
+    "TAPO_RESILIENCE_STATE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "resilience.json"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Appel refusé sans tentative: disjoncteur ouvert pour cet appareil"""
+
+
+class LatencyTracker:
+    """Fenêtre glissante des latences réussies d'une opération"""
+
+    def __init__(self, window: int = 256):
+        self.samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Disjoncteur d'un appareil (horloge murale pour pouvoir être persisté)"""
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0,
+                 max_cooldown: float = 300.0):
+        """
+        Args:
+            failure_threshold: Échecs consécutifs avant ouverture
+            cooldown: Délai initial (s) avant l'appel d'essai
+            max_cooldown: Délai max (s); il double à chaque essai raté
+        """
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.cooldown = cooldown
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self, now: float) -> bool:
+        """Autorise (ou non) une tentative; passe en half-open après le refroidissement"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def retry_in(self, now: float) -> float:
+        return max(0.0, self.opened_at + self.cooldown - now)
+
+    def release(self):
+        """Essai sans verdict (annulé, erreur non retentée): un autre essai pourra passer"""
+        self._probing = False
+
+    def success(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.cooldown = self.base_cooldown
+        self._probing = False
+
+    def failure(self, now: float) -> bool:
+        """Enregistre un échec; retourne True si le disjoncteur vient de s'ouvrir"""
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN:
+            self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+        elif self.consecutive_failures < self.failure_threshold:
+            return False
+        self.state = OPEN
+        self.opened_at = now
+        self._probing = False
+        return True
+
+
+class DeviceStats:
+    """Compteurs et latences d'un appareil"""
+
+    def __init__(self, breaker: CircuitBreaker, window: int):
+        self.breaker = breaker
+        self.latency: Dict[str, LatencyTracker] = {}
+        self.window = window
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.short_circuits = 0
+        self.trips = 0
+
+    def tracker(self, op: str) -> LatencyTracker:
+        tracker = self.latency.get(op)
+        if tracker is None:
+            tracker = self.latency[op] = LatencyTracker(self.window)
+        return tracker
+
+
+def default_retryable(error: Exception) -> bool:
+    """Les erreurs de validation (ValueError, TypeError) ne sont jamais retentées"""
+    return not isinstance(error, (ValueError, TypeError))
+
+
+class ResiliencePolicy:
+    """Enveloppe les appels aux appareils avec timeout, reprises et disjoncteur"""
+
+    def __init__(self, attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0,
+                 timeout_multiplier: float = 3.0, min_timeout: float = 0.5,
+                 max_timeout: float = 10.0, default_timeout: float = 5.0,
+                 min_samples: int = 20, failure_threshold: int = 3,
+                 cooldown: float = 30.0, max_cooldown: float = 300.0,
+                 window: int = 256,
+                 retryable: Callable[[Exception], bool] = default_retryable,
+                 rng: Optional[random.Random] = None):
+        """
+        Args:
+            attempts: Nombre max de tentatives par appel
+            base_delay: Délai de base (s) du backoff entre tentatives
+            max_delay: Délai max (s) entre tentatives
+            timeout_multiplier: Timeout = multiplicateur x p99 observé
+            min_timeout: Timeout minimal (s)
+            max_timeout: Timeout maximal (s)
+            default_timeout: Timeout (s) tant que l'historique est insuffisant
+            min_samples: Nombre de mesures avant d'utiliser le p99
+            failure_threshold: Échecs consécutifs avant ouverture du disjoncteur
+            cooldown: Refroidissement initial (s) du disjoncteur
+            max_cooldown: Refroidissement max (s) du disjoncteur
+            window: Nombre de latences conservées par opération
+            retryable: Prédicat indiquant si une erreur justifie une reprise
+            rng: Générateur aléatoire du jitter
+        """
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.default_timeout = default_timeout
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.window = window
+        self.retryable = retryable
+        self.rng = rng or random.Random()
+        self.devices: Dict[str, DeviceStats] = {}
+
+    def stats(self, device: str) -> DeviceStats:
+        stats = self.devices.get(device)
+        if stats is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.cooldown, self.max_cooldown)
+            stats = self.devices[device] = DeviceStats(breaker, self.window)
+        return stats
+
+    def timeout(self, device: str, op: str = "command") -> float:
+        """Timeout courant d'une opération sur un appareil"""
+        tracker = self.stats(device).tracker(op)
+        if len(tracker.samples) < self.min_samples:
+            return self.default_timeout
+        timeout = self.timeout_multiplier * tracker.percentile(0.99)
+        return max(self.min_timeout, min(self.max_timeout, timeout))
+
+    def backoff(self, attempt: int) -> float:
+        """Délai avant la tentative suivante (jitter complet)"""
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def call(self, device: str, factory: Callable[[], Awaitable[Any]],
+                   op: Union[str, Callable[[], str]] = "command") -> Any:
+        """
+        Exécute un appel résilient
+
+        Args:
+            device: Nom de l'appareil (clé du disjoncteur et des latences)
+            factory: Fonction créant la coroutine d'une tentative
+            op: Nom de l'opération, ou fonction le retournant à chaque tentative
+                (ex: "session" si un handshake est nécessaire, "command" sinon)
+
+        Raises:
+            CircuitOpenError: Disjoncteur ouvert, aucune tentative effectuée
+            asyncio.TimeoutError: Dernière tentative hors délai
+            Exception: Dernière erreur de l'appareil
+        """
+        stats = self.stats(device)
+        breaker = stats.breaker
+        stats.calls += 1
+        for attempt in range(self.attempts):
+            now = time.time()
+            if not breaker.allow(now):
+                stats.short_circuits += 1
+                raise CircuitOpenError(
+                    f"{device}: disjoncteur ouvert après {breaker.consecutive_failures} échecs, "
+                    f"nouvel essai dans {breaker.retry_in(now):.0f}s")
+            name = op() if callable(op) else op
+            timeout = self.timeout(device, name)
+            start = time.monotonic()
+            try:
+                result = await asyncio.wait_for(factory(), timeout)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    stats.timeouts += 1
+                if not self.retryable(e):
+                    breaker.release()
+                    stats.failures += 1
+                    raise
+                if breaker.failure(time.time()):
+                    stats.trips += 1
+                if attempt + 1 >= self.attempts or breaker.state != CLOSED:
+                    stats.failures += 1
+                    raise
+                stats.retries += 1
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            stats.tracker(name).record(time.monotonic() - start)
+            breaker.success()
+            stats.successes += 1
+            return result
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Métriques par appareil: état du disjoncteur, compteurs, latences, timeouts"""
+        out = {}
+        for device, stats in self.devices.items():
+            latency = {}
+            for op, tracker in stats.latency.items():
+                p50, p99 = tracker.percentile(0.50), tracker.percentile(0.99)
+                latency[op] = {
+                    "samples": len(tracker.samples),
+                    "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                    "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+                    "timeout_s": round(self.timeout(device, op), 3),
+                }
+            out[device] = {
+                "breaker": stats.breaker.state,
+                "consecutive_failures": stats.breaker.consecutive_failures,
+                "calls": stats.calls,
+                "successes": stats.successes,
+                "failures": stats.failures,
+                "timeouts": stats.timeouts,
+                "retries": stats.retries,
+                "short_circuits": stats.short_circuits,
+                "trips": stats.trips,
+                "latency": latency,
+            }
+        return out
+
+    def collect(self):
+        """Collecteur pour le registre de métriques (COMMON/metrics.py)"""
+        breaker_open, counters = [], {key: [] for key in
+                                      ("retries", "timeouts", "short_circuits", "trips")}
+        for device, stats in self.devices.items():
+            labels = {"device": device}
+            breaker_open.append((labels, 0 if stats.breaker.state == CLOSED else 1))
+            for key, samples in counters.items():
+                samples.append((labels, getattr(stats, key)))
+        yield ("tapo_breaker_open", "gauge", "Disjoncteur ouvert (1) ou fermé (0)", breaker_open)
+        yield ("tapo_retries_total", "counter", "Reprises d'appels Tapo", counters["retries"])
+        yield ("tapo_timeouts_total", "counter", "Tentatives hors délai", counters["timeouts"])
+        yield ("tapo_short_circuits_total", "counter", "Appels refusés (disjoncteur ouvert)",
+               counters["short_circuits"])
+        yield ("tapo_breaker_trips_total", "counter", "Ouvertures du disjoncteur", counters["trips"])
+
+    def print_metrics(self):
+        metrics = self.metrics()
+        if not metrics:
+            print("Aucune métrique enregistrée")
+            return
+        print(f"{'appareil':<20} {'disjoncteur':<11} {'appels':>6} {'ok':>6} {'échecs':>6} "
+              f"{'timeouts':>8} {'reprises':>8} {'refusés':>7}")
+        for device, m in sorted(metrics.items()):
+            print(f"{device:<20} {m['breaker']:<11} {m['calls']:6d} {m['successes']:6d} "
+                  f"{m['failures']:6d} {m['timeouts']:8d} {m['retries']:8d} "
+                  f"{m['short_circuits']:7d}")
+            for op, lat in sorted(m["latency"].items()):
+                if not lat["samples"]:
+                    print(f"    {op:<10} aucune mesure  timeout {lat['timeout_s']}s")
+                    continue
+                print(f"    {op:<10} {lat['samples']:4d} mesures  p50 {lat['p50_ms']}ms  "
+                      f"p99 {lat['p99_ms']}ms  timeout {lat['timeout_s']}s")
+
+    def to_dict(self) -> Dict[str, Any]:
+        devices = {}
+        for device, stats in self.devices.items():
+            breaker = stats.breaker
+            devices[device] = {
+                "breaker": {
+                    "state": breaker.state,
+                    "consecutive_failures": breaker.consecutive_failures,
+                    "cooldown": breaker.cooldown,
+                    "opened_at": breaker.opened_at,
+                },
+                "counters": {
+                    key: getattr(stats, key)
+                    for key in ("calls", "successes", "failures", "timeouts", "retries",
+                                "short_circuits", "trips")
+                },
+                "latency": {op: list(t.samples) for op, t in stats.latency.items()},
+            }
+        return {"devices": devices}
+
+    def load_dict(self, data: Dict[str, Any]):
+        for device, entry in data.get("devices", {}).items():
+            stats = self.stats(device)
+            breaker = entry.get("breaker", {})
+            stats.breaker.state = breaker.get("state", CLOSED)
+            stats.breaker.consecutive_failures = breaker.get("consecutive_failures", 0)
+            stats.breaker.cooldown = breaker.get("cooldown", self.cooldown)
+            stats.breaker.opened_at = breaker.get("opened_at", 0.0)
+            for key, value in entry.get("counters", {}).items():
+                setattr(stats, key, value)
+            for op, samples in entry.get("latency", {}).items():
+                stats.tracker(op).samples.extend(samples)
+
+    def save(self, path: str = DEFAULT_STATE_PATH):
+        """Persiste l'état (écriture atomique)"""
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_STATE_PATH, **options) -> "ResiliencePolicy":
+        """Politique initialisée depuis l'état persisté (vide si absent ou illisible)"""
+        policy = cls(**options)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                policy.load_dict(json.load(f))
+        except (OSError, ValueError):
+            pass
+        return policy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Métriques de résilience des appels Tapo")
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH, help="Fichier d'état JSON")
+    parser.add_argument("--reset", metavar="APPAREIL", nargs="*",
+                        help="Réinitialise le disjoncteur (tous si aucun nom)")
+    parser.add_argument("--json", action="store_true", help="Métriques au format JSON")
+    args = parser.parse_args()
+
+    policy = ResiliencePolicy.load(args.state)
+    if args.reset is not None:
+        for device in args.reset or list(policy.devices):
+            policy.stats(device).breaker.success()
+            print(f"Disjoncteur réinitialisé: {device}")
+        policy.save(args.state)
+        return
+    if args.json:
+        print(json.dumps(policy.metrics(), indent=2, ensure_ascii=False))
+    else:
+        policy.print_metrics()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Agrégats (rollups) de la télémétrie énergie Tapo
+Maintien incrémental de min/max/avg/sum à 1 minute, 1 heure et 1 jour,
+rétention par résolution et choix automatique de la résolution en lecture
+
+Les agrégats sont stockés dans <store>/rollup_<res>/ avec le même format
+colonne que les échantillons bruts. Les seaux sont alignés sur l'UTC.
+"""
+
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+import argparse
+import json
+import os
+import time
+
+from tapo_telemetry import ColumnTable, DEFAULT_STORE_PATH, TelemetryStore, parse_time
+
+MINUTE_MS = 60_000
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+
+# Résolutions de la plus fine à la plus grossière: (nom, taille du seau en ms)
+RESOLUTIONS: List[Tuple[str, int]] = [
+    ("1m", MINUTE_MS),
+    ("1h", HOUR_MS),
+    ("1d", DAY_MS),
+]
+
+# Rétention par résolution (None = illimitée); "raw" = échantillons bruts
+DEFAULT_RETENTION_MS: Dict[str, Optional[int]] = {
+    "raw": 7 * DAY_MS,
+    "1m": 30 * DAY_MS,
+    "1h": 730 * DAY_MS,
+    "1d": None,
+}
+
+ROLLUP_COLUMNS = {
+    "ts": "q",
+    "device": "H",
+    "count": "I",
+    "min": "f",
+    "max": "f",
+    "sum": "d",
+}
+
+# Délai après la fin d'un seau avant de le clore même sans nouvel échantillon
+CLOSE_GRACE_MS = 2 * MINUTE_MS
+RETENTION_PERIOD_S = 3600.0
+
+
+class Bucket(NamedTuple):
+    ts_ms: int
+    device: str
+    count: int
+    min: float
+    max: float
+    sum: float
+
+    @property
+    def avg(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+def _merge(acc: Optional[List[float]], count: int, vmin: float, vmax: float,
+           vsum: float) -> List[float]:
+    if acc is None:
+        return [count, vmin, vmax, vsum]
+    acc[0] += count
+    acc[1] = min(acc[1], vmin)
+    acc[2] = max(acc[2], vmax)
+    acc[3] += vsum
+    return acc
+
+
+class RollupEngine:
+    """
+    Maintient les agrégats à partir des lignes brutes pas encore traitées
+
+    Chaque appareil a un seau ouvert par résolution. Un seau est clos quand
+    un échantillon plus récent de ce même appareil tombe au-delà de sa fin
+    (ou après CLOSE_GRACE_MS sans échantillon); il est alors écrit sur disque
+    et fusionné dans le seau ouvert de la résolution suivante (1m -> 1h -> 1d).
+    L'état (dernière ligne brute traitée et seaux ouverts) est persisté dans
+    rollup_state.json, ce qui rend la mise à jour incrémentale entre deux exécutions.
+
+    Les tables sont écrites avant l'état: après un arrêt brutal entre les
+    deux, les lignes brutes sont rejouées depuis l'ancien état. L'état garde
+    aussi la fin de chaque table; les seaux écrits au-delà donnent, par
+    appareil, le dernier début de seau déjà sur disque, et un seau rejoué
+    qui ne le dépasse pas n'est pas réécrit (il remonte tout de même dans
+    la résolution suivante, dont le seau ouvert vient de l'ancien état).
+    """
+
+    def __init__(self, store: TelemetryStore,
+                 retention_ms: Optional[Dict[str, Optional[int]]] = None):
+        """
+        Args:
+            store: Stockage des échantillons bruts
+            retention_ms: Rétention par résolution (défaut: DEFAULT_RETENTION_MS)
+        """
+        self.store = store
+        self.retention_ms = dict(DEFAULT_RETENTION_MS)
+        if retention_ms:
+            self.retention_ms.update(retention_ms)
+        self.tables = {
+            name: ColumnTable(os.path.join(store.path, f"rollup_{name}"), ROLLUP_COLUMNS,
+                              fsync_every=store.fsync_every,
+                              fsync_interval=store.fsync_interval)
+            for name, _ in RESOLUTIONS
+        }
+        self._state_path = os.path.join(store.path, "rollup_state.json")
+        self._raw_row = 0
+        # résolution -> device id -> (début du seau, [count, min, max, sum])
+        self._open: Dict[str, Dict[int, Tuple[int, List[float]]]] = {
+            name: {} for name, _ in RESOLUTIONS
+        }
+        # résolution -> device id -> début du dernier seau écrit (seaux rejoués ignorés)
+        self._written: Dict[str, Dict[int, int]] = {name: {} for name, _ in RESOLUTIONS}
+        self._load_state()
+        self._last_retention = 0.0
+
+    def _load_state(self):
+        table_ends: Dict[str, int] = {}
+        if os.path.exists(self._state_path):
+            with open(self._state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self._raw_row = state["raw_row"]
+            for name, buckets in state["open"].items():
+                self._open[name] = {int(dev): (start, acc) for dev, (start, acc) in buckets.items()}
+            table_ends = state.get("table_end", {})
+        # Seaux écrits après la dernière sauvegarde de l'état (tout, sans état)
+        for name, table in self.tables.items():
+            written = self._written[name]
+            from_row = max(table_ends.get(name, table.base), table.base)
+            for ts, dev, *_ in table.scan(from_row=from_row):
+                if ts > written.get(dev, -(1 << 63)):
+                    written[dev] = ts
+
+    def _save_state(self):
+        state = {
+            "raw_row": self._raw_row,
+            "table_end": {name: table.end for name, table in self.tables.items()},
+            "open": {
+                name: {str(dev): [start, acc] for dev, (start, acc) in buckets.items()}
+                for name, buckets in self._open.items()
+            },
+        }
+        tmp_path = self._state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._state_path)
+
+    def _feed(self, level: int, dev: int, ts_ms: int, count: int, vmin: float,
+              vmax: float, vsum: float):
+        """Ajoute une valeur (ou un seau clos de la résolution inférieure) au niveau `level`"""
+        name, size = RESOLUTIONS[level]
+        start = ts_ms - ts_ms % size
+        current = self._open[name].get(dev)
+        if current is not None and start > current[0]:
+            self._close(level, dev)
+            current = None
+        if current is None:
+            self._open[name][dev] = (start, _merge(None, count, vmin, vmax, vsum))
+        else:
+            # Échantillon en retard: fusionné dans le seau ouvert
+            _merge(current[1], count, vmin, vmax, vsum)
+
+    def _close(self, level: int, dev: int):
+        name, _ = RESOLUTIONS[level]
+        start, (count, vmin, vmax, vsum) = self._open[name].pop(dev)
+        written = self._written[name]
+        if start > written.get(dev, -(1 << 63)):
+            self.tables[name].append((start, dev, int(count), vmin, vmax, vsum))
+            written[dev] = start
+        if level + 1 < len(RESOLUTIONS):
+            self._feed(level + 1, dev, start, int(count), vmin, vmax, vsum)
+
+    def update(self, now_ms: Optional[int] = None) -> int:
+        """
+        Intègre les nouvelles lignes brutes et clôt les seaux échus
+
+        Args:
+            now_ms: Horloge courante (défaut: time.time())
+
+        Returns:
+            Nombre de lignes brutes traitées
+        """
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        self.store.flush()
+        end = self.store.end
+        start = max(self._raw_row, self.store.base)
+        processed = 0
+        if start < end:
+            for ts, dev, watts, _energy in self.store.scan(from_row=start):
+                self._feed(0, dev, ts, 1, watts, watts, watts)
+                processed += 1
+        self._raw_row = end
+
+        for level, (name, size) in enumerate(RESOLUTIONS):
+            for dev, (bucket_start, _) in list(self._open[name].items()):
+                if bucket_start + size + CLOSE_GRACE_MS <= now_ms:
+                    self._close(level, dev)
+
+        # Tables sur disque avant l'état qui les référence
+        for table in self.tables.values():
+            table.flush(force_fsync=True)
+        self._save_state()
+        return processed
+
+    def apply_retention(self, now_ms: Optional[int] = None) -> Dict[str, int]:
+        """
+        Supprime les données plus anciennes que la rétention de chaque résolution
+
+        Returns:
+            Nombre de lignes supprimées par résolution
+        """
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        # Les lignes brutes doivent être agrégées avant d'être supprimées
+        self.update(now_ms)
+        dropped = {}
+        tables = dict(self.tables, raw=self.store)
+        for name, table in tables.items():
+            keep = self.retention_ms.get(name)
+            if keep is not None:
+                dropped[name] = table.compact_before(now_ms - keep)
+        return dropped
+
+    def maintain(self):
+        """Mise à jour incrémentale + rétention périodique (callback du poller)"""
+        self.update()
+        if time.monotonic() - self._last_retention >= RETENTION_PERIOD_S:
+            self.apply_retention()
+            self._last_retention = time.monotonic()
+
+    def choose_resolution(self, start_ms: int, end_ms: int, step_ms: Optional[int] = None,
+                          max_points: int = 1000, now_ms: Optional[int] = None) -> str:
+        """
+        Choisit la résolution la plus grossière qui satisfait la requête
+
+        Une résolution convient si la taille de ses seaux ne dépasse pas le
+        pas demandé (ou span / max_points) et si sa rétention couvre le début
+        de l'intervalle. À défaut, la résolution disponible la plus fine qui
+        couvre l'intervalle est retenue.
+
+        Returns:
+            "1d", "1h", "1m" ou "raw"
+        """
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        if step_ms is None:
+            step_ms = max(1, (end_ms - start_ms) // max(1, max_points))
+
+        def covers(name: str) -> bool:
+            keep = self.retention_ms.get(name)
+            return keep is None or start_ms >= now_ms - keep
+
+        for name, size in reversed(RESOLUTIONS):
+            if size <= step_ms and covers(name):
+                return name
+        if covers("raw"):
+            return "raw"
+        for name, _ in RESOLUTIONS:
+            if covers(name):
+                return name
+        return RESOLUTIONS[-1][0]
+
+    def buckets(self, resolution: str, start_ms: Optional[int] = None,
+                end_ms: Optional[int] = None,
+                devices: Optional[Sequence[str]] = None) -> Iterator[Bucket]:
+        """
+        Parcourt les seaux d'une résolution, seaux ouverts compris
+
+        Pour "raw", chaque échantillon est rendu comme un seau d'une valeur.
+        """
+        where = self.store.device_filter(devices)
+        name_of = self.store.device_name
+        if resolution == "raw":
+            for ts, dev, watts, _energy in self.store.scan(start_ms, end_ms, where):
+                yield Bucket(ts, name_of(dev), 1, watts, watts, watts)
+            return
+
+        lo = start_ms if start_ms is not None else -(1 << 63)
+        hi = end_ms if end_ms is not None else (1 << 63) - 1
+        for ts, dev, count, vmin, vmax, vsum in self.tables[resolution].scan(start_ms, end_ms, where):
+            yield Bucket(ts, name_of(dev), count, vmin, vmax, vsum)
+        for (dev, bucket_start), (count, vmin, vmax, vsum) in self._open_view(resolution).items():
+            if lo <= bucket_start < hi and (where is None or dev in where[1]):
+                yield Bucket(bucket_start, name_of(dev), int(count), vmin, vmax, vsum)
+
+    def _open_view(self, resolution: str) -> Dict[Tuple[int, int], List[float]]:
+        """
+        Seaux ouverts d'une résolution, complétés par les seaux encore
+        ouverts des résolutions plus fines (pas encore remontés)
+        """
+        view: Dict[Tuple[int, int], List[float]] = {}
+        size = dict(RESOLUTIONS)[resolution]
+        for name, _ in RESOLUTIONS:
+            for dev, (start, acc) in self._open[name].items():
+                key = (dev, start - start % size)
+                view[key] = _merge(view.get(key), *acc)
+            if name == resolution:
+                break
+        return view
+
+    def query(self, start_ms: int, end_ms: int, devices: Optional[Sequence[str]] = None,
+              step_ms: Optional[int] = None,
+              max_points: int = 1000) -> Tuple[str, Iterator[Bucket]]:
+        """
+        Requête d'intervalle avec choix automatique de la résolution
+
+        Returns:
+            (résolution retenue, itérateur de seaux)
+        """
+        self.update()
+        resolution = self.choose_resolution(start_ms, end_ms, step_ms, max_points)
+        return resolution, self.buckets(resolution, start_ms, end_ms, devices)
+
+    def close(self):
+        self.update()
+        for table in self.tables.values():
+            table.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrégats de la télémétrie énergie Tapo")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH,
+                        help="Répertoire du stockage local")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    sub.add_parser("update", help="Intègre les nouveaux échantillons aux agrégats")
+    sub.add_parser("retention", help="Applique les politiques de rétention")
+
+    query = sub.add_parser("query", help="Affiche les agrégats d'un intervalle")
+    query.add_argument("--device", action="append", help="Filtre par appareil (répétable)")
+    query.add_argument("--start", required=True, help="Début (YYYY-MM-DD[THH:MM[:SS]] ou epoch)")
+    query.add_argument("--end", help="Fin exclue (défaut: maintenant)")
+    query.add_argument("--step", type=int, default=None,
+                       help="Pas maximal souhaité en secondes")
+    query.add_argument("--max-points", type=int, default=1000,
+                       help="Nombre de points visé si --step est absent (défaut: 1000)")
+
+    args = parser.parse_args()
+    store = TelemetryStore(args.store)
+    engine = RollupEngine(store)
+    try:
+        if args.mode == "update":
+            print(f"{engine.update()} échantillons intégrés")
+        elif args.mode == "retention":
+            for name, count in engine.apply_retention().items():
+                print(f"{name:>4}: {count} lignes supprimées")
+        else:
+            start = parse_time(args.start)
+            end = parse_time(args.end) if args.end else int(time.time() * 1000)
+            step = args.step * 1000 if args.step else None
+            resolution, buckets = engine.query(start, end, args.device or None, step,
+                                               args.max_points)
+            print(f"Résolution: {resolution}")
+            for b in buckets:
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(b.ts_ms / 1000))
+                print(f"{stamp}  {b.device:<20} min {b.min:8.1f}  max {b.max:8.1f}  "
+                      f"avg {b.avg:8.1f}  sum {b.sum:10.1f}  n={b.count}")
+    finally:
+        engine.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
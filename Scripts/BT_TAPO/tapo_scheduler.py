@@ -0,0 +1,296 @@
+"""
+Ordonnanceur de polling adaptatif pour les appareils Tapo
+
+Tas de minuteurs (heapq) partagé par tous les pollings:
+- décalage de phase aléatoire au démarrage et jitter à chaque période,
+  pour éviter les rafales synchronisées sur le Wi-Fi
+- backoff exponentiel pour les appareils en échec
+- période adaptative: plus rapide quand l'état change, plus lente quand il est stable
+- budget de polls par appareil et par minute
+- métriques: cadence obtenue et retard (lateness) par rapport à l'échéance
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from collections import deque
+import asyncio
+import heapq
+import itertools
+import random
+import time
+
+MAX_BACKOFF_EXPONENT = 16
+
+
+def value_changed(previous: Any, current: Any) -> bool:
+    """Détection de changement par défaut: égalité stricte"""
+    return previous != current
+
+
+def relative_change(threshold: float = 0.05, floor: float = 1.0) -> Callable[[Any, Any], bool]:
+    """
+    Détecteur de changement pour des valeurs numériques (ex: puissance en W)
+
+    Args:
+        threshold: Variation relative considérée comme un changement
+        floor: Variation absolue minimale considérée comme un changement
+    """
+    def changed(previous: Any, current: Any) -> bool:
+        if previous is None or current is None:
+            return previous is not current
+        return abs(current - previous) > max(floor, abs(previous) * threshold)
+    return changed
+
+
+class PollJob:
+    """Polling périodique d'un appareil (ou toute tâche périodique)"""
+
+    def __init__(self, name: str, poll: Callable[[], Awaitable[Any]], interval: float,
+                 min_interval: Optional[float] = None, max_interval: Optional[float] = None,
+                 budget_per_minute: Optional[int] = None,
+                 changed: Callable[[Any, Any], bool] = value_changed,
+                 adaptive: bool = True):
+        """
+        Args:
+            name: Identifiant unique (nom de l'appareil)
+            poll: Coroutine de polling; sa valeur de retour sert à détecter les changements
+            interval: Période nominale en secondes
+            min_interval: Période minimale quand l'état change (défaut: interval / 4)
+            max_interval: Période maximale quand l'état est stable (défaut: interval * 4)
+            budget_per_minute: Nombre max de polls par minute (None = illimité)
+            changed: Prédicat (ancienne valeur, nouvelle valeur) -> changement
+            adaptive: Désactive l'adaptation de période si False
+        """
+        self.name = name
+        self.poll = poll
+        self.interval = interval
+        self.min_interval = min_interval if min_interval is not None else interval / 4
+        self.max_interval = max_interval if max_interval is not None else interval * 4
+        self.budget_per_minute = budget_per_minute
+        self.changed = changed
+        self.adaptive = adaptive
+
+        self.current_interval = interval
+        self.last_value: Any = None
+        self.failures = 0
+        self.polls = 0
+        self.errors = 0
+        self.budget_deferrals = 0
+        self.recent_starts: deque = deque()
+        self.active = True
+
+
+class PollScheduler:
+    """Ordonnanceur à tas de minuteurs pour tous les pollings"""
+
+    def __init__(self, max_concurrency: int = 16, jitter: float = 0.1,
+                 max_backoff: float = 300.0, speedup: float = 0.5, slowdown: float = 1.25,
+                 rng: Optional[random.Random] = None, lateness_window: int = 1024):
+        """
+        Args:
+            max_concurrency: Nombre max de polls simultanés (tous appareils)
+            jitter: Jitter relatif appliqué à chaque période (±)
+            max_backoff: Délai max (s) entre deux tentatives d'un appareil en échec
+            speedup: Facteur appliqué à la période quand l'état change
+            slowdown: Facteur appliqué à la période quand l'état est stable
+            rng: Générateur aléatoire (injectable pour des tirages reproductibles)
+            lateness_window: Nombre de mesures de retard conservées
+        """
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.speedup = speedup
+        self.slowdown = slowdown
+        self.rng = rng or random.Random()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._jobs: Dict[str, PollJob] = {}
+        self._tasks: set = set()
+        self._wakeup = asyncio.Event()
+        self._lateness: deque = deque(maxlen=lateness_window)
+        self._started_at: Optional[float] = None
+        self._polls = 0
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def _push(self, due: float, name: str):
+        heapq.heappush(self._heap, (due, next(self._seq), name))
+        self._wakeup.set()
+
+    def add(self, job: PollJob, now: Optional[float] = None):
+        """
+        Ajoute un job avec un décalage de phase aléatoire dans [0, interval)
+
+        Args:
+            job: Job à planifier
+            now: Horloge de référence (défaut: horloge de la boucle asyncio)
+        """
+        if job.name in self._jobs:
+            raise ValueError(f"Job déjà planifié: {job.name}")
+        self._jobs[job.name] = job
+        now = self._now() if now is None else now
+        self._push(now + self.rng.uniform(0, job.interval), job.name)
+
+    def remove(self, name: str):
+        """Retire un job (les entrées du tas sont ignorées paresseusement)"""
+        job = self._jobs.pop(name, None)
+        if job is not None:
+            job.active = False
+
+    def jobs(self) -> Dict[str, PollJob]:
+        return dict(self._jobs)
+
+    def _jittered(self, delay: float) -> float:
+        return delay * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def next_delay(self, job: PollJob, ok: bool, value: Any = None) -> float:
+        """
+        Calcule le délai avant le prochain poll d'un job
+
+        Args:
+            job: Job venant d'être exécuté
+            ok: Succès du poll
+            value: Valeur retournée par le poll (si succès)
+        """
+        if not ok:
+            job.failures += 1
+            # Exposant borné: un appareil débranché des jours ne déborde pas le float
+            exponent = min(job.failures, MAX_BACKOFF_EXPONENT)
+            backoff = min(self.max_backoff, job.interval * (2 ** exponent))
+            # Jitter "complet" sur la seconde moitié pour désynchroniser les reprises
+            return self.rng.uniform(backoff / 2, backoff)
+
+        job.failures = 0
+        if job.adaptive:
+            if job.polls > 1 and job.changed(job.last_value, value):
+                job.current_interval = max(job.min_interval, job.current_interval * self.speedup)
+            else:
+                job.current_interval = min(job.max_interval, job.current_interval * self.slowdown)
+        job.last_value = value
+        return self._jittered(job.current_interval)
+
+    def _budget_delay(self, job: PollJob, now: float) -> float:
+        """Délai imposé par le budget par minute (0 si le poll peut partir)"""
+        if job.budget_per_minute is None:
+            return 0.0
+        starts = job.recent_starts
+        while starts and starts[0] <= now - 60.0:
+            starts.popleft()
+        if len(starts) < job.budget_per_minute:
+            return 0.0
+        return starts[0] + 60.0 - now
+
+    async def _execute(self, job: PollJob, due: float):
+        async with self._semaphore:
+            start = self._now()
+            self._lateness.append(start - due)
+            if job.budget_per_minute is not None:
+                job.recent_starts.append(start)
+            job.polls += 1
+            self._polls += 1
+            try:
+                value = await job.poll()
+                ok = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.errors += 1
+                ok, value = False, None
+                if job.failures == 0:
+                    print(f"Échec du polling {job.name}: {e}")
+        if job.active:
+            self._push(self._now() + self.next_delay(job, ok, value), job.name)
+
+    async def run(self, duration: Optional[float] = None):
+        """
+        Boucle principale; s'arrête après `duration` secondes (None = infini)
+        """
+        self._started_at = time.monotonic()
+        stop_at = None if duration is None else self._now() + duration
+        try:
+            while stop_at is None or self._now() < stop_at:
+                if not self._heap:
+                    self._wakeup.clear()
+                    timeout = None if stop_at is None else stop_at - self._now()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    continue
+
+                due, _, name = self._heap[0]
+                now = self._now()
+                if due > now:
+                    self._wakeup.clear()
+                    wait = due - now if stop_at is None else min(due, stop_at) - now
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                heapq.heappop(self._heap)
+                job = self._jobs.get(name)
+                if job is None or not job.active:
+                    continue
+                deferral = self._budget_delay(job, now)
+                if deferral > 0:
+                    job.budget_deferrals += 1
+                    self._push(now + deferral, name)
+                    continue
+                task = asyncio.create_task(self._execute(job, due))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Métriques de l'ordonnanceur
+
+        Returns:
+            Cadence obtenue (polls/s), retard moyen/p50/p95/max (ms) et
+            détail par job (période courante, échecs, reports de budget)
+        """
+        elapsed = 0.0 if self._started_at is None else time.monotonic() - self._started_at
+        lateness = sorted(self._lateness)
+
+        def pct(p: float) -> float:
+            if not lateness:
+                return 0.0
+            return lateness[min(len(lateness) - 1, int(p * len(lateness)))] * 1000
+
+        return {
+            "polls": self._polls,
+            "poll_rate": self._polls / elapsed if elapsed > 0 else 0.0,
+            "lateness_ms": {
+                "mean": sum(lateness) / len(lateness) * 1000 if lateness else 0.0,
+                "p50": pct(0.50),
+                "p95": pct(0.95),
+                "max": lateness[-1] * 1000 if lateness else 0.0,
+            },
+            "jobs": {
+                name: {
+                    "polls": job.polls,
+                    "errors": job.errors,
+                    "failures": job.failures,
+                    "interval": job.current_interval,
+                    "rate": job.polls / elapsed if elapsed > 0 else 0.0,
+                    "budget_deferrals": job.budget_deferrals,
+                }
+                for name, job in self._jobs.items()
+            },
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        late = stats["lateness_ms"]
+        print(f"Polls: {stats['polls']} ({stats['poll_rate']:.2f}/s) - retard moyen "
+              f"{late['mean']:.1f}ms, p50 {late['p50']:.1f}ms, p95 {late['p95']:.1f}ms, "
+              f"max {late['max']:.1f}ms")
+        for name, job in stats["jobs"].items():
+            print(f"  {name:<20} période {job['interval']:6.1f}s  polls {job['polls']:5d}  "
+                  f"erreurs {job['errors']:4d}  reports budget {job['budget_deferrals']}")
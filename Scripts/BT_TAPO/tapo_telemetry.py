@@ -0,0 +1,687 @@
+#!/usr/bin/env python3
+"""
+Télémétrie énergie des prises Tapo P110/P110M
+Poller asyncio multi-prises + stockage local en colonnes (append-only, mmap)
+
+Format du stockage (un répertoire):
+    ts.<gen>.col      int64   horodatage en millisecondes (epoch)
+    device.<gen>.col  uint16  identifiant numérique de l'appareil
+    watts.<gen>.col   float32 puissance instantanée (W)
+    energy.<gen>.col  float32 énergie consommée aujourd'hui (Wh)
+    zones.<gen>.idx   int64   paires (min_ts, max_ts) par bloc complet de BLOCK_ROWS lignes
+    meta.json                 génération courante et numéro absolu de la première ligne
+    devices.json              table nom d'appareil -> identifiant
+"""
+
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+from array import array
+from functools import partial
+import argparse
+import asyncio
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+
+from tapo_scheduler import PollJob, PollScheduler, relative_change
+
+_COMMON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "COMMON")
+if _COMMON not in sys.path:
+    sys.path.insert(0, _COMMON)
+
+from metrics import REGISTRY, serve as serve_metrics
+
+POLL_SECONDS = REGISTRY.histogram(
+    "tapo_energy_poll_seconds", "Durée d'un échantillonnage puissance + énergie", ["device"])
+POLLS_TOTAL = REGISTRY.counter(
+    "tapo_energy_polls_total", "Échantillonnages par résultat", ["device", "status"])
+
+ENERGY_DEVICE_TYPES = ("P110", "P110M")
+BLOCK_ROWS = 1024
+FLUSH_JOB = "__flush__"
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml")
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "telemetry")
+
+# Nom de colonne -> code de type du module array
+COLUMNS = {
+    "ts": "q",
+    "device": "H",
+    "watts": "f",
+    "energy": "f",
+}
+
+
+class Sample(NamedTuple):
+    ts_ms: int
+    device: str
+    watts: float
+    energy_wh: float
+
+
+class _MappedColumn:
+    """Vue typée en lecture seule sur un fichier colonne projeté par mmap"""
+
+    def __init__(self, path: str, code: str, rows: int):
+        self._mm = None
+        self._views = []
+        if rows == 0:
+            self.view = memoryview(array(code))
+            return
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        raw = memoryview(self._mm)
+        typed = raw.cast(code)
+        self.view = typed[:rows]
+        self._views = [raw, typed]
+
+    def bounds(self, start: int, stop: int) -> Tuple[int, int]:
+        """(min, max) des valeurs de la tranche [start, stop)"""
+        with self.view[start:stop] as chunk:
+            return min(chunk), max(chunk)
+
+    def close(self):
+        self.view.release()
+        for view in reversed(self._views):
+            view.release()
+        if self._mm is not None:
+            self._mm.close()
+
+
+class ColumnTable:
+    """
+    Table colonne append-only indexée par horodatage
+
+    Les écritures sont bufferisées en mémoire puis ajoutées aux fichiers
+    colonnes; le fsync est groupé (tous les `fsync_every` lignes ou toutes
+    les `fsync_interval` secondes). Les lectures passent par mmap et sautent
+    les blocs dont l'intervalle [min_ts, max_ts] ne recoupe pas la requête:
+    la table complète n'est jamais chargée en mémoire.
+
+    La première colonne doit être "ts" (int64, millisecondes). Les lignes
+    ont un numéro absolu stable, y compris après `compact_before`.
+
+    Ajouts, flush et compaction sont sérialisés par un verrou: la maintenance
+    (agrégats, rétention) peut tourner dans un thread pendant que la boucle
+    asyncio continue d'ajouter des lignes.
+    """
+
+    def __init__(self, path: str, columns: Dict[str, str], fsync_every: int = 256,
+                 fsync_interval: float = 5.0):
+        """
+        Ouvre (ou crée) une table
+
+        Args:
+            path: Répertoire de la table
+            columns: Nom de colonne -> code de type du module array
+            fsync_every: Nombre de lignes écrites entre deux fsync
+            fsync_interval: Délai max (s) entre deux fsync
+        """
+        if next(iter(columns)) != "ts" or columns["ts"] != "q":
+            raise ValueError("La première colonne doit être 'ts' (int64)")
+        self.path = path
+        self.columns = dict(columns)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._files = {}
+        self._pending = self._empty_buffers()
+        self._zones = array("q")
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+
+        # generation: suffixe des fichiers courants; base: numéro absolu de la ligne 0
+        self._meta = {"generation": 0, "base": 0}
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self._meta = json.load(f)
+        self._remove_stale_generations()
+        self.rows = self._recover()
+        self._open_appenders()
+
+    @property
+    def base(self) -> int:
+        """Numéro absolu de la première ligne conservée"""
+        return self._meta["base"]
+
+    @property
+    def end(self) -> int:
+        """Numéro absolu de la prochaine ligne écrite sur disque"""
+        return self._meta["base"] + self.rows
+
+    def _empty_buffers(self) -> Dict[str, array]:
+        return {name: array(code) for name, code in self.columns.items()}
+
+    def _column_path(self, name: str, generation: Optional[int] = None) -> str:
+        gen = self._meta["generation"] if generation is None else generation
+        return os.path.join(self.path, f"{name}.{gen}.col")
+
+    def _zones_path(self, generation: Optional[int] = None) -> str:
+        gen = self._meta["generation"] if generation is None else generation
+        return os.path.join(self.path, f"zones.{gen}.idx")
+
+    def _save_meta(self, meta: Dict[str, int]):
+        meta_path = os.path.join(self.path, "meta.json")
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, meta_path)
+
+    def _remove_stale_generations(self):
+        current = f".{self._meta['generation']}."
+        for entry in os.listdir(self.path):
+            if entry.endswith((".col", ".idx")) and current not in entry:
+                os.remove(os.path.join(self.path, entry))
+
+    def _open_appenders(self):
+        for name in self.columns:
+            self._files[name] = open(self._column_path(name), "ab")
+        self._zones_file = open(self._zones_path(), "ab")
+
+    def _close_appenders(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        self._zones_file.close()
+
+    def _recover(self) -> int:
+        """Aligne les colonnes après un arrêt brutal et reconstruit l'index de zones"""
+        rows = None
+        for name, code in self.columns.items():
+            col_path = self._column_path(name)
+            size = os.path.getsize(col_path) if os.path.exists(col_path) else 0
+            n = size // array(code).itemsize
+            rows = n if rows is None else min(rows, n)
+
+        for name, code in self.columns.items():
+            col_path = self._column_path(name)
+            if os.path.exists(col_path):
+                with open(col_path, "r+b") as f:
+                    f.truncate(rows * array(code).itemsize)
+
+        self._zones = array("q")
+        zones_path = self._zones_path()
+        if os.path.exists(zones_path):
+            with open(zones_path, "rb") as f:
+                self._zones.frombytes(f.read())
+        full_blocks = rows // BLOCK_ROWS
+        if len(self._zones) // 2 != full_blocks:
+            # Index incohérent: on le recalcule à partir de la colonne ts
+            self._zones = array("q")
+            ts = self._map_column("ts", rows)
+            try:
+                for block in range(full_blocks):
+                    self._zones.extend(ts.bounds(block * BLOCK_ROWS, (block + 1) * BLOCK_ROWS))
+            finally:
+                ts.close()
+            with open(zones_path, "wb") as f:
+                self._zones.tofile(f)
+        return rows
+
+    def _map_column(self, name: str, rows: int) -> _MappedColumn:
+        """Projette une colonne en mémoire (lecture seule), sans la copier"""
+        return _MappedColumn(self._column_path(name), self.columns[name], rows)
+
+    def append(self, row: Sequence):
+        """
+        Ajoute une ligne (bufferisée jusqu'au prochain flush)
+
+        Args:
+            row: Valeurs dans l'ordre des colonnes
+        """
+        with self._lock:
+            for buf, value in zip(self._pending.values(), row):
+                buf.append(value)
+
+    def flush(self, force_fsync: bool = False):
+        """
+        Écrit les lignes en attente; fsync groupé selon la politique
+
+        Args:
+            force_fsync: Force le fsync même si les seuils ne sont pas atteints
+        """
+        with self._lock:
+            count = len(self._pending["ts"])
+            if count:
+                for name, buf in self._pending.items():
+                    buf.tofile(self._files[name])
+                    self._files[name].flush()
+                self._index_new_blocks(self.rows, self.rows + count)
+                self.rows += count
+                self._unsynced += count
+                self._pending = self._empty_buffers()
+
+            elapsed = time.monotonic() - self._last_fsync
+            if self._unsynced and (force_fsync or self._unsynced >= self.fsync_every
+                                   or elapsed >= self.fsync_interval):
+                for f in self._files.values():
+                    os.fsync(f.fileno())
+                os.fsync(self._zones_file.fileno())
+                self._unsynced = 0
+                self._last_fsync = time.monotonic()
+
+    def _index_new_blocks(self, old_rows: int, new_rows: int):
+        first = old_rows // BLOCK_ROWS
+        last = new_rows // BLOCK_ROWS
+        if last == first:
+            return
+        ts = self._map_column("ts", new_rows)
+        try:
+            zones = array("q")
+            for block in range(first, last):
+                zones.extend(ts.bounds(block * BLOCK_ROWS, (block + 1) * BLOCK_ROWS))
+        finally:
+            ts.close()
+        zones.tofile(self._zones_file)
+        self._zones_file.flush()
+        self._zones.extend(zones)
+
+    def scan(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+             where: Optional[Tuple[str, Set[int]]] = None,
+             from_row: Optional[int] = None) -> Iterator[Tuple]:
+        """
+        Parcourt les lignes d'un intervalle [start_ms, end_ms)
+
+        Seuls les blocs pertinents sont lus (via mmap); les lignes sont
+        produites une par une dans l'ordre d'écriture.
+
+        Args:
+            start_ms: Borne basse incluse (None = début)
+            end_ms: Borne haute exclue (None = fin)
+            where: Filtre (nom de colonne, valeurs acceptées)
+            from_row: Numéro absolu de la première ligne à considérer
+        """
+        with self._lock:
+            self.flush()
+            rows = self.rows
+            first = 0 if from_row is None else max(0, from_row - self.base)
+            if first >= rows:
+                return
+            # Projection sous verrou: une compaction change de génération de fichiers
+            cols = [self._map_column(name, rows) for name in self.columns]
+            zones = self._zones
+        lo = start_ms if start_ms is not None else -(1 << 63)
+        hi = end_ms if end_ms is not None else (1 << 63) - 1
+
+        try:
+            views = [col.view for col in cols]
+            ts = views[0]
+            filter_view, accepted = None, None
+            if where is not None:
+                filter_view = views[list(self.columns).index(where[0])]
+                accepted = where[1]
+            for block in range(first // BLOCK_ROWS, (rows + BLOCK_ROWS - 1) // BLOCK_ROWS):
+                if block * 2 + 1 < len(zones):
+                    if zones[block * 2 + 1] < lo or zones[block * 2] >= hi:
+                        continue
+                for i in range(max(first, block * BLOCK_ROWS), min(rows, (block + 1) * BLOCK_ROWS)):
+                    t = ts[i]
+                    if t < lo or t >= hi:
+                        continue
+                    if filter_view is not None and filter_view[i] not in accepted:
+                        continue
+                    yield tuple(view[i] for view in views)
+        finally:
+            for col in cols:
+                col.close()
+
+    def compact_before(self, cutoff_ms: int) -> int:
+        """
+        Rétention: supprime les blocs entièrement antérieurs à cutoff_ms
+
+        La copie se fait par tranches dans une nouvelle génération de
+        fichiers, activée atomiquement via meta.json.
+
+        Returns:
+            Nombre de lignes supprimées
+        """
+        with self._lock:
+            self.flush(force_fsync=True)
+            drop_blocks = 0
+            while drop_blocks * 2 + 1 < len(self._zones) and self._zones[drop_blocks * 2 + 1] < cutoff_ms:
+                drop_blocks += 1
+            drop = drop_blocks * BLOCK_ROWS
+            if drop == 0:
+                return 0
+
+            new_meta = {"generation": self._meta["generation"] + 1, "base": self.base + drop}
+            for name, code in self.columns.items():
+                col = self._map_column(name, self.rows)
+                try:
+                    with open(self._column_path(name, new_meta["generation"]), "wb") as out:
+                        step = BLOCK_ROWS * 64
+                        for start in range(drop, self.rows, step):
+                            with col.view[start:min(self.rows, start + step)] as chunk:
+                                out.write(chunk)
+                        out.flush()
+                        os.fsync(out.fileno())
+                finally:
+                    col.close()
+            with open(self._zones_path(new_meta["generation"]), "wb") as out:
+                self._zones[drop_blocks * 2:].tofile(out)
+                out.flush()
+                os.fsync(out.fileno())
+
+            self._close_appenders()
+            self._save_meta(new_meta)
+            self._meta = new_meta
+            self._remove_stale_generations()
+            self.rows = self._recover()
+            self._open_appenders()
+            return drop
+
+    def close(self):
+        """Flush final (avec fsync) et fermeture des fichiers"""
+        with self._lock:
+            self.flush(force_fsync=True)
+            self._close_appenders()
+
+
+class TelemetryStore(ColumnTable):
+    """
+    Stockage des échantillons de puissance (timestamp, appareil, watts, Wh)
+
+    Les noms d'appareils sont stockés sous forme d'identifiants uint16
+    (table devices.json) pour garder des lignes de 18 octets.
+    """
+
+    LAYOUT = COLUMNS
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH, fsync_every: int = 256,
+                 fsync_interval: float = 5.0):
+        """
+        Ouvre (ou crée) un stockage
+
+        Args:
+            path: Répertoire du stockage
+            fsync_every: Nombre d'échantillons écrits entre deux fsync
+            fsync_interval: Délai max (s) entre deux fsync
+        """
+        super().__init__(path, self.LAYOUT, fsync_every, fsync_interval)
+        self._devices: Dict[str, int] = {}
+        self._device_names: List[str] = []
+        self._load_devices()
+
+    def _load_devices(self):
+        devices_path = os.path.join(self.path, "devices.json")
+        if os.path.exists(devices_path):
+            with open(devices_path, "r", encoding="utf-8") as f:
+                self._devices = json.load(f)
+        self._device_names = [""] * len(self._devices)
+        for name, dev_id in self._devices.items():
+            self._device_names[dev_id] = name
+
+    def _save_devices(self):
+        devices_path = os.path.join(self.path, "devices.json")
+        tmp_path = devices_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._devices, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, devices_path)
+
+    def device_id(self, name: str) -> int:
+        """Retourne (et enregistre si besoin) l'identifiant numérique d'un appareil"""
+        dev_id = self._devices.get(name)
+        if dev_id is None:
+            dev_id = len(self._device_names)
+            if dev_id > 0xFFFF:
+                raise ValueError("Trop d'appareils pour la colonne device (uint16)")
+            self._devices[name] = dev_id
+            self._device_names.append(name)
+            self._save_devices()
+        return dev_id
+
+    def device_name(self, dev_id: int) -> str:
+        return self._device_names[dev_id]
+
+    def device_filter(self, devices: Optional[Sequence[str]]) -> Optional[Tuple[str, Set[int]]]:
+        """Construit le filtre `where` de scan() pour une liste de noms (None = tous)"""
+        if devices is None:
+            return None
+        return ("device", {self._devices[d] for d in devices if d in self._devices})
+
+    def add_sample(self, ts_ms: int, device: str, watts: float, energy_wh: float = 0.0):
+        """
+        Ajoute un échantillon (bufferisé jusqu'au prochain flush)
+
+        Args:
+            ts_ms: Horodatage en millisecondes
+            device: Nom de l'appareil
+            watts: Puissance instantanée
+            energy_wh: Énergie consommée aujourd'hui
+        """
+        self.append((ts_ms, self.device_id(device), watts, energy_wh))
+
+    def devices(self) -> List[str]:
+        """Liste des appareils connus du stockage"""
+        return list(self._device_names)
+
+    def samples(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                devices: Optional[Sequence[str]] = None) -> Iterator[Sample]:
+        """
+        Parcourt les échantillons d'un intervalle [start_ms, end_ms)
+
+        Args:
+            start_ms: Borne basse incluse (None = début)
+            end_ms: Borne haute exclue (None = fin)
+            devices: Filtre sur les noms d'appareils (None = tous)
+        """
+        names = self._device_names
+        for ts, dev, watts, energy in self.scan(start_ms, end_ms, self.device_filter(devices)):
+            yield Sample(ts, names[dev], watts, energy)
+
+
+class EnergyPoller:
+    """Échantillonne la puissance et l'énergie de plusieurs prises P110 via PollScheduler"""
+
+    def __init__(self, backend, devices: Dict[str, Tuple[str, str]], store: TelemetryStore,
+                 interval: float = 10.0, max_concurrency: int = 32,
+                 on_cycle: Optional[Callable[[], None]] = None,
+                 budget_per_minute: Optional[int] = None):
+        """
+        Args:
+            backend: Backend d'accès aux appareils (voir tapo_backend)
+            devices: Nom d'appareil -> (type, ip), uniquement P110/P110M
+            store: Stockage de destination
+            interval: Période nominale d'échantillonnage en secondes
+            max_concurrency: Nombre max de requêtes simultanées
+            on_cycle: Appelé à chaque flush du stockage (ex: mise à jour des agrégats),
+                dans un thread de travail: fsync et agrégation ne bloquent pas la boucle
+            budget_per_minute: Nombre max de lectures par prise et par minute
+        """
+        self.backend = backend
+        self.devices = devices
+        self.store = store
+        self.interval = interval
+        self.on_cycle = on_cycle
+        self.scheduler = PollScheduler(max_concurrency=max_concurrency)
+        for name in devices:
+            self.scheduler.add(PollJob(
+                name, partial(self.sample_device, name), interval,
+                budget_per_minute=budget_per_minute, changed=relative_change(),
+            ))
+        self.scheduler.add(PollJob(FLUSH_JOB, self._flush, interval, adaptive=False))
+        self._handles = {}
+        self._maintenance: Optional[asyncio.Future] = None
+
+    async def _handle(self, name: str):
+        handle = self._handles.get(name)
+        if handle is None:
+            device_type, ip = self.devices[name]
+            handle = await self.backend.connect(device_type, ip)
+            self._handles[name] = handle
+        return handle
+
+    async def sample_device(self, name: str) -> float:
+        """Lit puissance et énergie d'une prise et l'ajoute au stockage; retourne les watts"""
+        start = time.perf_counter()
+        try:
+            handle = await self._handle(name)
+            power = await handle.get_current_power()
+            usage = await handle.get_energy_usage()
+        except Exception as e:
+            # La session sera renégociée au prochain essai
+            self._handles.pop(name, None)
+            POLLS_TOTAL.labels(name, type(e).__name__).inc()
+            raise
+        POLL_SECONDS.labels(name).observe(time.perf_counter() - start)
+        POLLS_TOTAL.labels(name, "ok").inc()
+        watts = float(power.current_power)
+        self.store.add_sample(int(time.time() * 1000), name, watts, float(usage.today_energy))
+        return watts
+
+    def _flush_sync(self):
+        self.store.flush()
+        if self.on_cycle is not None:
+            self.on_cycle()
+
+    async def _flush(self):
+        # Protégé de l'annulation: run() attend la fin avant de rendre la main
+        # (fermeture du stockage et des agrégats)
+        self._maintenance = asyncio.ensure_future(asyncio.to_thread(self._flush_sync))
+        await asyncio.shield(self._maintenance)
+
+    async def run(self, duration: Optional[float] = None, stats_every: float = 60.0):
+        """
+        Échantillonne en continu
+
+        Args:
+            duration: Durée en secondes (None = infini)
+            stats_every: Période d'affichage des métriques de l'ordonnanceur
+        """
+        async def report():
+            while True:
+                await asyncio.sleep(stats_every)
+                self.scheduler.print_stats()
+
+        reporter = asyncio.create_task(report())
+        try:
+            await self.scheduler.run(duration)
+        finally:
+            reporter.cancel()
+            if self._maintenance is not None:
+                await asyncio.gather(self._maintenance, return_exceptions=True)
+            self.store.flush()
+            self.scheduler.print_stats()
+
+
+def energy_devices(config, addresses=None) -> Dict[str, Tuple[str, str]]:
+    """
+    Extrait les prises avec mesure d'énergie de la configuration
+
+    Args:
+        config: Configuration validée
+        addresses: AddressTable des adresses découvertes (None = IP de config.yaml)
+    """
+    return {
+        name: (dev.type, addresses.ip(name, dev.ip) if addresses is not None else dev.ip)
+        for name, dev in config.devices.items()
+        if dev.type in ENERGY_DEVICE_TYPES
+    }
+
+
+def parse_time(value: Optional[str]) -> Optional[int]:
+    """Convertit 'YYYY-MM-DD[THH:MM[:SS]]' ou un epoch (s) en millisecondes"""
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value) * 1000
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            return int(time.mktime(time.strptime(value, fmt)) * 1000)
+        except ValueError:
+            continue
+    raise ValueError(f"Date invalide: {value}")
+
+
+async def poll_main(args):
+    from bt_tapo_strict_2 import load_config
+    from tapo_backend import make_backend
+    from tapo_discovery import AddressTable
+    from tapo_rollup import RollupEngine
+
+    config = load_config(path=args.config)
+    devices = energy_devices(config, AddressTable.load())
+    if not devices:
+        print("Aucune prise P110/P110M dans la configuration")
+        sys.exit(1)
+
+    backend = make_backend(config)
+    store = TelemetryStore(args.store, fsync_every=args.fsync_every,
+                           fsync_interval=args.fsync_interval)
+    rollups = RollupEngine(store)
+    poller = EnergyPoller(backend, devices, store, interval=args.interval,
+                          max_concurrency=args.concurrency, on_cycle=rollups.maintain,
+                          budget_per_minute=args.budget)
+    metrics_server = serve_metrics(args.metrics_port, host=args.metrics_host) if args.metrics_port else None
+    try:
+        await poller.run(duration=args.duration)
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        rollups.close()
+        store.close()
+
+
+def query_main(args):
+    store = TelemetryStore(args.store)
+    try:
+        devices = args.device or None
+        count = 0
+        for s in store.samples(parse_time(args.start), parse_time(args.end), devices):
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(s.ts_ms / 1000))
+            print(f"{stamp}  {s.device:<20} {s.watts:8.1f} W  {s.energy_wh:8.0f} Wh")
+            count += 1
+        print(f"{count} échantillons")
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Télémétrie énergie des prises Tapo P110")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH,
+                        help="Répertoire du stockage local")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    poll = sub.add_parser("poll", help="Échantillonne les prises en continu")
+    poll.add_argument("--config", default=DEFAULT_CONFIG_PATH)
+    poll.add_argument("--interval", type=float, default=10.0,
+                      help="Période nominale d'échantillonnage en secondes (défaut: 10)")
+    poll.add_argument("--concurrency", type=int, default=32,
+                      help="Requêtes simultanées max (défaut: 32)")
+    poll.add_argument("--budget", type=int, default=None,
+                      help="Lectures max par prise et par minute (défaut: illimité)")
+    poll.add_argument("--duration", type=float, default=None,
+                      help="Durée en secondes avant arrêt (défaut: infini)")
+    poll.add_argument("--fsync-every", type=int, default=256)
+    poll.add_argument("--fsync-interval", type=float, default=5.0)
+    poll.add_argument("--metrics-port", type=int, default=None,
+                      help="Expose GET /metrics sur ce port")
+    poll.add_argument("--metrics-host", default="127.0.0.1",
+                      help="Adresse d'écoute de /metrics (défaut: 127.0.0.1, 0.0.0.0 pour le réseau)")
+
+    query = sub.add_parser("query", help="Affiche les échantillons d'un intervalle")
+    query.add_argument("--device", action="append", help="Filtre par appareil (répétable)")
+    query.add_argument("--start", help="Début (YYYY-MM-DD[THH:MM[:SS]] ou epoch)")
+    query.add_argument("--end", help="Fin exclue (même format)")
+
+    args = parser.parse_args()
+    if args.mode == "poll":
+        try:
+            asyncio.run(poll_main(args))
+        except KeyboardInterrupt:
+            print("\nArrêt du poller.")
+    else:
+        query_main(args)
+
+
+if __name__ == "__main__":
+    main()
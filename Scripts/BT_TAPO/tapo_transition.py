@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Transitions de luminosité et de couleur côté client pour L530/L510/L520
+
+Le moteur interpole luminosité et couleur HSV sur une durée donnée et envoie
+des trames intermédiaires sur une session réutilisée. La cadence suit le
+temps d'aller-retour mesuré (EWMA): une trame n'est envoyée que si la
+précédente a répondu, et la valeur envoyée est toujours celle de l'instant
+d'arrivée prévu. Les trames dont le créneau est passé sont abandonnées, et
+la trame finale part à temps pour arriver à l'échéance, sur la cible exacte.
+
+Exemples:
+    python tapo_transition.py salon_lampe brightness 10 --duration 5
+    python tapo_transition.py salon_lampe color 255 80 0 --brightness 60 --duration 10
+"""
+
+from typing import Any, Callable, Dict, NamedTuple, Optional
+import argparse
+import asyncio
+import colorsys
+import sys
+import time
+
+COLOR_TYPES = ("L530",)
+DIMMABLE_TYPES = ("L510", "L520", "L530")
+
+
+class HSV(NamedTuple):
+    """État lumineux: teinte (0-360), saturation (0-100), luminosité (1-100)"""
+    hue: Optional[float]
+    saturation: Optional[float]
+    brightness: float
+
+    def quantized(self) -> "HSV":
+        """Valeurs entières telles qu'envoyées à l'appareil"""
+        return HSV(
+            None if self.hue is None else int(round(self.hue)) % 360,
+            None if self.saturation is None else int(round(self.saturation)),
+            max(1, min(100, int(round(self.brightness)))),
+        )
+
+
+def rgb_to_hsv(r: int, g: int, b: int) -> HSV:
+    h, s, _v = colorsys.rgb_to_hsv(r / 255, g / 255, b / 255)
+    return HSV(h * 360, s * 100, 100)
+
+
+def linear(t: float) -> float:
+    return t
+
+
+def ease_in_out(t: float) -> float:
+    return t * t * (3 - 2 * t)
+
+
+EASINGS: Dict[str, Callable[[float], float]] = {
+    "linear": linear,
+    "ease": ease_in_out,
+}
+
+
+def interpolate(start: HSV, target: HSV, t: float) -> HSV:
+    """Interpolation HSV; la teinte suit le plus court chemin sur le cercle"""
+    t = max(0.0, min(1.0, t))
+    hue = saturation = None
+    if start.hue is not None and target.hue is not None:
+        delta = (target.hue - start.hue + 180) % 360 - 180
+        hue = (start.hue + delta * t) % 360
+        saturation = start.saturation + (target.saturation - start.saturation) * t
+    brightness = start.brightness + (target.brightness - start.brightness) * t
+    return HSV(hue, saturation, brightness)
+
+
+class TransitionStats:
+    def __init__(self):
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.frames_unchanged = 0
+        self.rtt_ms_total = 0.0
+        self.rtt_ms_max = 0.0
+        self.late_ms = 0.0
+
+    @property
+    def rtt_ms_avg(self) -> float:
+        return self.rtt_ms_total / self.frames_sent if self.frames_sent else 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "frames_unchanged": self.frames_unchanged,
+            "rtt_ms_avg": round(self.rtt_ms_avg, 1),
+            "rtt_ms_max": round(self.rtt_ms_max, 1),
+            "late_ms": round(self.late_ms, 1),
+        }
+
+
+class Transition:
+    """Fondu d'un état HSV vers un autre sur une session d'appareil existante"""
+
+    def __init__(self, handle: Any, start: HSV, target: HSV, duration: float,
+                 min_interval: float = 0.05, easing: Callable[[float], float] = linear,
+                 initial_rtt: float = 0.1, rtt_alpha: float = 0.3):
+        """
+        Args:
+            handle: Handle d'appareil (session réutilisée pour toutes les trames)
+            start: État de départ
+            target: État final
+            duration: Durée du fondu en secondes
+            min_interval: Intervalle minimal entre deux trames (s)
+            easing: Courbe de progression (0..1 -> 0..1)
+            initial_rtt: Estimation initiale de l'aller-retour (s)
+            rtt_alpha: Poids des nouvelles mesures dans l'EWMA du RTT
+        """
+        self.handle = handle
+        self.start = start
+        self.target = target
+        self.duration = duration
+        self.min_interval = min_interval
+        self.easing = easing
+        self.rtt = initial_rtt
+        self.rtt_alpha = rtt_alpha
+        self.stats = TransitionStats()
+        self._sent: Optional[HSV] = None
+
+    async def _send(self, state: HSV):
+        """Envoie une trame (uniquement les composantes modifiées) et mesure le RTT"""
+        state = state.quantized()
+        previous = self._sent
+        color_changed = state.hue is not None and (
+            previous is None or (state.hue, state.saturation) != (previous.hue, previous.saturation))
+        brightness_changed = previous is None or state.brightness != previous.brightness
+
+        begin = time.monotonic()
+        if color_changed and brightness_changed and hasattr(self.handle, "set"):
+            # Une seule requête pour couleur + luminosité
+            await self.handle.set().brightness(state.brightness).hue_saturation(
+                state.hue, state.saturation).send(self.handle)
+        else:
+            if color_changed:
+                await self.handle.set_hue_saturation(state.hue, state.saturation)
+            if brightness_changed:
+                await self.handle.set_brightness(state.brightness)
+        rtt = time.monotonic() - begin
+
+        self.rtt += self.rtt_alpha * (rtt - self.rtt)
+        self.stats.frames_sent += 1
+        self.stats.rtt_ms_total += rtt * 1000
+        self.stats.rtt_ms_max = max(self.stats.rtt_ms_max, rtt * 1000)
+        self._sent = state
+
+    async def run(self) -> TransitionStats:
+        origin = time.monotonic()
+        end = origin + self.duration
+        next_slot = origin
+        while True:
+            now = time.monotonic()
+            # La trame finale doit partir maintenant pour arriver à l'échéance
+            if end - now <= self.rtt:
+                break
+            # Valeur attendue au moment où la trame arrivera sur l'appareil
+            progress = (now + self.rtt / 2 - origin) / self.duration
+            state = interpolate(self.start, self.target, self.easing(progress))
+            if state.quantized() != self._sent:
+                await self._send(state)
+            else:
+                self.stats.frames_unchanged += 1
+
+            interval = max(self.min_interval, self.rtt)
+            next_slot += interval
+            now = time.monotonic()
+            if now > next_slot:
+                # Appareil en retard: les créneaux dépassés sont abandonnés
+                missed = int((now - next_slot) / interval) + 1
+                self.stats.frames_dropped += missed
+                next_slot += missed * interval
+            await asyncio.sleep(max(0.0, min(next_slot, end - self.rtt) - now))
+
+        if self.target.quantized() != self._sent:
+            await self._send(self.target)
+        self.stats.late_ms = max(0.0, (time.monotonic() - end) * 1000)
+        return self.stats
+
+
+async def current_state(handle: Any) -> HSV:
+    """État HSV courant lu sur l'appareil"""
+    info = (await handle.get_device_info()).to_dict()
+    hue = info.get("hue")
+    saturation = info.get("saturation")
+    brightness = info.get("brightness") or 1
+    if not info.get("device_on", True):
+        brightness = 1
+    if hue is None or saturation is None:
+        return HSV(None, None, brightness)
+    return HSV(hue, saturation, brightness)
+
+
+async def fade(handle: Any, target: HSV, duration: float, start: Optional[HSV] = None,
+               turn_off: bool = False, **options) -> TransitionStats:
+    """
+    Fondu complet: lit l'état initial si besoin, allume, interpole, éteint en option
+
+    Args:
+        handle: Handle d'appareil
+        target: État final (hue/saturation à None pour la luminosité seule)
+        duration: Durée en secondes
+        start: État initial (None = lu sur l'appareil)
+        turn_off: Éteint l'appareil à la fin (fondu vers le noir)
+        options: Paramètres additionnels de Transition
+    """
+    if start is None:
+        probe = time.monotonic()
+        start = await current_state(handle)
+        options.setdefault("initial_rtt", time.monotonic() - probe)
+    if target.hue is None:
+        start = HSV(None, None, start.brightness)
+    elif start.hue is None:
+        start = HSV(target.hue, target.saturation, start.brightness)
+    await handle.on()
+    stats = await Transition(handle, start, target, duration, **options).run()
+    if turn_off:
+        await handle.off()
+    return stats
+
+
+async def transition_main(args):
+    from bt_tapo_strict_2 import CONFIG_PATH, load_config
+    from tapo_backend import make_backend
+    from tapo_discovery import AddressTable
+
+    config = load_config(path=args.config or CONFIG_PATH)
+    if args.device not in config.devices:
+        print(f"Appareil {args.device} introuvable dans config.yaml")
+        sys.exit(1)
+    device = config.devices[args.device]
+    if device.type not in DIMMABLE_TYPES:
+        print(f"Transitions non gérées pour {device.type}")
+        sys.exit(1)
+
+    turn_off = False
+    if args.mode == "brightness":
+        value = args.values[0]
+        turn_off = value == 0
+        target = HSV(None, None, max(1, value))
+    else:
+        if device.type not in COLOR_TYPES:
+            print(f"Couleur non gérée pour {device.type}")
+            sys.exit(1)
+        if args.mode == "color":
+            r, g, b = args.values
+            target = rgb_to_hsv(r, g, b)
+        else:
+            target = HSV(args.values[0], args.values[1], 100)
+        target = HSV(target.hue, target.saturation, args.brightness)
+
+    backend = make_backend(config)
+    # Adresse découverte par tapo_discovery.py si l'appareil a changé d'IP
+    ip = AddressTable.load().ip(args.device, device.ip)
+    handle = await backend.connect(device.type, ip)
+    stats = await fade(handle, target, args.duration, turn_off=turn_off,
+                       min_interval=args.min_interval, easing=EASINGS[args.easing])
+    s = stats.to_dict()
+    print(f"Transition terminée: {s['frames_sent']} trames envoyées, {s['frames_dropped']} abandonnées, "
+          f"{s['frames_unchanged']} inchangées")
+    print(f"  RTT moyen {s['rtt_ms_avg']}ms (max {s['rtt_ms_max']}ms), retard final {s['late_ms']}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transitions luminosité/couleur Tapo")
+    parser.add_argument("device", help="Nom de l'appareil dans config.yaml")
+    parser.add_argument("mode", choices=["brightness", "color", "hsv"],
+                        help="brightness <0-100> | color <r> <g> <b> | hsv <teinte> <saturation>")
+    parser.add_argument("values", type=int, nargs="+")
+    parser.add_argument("--duration", type=float, default=3.0, help="Durée en secondes (défaut: 3)")
+    parser.add_argument("--brightness", type=int, default=100,
+                        help="Luminosité finale pour color/hsv (défaut: 100)")
+    parser.add_argument("--min-interval", type=float, default=0.05,
+                        help="Intervalle minimal entre trames en secondes (défaut: 0.05)")
+    parser.add_argument("--easing", choices=sorted(EASINGS), default="linear")
+    parser.add_argument("--config", default=None)
+    args = parser.parse_args()
+
+    expected = {"brightness": 1, "color": 3, "hsv": 2}[args.mode]
+    if len(args.values) != expected:
+        parser.error(f"{args.mode} requiert {expected} valeur(s)")
+    asyncio.run(transition_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Profilage par phases d'une exécution de commande (--profile)
+
+Horodatages monotones (perf_counter) autour de chaque phase: démarrage de
+l'interpréteur, imports, chargement de la configuration, handshake,
+requête, émission IR... Restitution en tableau, en JSON, ou en fichier de
+trace au format Chrome Trace Event (chrome://tracing, ui.perfetto.dev).
+
+Le démarrage de l'interpréteur (avant la première ligne du script) est
+estimé sous Linux depuis /proc (résolution d'un tick d'horloge, ~10 ms).
+
+Exemple:
+    import time
+    _T0 = time.perf_counter()          # tout en haut du script
+    ...
+    profiler = PhaseProfiler(origin=_T0)
+    profiler.mark("imports")           # de l'origine jusqu'à maintenant
+    with profiler.phase("config"):
+        config = load_config()
+    profiler.print_table()
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from contextlib import contextmanager
+import json
+import os
+import sys
+import threading
+import time
+
+
+def process_age() -> Optional[float]:
+    """Âge du processus (s) d'après /proc, None si indisponible (hors Linux)"""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        # Champ 22 de /proc/self/stat (le 20e après le nom de commande)
+        start_ticks = int(fields[19])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class PhaseProfiler:
+    """Enregistre des phases (nom, début, fin, profondeur) relatives à une origine"""
+
+    def __init__(self, origin: Optional[float] = None, startup: bool = True):
+        """
+        Args:
+            origin: perf_counter() pris au plus tôt dans le script (défaut: maintenant)
+            startup: Ajoute la phase de démarrage de l'interpréteur (Linux)
+        """
+        now = time.perf_counter()
+        self.origin = origin if origin is not None else now
+        self.phases: List[Tuple[str, float, float, int]] = []
+        self._cursor = self.origin
+        self._depth = threading.local()
+        self.startup: Optional[float] = None
+        if startup:
+            age = process_age()
+            if age is not None:
+                # L'âge est mesuré maintenant: on retire le temps écoulé depuis l'origine
+                self.startup = max(0.0, age - (now - self.origin))
+
+    def _level(self) -> int:
+        return getattr(self._depth, "value", 0)
+
+    def mark(self, name: str):
+        """Phase allant de la fin de la phase précédente (ou de l'origine) à maintenant"""
+        now = time.perf_counter()
+        self.phases.append((name, self._cursor, now, self._level()))
+        self._cursor = now
+
+    @contextmanager
+    def phase(self, name: str):
+        """Mesure le bloc; les phases imbriquées sont indentées dans le rapport"""
+        level = self._level()
+        self._depth.value = level + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._depth.value = level
+            self.phases.append((name, start, end, level))
+            if level == 0:
+                self._cursor = end
+
+    def report(self) -> Dict[str, Any]:
+        """Phases triées par début, en millisecondes depuis l'origine"""
+        end = time.perf_counter()
+        phases = [
+            {"phase": name, "start_ms": round((s - self.origin) * 1000, 3),
+             "duration_ms": round((e - s) * 1000, 3), "depth": depth}
+            for name, s, e, depth in sorted(self.phases, key=lambda p: (p[1], p[3]))
+        ]
+        measured = sum(p["duration_ms"] for p in phases if p["depth"] == 0)
+        return {
+            "startup_ms": round(self.startup * 1000, 1) if self.startup is not None else None,
+            "phases": phases,
+            "script_ms": round((end - self.origin) * 1000, 3),
+            "unattributed_ms": round((end - self.origin) * 1000 - measured, 3),
+        }
+
+    def print_table(self):
+        report = self.report()
+        total = report["script_ms"] + (report["startup_ms"] or 0)
+        print("\n=== PROFIL ===")
+        print(f"{'phase':<34} {'début':>10} {'durée':>10} {'part':>6}")
+        if report["startup_ms"] is not None:
+            print(f"{'démarrage interpréteur':<34} {'-':>10} {report['startup_ms']:9.1f}ms "
+                  f"{report['startup_ms'] / total * 100 if total else 0:5.1f}%")
+        for p in report["phases"]:
+            name = "  " * p["depth"] + p["phase"]
+            print(f"{name:<34} {p['start_ms']:8.1f}ms {p['duration_ms']:8.1f}ms "
+                  f"{p['duration_ms'] / total * 100 if total else 0:5.1f}%")
+        print(f"{'(non attribué)':<34} {'':>10} {report['unattributed_ms']:8.1f}ms")
+        print(f"{'TOTAL':<34} {'':>10} {total:8.1f}ms")
+
+    def print_json(self):
+        print(json.dumps(self.report(), indent=2, ensure_ascii=False))
+
+    def write_trace(self, path: str):
+        """Fichier Chrome Trace Event (événements complets 'X', µs)"""
+        pid = os.getpid()
+        offset = self.startup or 0.0
+        events: List[Dict[str, Any]] = [
+            {"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+             "args": {"name": os.path.basename(sys.argv[0]) or "python"}},
+        ]
+        if self.startup is not None:
+            events.append({"name": "démarrage interpréteur", "ph": "X", "pid": pid, "tid": 0,
+                           "ts": 0, "dur": round(self.startup * 1e6, 1)})
+        for name, s, e, depth in self.phases:
+            events.append({"name": name, "ph": "X", "pid": pid, "tid": 0,
+                           "ts": round((offset + s - self.origin) * 1e6, 1),
+                           "dur": round((e - s) * 1e6, 1), "args": {"depth": depth}})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    def output(self, fmt: str = "table", trace_path: Optional[str] = None):
+        """Restitue le profil (table ou json) et écrit la trace si demandé"""
+        if fmt == "json":
+            self.print_json()
+        else:
+            self.print_table()
+        if trace_path:
+            self.write_trace(trace_path)
+            print(f"Trace écrite: {trace_path}")
+
+
+class _NullProfiler:
+    """Profileur inactif: mêmes appels, aucun coût notable"""
+
+    def mark(self, name: str):
+        pass
+
+    @contextmanager
+    def phase(self, name: str):
+        yield
+
+    def output(self, fmt: str = "table", trace_path: Optional[str] = None):
+        pass
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+def pop_profile_flags(argv: List[str]) -> Tuple[Optional[str], Optional[str], List[str]]:
+    """
+    Extrait --profile[=table|json] et --profile-trace FICHIER d'une ligne de commande
+
+    Returns:
+        (format ou None si pas de profilage, chemin de trace, arguments restants)
+    """
+    fmt, trace, rest = None, None, []
+    args = iter(argv)
+    for arg in args:
+        if arg == "--profile":
+            fmt = "table"
+        elif arg.startswith("--profile="):
+            fmt = arg.split("=", 1)[1]
+        elif arg == "--profile-trace":
+            trace = next(args, None)
+            fmt = fmt or "table"
+        elif arg.startswith("--profile-trace="):
+            trace = arg.split("=", 1)[1]
+            fmt = fmt or "table"
+        else:
+            rest.append(arg)
+    if fmt not in (None, "table", "json"):
+        raise ValueError(f"Format de profil inconnu: {fmt} (table ou json)")
+    return fmt, trace, rest
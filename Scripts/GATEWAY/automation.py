@@ -0,0 +1,566 @@
+#!/usr/bin/env python3
+"""
+Automatisations horaires de la passerelle (règles cron et ponctuelles)
+
+Remplace les entrées crontab qui lançaient un script Tapo/IR par exécution
+(démarrage de l'interpréteur + handshake à chaque fois): les règles sont
+déclenchées dans le processus de la passerelle et passent par ses
+exécuteurs persistants (sessions Tapo ouvertes, file par appareil, thread
+IR par pin).
+
+Un seul tas de minuteurs (heapq) porte l'échéance suivante de chaque règle:
+ajout et déclenchement en O(log n), suppression paresseuse. Le prochain
+déclenchement d'une règle cron est calculé champ par champ (mois, jour,
+heure, minute, seconde) sans parcourir les secondes intermédiaires.
+
+Fichier de règles (YAML):
+    rules:
+      - id: lampe_matin
+        cron: "0 7 * * mon-fri"          # minute heure jour mois jour_semaine
+        actions:
+          - {tapo: salon_lampe, command: "on"}
+      - id: lever_soleil
+        cron: "0 30 6 * * *"             # 6 champs: seconde en premier
+        fade: {tapo: chambre, brightness: 100, duration: 1800}
+      - id: ampli_off
+        at: "2025-12-31T23:30:00"        # ponctuelle, heure locale
+        actions:
+          - {ir: ampli, command: POWER}
+
+Exemples:
+    python automation.py rules.yaml --gateway gateway.yaml     # exécution
+    python automation.py rules.yaml --list                      # prochaines échéances
+    python automation.py --bench 10000                          # coût ajout/déclenchement
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from bisect import bisect_left
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import heapq
+import itertools
+import random
+import sys
+import time
+
+import yaml
+from pydantic import BaseModel, ValidationError, field_validator, model_validator
+
+from gateway import CommandModel
+
+MAX_SLEEP = 60.0  # Réveil au moins chaque minute: suit les sauts de l'horloge murale
+
+
+class CronError(ValueError):
+    """Expression cron invalide"""
+
+
+CRON_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+}
+MONTH_NAMES = {name: i for i, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], 1)}
+DAY_NAMES = {name: i for i, name in enumerate(["sun", "mon", "tue", "wed", "thu", "fri", "sat"])}
+
+
+def _parse_field(text: str, low: int, high: int, names: Optional[Dict[str, int]] = None) -> List[int]:
+    """'*', '1-5', 'mon-fri', '*/15', '0,30' -> valeurs triées"""
+    values: Set[int] = set()
+
+    def value(token: str) -> int:
+        token = token.lower()
+        if names and token in names:
+            return names[token]
+        if not token.isdigit():
+            raise CronError(f"Valeur invalide: {token}")
+        return int(token)
+
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise CronError(f"Pas invalide: {step_text}")
+            step = int(step_text)
+        if part == "*":
+            start, stop = low, high
+        elif "-" in part:
+            first, last = part.split("-", 1)
+            start, stop = value(first), value(last)
+        else:
+            start = value(part)
+            stop = high if step > 1 else start
+        if not (low <= start <= high and low <= stop <= high) or start > stop:
+            raise CronError(f"Hors limites [{low}-{high}]: {part}")
+        values.update(range(start, stop + 1, step))
+    return sorted(values)
+
+
+class CronExpression:
+    """Expression cron à 5 champs (minute ...) ou 6 champs (seconde minute ...)"""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = CRON_ALIASES.get(expression.strip(), expression).split()
+        if len(fields) == 5:
+            fields.insert(0, "0")
+        if len(fields) != 6:
+            raise CronError(f"5 ou 6 champs attendus: {expression}")
+        self.seconds = _parse_field(fields[0], 0, 59)
+        self.minutes = _parse_field(fields[1], 0, 59)
+        self.hours = _parse_field(fields[2], 0, 23)
+        self.days = set(_parse_field(fields[3], 1, 31))
+        self.months = set(_parse_field(fields[4], 1, 12, MONTH_NAMES))
+        # 7 = dimanche, comme 0
+        self.weekdays = {d % 7 for d in _parse_field(fields[5], 0, 7, DAY_NAMES)}
+        self.any_day = fields[3] == "*"
+        self.any_weekday = fields[5] == "*"
+
+    def _day_matches(self, t: datetime) -> bool:
+        day_ok = t.day in self.days
+        weekday_ok = (t.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        # Jour du mois ET jour de semaine restreints: l'un ou l'autre (règle cron)
+        return day_ok or weekday_ok
+
+    @staticmethod
+    def _next_value(values: List[int], current: int) -> Optional[int]:
+        i = bisect_left(values, current)
+        return values[i] if i < len(values) else None
+
+    def next_after(self, after: datetime) -> datetime:
+        """Première échéance strictement postérieure à `after` (heure locale naïve)"""
+        t = after.replace(microsecond=0) + timedelta(seconds=1)
+        limit = t.year + 5
+        while t.year <= limit:
+            if t.month not in self.months:
+                t = datetime(t.year + (t.month == 12), t.month % 12 + 1, 1)
+                continue
+            if not self._day_matches(t):
+                t = datetime(t.year, t.month, t.day) + timedelta(days=1)
+                continue
+            hour = self._next_value(self.hours, t.hour)
+            if hour is None:
+                t = datetime(t.year, t.month, t.day) + timedelta(days=1)
+                continue
+            if hour != t.hour:
+                t = t.replace(hour=hour, minute=0, second=0)
+            minute = self._next_value(self.minutes, t.minute)
+            if minute is None:
+                t = t.replace(minute=0, second=0) + timedelta(hours=1)
+                continue
+            if minute != t.minute:
+                t = t.replace(minute=minute, second=0)
+            second = self._next_value(self.seconds, t.second)
+            if second is None:
+                t = t.replace(second=0) + timedelta(minutes=1)
+                continue
+            return t.replace(second=second)
+        raise CronError(f"Aucune échéance dans les 5 ans: {self.expression}")
+
+
+# Modèles Pydantic
+class FadeModel(BaseModel):
+    tapo: str
+    brightness: int
+    duration: float
+    hue: Optional[int] = None
+    saturation: Optional[int] = None
+    turn_off: bool = False
+
+    @field_validator('brightness')
+    def validate_brightness(cls, v):
+        if not (1 <= v <= 100):
+            raise ValueError("brightness doit être entre 1 et 100")
+        return v
+
+
+class RuleModel(BaseModel):
+    id: str
+    cron: Optional[str] = None
+    at: Optional[datetime] = None
+    actions: List[CommandModel] = []
+    fade: Optional[FadeModel] = None
+    enabled: bool = True
+
+    @field_validator('cron')
+    def validate_cron(cls, v):
+        if v is not None:
+            CronExpression(v)
+        return v
+
+    @model_validator(mode='after')
+    def validate_rule(self):
+        if (self.cron is None) == (self.at is None):
+            raise ValueError("Une règle doit avoir soit 'cron', soit 'at'")
+        if not self.actions and self.fade is None:
+            raise ValueError("Une règle doit avoir des 'actions' ou un 'fade'")
+        if self.at is not None and self.at.tzinfo is not None:
+            # Échéances en heure locale naïve, comme les règles cron
+            self.at = self.at.astimezone().replace(tzinfo=None)
+        return self
+
+
+class RulesFileModel(BaseModel):
+    rules: List[RuleModel] = []
+
+    @field_validator('rules')
+    def validate_unique(cls, v):
+        ids = [rule.id for rule in v]
+        duplicates = sorted({i for i in ids if ids.count(i) > 1})
+        if duplicates:
+            raise ValueError(f"Identifiants de règle en double: {', '.join(duplicates)}")
+        return v
+
+
+def load_rules(path: str) -> List[RuleModel]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    return RulesFileModel(**data).rules
+
+
+class _Entry:
+    """Règle planifiée: échéance courante et compteurs"""
+
+    def __init__(self, rule: RuleModel):
+        self.rule = rule
+        self.cron = CronExpression(rule.cron) if rule.cron else None
+        self.due: Optional[float] = None
+        self.seq = -1
+        self.running = False
+        self.fired = 0
+        self.missed = 0
+        self.overlaps = 0
+        self.failures = 0
+        self.last_lateness: Optional[float] = None
+
+
+class AutomationScheduler:
+    """Tas d'échéances (epoch, seq, id) pour des milliers de règles"""
+
+    def __init__(self, dispatch: Callable[[RuleModel], Awaitable[bool]],
+                 misfire_grace: float = 60.0, clock: Callable[[], float] = time.time):
+        """
+        Args:
+            dispatch: Coroutine exécutant les actions d'une règle; retourne False
+                si une action a échoué
+            misfire_grace: Retard max (s) au-delà duquel une échéance est
+                abandonnée (processus suspendu, horloge avancée)
+            clock: Horloge murale (epoch en secondes)
+        """
+        self.dispatch = dispatch
+        self.misfire_grace = misfire_grace
+        self.clock = clock
+        self._heap: List[Tuple[float, int, str]] = []
+        self._entries: Dict[str, _Entry] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.lateness: List[float] = []
+
+    def _schedule(self, entry: _Entry, after: float):
+        rule = entry.rule
+        if entry.cron is not None:
+            due = entry.cron.next_after(datetime.fromtimestamp(after)).timestamp()
+        elif entry.fired or entry.missed:
+            due = None
+        else:
+            due = rule.at.timestamp()
+            if due < after - self.misfire_grace:
+                due = None  # Ponctuelle déjà passée
+        entry.due = due
+        if due is None:
+            entry.seq = -1
+            return
+        entry.seq = next(self._seq)
+        heapq.heappush(self._heap, (due, entry.seq, rule.id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def add(self, rule: RuleModel) -> Optional[float]:
+        """
+        Ajoute (ou remplace) une règle; O(log n)
+
+        Returns:
+            Prochaine échéance (epoch), None si la règle ne se déclenchera plus
+        """
+        entry = _Entry(rule)
+        self._entries[rule.id] = entry
+        if rule.enabled:
+            self._schedule(entry, self.clock())
+        return entry.due
+
+    def remove(self, rule_id: str):
+        """Supprime une règle (l'entrée du tas est ignorée à son échéance)"""
+        self._entries.pop(rule_id, None)
+
+    def pop_due(self, now: float) -> List[Tuple[_Entry, float, bool]]:
+        """
+        Retire les échéances atteintes et replanifie les règles cron
+
+        Returns:
+            (règle, échéance, manquée) pour chaque échéance atteinte
+        """
+        fired = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            due, seq, rule_id = heapq.heappop(heap)
+            entry = self._entries.get(rule_id)
+            if entry is None or entry.seq != seq:
+                continue  # Règle supprimée ou replanifiée
+            missed = now - due > self.misfire_grace
+            if missed:
+                entry.missed += 1
+            fired.append((entry, due, missed))
+            if entry.cron is None:
+                # Ponctuelle consommée: jamais remise dans le tas
+                entry.due = None
+                entry.seq = -1
+                continue
+            # Après un retard excessif, on repart de maintenant (pas de rafale de rattrapage)
+            self._schedule(entry, now if missed else due)
+        return fired
+
+    def next_due(self) -> Optional[float]:
+        heap = self._heap
+        while heap:
+            due, seq, rule_id = heap[0]
+            entry = self._entries.get(rule_id)
+            if entry is not None and entry.seq == seq:
+                return due
+            heapq.heappop(heap)
+        return None
+
+    async def _fire(self, entry: _Entry):
+        entry.running = True
+        try:
+            ok = await self.dispatch(entry.rule)
+        except Exception as e:
+            print(f"Règle {entry.rule.id}: échec {type(e).__name__}: {e}")
+            ok = False
+        finally:
+            entry.running = False
+        if not ok:
+            entry.failures += 1
+
+    async def run(self, duration: Optional[float] = None):
+        """
+        Déclenche les règles jusqu'à expiration de `duration` (None = infini)
+
+        Les actions s'exécutent dans des tâches séparées: une règle lente (fondu)
+        ne retarde pas les autres. Une règle encore en cours à sa prochaine
+        échéance est sautée.
+        """
+        self._wakeup = asyncio.Event()
+        end = self.clock() + duration if duration is not None else None
+        try:
+            while True:
+                now = self.clock()
+                if end is not None and now >= end:
+                    break
+                for entry, due, missed in self.pop_due(now):
+                    if missed:
+                        continue
+                    if entry.running:
+                        entry.overlaps += 1
+                        continue
+                    entry.fired += 1
+                    entry.last_lateness = now - due
+                    self.lateness.append(now - due)
+                    del self.lateness[:-1024]
+                    task = asyncio.create_task(self._fire(entry))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                due = self.next_due()
+                timeout = MAX_SLEEP if due is None else min(MAX_SLEEP, max(0.0, due - self.clock()))
+                if end is not None:
+                    timeout = min(timeout, max(0.0, end - self.clock()))
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._wakeup = None
+
+    def describe(self) -> Dict[str, Any]:
+        """Règles, prochaines échéances et compteurs"""
+        def stamp(ts: Optional[float]) -> Optional[str]:
+            return datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts else None
+
+        lateness = sorted(self.lateness)
+        return {
+            "rules": {
+                rule_id: {
+                    "schedule": e.rule.cron or stamp(e.rule.at.timestamp()),
+                    "enabled": e.rule.enabled,
+                    "next": stamp(e.due),
+                    "fired": e.fired,
+                    "missed": e.missed,
+                    "overlaps": e.overlaps,
+                    "failures": e.failures,
+                    "last_lateness_ms": round(e.last_lateness * 1000, 1)
+                    if e.last_lateness is not None else None,
+                }
+                for rule_id, e in sorted(self._entries.items())
+            },
+            "lateness_ms_p50": round(lateness[len(lateness) // 2] * 1000, 1) if lateness else None,
+            "lateness_ms_max": round(lateness[-1] * 1000, 1) if lateness else None,
+        }
+
+
+def gateway_dispatcher(gateway) -> Callable[[RuleModel], Awaitable[bool]]:
+    """Exécution des règles par les exécuteurs persistants de la passerelle"""
+    async def dispatch(rule: RuleModel) -> bool:
+        start = time.perf_counter()
+        ok = True
+        if rule.actions:
+            results = await gateway.execute_batch(rule.actions)
+            ok = all(r["ok"] for r in results)
+        if rule.fade is not None:
+            ok = await _fade(gateway, rule.fade) and ok
+        gateway.publish({"type": "automation", "rule": rule.id, "ok": ok,
+                         "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)})
+        return ok
+    return dispatch
+
+
+async def _fade(gateway, spec: FadeModel) -> bool:
+    from tapo_transition import HSV, fade
+
+    if gateway.controller is None:
+        print("Fondu ignoré: aucune configuration Tapo chargée")
+        return False
+    try:
+        # Appareil réservé pendant tout le fondu (les commandes en file attendent);
+        # chaque trame passe par le contrôleur: session, reprises et disjoncteur
+        async with gateway.controller.exclusive(spec.tapo, "fade") as handle:
+            await fade(handle, HSV(spec.hue, spec.saturation, spec.brightness), spec.duration,
+                       turn_off=spec.turn_off)
+    except Exception as e:
+        print(f"Fondu {spec.tapo}: échec {type(e).__name__}: {e}")
+        return False
+    return True
+
+
+def print_rules(scheduler: AutomationScheduler):
+    info = scheduler.describe()
+    print(f"=== AUTOMATISATIONS ({len(info['rules'])} règles) ===")
+    for rule_id, r in info["rules"].items():
+        print(f"  {rule_id:<24} {r['schedule']:<22} prochaine: {r['next'] or '-'}")
+
+
+def bench(count: int, hours: float = 1.0, seed: int = 1) -> Dict[str, Any]:
+    """
+    Coût de l'ordonnanceur seul: `count` règles cron aléatoires, horloge virtuelle
+
+    Returns:
+        Durée d'ajout par règle, échéances traitées et coût par déclenchement
+    """
+    rng = random.Random(seed)
+    origin = time.time()
+    virtual = [origin]
+
+    async def noop(rule: RuleModel) -> bool:
+        return True
+
+    scheduler = AutomationScheduler(noop, clock=lambda: virtual[0])
+    rules = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            cron = f"{rng.randrange(60)} {rng.randrange(60)} * * * *"
+        elif kind < 0.8:
+            cron = f"{rng.randrange(60)} */{rng.choice([1, 2, 5, 10, 15])} * * * *"
+        else:
+            cron = f"{rng.randrange(60)} {rng.randrange(60)} {rng.randrange(24)} * * mon-fri"
+        rules.append(RuleModel(id=f"r{i}", cron=cron, actions=[{"tapo": "x", "command": "on"}]))
+
+    start = time.perf_counter()
+    for rule in rules:
+        scheduler.add(rule)
+    add_s = time.perf_counter() - start
+
+    fired = 0
+    start = time.perf_counter()
+    for second in range(int(hours * 3600)):
+        virtual[0] = origin + second
+        fired += len(scheduler.pop_due(virtual[0]))
+    fire_s = time.perf_counter() - start
+    return {
+        "rules": count,
+        "add_us_per_rule": round(add_s / count * 1e6, 1),
+        "simulated_hours": hours,
+        "fired": fired,
+        "fire_us_per_event": round(fire_s / fired * 1e6, 1) if fired else None,
+    }
+
+
+async def automation_main(args):
+    from gateway import build_gateway, load_gateway_config
+
+    rules = load_rules(args.rules)
+    gateway = build_gateway(load_gateway_config(args.gateway))
+    scheduler = AutomationScheduler(gateway_dispatcher(gateway), args.misfire_grace)
+    for rule in rules:
+        scheduler.add(rule)
+    print_rules(scheduler)
+    try:
+        await scheduler.run(args.duration)
+    finally:
+        gateway.close()
+        for remote in gateway.remotes.values():
+            remote.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Automatisations horaires Tapo + IR")
+    parser.add_argument("rules", nargs="?", help="Fichier YAML des règles")
+    parser.add_argument("--gateway", default=None, help="Configuration de la passerelle (YAML)")
+    parser.add_argument("--list", action="store_true", help="Affiche les prochaines échéances")
+    parser.add_argument("--duration", type=float, default=None, help="Durée (s) avant arrêt")
+    parser.add_argument("--misfire-grace", type=float, default=60.0,
+                        help="Retard max (s) avant d'abandonner une échéance")
+    parser.add_argument("--bench", type=int, metavar="N",
+                        help="Mesure ajout/déclenchement pour N règles (horloge virtuelle)")
+    args = parser.parse_args()
+
+    if args.bench:
+        result = bench(args.bench)
+        print(f"{result['rules']} règles: ajout {result['add_us_per_rule']} µs/règle, "
+              f"{result['fired']} déclenchements sur {result['simulated_hours']} h simulée, "
+              f"{result['fire_us_per_event']} µs/déclenchement")
+        return
+    if not args.rules:
+        parser.error("fichier de règles requis")
+    try:
+        rules = load_rules(args.rules)
+    except ValidationError as e:
+        print("Erreur de validation des règles:", e)
+        sys.exit(1)
+    if args.list:
+        async def noop(rule: RuleModel) -> bool:
+            return True
+        scheduler = AutomationScheduler(noop)
+        for rule in rules:
+            scheduler.add(rule)
+        print_rules(scheduler)
+        return
+    try:
+        asyncio.run(automation_main(args))
+    except KeyboardInterrupt:
+        print("\nArrêt des automatisations.")
+
+
+if __name__ == "__main__":
+    main()
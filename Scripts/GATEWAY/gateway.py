@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+Passerelle HTTP/WebSocket locale pour les appareils Tapo et les télécommandes IR
+
+Le processus garde les sessions Tapo ouvertes (TapoController) et les GPIO IR
+réservés, ce qui évite le démarrage de l'interpréteur et le handshake à
+chaque commande. Les commandes peuvent être envoyées par lots: les cibles
+différentes s'exécutent en parallèle, l'ordre est conservé pour une même cible.
+
+Routes:
+    GET  /devices                     appareils Tapo, télécommandes et état connu
+    GET  /state                       état connu des appareils
+    GET  /queue                       files Tapo: profondeur et commandes fusionnées
+    GET  /metrics                     métriques au format texte Prometheus
+    POST /tapo/{appareil}/{commande}  {"args": [...]}
+    POST /ir/{telecommande}/{commande} {"repeat": 0}
+    POST /batch                       [{"tapo": "salon_lampe", "command": "on"}, ...]
+    GET  /ws                          WebSocket: événements d'état poussés, et
+                                      commandes (objet ou tableau) acceptées
+    GET  /automations                 règles horaires, prochaines échéances
+                                      (si `automations` est configuré, voir automation.py)
+
+Écoute sur 127.0.0.1 par défaut. Avec `token` dans la configuration, chaque
+requête doit porter `Authorization: Bearer <token>` (ou `?token=` pour /ws,
+qu'un navigateur ne peut pas authentifier par en-tête); sans jeton, l'écoute
+hors boucle locale est refusée.
+
+Exemple: python gateway.py gateway.yaml
+"""
+
+from typing import Any, Dict, List, Optional, Set, Union
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import json
+import os
+import sys
+import time
+
+import yaml
+from aiohttp import WSMsgType, web
+from pydantic import BaseModel, ValidationError, field_validator, model_validator
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _sub in ("BT_TAPO", "IR_OSRAM", "IR_YAMAHA", "IR_CORE", "SCENES", "COMMON"):
+    _path = os.path.join(SCRIPTS_DIR, _sub)
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from ir_async import AsyncTransmitter
+from metrics import REGISTRY
+from scene_engine import NEC_FRAME_GAP_MS, RemoteModel, remote_class
+
+EVENT_QUEUE_SIZE = 256
+
+
+# Modèles Pydantic
+class GatewayConfigModel(BaseModel):
+    tapo_config: Optional[str] = None
+    host: str = "127.0.0.1"
+    port: int = 8080
+    token: Optional[str] = None
+    rate: float = 2.0
+    burst: float = 4.0
+    automations: Optional[str] = None
+    remotes: Dict[str, RemoteModel] = {}
+
+
+class CommandModel(BaseModel):
+    tapo: Optional[str] = None
+    ir: Optional[str] = None
+    command: str
+    args: List[Union[int, str]] = []
+    repeat: int = 0
+
+    @field_validator('command', mode='before')
+    def validate_command(cls, v):
+        # YAML/JSON: on/off peuvent arriver sous forme de booléens
+        if isinstance(v, bool):
+            return "on" if v else "off"
+        return v
+
+    @field_validator('repeat')
+    def validate_repeat(cls, v):
+        if not (0 <= v <= 20):
+            raise ValueError("repeat doit être entre 0 et 20")
+        return v
+
+    @model_validator(mode='after')
+    def validate_target(self):
+        if (self.tapo is None) == (self.ir is None):
+            raise ValueError("Préciser exactement une cible ('tapo' ou 'ir')")
+        return self
+
+
+def load_gateway_config(path: Optional[str]) -> GatewayConfigModel:
+    if path is None:
+        return GatewayConfigModel()
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    config = GatewayConfigModel(**data)
+    base = os.path.dirname(os.path.abspath(path))
+    if config.tapo_config is not None and not os.path.isabs(config.tapo_config):
+        config.tapo_config = os.path.join(base, config.tapo_config)
+    if config.automations is not None and not os.path.isabs(config.automations):
+        config.automations = os.path.join(base, config.automations)
+    return config
+
+
+def _jsonable(result: Any) -> Any:
+    """Résultat d'appareil sérialisable (les résultats tapo exposent to_dict())"""
+    if result is None or isinstance(result, (bool, int, float, str, list, dict)):
+        return result
+    if hasattr(result, "to_dict"):
+        return result.to_dict()
+    return str(result)
+
+
+class Gateway:
+    """Exécute les commandes Tapo/IR et diffuse les changements d'état"""
+
+    def __init__(self, controller=None, remotes: Optional[Dict[str, object]] = None,
+                 remote_types: Optional[Dict[str, str]] = None, queue=None):
+        """
+        Args:
+            controller: TapoController (sessions persistantes), None sans Tapo
+            remotes: Nom -> télécommande initialisée (GPIO réservé)
+            remote_types: Nom -> type de télécommande (yamaha/osram)
+            queue: CommandQueue (débit limité et fusion par appareil), None = direct
+        """
+        self.controller = controller
+        self.queue = queue
+        self.remotes = remotes or {}
+        self.remote_types = remote_types or {}
+        self.state: Dict[str, Dict[str, Any]] = {}
+        self._subscribers: Set[asyncio.Queue] = set()
+        # Un thread par pin: les émissions d'un même émetteur restent dans l'ordre
+        self.transmitter = AsyncTransmitter(NEC_FRAME_GAP_MS / 1000)
+
+    # --- Événements ---
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(EVENT_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event: Dict[str, Any]):
+        """Diffuse un événement; un abonné trop lent perd ses événements les plus anciens"""
+        event.setdefault("ts", time.time())
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    # --- Commandes ---
+    def _update_state(self, command: CommandModel):
+        if command.tapo is not None:
+            state = self.state.setdefault(command.tapo, {})
+            if command.command in ("on", "off"):
+                state["device_on"] = command.command == "on"
+            elif command.command == "set_brightness":
+                state.update(device_on=True, brightness=int(command.args[0]))
+            elif command.command == "set_color":
+                state.update(device_on=True, color=[int(a) for a in command.args])
+            return command.tapo, state
+        state = self.state.setdefault(command.ir, {})
+        state["last_command"] = command.command
+        return command.ir, state
+
+    async def _send_ir(self, command: CommandModel) -> None:
+        if command.ir not in self.remotes:
+            raise KeyError(f"Télécommande {command.ir} inconnue")
+        remote = self.remotes[command.ir]
+        if self.remote_types.get(command.ir) == "osram":
+            frames = remote.render_frames(command.command, command.repeat)
+        else:
+            frames = remote.render_frames(command.command)
+            if frames is not None and command.repeat:
+                frames = frames + [frames[-1]] * command.repeat
+        if frames is None:
+            raise KeyError(f"Commande IR inconnue: {command.command}")
+        await self.transmitter.send(remote, frames)
+
+    async def execute(self, command: CommandModel) -> Dict[str, Any]:
+        """Exécute une commande; le résultat est toujours un dict (ok + result/error)"""
+        start = time.perf_counter()
+        try:
+            if command.tapo is not None:
+                if self.controller is None:
+                    raise KeyError("Aucune configuration Tapo chargée")
+                executor = self.queue if self.queue is not None else self.controller
+                result = await executor.execute(command.tapo, command.command,
+                                                [str(a) for a in command.args])
+            else:
+                result = await self._send_ir(command)
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}",
+                    "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+        target, state = self._update_state(command)
+        self.publish({"type": "state", "target": target, "command": command.command,
+                      "args": command.args, "state": dict(state)})
+        return {"ok": True, "result": _jsonable(result),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    async def execute_batch(self, commands: List[CommandModel]) -> List[Dict[str, Any]]:
+        """
+        Exécute un lot: en parallèle entre cibles, dans l'ordre pour une même cible
+
+        Returns:
+            Résultats dans l'ordre du lot
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(commands)
+        chains: Dict[str, List[int]] = {}
+        for i, command in enumerate(commands):
+            key = f"tapo:{command.tapo}" if command.tapo is not None else f"ir:{command.ir}"
+            chains.setdefault(key, []).append(i)
+
+        async def run_chain(indexes: List[int]):
+            if self.queue is not None and commands[indexes[0]].tapo is not None:
+                # Mises en file dans l'ordre du lot: la file de l'appareil fusionne
+                outcomes = await asyncio.gather(*(self.execute(commands[i]) for i in indexes))
+                for i, outcome in zip(indexes, outcomes):
+                    results[i] = outcome
+                return
+            for i in indexes:
+                results[i] = await self.execute(commands[i])
+
+        await asyncio.gather(*(run_chain(indexes) for indexes in chains.values()))
+        return results
+
+    def describe(self) -> Dict[str, Any]:
+        tapo = {}
+        if self.controller is not None:
+            tapo = {name: {"type": dev.type, "ip": dev.ip}
+                    for name, dev in self.controller.config.devices.items()}
+        remotes = {name: {"type": self.remote_types.get(name), "pin": remote.ir_pin,
+                          "commands": sorted(remote.commands)}
+                   for name, remote in self.remotes.items()}
+        return {"tapo": tapo, "remotes": remotes, "state": self.state}
+
+    def close(self):
+        self.transmitter.close()
+
+
+def parse_commands(payload: Any) -> List[CommandModel]:
+    """Objet ou tableau JSON -> commandes validées (ValidationError sinon)"""
+    items = payload if isinstance(payload, list) else [payload]
+    return [CommandModel(**item) for item in items]
+
+
+# --- Routes HTTP ---
+GATEWAY_KEY = web.AppKey("gateway", Gateway)
+AUTOMATIONS_KEY = web.AppKey("automations", object)
+AUTOMATIONS_TASK_KEY = web.AppKey("automations_task", asyncio.Task)
+
+
+def _error(status: int, message: str) -> web.Response:
+    return web.json_response({"ok": False, "error": message}, status=status)
+
+
+async def _body(request: web.Request, expected: Union[type, tuple] = dict) -> Any:
+    """Corps JSON de la requête (objet attendu, ou tableau pour /batch)"""
+    if not request.can_read_body:
+        return {}
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="JSON invalide")
+    if not isinstance(body, expected):
+        raise web.HTTPBadRequest(text=f"Corps JSON inattendu ({type(body).__name__})")
+    return body
+
+
+async def handle_devices(request: web.Request) -> web.Response:
+    return web.json_response(request.app[GATEWAY_KEY].describe())
+
+
+async def handle_state(request: web.Request) -> web.Response:
+    return web.json_response(request.app[GATEWAY_KEY].state)
+
+
+async def handle_queue(request: web.Request) -> web.Response:
+    queue = request.app[GATEWAY_KEY].queue
+    return web.json_response(queue.stats() if queue is not None else {})
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=REGISTRY.render(), content_type="text/plain")
+
+
+async def handle_tapo(request: web.Request) -> web.Response:
+    body = await _body(request)
+    try:
+        command = CommandModel(tapo=request.match_info["device"],
+                               command=request.match_info["command"],
+                               args=body.get("args", []))
+    except ValidationError as e:
+        return _error(400, str(e))
+    result = await request.app[GATEWAY_KEY].execute(command)
+    return web.json_response(result, status=200 if result["ok"] else 502)
+
+
+async def handle_ir(request: web.Request) -> web.Response:
+    body = await _body(request)
+    try:
+        command = CommandModel(ir=request.match_info["remote"],
+                               command=request.match_info["command"],
+                               repeat=body.get("repeat", 0))
+    except ValidationError as e:
+        return _error(400, str(e))
+    result = await request.app[GATEWAY_KEY].execute(command)
+    return web.json_response(result, status=200 if result["ok"] else 502)
+
+
+async def handle_batch(request: web.Request) -> web.Response:
+    try:
+        commands = parse_commands(await _body(request, (dict, list)))
+    except (ValidationError, TypeError) as e:
+        return _error(400, str(e))
+    results = await request.app[GATEWAY_KEY].execute_batch(commands)
+    return web.json_response({"ok": all(r["ok"] for r in results), "results": results})
+
+
+async def handle_ws(request: web.Request) -> web.WebSocketResponse:
+    gateway: Gateway = request.app[GATEWAY_KEY]
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    queue = gateway.subscribe()
+
+    async def push():
+        while True:
+            event = await queue.get()
+            await ws.send_json(event)
+
+    async def run(message: Dict[str, Any]):
+        request_id = message.pop("id", None) if isinstance(message, dict) else None
+        payload = message.get("commands", message) if isinstance(message, dict) else message
+        try:
+            commands = parse_commands(payload)
+        except (ValidationError, TypeError) as e:
+            await ws.send_json({"id": request_id, "ok": False, "error": str(e)})
+            return
+        results = await gateway.execute_batch(commands)
+        await ws.send_json({"id": request_id, "ok": all(r["ok"] for r in results),
+                            "results": results})
+
+    pusher = asyncio.create_task(push())
+    pending: Set[asyncio.Task] = set()
+    try:
+        await ws.send_json({"type": "snapshot", "state": gateway.state})
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                message = json.loads(msg.data)
+            except ValueError:
+                await ws.send_json({"ok": False, "error": "JSON invalide"})
+                continue
+            # Les commandes d'un client ne bloquent pas la lecture de ses messages suivants
+            task = asyncio.create_task(run(message))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    finally:
+        gateway.unsubscribe(queue)
+        pusher.cancel()
+        for task in pending:
+            task.cancel()
+    return ws
+
+
+async def handle_automations(request: web.Request) -> web.Response:
+    scheduler = request.app[AUTOMATIONS_KEY]
+    if scheduler is None:
+        return _error(404, "Aucune automatisation configurée")
+    return web.json_response(scheduler.describe())
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def bearer_auth(token: str):
+    """Middleware: jeton porteur exigé sur toutes les routes"""
+    expected = token.encode()
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        header = request.headers.get("Authorization", "")
+        supplied = header[7:] if header.startswith("Bearer ") else request.query.get("token", "")
+        if not hmac.compare_digest(supplied.encode(), expected):
+            return _error(401, "Jeton d'accès manquant ou invalide")
+        return await handler(request)
+    return middleware
+
+
+def make_app(gateway: Gateway, automations=None, token: Optional[str] = None) -> web.Application:
+    app = web.Application(middlewares=[bearer_auth(token)] if token else [])
+    app[GATEWAY_KEY] = gateway
+    app[AUTOMATIONS_KEY] = automations
+    if automations is not None:
+        async def start_automations(app: web.Application):
+            app[AUTOMATIONS_TASK_KEY] = asyncio.create_task(automations.run())
+
+        async def stop_automations(app: web.Application):
+            app[AUTOMATIONS_TASK_KEY].cancel()
+            await asyncio.gather(app[AUTOMATIONS_TASK_KEY], return_exceptions=True)
+
+        app.on_startup.append(start_automations)
+        app.on_cleanup.append(stop_automations)
+    app.router.add_get("/devices", handle_devices)
+    app.router.add_get("/state", handle_state)
+    app.router.add_get("/queue", handle_queue)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_post("/tapo/{device}/{command}", handle_tapo)
+    app.router.add_post("/ir/{remote}/{command}", handle_ir)
+    app.router.add_post("/batch", handle_batch)
+    app.router.add_get("/ws", handle_ws)
+    app.router.add_get("/automations", handle_automations)
+    return app
+
+
+def build_gateway(config: GatewayConfigModel) -> Gateway:
+    controller = queue = None
+    if config.tapo_config is not None:
+        from bt_tapo_strict_2 import load_config
+        from tapo_backend import make_backend
+        from tapo_controller import TapoController
+        from tapo_discovery import AddressTable
+        from tapo_queue import CommandQueue
+        from tapo_resilience import ResiliencePolicy
+
+        tapo = load_config(path=config.tapo_config)
+        controller = TapoController(tapo, make_backend(tapo), ResiliencePolicy.load(),
+                                    AddressTable.load())
+        queue = CommandQueue(controller, config.rate, config.burst)
+        REGISTRY.register_collector(queue.collect)
+    remotes = {name: remote_class(remote.type)(remote.pin)
+               for name, remote in config.remotes.items()}
+    remote_types = {name: remote.type for name, remote in config.remotes.items()}
+    return Gateway(controller, remotes, remote_types, queue)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Passerelle HTTP/WebSocket Tapo + IR")
+    parser.add_argument("config", nargs="?", default=None,
+                        help="Fichier YAML de la passerelle (tapo_config, remotes, host, port)")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args()
+
+    try:
+        config = load_gateway_config(args.config)
+    except ValidationError as e:
+        print("Erreur de validation de la configuration:", e)
+        sys.exit(1)
+    host = args.host or config.host
+    if not config.token and not is_loopback(host):
+        print(f"Refus d'écouter sur {host} sans authentification: "
+              "définir `token` dans la configuration (ou garder 127.0.0.1)")
+        sys.exit(1)
+    if config.tapo_config is None:
+        from bt_tapo_strict_2 import CONFIG_PATH
+        if os.path.exists(CONFIG_PATH):
+            config.tapo_config = CONFIG_PATH
+
+    gateway = build_gateway(config)
+    automations = None
+    if config.automations is not None:
+        from automation import AutomationScheduler, gateway_dispatcher, load_rules
+
+        try:
+            rules = load_rules(config.automations)
+        except ValidationError as e:
+            print("Erreur de validation des automatisations:", e)
+            sys.exit(1)
+        automations = AutomationScheduler(gateway_dispatcher(gateway))
+        for rule in rules:
+            automations.add(rule)
+    try:
+        web.run_app(make_app(gateway, automations, config.token), host=host,
+                    port=args.port or config.port)
+    finally:
+        gateway.close()
+        for remote in gateway.remotes.values():
+            remote.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Animations IR cadencées sur des échéances absolues
+
+Une animation est une liste d'étapes (décalage depuis le départ, commande).
+Le lecteur calcule chaque échéance depuis l'origine de l'animation, pas
+depuis la fin de l'étape précédente: la durée d'émission d'une trame
+(~70 ms) et l'encodage ne s'accumulent pas d'une étape à l'autre. Les
+trames sont pré-calculées avant le départ (render_frames de la télécommande).
+
+En retard, deux politiques:
+- "skip": une étape dont la suivante est déjà échue est sautée (sauf si
+  elle est obligatoire, ex: OFF final), pour se recaler immédiatement
+- "compress": toutes les étapes sont jouées, enchaînées sans attente
+  jusqu'à rattraper le planning
+
+Aucune étape n'est émise si sa trame dépasserait la fin de l'animation.
+Le rapport compare, étape par étape, l'instant prévu et l'instant réel.
+
+Exemple:
+    anim = Animation.cycle(["RED", "GREEN", "BLUE"], period=2.0, duration=30)
+    report = AnimationPlayer(remote).play(anim)
+    print_report(report)
+"""
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import time
+
+NEC_FRAME_GAP_S = 0.108  # Gap standard NEC entre deux trames
+LATE_TOLERANCE_S = 0.005  # Au-delà, une étape est comptée en retard
+POLICIES = ("skip", "compress")
+
+
+class Step(NamedTuple):
+    at: float               # décalage depuis le départ (s)
+    command: str
+    label: str = ""
+    required: bool = False  # jamais sauté (politique skip)
+
+
+class Animation:
+    """Étapes triées par échéance et durée totale"""
+
+    def __init__(self, name: str, steps: Sequence[Step], duration: Optional[float] = None):
+        """
+        Args:
+            name: Nom affiché dans le rapport
+            steps: Étapes (triées par `at` à la construction)
+            duration: Fin de l'animation (s); None: pas de borne, la dernière
+                étape est toujours émise
+        """
+        self.name = name
+        self.steps = sorted(steps, key=lambda s: s.at)
+        self.duration = duration
+
+    @classmethod
+    def cycle(cls, commands: Sequence[str], period: float, duration: float,
+              start: float = 0.0, name: str = "cycle") -> "Animation":
+        """Commandes en boucle, une toutes les `period` secondes jusqu'à `duration`"""
+        steps = []
+        at, index = start, 0
+        while at < duration:
+            command = commands[index % len(commands)]
+            steps.append(Step(at, command, f"Couleur: {command}"))
+            at = start + (index + 1) * period
+            index += 1
+        return cls(name, steps, duration)
+
+    @classmethod
+    def fade(cls, command: str, count: int, duration: float, start: float = 0.0,
+             name: str = "fondu") -> "Animation":
+        """
+        Fondu par paliers: `count` émissions de `command` (ex: BRIGHT_DOWN)
+        réparties uniformément sur `duration` secondes
+        """
+        period = duration / count if count else 0.0
+        steps = [Step(start + i * period, command, f"Palier {i + 1}/{count}: {command}")
+                 for i in range(count)]
+        return cls(name, steps, start + duration)
+
+    def shifted(self, offset: float) -> List[Step]:
+        """Étapes décalées de `offset` secondes (composition de séquences)"""
+        return [step._replace(at=step.at + offset) for step in self.steps]
+
+
+class AnimationPlayer:
+    """Joue une Animation sur une télécommande IR (render_frames + send_ir_signal)"""
+
+    def __init__(self, remote, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep, verbose: bool = True):
+        """
+        Args:
+            remote: Télécommande (YamahaRemote, OsramRGBWRemote)
+            clock: Horloge monotone (s)
+            sleep: Attente (s)
+            verbose: Affiche le libellé de chaque étape émise
+        """
+        self.remote = remote
+        self.clock = clock
+        self.sleep = sleep
+        self.verbose = verbose
+
+    def prerender(self, animation: Animation) -> Dict[str, Tuple[List[list], float]]:
+        """
+        Trames de chaque commande distincte et durée d'émission (s)
+
+        Raises:
+            ValueError: Commande inconnue de la télécommande
+        """
+        rendered = {}
+        for step in animation.steps:
+            if step.command in rendered:
+                continue
+            frames = self.remote.render_frames(step.command)
+            if frames is None:
+                raise ValueError(f"Commande inconnue dans l'animation {animation.name}: {step.command}")
+            airtime = sum(sum(frame) for frame in frames) / 1e6 + NEC_FRAME_GAP_S * (len(frames) - 1)
+            rendered[step.command] = (frames, airtime)
+        return rendered
+
+    def _emit(self, frames: List[list]):
+        for index, frame in enumerate(frames):
+            if index:
+                self.sleep(NEC_FRAME_GAP_S)
+            self.remote.send_ir_signal(frame)
+
+    def play(self, animation: Animation, policy: str = "skip") -> Dict[str, object]:
+        """
+        Joue l'animation
+
+        Args:
+            animation: Animation à jouer
+            policy: "skip" ou "compress" (comportement en retard)
+
+        Returns:
+            Rapport: étapes (prévu, réel, retard, statut) et synthèse
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Politique inconnue: {policy} (attendu: {', '.join(POLICIES)})")
+        rendered = self.prerender(animation)
+        steps = animation.steps
+        results = []
+        origin = self.clock()
+
+        for index, step in enumerate(steps):
+            frames, airtime = rendered[step.command]
+            deadline = origin + step.at
+            now = self.clock()
+            if now < deadline:
+                self.sleep(deadline - now)
+                now = self.clock()
+
+            status = "ok"
+            if animation.duration is not None and now - origin + airtime > animation.duration:
+                status = "hors délai"
+            elif (policy == "skip" and not step.required and index + 1 < len(steps)
+                  and now >= origin + steps[index + 1].at):
+                status = "sauté"
+            if status != "ok":
+                results.append({"at_ms": step.at * 1000, "command": step.command,
+                                "start_ms": None, "lag_ms": None, "status": status})
+                continue
+
+            if self.verbose and step.label:
+                print(step.label)
+            self._emit(frames)
+            lag = now - deadline
+            results.append({"at_ms": step.at * 1000, "command": step.command,
+                            "start_ms": (now - origin) * 1000, "lag_ms": lag * 1000,
+                            "status": "retard" if lag > LATE_TOLERANCE_S else "ok"})
+
+        # Tient le dernier état jusqu'à la fin prévue
+        if animation.duration is not None:
+            remaining = origin + animation.duration - self.clock()
+            if remaining > 0:
+                self.sleep(remaining)
+        end = self.clock() - origin
+        lags = sorted(r["lag_ms"] for r in results if r["lag_ms"] is not None)
+        return {
+            "animation": animation.name,
+            "policy": policy,
+            "steps": results,
+            "planned_s": animation.duration if animation.duration is not None else (
+                steps[-1].at + rendered[steps[-1].command][1] if steps else 0.0),
+            "achieved_s": end,
+            "played": len(lags),
+            "skipped": sum(1 for r in results if r["start_ms"] is None),
+            "late": sum(1 for r in results if r["status"] == "retard"),
+            "lag_p50_ms": lags[len(lags) // 2] if lags else 0.0,
+            "lag_max_ms": lags[-1] if lags else 0.0,
+        }
+
+
+def print_report(report: Dict[str, object], steps: bool = False):
+    """Synthèse prévu / réel (et détail par étape si `steps`)"""
+    print(f"=== ANIMATION {report['animation']} ({report['policy']}) ===")
+    if steps:
+        print(f"{'prévu':>9} {'réel':>9} {'retard':>8}  commande")
+        for r in report["steps"]:
+            start = f"{r['start_ms']:7.1f}ms" if r["start_ms"] is not None else f"{'-':>9}"
+            lag = f"{r['lag_ms']:6.1f}ms" if r["lag_ms"] is not None else f"{'-':>8}"
+            print(f"{r['at_ms']:7.1f}ms {start} {lag}  {r['command']} ({r['status']})")
+    print(f"Étapes jouées: {report['played']} (dont {report['late']} en retard), "
+          f"non jouées: {report['skipped']}")
+    print(f"Retard au départ des étapes: p50 {report['lag_p50_ms']:.2f}ms, "
+          f"max {report['lag_max_ms']:.2f}ms")
+    print(f"Durée prévue {report['planned_s']:.3f}s, réelle {report['achieved_s']:.3f}s")
@@ -0,0 +1,681 @@
+#!/usr/bin/env python3
+"""
+Émission IR déléguée à un Arduino par liaison série (trames binaires pipelinées)
+
+L'Arduino (IR_YAMAHA/yamaha_remote_arduino.c, IRremote) a un timing
+matériel parfait là où le Pi lutte en logiciel. Ici l'hôte n'envoie plus
+d'impulsions mais des commandes compactes; plusieurs commandes sont en vol
+à la fois, chacune acquittée à la réception puis signalée une fois émise.
+
+Trame (les deux sens):
+    0xA5 | LEN | SEQ | TYPE | charge (LEN octets) | CRC-8 (poly 0x07, LEN..charge)
+
+Hôte -> Arduino:
+    SEND (0x01)  protocole (1 = NEC), adresse (u16 LE), commande, répétitions,
+                 gap en ms (u16 LE): 1 + répétitions trames complètes, séparées
+                 de gap ms de silence (gap aussi imposé avant la commande suivante);
+                 protocole 2 = code de répétition NEC (adresse et commande
+                 ignorées)
+    PING (0x02)  réinitialise la file; le prochain SEQ attendu est SEQ + 1
+Arduino -> hôte:
+    READY (0x81) réponse au PING: version du protocole, taille de la file
+    ACK (0x82)   SEND reçu intact et mis en file
+    DONE (0x83)  dernière trame du SEND émise par la LED
+    NAK (0x84)   SEND refusé: code d'erreur (ERRORS)
+
+Fenêtre glissante « go-back-N »: l'Arduino n'accepte que le SEQ attendu et
+ignore les trames hors séquence ou corrompues; sans ACK après ack_timeout,
+l'hôte renvoie toutes les trames non acquittées, dans l'ordre. Un doublon
+est ré-acquitté (et re-signalé émis s'il a déjà quitté la file). Une commande
+abandonnée après max_retries renvois laisserait l'Arduino attendre son SEQ
+pour toujours: l'hôte la met en échec, laisse finir les commandes acquittées
+puis se resynchronise par un PING avant de renvoyer les suivantes. La fenêtre
+(4 commandes, 48 octets) tient dans le tampon de réception de 64 octets de
+l'UNO même pendant qu'IrSender bloque la boucle.
+
+Les trains d'impulsions des télécommandes (send_ir_signal, mode touches,
+codes de répétition) sont redécodés en NEC par send_pulses: en mode
+Arduino, tous les chemins d'émission passent par la liaison.
+
+L'émulateur du firmware (FirmwareEmulator) tourne sur un pty: --selftest
+vérifie l'hôte (pipeline, pertes, refus) sans Arduino.
+
+Exemples:
+    python arduino_link.py /dev/ttyACM0 yamaha VOL+ --repeat 2
+    python arduino_link.py --selftest
+    python arduino_link.py --emulate          # pty à passer à --arduino
+"""
+
+from concurrent.futures import Future
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+import argparse
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from ir_remotes import REMOTE_TYPES, offline_remote
+
+try:
+    import termios
+    import tty
+except ImportError:  # Windows: pas de termios
+    termios = None
+    tty = None
+
+SYNC = 0xA5
+MAX_PAYLOAD = 8
+PROTOCOL_VERSION = 2
+
+MSG_SEND = 0x01
+MSG_PING = 0x02
+MSG_READY = 0x81
+MSG_ACK = 0x82
+MSG_DONE = 0x83
+MSG_NAK = 0x84
+
+PROTO_NEC = 1
+PROTO_NEC_REPEAT = 2
+
+ERR_PROTOCOL = 1
+ERR_QUEUE_FULL = 2
+ERR_LENGTH = 3
+ERRORS = {ERR_PROTOCOL: "protocole inconnu", ERR_QUEUE_FULL: "file pleine",
+          ERR_LENGTH: "charge invalide"}
+
+SEND_FORMAT = "<BHBBH"        # protocole, adresse, commande, répétitions, gap ms
+DEFAULT_BAUD = 115200
+DEFAULT_GAP_MS = 108          # Gap standard NEC entre deux trames
+NEC_FRAME_S = 0.0675          # Durée d'une trame NEC (IrSender bloquant)
+NEC_REPEAT_S = 0.0118         # Durée d'un code de répétition NEC
+DEVICE_QUEUE = 4
+
+
+class ArduinoError(RuntimeError):
+    """Commande refusée par l'Arduino ou liaison perdue"""
+
+
+def crc8(data: bytes) -> int:
+    """CRC-8 polynôme 0x07, valeur initiale 0 (même calcul côté firmware)"""
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+def encode_frame(seq: int, msg_type: int, payload: bytes = b"") -> bytes:
+    body = bytes([len(payload), seq & 0xFF, msg_type]) + payload
+    return bytes([SYNC]) + body + bytes([crc8(body)])
+
+
+def nec_decode(pulses: Sequence[int]) -> Optional[Tuple[int, int, int]]:
+    """
+    Retrouve la commande NEC d'un train d'impulsions (nec_encode des télécommandes)
+
+    Returns:
+        (protocole, adresse, commande): adresse 8 bits si l'octet suivant est
+        son complément, 16 bits sinon; PROTO_NEC_REPEAT pour un code de
+        répétition. None si le train n'est pas du NEC
+    """
+    if len(pulses) == 3 and 8000 <= pulses[0] <= 10000 and 1700 <= pulses[1] <= 2800:
+        return PROTO_NEC_REPEAT, 0, 0
+    # 67 impulsions (AGC, 32 bits, stop); celles d'après (bourrage Osram) sont ignorées
+    if len(pulses) < 67 or not (8000 <= pulses[0] <= 10000 and 3500 <= pulses[1] <= 5500):
+        return None
+    value = 0
+    for bit in range(32):
+        if pulses[3 + 2 * bit] > 1120:  # Espace de 1690 µs: bit à 1
+            value |= 1 << bit
+    low, high, command, command_inv = (value >> shift & 0xFF for shift in (0, 8, 16, 24))
+    if command ^ command_inv != 0xFF:
+        return None
+    address = low if low ^ high == 0xFF else low | high << 8
+    return PROTO_NEC, address, command
+
+
+def seq_before(a: int, b: int) -> bool:
+    """a précède b (arithmétique modulo 256, fenêtre < 128)"""
+    return 0 < ((b - a) & 0xFF) < 128
+
+
+class Message(NamedTuple):
+    seq: int
+    type: int
+    payload: bytes
+
+
+class FrameParser:
+    """Découpe un flux d'octets en trames; resynchronise sur erreur de CRC"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.crc_errors = 0
+
+    def feed(self, data: bytes) -> List[Message]:
+        self.buffer += data
+        messages = []
+        while True:
+            start = self.buffer.find(SYNC)
+            if start < 0:
+                self.buffer.clear()  # texte du firmware (bannière, moniteur série)
+                return messages
+            del self.buffer[:start]
+            if len(self.buffer) < 2:
+                return messages
+            length = self.buffer[1]
+            if length > MAX_PAYLOAD:
+                del self.buffer[:1]
+                continue
+            size = 5 + length
+            if len(self.buffer) < size:
+                return messages
+            frame = bytes(self.buffer[:size])
+            if crc8(frame[1:-1]) != frame[-1]:
+                self.crc_errors += 1
+                del self.buffer[:1]
+                continue
+            del self.buffer[:size]
+            messages.append(Message(frame[2], frame[3], frame[4:-1]))
+
+
+def open_serial(path: str, baud: int = DEFAULT_BAUD) -> int:
+    """
+    Ouvre un port série en mode brut (termios, sans pyserial)
+
+    Returns:
+        Descripteur de fichier (lecture/écriture bloquantes)
+
+    Raises:
+        ValueError: Débit non supporté
+    """
+    if termios is None:
+        raise RuntimeError("Liaison série: termios requis (Linux)")
+    speed = getattr(termios, f"B{baud}", None)
+    if speed is None:
+        raise ValueError(f"Débit non supporté: {baud}")
+    fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+    tty.setraw(fd)
+    attrs = termios.tcgetattr(fd)
+    attrs[2] |= termios.CLOCAL | termios.CREAD
+    attrs[4] = attrs[5] = speed
+    termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    return fd
+
+
+class _Job:
+    __slots__ = ("seq", "frame", "future", "expected_s", "sent_at", "acked",
+                 "ack_at", "done_by", "retries", "submitted")
+
+    def __init__(self, frame_payload: bytes, expected_s: float):
+        self.seq = -1
+        self.frame = frame_payload
+        self.future: Future = Future()
+        self.expected_s = expected_s
+        self.sent_at = 0.0
+        self.acked = False
+        self.ack_at = 0.0
+        self.done_by = 0.0
+        self.retries = 0
+        self.submitted = time.perf_counter()
+
+
+class ArduinoLink:
+    """Commandes IR pipelinées vers l'Arduino (fenêtre glissante, ACK puis DONE)"""
+
+    def __init__(self, port: str, baud: int = DEFAULT_BAUD, window: int = DEVICE_QUEUE,
+                 ack_timeout: float = 0.25, max_retries: int = 5, ready_timeout: float = 4.0):
+        """
+        Args:
+            port: Port série (/dev/ttyACM0, /dev/ttyUSB0, ou pty de l'émulateur)
+            baud: Débit (celui de Serial.begin du firmware)
+            window: Commandes en vol au plus (bornée par la file annoncée)
+            ack_timeout: Sans ACK passé ce délai, renvoi des trames non acquittées
+            max_retries: Renvois avant d'abandonner une commande
+            ready_timeout: Attente du firmware (l'UNO redémarre à l'ouverture)
+
+        Raises:
+            ArduinoError: Pas de réponse au PING
+        """
+        self.port = port
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        self.fd = open_serial(port, baud)
+        self.parser = FrameParser()
+        self.stats = {"sent": 0, "retransmits": 0, "done": 0, "nak": 0, "resyncs": 0}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending: List[_Job] = []
+        self._inflight: Dict[int, _Job] = {}   # seq -> commande, ordre d'envoi
+        self._ready = threading.Event()
+        self._resyncing = False     # PING en attente de READY après un abandon
+        self._ping_at = 0.0
+        self._pings = 0
+        self._closed = False
+        self._seq = 0
+        self.window = window
+        self.version = None
+        self._thread = threading.Thread(target=self._reader, name="arduino-link", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + ready_timeout
+        while not self._ready.wait(0.5):
+            if time.monotonic() > deadline:
+                self.close()
+                raise ArduinoError(f"Pas de réponse du firmware sur {port}")
+            self._write(encode_frame(self._seq, MSG_PING))
+        print(f"Arduino prêt sur {port}: protocole v{self.version}, fenêtre {self.window}")
+
+    def _write(self, data: bytes):
+        with self._write_lock:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self.fd, view):]
+
+    def submit(self, address: int, command: int, repeats: int = 0,
+               gap_ms: int = DEFAULT_GAP_MS, protocol: int = PROTO_NEC) -> Future:
+        """
+        Met une commande en file (non bloquant)
+
+        Args:
+            address: Adresse NEC (8 bits: complément ajouté par IRremote, ou 16 bits)
+            command: Octet de commande
+            repeats: Trames complètes supplémentaires (POWER doublé: 1)
+            gap_ms: Silence après chaque trame
+
+        Returns:
+            Futur résolu à l'émission de la dernière trame (seq, délais en ms,
+            renvois), en erreur (ArduinoError) si refusée ou sans réponse
+        """
+        payload = struct.pack(SEND_FORMAT, protocol, address, command, repeats, gap_ms)
+        frame_s = NEC_REPEAT_S if protocol == PROTO_NEC_REPEAT else NEC_FRAME_S
+        job = _Job(payload, (repeats + 1) * (frame_s + gap_ms / 1000))
+        with self._lock:
+            if self._closed:
+                raise ArduinoError("Liaison Arduino fermée")
+            self._pending.append(job)
+            self._pump()
+        return job.future
+
+    def send_command(self, remote, command_name: str, repeat_count: int = 0) -> Future:
+        """
+        Commande d'une télécommande (codebook et trames de render_frames)
+
+        Raises:
+            KeyError: Commande inconnue
+        """
+        code = remote.codebook.get(command_name)
+        if code is None:
+            raise KeyError(f"Commande inconnue: {command_name}")
+        frames = remote.render_frames(command_name)
+        return self.submit(code.address, code.command, len(frames) - 1 + repeat_count)
+
+    def send_pulses(self, pulses: Sequence[int]) -> Future:
+        """
+        Train d'impulsions NEC (trame ou code de répétition), émis sans gap:
+        l'appelant garde le rythme (répétitions toutes les 108 ms)
+
+        Raises:
+            ValueError: Train qui n'est pas du NEC
+        """
+        decoded = nec_decode(pulses)
+        if decoded is None:
+            raise ValueError("Train d'impulsions non NEC: non transmissible à l'Arduino")
+        protocol, address, command = decoded
+        return self.submit(address, command, 0, gap_ms=0, protocol=protocol)
+
+    def _pump(self):
+        # Appelé sous self._lock
+        while not self._resyncing and self._pending and len(self._inflight) < self.window:
+            job = self._pending.pop(0)
+            self._seq = (self._seq + 1) & 0xFF
+            job.seq = self._seq
+            job.sent_at = time.perf_counter()
+            self._inflight[job.seq] = job
+            self._write(encode_frame(job.seq, MSG_SEND, job.frame))
+            self.stats["sent"] += 1
+
+    def _reader(self):
+        while not self._closed:
+            try:
+                readable, _, _ = select.select([self.fd], [], [], 0.02)
+                data = os.read(self.fd, 256) if readable else b""
+            except OSError:
+                break
+            for message in self.parser.feed(data):
+                self._handle(message)
+            self._check_timeouts()
+        self._fail_all(ArduinoError("Liaison Arduino fermée"))
+
+    def _handle(self, message: Message):
+        now = time.perf_counter()
+        with self._lock:
+            if message.type == MSG_READY:
+                if message.seq == self._seq and message.payload:
+                    self.version = message.payload[0]
+                    self.window = max(1, min(self.window, message.payload[1]))
+                    self._ready.set()
+                    if self._resyncing:
+                        self._resyncing = False
+                        self._pump()
+                return
+            job = self._inflight.get(message.seq)
+            if job is None:
+                return  # doublon d'une commande déjà terminée
+            if message.type == MSG_ACK and not job.acked:
+                job.acked = True
+                job.ack_at = now
+                # Les commandes s'émettent dans l'ordre: échéance chaînée
+                previous = max((j.done_by for j in self._inflight.values() if j.acked),
+                               default=now)
+                job.done_by = max(now, previous) + job.expected_s + 1.0
+            elif message.type == MSG_DONE:
+                del self._inflight[message.seq]
+                self.stats["done"] += 1
+                job.future.set_result({
+                    "seq": job.seq,
+                    "ack_ms": round(((job.ack_at or now) - job.sent_at) * 1000, 2),
+                    "done_ms": round((now - job.submitted) * 1000, 2),
+                    "retries": job.retries})
+                self._pump()
+            elif message.type == MSG_NAK:
+                code = message.payload[0] if message.payload else 0
+                if code == ERR_QUEUE_FULL:
+                    job.sent_at = 0.0  # renvoyée avec les suivantes au prochain délai
+                    return
+                del self._inflight[message.seq]
+                self.stats["nak"] += 1
+                job.future.set_exception(ArduinoError(f"Commande refusée: {ERRORS.get(code, code)}"))
+                self._pump()
+
+    def _check_timeouts(self):
+        now = time.perf_counter()
+        failed: List[_Job] = []
+        with self._lock:
+            unacked = [j for j in self._inflight.values() if not j.acked]
+            if unacked and now - unacked[0].sent_at > self.ack_timeout:
+                if unacked[0].retries >= self.max_retries:
+                    # Abandon: l'Arduino attend toujours ce SEQ et ignorerait les
+                    # suivants; ils repartent en file, renumérotés après un PING
+                    failed.append(unacked[0])
+                    for job in unacked[1:]:
+                        del self._inflight[job.seq]
+                        job.retries = 0
+                    self._pending[:0] = unacked[1:]
+                    self._resyncing = True
+                    self._ping_at = 0.0
+                    self._pings = 0
+                else:
+                    # Go-back-N: toutes les trames non acquittées, dans l'ordre
+                    for job in unacked:
+                        job.retries += 1
+                        job.sent_at = now
+                        self._write(encode_frame(job.seq, MSG_SEND, job.frame))
+                        self.stats["retransmits"] += 1
+            failed += [j for j in self._inflight.values() if j.acked and now > j.done_by]
+            for job in failed:
+                self._inflight.pop(job.seq, None)
+            if self._resyncing and not self._inflight and now - self._ping_at > self.ack_timeout:
+                # Le PING vide la file de l'Arduino: envoyé une fois les acquittées terminées
+                if self._pings > self.max_retries:
+                    # Arduino muet: la file n'attend pas indéfiniment
+                    failed += self._pending
+                    self._pending.clear()
+                self._seq = (self._seq + 1) & 0xFF
+                self._ping_at = now
+                self._pings += 1
+                self._write(encode_frame(self._seq, MSG_PING))
+                self.stats["resyncs"] += 1
+            elif failed:
+                self._pump()
+        for job in failed:
+            job.future.set_exception(ArduinoError(
+                f"Pas de réponse de l'Arduino (seq {job.seq}, {job.retries} renvois)"))
+
+    def _fail_all(self, error: Exception):
+        with self._lock:
+            jobs = list(self._inflight.values()) + self._pending
+            self._inflight.clear()
+            self._pending.clear()
+        for job in jobs:
+            if not job.future.done():
+                job.future.set_exception(error)
+
+    def close(self):
+        self._closed = True
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        os.close(self.fd)
+
+
+# --- Émulateur du firmware (pty) ---
+
+class FirmwareEmulator:
+    """Logique de yamaha_remote_arduino.c sur un pty: file, go-back-N, IrSender bloquant"""
+
+    def __init__(self, frame_s: float = NEC_FRAME_S, queue_size: int = DEVICE_QUEUE,
+                 drop: Sequence[int] = ()):
+        """
+        Args:
+            frame_s: Durée d'émission d'une trame (boucle bloquée, comme sendNEC)
+            queue_size: Taille de la file annoncée dans READY
+            drop: Numéros (à partir de 0) des SEND reçus à ignorer, comme corrompus
+        """
+        self.frame_s = frame_s
+        self.queue_size = queue_size
+        self.drop: Set[int] = set(drop)
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        self.parser = FrameParser()
+        # [seq, adresse, commande, répétitions, gap, émises, protocole]
+        self.queue: List[List[int]] = []
+        self.expected = 0
+        self.received = 0
+        self.next_at = 0.0
+        self.emitted: List[Tuple[int, int, int, float]] = []  # seq, adresse, commande, instant
+        self.repeat_codes = 0
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="arduino-emu", daemon=True)
+
+    def start(self) -> "FirmwareEmulator":
+        os.write(self.master, "Télécommande IR Yamaha - Démarrage\r\n".encode())
+        self._thread.start()
+        return self
+
+    def _reply(self, seq: int, msg_type: int, payload: bytes = b""):
+        os.write(self.master, encode_frame(seq, msg_type, payload))
+
+    def _handle(self, message: Message):
+        if message.type == MSG_PING:
+            self.queue.clear()
+            self.expected = (message.seq + 1) & 0xFF
+            self._reply(message.seq, MSG_READY, bytes([PROTOCOL_VERSION, self.queue_size]))
+            return
+        if message.type != MSG_SEND:
+            return
+        index = self.received
+        self.received += 1
+        if index in self.drop:
+            return
+        seq = message.seq
+        if seq == self.expected:
+            if len(message.payload) != struct.calcsize(SEND_FORMAT):
+                self._reply(seq, MSG_NAK, bytes([ERR_LENGTH]))
+            elif len(self.queue) >= self.queue_size:
+                self._reply(seq, MSG_NAK, bytes([ERR_QUEUE_FULL]))
+                return
+            else:
+                protocol, address, command, repeats, gap = struct.unpack(SEND_FORMAT,
+                                                                         message.payload)
+                if protocol not in (PROTO_NEC, PROTO_NEC_REPEAT):
+                    self._reply(seq, MSG_NAK, bytes([ERR_PROTOCOL]))
+                else:
+                    self.queue.append([seq, address, command, repeats, gap, 0, protocol])
+                    self._reply(seq, MSG_ACK)
+            self.expected = (self.expected + 1) & 0xFF
+        elif seq_before(seq, self.expected):
+            self._reply(seq, MSG_ACK)
+            if all(job[0] != seq for job in self.queue):
+                self._reply(seq, MSG_DONE)
+        # Hors séquence: ignorée, l'hôte renverra
+
+    def _loop(self):
+        while self._running:
+            readable, _, _ = select.select([self.master], [], [], 0.002)
+            if readable:
+                try:
+                    data = os.read(self.master, 64)  # tampon de réception de l'UNO
+                except OSError:
+                    return
+                for message in self.parser.feed(data):
+                    self._handle(message)
+            now = time.perf_counter()
+            if self.queue and now >= self.next_at:
+                job = self.queue[0]
+                if job[6] == PROTO_NEC_REPEAT:
+                    self.repeat_codes += 1
+                    time.sleep(self.frame_s * NEC_REPEAT_S / NEC_FRAME_S)
+                else:
+                    self.emitted.append((job[0], job[1], job[2], now))
+                    time.sleep(self.frame_s)  # IrSender.sendNEC bloque la boucle
+                job[5] += 1
+                self.next_at = time.perf_counter() + job[4] / 1000
+                if job[5] > job[3]:
+                    self.queue.pop(0)
+                    self._reply(job[0], MSG_DONE)
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+def selftest(frame_s: float = 0.01) -> bool:
+    """
+    Hôte contre l'émulateur: pipeline, SEND perdus, refus, ordre d'émission
+
+    Trames raccourcies (frame_s) pour un test rapide; les gaps sont réels.
+    """
+    ok = True
+    remote = offline_remote("yamaha")
+    names = ["VOL+", "VOL+", "VOL-", "POWER", "1", "2", "MUTE_INCONNU", "DISPLAY", "VOL-", "PLAY"]
+    emulator = FirmwareEmulator(frame_s, drop=(2, 5)).start()
+    link = ArduinoLink(emulator.path, ready_timeout=2.0, ack_timeout=0.15)
+    try:
+        # Pipeline: tout est soumis d'un coup, l'attente ne se fait qu'à la fin
+        start = time.perf_counter()
+        futures = []
+        for name in names:
+            try:
+                futures.append((name, link.send_command(remote, name)))
+            except KeyError:
+                print(f"  {name}: inconnue (refusée côté hôte)")
+        results = [(name, future.result(timeout=10)) for name, future in futures]
+        pipelined = time.perf_counter() - start
+        # Une entrée par trame émise: POWER deux fois (render_frames)
+        emitted = [command for _, _, command, _ in emulator.emitted]
+        planned = []
+        for name, _ in futures:
+            planned += [remote.codebook.get(name).command] * len(remote.render_frames(name))
+        if emitted != planned:
+            ok = False
+            print(f"  Ordre d'émission incorrect: {emitted} au lieu de {planned}")
+        retries = sum(r["retries"] for _, r in results)
+        print(f"Pipeline: {len(results)} commandes en {pipelined * 1000:.0f}ms, "
+              f"{link.stats['retransmits']} renvois ({retries} commandes touchées, "
+              f"{len(emulator.drop)} SEND perdus), ACK max "
+              f"{max(r['ack_ms'] for _, r in results):.1f}ms")
+        if link.stats["retransmits"] == 0:
+            ok = False
+            print("  Les SEND perdus n'ont pas été renvoyés")
+
+        # Attente commande par commande, pour comparaison
+        emulator.emitted.clear()
+        start = time.perf_counter()
+        for name, _ in futures:
+            link.send_command(remote, name).result(timeout=10)
+        sequential = time.perf_counter() - start
+        print(f"Sans pipeline: {sequential * 1000:.0f}ms "
+              f"(aller-retour série attendu à chaque commande)")
+
+        # Trains d'impulsions (mode touches): trame redécodée puis codes de répétition
+        emulator.emitted.clear()
+        frame = remote.render_frames("VOL+")[0]
+        for pulses in [frame] + [[9000, 2250, 560]] * 3:
+            link.send_pulses(pulses).result(timeout=5)
+        code = remote.codebook.get("VOL+")
+        emitted = [(address, command) for _, address, command, _ in emulator.emitted]
+        if emitted != [(code.address, code.command)] or emulator.repeat_codes != 3:
+            ok = False
+            print(f"  Trains mal transmis: {emitted}, {emulator.repeat_codes} répétitions")
+        else:
+            print("Trains d'impulsions: trame VOL+ et 3 codes de répétition émis")
+
+        # Refus: protocole inconnu
+        try:
+            link.submit(0x78, 0x1E, protocol=9).result(timeout=5)
+            ok = False
+            print("  Protocole inconnu accepté")
+        except ArduinoError as e:
+            print(f"Refus attendu: {e}")
+        link.submit(0x78, 0x1E).result(timeout=5)  # la liaison reste utilisable
+    finally:
+        link.close()
+        emulator.close()
+    print("Auto-test " + ("réussi" if ok else "ÉCHOUÉ"))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Émission IR déléguée à un Arduino (série)")
+    parser.add_argument("port", nargs="?", help="Port série (/dev/ttyACM0)")
+    parser.add_argument("remote", nargs="?", choices=REMOTE_TYPES)
+    parser.add_argument("commands", nargs="*", help="Commandes, émises dans l'ordre")
+    parser.add_argument("--baud", type=int, default=DEFAULT_BAUD)
+    parser.add_argument("--repeat", type=int, default=0, help="Trames supplémentaires")
+    parser.add_argument("--selftest", action="store_true",
+                        help="Vérifie l'hôte contre l'émulateur du firmware (pty)")
+    parser.add_argument("--emulate", action="store_true",
+                        help="Émulateur du firmware sur un pty, jusqu'à Ctrl+C")
+    args = parser.parse_args()
+
+    if args.selftest:
+        sys.exit(0 if selftest() else 1)
+    if args.emulate:
+        emulator = FirmwareEmulator().start()
+        print(f"Émulateur Arduino sur {emulator.path} (Ctrl+C pour arrêter)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            emulator.close()
+        print(f"{len(emulator.emitted)} trames émises")
+        return
+    if not args.port or not args.remote or not args.commands:
+        parser.error("port, télécommande et commandes requis (ou --selftest / --emulate)")
+
+    remote = offline_remote(args.remote)
+    link = ArduinoLink(args.port, args.baud)
+    try:
+        futures = [(name, link.send_command(remote, name, args.repeat)) for name in args.commands]
+        for name, future in futures:
+            try:
+                result = future.result()
+                print(f"{name}: émise (ACK {result['ack_ms']}ms, fin {result['done_ms']}ms"
+                      + (f", {result['retries']} renvois" if result["retries"] else "") + ")")
+            except ArduinoError as e:
+                print(f"{name}: {e}")
+    except KeyError as e:
+        parser.error(str(e))
+    finally:
+        link.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Registre des codes IR (codebooks) partagé par les télécommandes
+
+Les codes sont déclarés une seule fois dans codebooks.json: adresse NEC,
+commandes (nom canonique -> octet de commande), alias et, si besoin, le
+fichier C dont la table `#define` doit être fusionnée (croquis Arduino).
+Le registre est construit une fois par processus et figé:
+- une seule table clé normalisée -> Code (nom canonique, adresse, commande,
+  mot NEC 32 bits) pour les noms canoniques comme pour les alias: une
+  recherche O(1) par commande, sans cascade alias puis commandes
+- les alias orphelins et les conflits avec la table #define sont refusés
+  au chargement (CodebookError)
+- un arbre de préfixes alimente la complétion (touche Tab) du mode interactif
+
+Exemple:
+    from codebook import load_codebook
+    codes = load_codebook("yamaha")
+    codes.get("vol+")        # Code(name='VOL_UP', address=0x78, command=0x1E, ...)
+    codes.complete("VOL")    # ['VOL+', 'VOL-', 'VOLDOWN', 'VOLUP', 'VOL_DOWN', 'VOL_UP']
+"""
+
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional
+from functools import lru_cache
+from types import MappingProxyType
+import json
+import os
+import re
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CODEBOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "codebooks.json")
+
+_DEFINE = re.compile(r"^\s*#define\s+(\w+)\s+(0[xX][0-9A-Fa-f]+|\d+)\b")
+
+
+class CodebookError(ValueError):
+    """Codebook incohérent (alias orphelin, conflit avec la table #define, ...)"""
+
+
+class Code(NamedTuple):
+    """Commande résolue, prête à encoder"""
+    name: str       # nom canonique
+    address: int
+    command: int
+    word: int       # trame NEC complète: adresse, ~adresse, commande, ~commande
+
+
+def normalize(key: str) -> str:
+    """Clé de recherche: insensible à la casse et aux espaces autour"""
+    return key.strip().upper()
+
+
+class PrefixTrie:
+    """Arbre de préfixes des clés (complétion)"""
+
+    __slots__ = ("children", "terminal")
+
+    def __init__(self, words: Iterable[str] = ()):
+        self.children: Dict[str, "PrefixTrie"] = {}
+        self.terminal = False
+        for word in words:
+            self.insert(word)
+
+    def insert(self, word: str):
+        node = self
+        for char in word:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = PrefixTrie()
+            node = child
+        node.terminal = True
+
+    def complete(self, prefix: str) -> List[str]:
+        """Clés commençant par `prefix`, triées"""
+        node = self
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        out: List[str] = []
+        stack = [(node, prefix)]
+        while stack:
+            node, word = stack.pop()
+            if node.terminal:
+                out.append(word)
+            for char, child in node.children.items():
+                stack.append((child, word + char))
+        return sorted(out)
+
+
+def parse_defines(path: str) -> Dict[str, int]:
+    """Table `#define NOM valeur` (valeurs numériques uniquement) d'un fichier C"""
+    defines: Dict[str, int] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            match = _DEFINE.match(line)
+            if match:
+                defines[match.group(1)] = int(match.group(2), 0)
+    return defines
+
+
+class Codebook:
+    """Codes d'une télécommande: table de recherche figée + complétion"""
+
+    def __init__(self, name: str, address: int, commands: Mapping[str, int],
+                 aliases: Mapping[str, str]):
+        """
+        Args:
+            name: Nom de la télécommande (yamaha, osram)
+            address: Adresse NEC (8 bits)
+            commands: Nom canonique -> octet de commande
+            aliases: Alias -> nom canonique
+
+        Raises:
+            CodebookError: Code hors plage, alias orphelin ou ambigu
+        """
+        self.name = name
+        self.address = address
+        commands = {normalize(k): v for k, v in commands.items()}
+        aliases = {normalize(k): normalize(v) for k, v in aliases.items()}
+        bad = sorted(k for k, v in commands.items() if not 0 <= v <= 0xFF)
+        if bad or not 0 <= address <= 0xFF:
+            raise CodebookError(f"{name}: codes hors plage 0-255: {', '.join(bad) or 'adresse'}")
+        dangling = sorted(f"{k} -> {v}" for k, v in aliases.items() if v not in commands)
+        if dangling:
+            raise CodebookError(f"{name}: alias vers des commandes inexistantes: {', '.join(dangling)}")
+        shadowed = sorted(k for k in aliases if k in commands and aliases[k] != k)
+        if shadowed:
+            raise CodebookError(f"{name}: alias masquant une commande: {', '.join(shadowed)}")
+
+        lookup = {}
+        for key, command in commands.items():
+            word = ((address << 24) | ((~address & 0xFF) << 16)
+                    | (command << 8) | (~command & 0xFF))
+            lookup[key] = Code(key, address, command, word)
+        for alias, target in aliases.items():
+            lookup[alias] = lookup[target]
+
+        self.commands: Mapping[str, int] = MappingProxyType(commands)
+        self.aliases: Mapping[str, str] = MappingProxyType(aliases)
+        self._lookup: Mapping[str, Code] = MappingProxyType(lookup)
+        self.trie = PrefixTrie(lookup)
+
+    def get(self, key: str) -> Optional[Code]:
+        """Commande ou alias -> Code, None si inconnu"""
+        code = self._lookup.get(key)
+        if code is None:
+            code = self._lookup.get(normalize(key))
+        return code
+
+    def resolve(self, key: str) -> str:
+        """Nom canonique d'une commande ou d'un alias (clé normalisée si inconnue)"""
+        code = self.get(key)
+        return code.name if code is not None else normalize(key)
+
+    def complete(self, prefix: str) -> List[str]:
+        return self.trie.complete(normalize(prefix))
+
+    def keys(self) -> List[str]:
+        return sorted(self._lookup)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._lookup)
+
+
+@lru_cache(maxsize=None)
+def load_codebook(name: str, path: str = CODEBOOK_PATH) -> Codebook:
+    """
+    Codebook d'une télécommande, construit une fois par processus
+
+    Les `#define` du fichier C référencé (`defines`) sont fusionnés: une
+    commande absente du JSON est ajoutée, une valeur différente est une
+    erreur. Les broches (*_PIN) sont ignorées; `address_define` désigne la
+    constante d'adresse, comparée à `address`.
+
+    Raises:
+        CodebookError: Télécommande absente ou codebook incohérent
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if name not in data or name.startswith("_"):
+        raise CodebookError(f"Télécommande inconnue dans {path}: {name}")
+    entry = data[name]
+    address = int(entry["address"], 0)
+    commands = {k: int(v, 0) for k, v in entry.get("commands", {}).items()}
+
+    if entry.get("defines"):
+        source = os.path.join(SCRIPTS_DIR, entry["defines"])
+        address_define = entry.get("address_define")
+        conflicts = []
+        for define, value in parse_defines(source).items():
+            if define.endswith("_PIN"):
+                continue
+            if define == address_define:
+                if value != address:
+                    conflicts.append(f"{define}=0x{value:02X} (JSON 0x{address:02X})")
+                continue
+            if define not in commands:
+                commands[define] = value
+            elif commands[define] != value:
+                conflicts.append(f"{define}=0x{value:02X} (JSON 0x{commands[define]:02X})")
+        if conflicts:
+            raise CodebookError(f"{name}: {entry['defines']} diverge: {', '.join(conflicts)}")
+
+    return Codebook(name, address, commands, entry.get("aliases", {}))
+
+
+def install_completer(codebook: Codebook, extra: Iterable[str] = ()) -> bool:
+    """
+    Complétion Tab (readline) sur les commandes, alias et mots-clés `extra`
+
+    Returns:
+        False si readline est indisponible (Windows sans pyreadline)
+    """
+    try:
+        import readline
+    except ImportError:
+        return False
+    trie = PrefixTrie(codebook.keys())
+    for word in extra:
+        trie.insert(normalize(word))
+
+    def complete(text: str, state: int) -> Optional[str]:
+        matches = trie.complete(normalize(text))
+        return matches[state] if state < len(matches) else None
+
+    readline.set_completer(complete)
+    readline.set_completer_delims(" \t")
+    readline.parse_and_bind("tab: complete")
+    return True
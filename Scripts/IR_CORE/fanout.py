@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Émission IR simultanée sur plusieurs pins GPIO (fan-out)
+
+Chaque télécommande émet sur son propre pin, l'une après l'autre: piloter
+l'ampli et deux pièces d'ampoules Osram coûte la somme des trames (~70 ms
+chacune). Ici, les trames pré-calculées de chaque pin sont fusionnées en un
+seul flux d'événements trié (instant, niveaux de tous les pins), écrit avec
+les écritures groupées de lgpio (group_write) sur un seul handle de puce:
+N appareils sont commandés dans la durée de la trame la plus longue.
+
+La porteuse 38 kHz est commune à tous les pins: à chaque période, les pins
+dont l'enveloppe est dans une impulsion ON passent à 1 ensemble, puis à 0
+après le rapport cyclique. Les débuts d'impulsion sont alignés sur la
+grille de la porteuse (26,3 µs), bien en deçà de la tolérance NEC.
+
+Exemples:
+    python fanout.py 18:yamaha:VOL+ 17:osram:RED 27:osram:RED --dry-run
+    python fanout.py 18:yamaha:POWER 17:osram:OFF
+"""
+
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+import argparse
+import json
+import math
+import time
+
+from ir_remotes import REMOTE_TYPES, offline_remote
+from precise_wait import default_waiter
+
+try:
+    import lgpio
+except ImportError:  # Compilation et --dry-run sans lgpio (hors Raspberry Pi)
+    lgpio = None
+
+CARRIER_HZ = 38000
+DUTY_CYCLE = 0.33        # comme les télécommandes (et l'Arduino)
+NEC_FRAME_GAP_US = 108000
+
+
+class FanoutProgram(NamedTuple):
+    """Flux d'événements compilé: (instant ns, bits des pins) trié par instant"""
+    pins: Tuple[int, ...]             # bit i -> pins[i]
+    events: List[Tuple[int, int]]
+    duration_ns: int
+
+
+def train_from_frames(frames: Sequence[List[int]], gap_us: int = NEC_FRAME_GAP_US) -> List[int]:
+    """Concatène des trames [ON, OFF, ...] en un train, séparées par `gap_us` de silence"""
+    train: List[int] = []
+    for frame in frames:
+        if train:
+            if len(train) % 2 == 1:
+                train.append(gap_us)
+            else:
+                train[-1] += gap_us
+        train.extend(frame)
+    return train
+
+
+def _marks(pulses: Sequence[int]) -> List[Tuple[int, int]]:
+    """Intervalles ON [début, fin) en ns d'un train d'impulsions"""
+    marks = []
+    t = 0
+    for i, duration in enumerate(pulses):
+        end = t + duration * 1000
+        if i % 2 == 0 and duration > 0:
+            marks.append((t, end))
+        t = end
+    return marks
+
+
+def compile_fanout(trains: Dict[int, Sequence[int]], carrier_hz: int = CARRIER_HZ,
+                   duty_cycle: float = DUTY_CYCLE) -> FanoutProgram:
+    """
+    Fusionne les trains de plusieurs pins en un flux d'événements groupés
+
+    Args:
+        trains: Pin -> train d'impulsions (µs, [ON, OFF, ON, ...])
+        carrier_hz: Fréquence de la porteuse
+        duty_cycle: Rapport cyclique de la porteuse
+
+    Returns:
+        FanoutProgram; deux événements par période de porteuse active
+        (montée des pins actifs, descente), rien pendant les silences
+    """
+    pins = tuple(trains)
+    period = 1e9 / carrier_hz
+    on_ns = int(period * duty_cycle)
+
+    # Frontières d'enveloppe triées: (instant, bit, +1 début / -1 fin)
+    boundaries = []
+    for bit, pin in enumerate(pins):
+        for start, end in _marks(trains[pin]):
+            boundaries.append((start, bit, 1))
+            boundaries.append((end, bit, -1))
+    boundaries.sort()
+    duration = max((sum(train) * 1000 for train in trains.values()), default=0)
+
+    events: List[Tuple[int, int]] = []
+    active = 0
+    index = 0
+    cycle = 0
+    while index < len(boundaries):
+        t = int(cycle * period)
+        # Une impulsion couvre les périodes qui commencent dans [début, fin)
+        while index < len(boundaries) and boundaries[index][0] <= t:
+            _, bit, edge = boundaries[index]
+            if edge > 0:
+                active |= 1 << bit
+            else:
+                active &= ~(1 << bit)
+            index += 1
+        if active:
+            events.append((t, active))
+            events.append((t + on_ns, 0))
+            cycle += 1
+        elif index < len(boundaries):
+            # Silence sur tous les pins: saut direct à la prochaine impulsion
+            cycle = max(cycle + 1, math.ceil(boundaries[index][0] / period))
+    return FanoutProgram(pins, events, duration)
+
+
+class FanoutTransmitter:
+    """Pins IR réservés en groupe sur un handle de puce, émission d'un FanoutProgram"""
+
+    def __init__(self, pins: Sequence[int], chip: int = 0):
+        """
+        Args:
+            pins: Pins GPIO des LED IR (le premier est le chef de groupe lgpio)
+            chip: Numéro de gpiochip (0 sur Pi 5)
+        """
+        if lgpio is None:
+            raise RuntimeError("lgpio requis pour émettre (sudo apt install python3-lgpio)")
+        if len(set(pins)) != len(pins):
+            raise ValueError(f"Pins en double: {list(pins)}")
+        self.pins = tuple(pins)
+        self.mask = (1 << len(self.pins)) - 1
+        self.waiter = default_waiter()
+        self.h = lgpio.gpiochip_open(chip)
+        lgpio.group_claim_output(self.h, list(self.pins), [0] * len(self.pins))
+
+    def transmit(self, program: FanoutProgram) -> Dict[str, float]:
+        """
+        Écrit le flux d'événements (sommeil puis spin jusqu'à chaque échéance,
+        precise_wait.py: les écarts entre impulsions ne consomment plus de CPU)
+
+        Returns:
+            Durée réelle, durée théorique et retard maximal d'un événement (ms)
+        """
+        if program.pins != self.pins:
+            raise ValueError(f"Programme compilé pour {program.pins}, émetteur {self.pins}")
+        leader = self.pins[0]
+        worst = 0
+        start = self.waiter.clock()
+        for at, bits in program.events:
+            target = start + at
+            now = self.waiter.wait_until(target)
+            worst = max(worst, now - target)
+            lgpio.group_write(self.h, leader, bits, self.mask)
+        lgpio.group_write(self.h, leader, 0, self.mask)
+        elapsed = self.waiter.clock() - start
+        return {"elapsed_ms": elapsed / 1e6, "planned_ms": program.duration_ns / 1e6,
+                "max_event_lag_ms": worst / 1e6, "events": len(program.events)}
+
+    def send(self, frames_by_pin: Dict[int, Sequence[List[int]]]) -> Dict[str, float]:
+        """Compile puis émet: pin -> trames (les pins absents restent à 0)"""
+        trains = {pin: train_from_frames(frames_by_pin.get(pin, [])) for pin in self.pins}
+        return self.transmit(compile_fanout(trains))
+
+    def close(self):
+        if self.h is not None:
+            lgpio.group_write(self.h, self.pins[0], 0, self.mask)
+            lgpio.group_free(self.h, self.pins[0])
+            lgpio.gpiochip_close(self.h)
+            self.h = None
+
+
+def parse_target(spec: str) -> Tuple[int, str, str]:
+    """'PIN:TYPE:COMMANDE' -> (pin, type, commande)"""
+    parts = spec.split(":", 2)
+    if len(parts) != 3 or not parts[0].isdigit() or parts[1] not in REMOTE_TYPES:
+        raise argparse.ArgumentTypeError(f"Cible invalide: {spec} (attendu PIN:yamaha|osram:COMMANDE)")
+    return int(parts[0]), parts[1], parts[2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Émission IR simultanée sur plusieurs pins")
+    parser.add_argument("targets", nargs="+", type=parse_target,
+                        help="PIN:TYPE:COMMANDE (ex: 18:yamaha:VOL+ 17:osram:RED)")
+    parser.add_argument("--chip", type=int, default=0, help="gpiochip (défaut: 0)")
+    parser.add_argument("--dry-run", action="store_true", help="Compile sans émettre")
+    parser.add_argument("--json", action="store_true", help="Sortie JSON")
+    args = parser.parse_args()
+
+    encoders = {}
+    frames_by_pin: Dict[int, List[List[int]]] = {}
+    for pin, remote_type, command in args.targets:
+        if pin in frames_by_pin:
+            parser.error(f"Un seul appareil par pin (pin {pin} en double)")
+        if remote_type not in encoders:
+            encoders[remote_type] = offline_remote(remote_type)
+        encoder = encoders[remote_type]
+        frames = encoder.render_frames(command)
+        if frames is None:
+            parser.error(f"Commande {remote_type} inconnue: {command}")
+        frames_by_pin[pin] = frames
+
+    trains = {pin: train_from_frames(frames) for pin, frames in frames_by_pin.items()}
+    start = time.perf_counter()
+    program = compile_fanout(trains)
+    report: Dict[str, object] = {
+        "pins": list(program.pins),
+        "events": len(program.events),
+        "compile_ms": round((time.perf_counter() - start) * 1000, 2),
+        "sequential_ms": round(sum(sum(t) for t in trains.values()) / 1000, 1),
+        "fanout_ms": round(program.duration_ns / 1e6, 1),
+    }
+    if not args.dry_run:
+        transmitter = FanoutTransmitter(program.pins, args.chip)
+        try:
+            report.update({k: round(v, 3) for k, v in transmitter.transmit(program).items()})
+        finally:
+            transmitter.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"=== FAN-OUT sur gpio {', '.join(str(p) for p in program.pins)} ===")
+    print(f"{report['events']} écritures groupées, compilées en {report['compile_ms']}ms")
+    print(f"Durée séquentielle {report['sequential_ms']}ms -> simultanée {report['fanout_ms']}ms")
+    if "elapsed_ms" in report:
+        print(f"Émission réelle {report['elapsed_ms']}ms "
+              f"(retard max d'un événement {report['max_event_lag_ms']}ms)")
+
+
+if __name__ == "__main__":
+    main()
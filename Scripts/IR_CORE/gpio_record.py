@@ -0,0 +1,190 @@
+"""
+Couche lgpio enregistreuse pour mesurer les émissions IR
+
+RecordingGpio expose les fonctions lgpio utilisées par les télécommandes
+(gpio_write, group_write, ...) et horodate chaque écriture
+(perf_counter_ns). Sans `delegate`, rien n'est écrit sur le matériel: les
+mesures tournent sur n'importe quelle machine; avec le module lgpio réel en
+`delegate`, les écritures sont aussi transmises aux pins.
+
+Les fonctions d'analyse reconstruisent l'enveloppe (impulsions ON/OFF) d'un
+pin à partir des écritures et la comparent au train d'impulsions prévu.
+
+Exemple:
+    import ir_osram
+    recorder = RecordingGpio()
+    with patched(ir_osram, recorder):
+        remote = ir_osram.OsramRGBWRemote(18)
+        remote.send_command("RED")
+    marks = envelope(recorder.records, 18)
+"""
+
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+import time
+
+MIN_SPACE_NS = 200_000  # Plus court espace NEC: 560 µs
+
+
+class Write(NamedTuple):
+    t_ns: int
+    pin: int
+    level: int
+
+
+class RecordingGpio:
+    """Sous-ensemble de l'API lgpio, écritures horodatées dans `records`"""
+
+    def __init__(self, delegate=None):
+        """
+        Args:
+            delegate: Module lgpio réel (None: enregistrement seul)
+        """
+        self.delegate = delegate
+        self.records: List[Write] = []
+        self.groups: Dict[int, Tuple[int, ...]] = {}
+
+    def __getattr__(self, name):
+        # Autres fonctions et constantes lgpio: déléguées, ou sans effet
+        if self.delegate is not None:
+            return getattr(self.delegate, name)
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: 0
+
+    def clear(self):
+        self.records.clear()
+
+    def gpiochip_open(self, chip: int) -> int:
+        return self.delegate.gpiochip_open(chip) if self.delegate is not None else 1
+
+    def gpio_write(self, h: int, pin: int, level: int) -> int:
+        self.records.append(Write(time.perf_counter_ns(), pin, 1 if level else 0))
+        return self.delegate.gpio_write(h, pin, level) if self.delegate is not None else 0
+
+    def group_claim_output(self, h: int, pins: Sequence[int], levels=(0,), flags: int = 0) -> int:
+        self.groups[pins[0]] = tuple(pins)
+        if self.delegate is not None:
+            return self.delegate.group_claim_output(h, list(pins), list(levels), flags)
+        return 0
+
+    def group_write(self, h: int, leader: int, bits: int, mask: int = 0xFFFFFFFF) -> int:
+        t = time.perf_counter_ns()
+        for i, pin in enumerate(self.groups.get(leader, (leader,))):
+            if (mask >> i) & 1:
+                self.records.append(Write(t, pin, (bits >> i) & 1))
+        return self.delegate.group_write(h, leader, bits, mask) if self.delegate is not None else 0
+
+    def writes(self, pin: Optional[int] = None) -> int:
+        """Nombre d'écritures (d'un pin, ou toutes)"""
+        if pin is None:
+            return len(self.records)
+        return sum(1 for r in self.records if r.pin == pin)
+
+
+@contextmanager
+def patched(module, recorder: RecordingGpio):
+    """Remplace `module.lgpio` par l'enregistreur le temps du bloc"""
+    original = module.lgpio
+    module.lgpio = recorder
+    try:
+        yield recorder
+    finally:
+        module.lgpio = original
+
+
+def envelope(records: Sequence[Write], pin: int,
+             min_space_ns: int = MIN_SPACE_NS) -> List[Tuple[int, int]]:
+    """
+    Impulsions ON reconstruites d'un pin: [(début ns, fin ns), ...]
+
+    Une impulsion est une suite de fronts montants (porteuse logicielle) ou
+    un unique palier à 1 (enveloppe pilotée, porteuse matérielle). Un
+    silence plus court que `min_space_ns` est un trou de porteuse (retard
+    d'ordonnancement) et non un espace NEC: il ne coupe pas l'impulsion.
+    Le début est le premier front montant, la fin le dernier front descendant.
+    """
+    marks: List[Tuple[int, int]] = []
+    level = 0
+    start = last_fall = None
+    for t, p, value in records:
+        if p != pin or value == level:
+            continue
+        level = value
+        if value:
+            if start is not None and last_fall is not None and t - last_fall >= min_space_ns:
+                marks.append((start, last_fall))
+                start = None
+            if start is None:
+                start = t
+        else:
+            last_fall = t
+    if start is not None and last_fall is not None and last_fall > start:
+        marks.append((start, last_fall))
+    return marks
+
+
+def planned_edges(pulses: Sequence[int]) -> List[int]:
+    """Instants prévus (ns depuis le premier front) des fronts d'enveloppe"""
+    edges = []
+    t = 0
+    for i, duration in enumerate(pulses):
+        if i % 2 == 0:
+            edges.append(t)
+            edges.append(t + duration * 1000)
+        t += duration * 1000
+    return edges
+
+
+def edge_lateness(marks: Sequence[Tuple[int, int]], pulses: Sequence[int]) -> List[float]:
+    """
+    Écart (ns) de chaque front réel au front prévu, origine au premier front
+
+    Valeur négative: front en avance. En porteuse logicielle, la fin d'une
+    impulsion tombe au dernier front descendant de la porteuse, donc jusqu'à
+    une période avant la fin prévue: c'est une erreur réelle d'enveloppe.
+    """
+    actual = [t for mark in marks for t in mark]
+    if not actual:
+        return []
+    origin = actual[0]
+    return [(a - origin) - e for a, e in zip(actual, planned_edges(pulses))]
+
+
+def carrier_stats(records: Sequence[Write], pin: int,
+                  marks: Sequence[Tuple[int, int]]) -> Optional[Dict[str, float]]:
+    """
+    Fréquence et rapport cyclique mesurés de la porteuse dans les impulsions
+
+    Chaque période est mesurée d'un front montant au suivant au sein d'une
+    même impulsion; le rapport cyclique est la part de la période passée à 1.
+
+    Returns:
+        {"frequency_hz", "duty_cycle", "periods"}, None sans porteuse logicielle
+        (enveloppe pilotée: un seul front montant par impulsion)
+    """
+    periods = 0
+    total_period = total_high = 0
+    mark_index = 0
+    rise = fall = None
+    for t, p, value in records:
+        if p != pin:
+            continue
+        while mark_index < len(marks) and t > marks[mark_index][1]:
+            mark_index += 1
+            rise = fall = None
+        if mark_index >= len(marks) or t < marks[mark_index][0]:
+            continue
+        if value:
+            if rise is not None and fall is not None and fall > rise:
+                total_period += t - rise
+                total_high += fall - rise
+                periods += 1
+            rise, fall = t, None
+        elif rise is not None and fall is None:
+            fall = t
+    if not periods:
+        return None
+    period = total_period / periods
+    return {"frequency_hz": 1e9 / period, "duty_cycle": total_high / total_period,
+            "periods": periods}
@@ -0,0 +1,223 @@
+"""
+Mode touches: appui maintenu avec répétitions NEC en continu
+
+input() lit des lignes entières: monter le volume de 20 crans demande de
+taper VOL+ vingt fois, chaque fois une trame complète. Ici le terminal passe
+en mode cbreak et chaque touche est lue dès l'appui:
+- le premier appui émet la trame complète (render_frames), puis des codes
+  de répétition NEC partent toutes les 108 ms (début à début, échéances
+  absolues) tant que la touche est maintenue
+- un terminal ne signale pas le relâchement: la touche est considérée
+  maintenue tant que l'auto-répétition du clavier renvoie le caractère.
+  Avant la première auto-répétition (délai clavier, ~500 ms sous X11,
+  `xset q`), hold_delay_s s'applique; ensuite release_s
+- l'émission tourne sur un thread dédié: la lecture du clavier n'attend
+  jamais la fin d'une trame; une autre touche interrompt les répétitions
+  et émet sa trame complète
+
+Exemple:
+    run_hold_mode(remote, {"UP": "VOL+", "DOWN": "VOL-"})
+"""
+
+from typing import Callable, Dict, List, Optional
+import os
+import sys
+import threading
+import time
+
+try:
+    import termios
+    import tty
+except ImportError:  # Windows: pas de mode cbreak
+    termios = None
+    tty = None
+
+NEC_REPEAT = [9000, 2250, 560]  # Code de répétition NEC
+REPEAT_PERIOD_S = 0.108          # Période NEC, début à début
+FRAME_GAP_S = 0.108              # Gap entre trames d'une même commande
+HOLD_DELAY_S = 0.55              # Attente de la première auto-répétition
+RELEASE_S = 0.15                 # Sans caractère depuis: touche relâchée
+
+ESCAPE_KEYS = {
+    "\x1b[A": "UP", "\x1b[B": "DOWN", "\x1b[C": "RIGHT", "\x1b[D": "LEFT",
+    "\x1bOA": "UP", "\x1bOB": "DOWN", "\x1bOC": "RIGHT", "\x1bOD": "LEFT",
+}
+QUIT_KEYS = ("q", "Q", "ESC")
+
+
+def split_keys(data: str) -> List[str]:
+    """
+    Découpe les caractères lus en touches (séquences des flèches comprises)
+
+    Returns:
+        Caractères simples, "UP"/"DOWN"/"RIGHT"/"LEFT", ou "ESC" seul
+    """
+    keys = []
+    i = 0
+    while i < len(data):
+        if data[i] == "\x1b":
+            sequence = data[i:i + 3]
+            if sequence in ESCAPE_KEYS:
+                keys.append(ESCAPE_KEYS[sequence])
+                i += 3
+                continue
+            keys.append("ESC")
+        else:
+            keys.append(data[i])
+        i += 1
+    return keys
+
+
+class HoldStreamer:
+    """Thread d'émission: trame complète à l'appui, répétitions tant que maintenu"""
+
+    def __init__(self, remote, hold_delay_s: float = HOLD_DELAY_S,
+                 release_s: float = RELEASE_S, clock: Callable[[], float] = time.perf_counter,
+                 verbose: bool = True):
+        """
+        Args:
+            remote: Télécommande (render_frames, send_ir_signal)
+            hold_delay_s: Maintien supposé après le premier appui
+            release_s: Maintien prolongé à chaque auto-répétition
+            clock: Horloge monotone (secondes)
+            verbose: Affiche une ligne par appui relâché
+        """
+        self.remote = remote
+        self.hold_delay_s = hold_delay_s
+        self.release_s = release_s
+        self.clock = clock
+        self.verbose = verbose
+        self.history: List[Dict[str, object]] = []
+        self._cond = threading.Condition()
+        self._pending: Optional[str] = None  # Nouvel appui pas encore émis
+        self._active: Optional[str] = None   # Commande en cours de répétition
+        self._deadline = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="ir-hold", daemon=True)
+        self._thread.start()
+
+    def key(self, command: str):
+        """Touche lue: nouvel appui, ou auto-répétition de la commande en cours"""
+        with self._cond:
+            now = self.clock()
+            repeating = (command == self._active and self._pending is None
+                         and now < self._deadline)
+            if repeating or command == self._pending:
+                self._deadline = max(self._deadline, now + self.release_s)
+            else:
+                self._pending = command
+                self._deadline = now + self.hold_delay_s
+            self._cond.notify()
+
+    def release(self):
+        """Arrête les répétitions en cours (la trame commencée va jusqu'au bout)"""
+        with self._cond:
+            self._deadline = 0.0
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                command, self._pending = self._pending, None
+                self._active = command
+            try:
+                self._hold(command)
+            except Exception as e:
+                print(f"Erreur: {e}")
+            with self._cond:
+                self._active = None
+
+    def _hold(self, command: str):
+        frames = self.remote.render_frames(command)
+        if frames is None:
+            print(f"Commande inconnue: {command}")
+            return
+        pressed = self.clock()
+        frame_start = pressed
+        for n, frame in enumerate(frames):
+            if n:
+                time.sleep(FRAME_GAP_S)
+            frame_start = self.clock()
+            self.remote.send_ir_signal(frame)
+        next_at = frame_start + REPEAT_PERIOD_S
+        repeats = late = 0
+        worst_lag = 0.0
+        while True:
+            with self._cond:
+                while not self._closed and self._pending is None:
+                    now = self.clock()
+                    if now >= self._deadline or now >= next_at:
+                        break
+                    self._cond.wait(min(next_at, self._deadline) - now)
+                if self._closed or self._pending is not None or self.clock() >= self._deadline:
+                    self._active = None
+                    break
+            lag = self.clock() - next_at
+            worst_lag = max(worst_lag, lag)
+            if lag > REPEAT_PERIOD_S / 10:
+                late += 1
+            self.remote.send_ir_signal(NEC_REPEAT)
+            repeats += 1
+            # Échéances absolues; après un retard on repart de maintenant
+            next_at = max(next_at + REPEAT_PERIOD_S, self.clock())
+        held = self.clock() - pressed
+        self.history.append({"command": command, "frames": len(frames), "repeats": repeats,
+                             "held_s": held, "late": late, "max_lag_ms": worst_lag * 1000})
+        if self.verbose:
+            print(f"{command}: {len(frames)} trame(s) + {repeats} répétition(s) "
+                  f"en {held:.2f}s" + (f", {late} en retard" if late else ""))
+
+
+def run_hold_mode(remote, bindings: Dict[str, str], hold_delay_s: float = HOLD_DELAY_S,
+                  release_s: float = RELEASE_S) -> List[Dict[str, object]]:
+    """
+    Boucle du mode touches jusqu'à q ou Échap
+
+    Args:
+        remote: Télécommande (render_frames, send_ir_signal)
+        bindings: Touche (caractère ou UP/DOWN/RIGHT/LEFT) -> commande
+        hold_delay_s: Délai avant la première auto-répétition du clavier
+        release_s: Silence clavier au-delà duquel la touche est relâchée
+
+    Returns:
+        Historique des appuis (commande, trames, répétitions, durée)
+
+    Raises:
+        RuntimeError: Entrée standard qui n'est pas un terminal
+    """
+    if termios is None or not sys.stdin.isatty():
+        raise RuntimeError("Mode touches: un terminal est requis")
+    print("Mode touches (maintenir pour répéter, q ou Échap pour quitter):")
+    for key, command in bindings.items():
+        print(f"  {repr(key) if len(key) == 1 else key:8s} {command}")
+    fd = sys.stdin.fileno()
+    saved = termios.tcgetattr(fd)
+    streamer = HoldStreamer(remote, hold_delay_s, release_s)
+    try:
+        tty.setcbreak(fd)
+        while True:
+            data = os.read(fd, 64).decode(errors="ignore")
+            if not data:
+                break
+            keys = split_keys(data)
+            if any(key in QUIT_KEYS for key in keys):
+                break
+            for key in keys:
+                command = bindings.get(key, bindings.get(key.lower()))
+                if command is not None:
+                    streamer.key(command)
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+        streamer.release()
+        streamer.close()
+    return streamer.history
@@ -0,0 +1,158 @@
+"""
+API asyncio d'émission IR: file par pin, thread d'émission dédié
+
+send_command busy-wait ~70 ms par trame (plus 108 ms entre deux trames
+d'un POWER doublé): appelé depuis une boucle asyncio, il la fige. Ici les
+trames pré-calculées sont confiées à un thread d'émission par pin via une
+file; la coroutine attend un futur résolu quand la dernière trame a quitté
+la LED:
+- les émissions d'un même pin sont sérialisées, dans l'ordre de soumission
+- des pins différents émettent chacun sur leur thread
+- annuler l'attente (task.cancel(), future.cancel()) retire les trames pas
+  encore émises; une trame commencée va toujours jusqu'au bout
+
+Exemple:
+    remote = YamahaRemote(18)
+    await remote.send("VOL+")                      # facade des télécommandes
+    future = shared_transmitter().submit(remote, frames)
+    future.cancel()                                # si encore en file
+"""
+
+from typing import Dict, Optional, Sequence
+import asyncio
+import queue
+import threading
+import time
+
+NEC_FRAME_GAP_S = 0.108  # Gap standard NEC entre deux trames
+
+
+class TransmitJob:
+    """Trames d'une commande en attente d'émission"""
+
+    __slots__ = ("remote", "frames", "loop", "future", "cancelled", "sent")
+
+    def __init__(self, remote, frames: Sequence[list], loop: asyncio.AbstractEventLoop,
+                 future: asyncio.Future):
+        self.remote = remote
+        self.frames = frames
+        self.loop = loop
+        self.future = future
+        self.cancelled = threading.Event()  # lu par le thread d'émission
+        self.sent = 0
+
+
+class AsyncTransmitter:
+    """Un thread d'émission et une file par pin IR"""
+
+    def __init__(self, gap_s: float = NEC_FRAME_GAP_S):
+        """
+        Args:
+            gap_s: Silence entre deux trames d'une même commande
+        """
+        self.gap_s = gap_s
+        self._queues: Dict[int, "queue.SimpleQueue[Optional[TransmitJob]]"] = {}
+        self._threads: Dict[int, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _queue_for(self, pin: int) -> "queue.SimpleQueue[Optional[TransmitJob]]":
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Émetteur IR fermé")
+            q = self._queues.get(pin)
+            if q is None:
+                q = self._queues[pin] = queue.SimpleQueue()
+                thread = threading.Thread(target=self._worker, args=(q,),
+                                          name=f"ir-tx{pin}", daemon=True)
+                self._threads[pin] = thread
+                thread.start()
+            return q
+
+    def submit(self, remote, frames: Sequence[list]) -> asyncio.Future:
+        """
+        Met en file les trames d'une commande (à appeler depuis la boucle asyncio)
+
+        Args:
+            remote: Télécommande (send_ir_signal, ir_pin)
+            frames: Trames pré-calculées (render_frames)
+
+        Returns:
+            Futur résolu avec le nombre de trames émises; annulable tant que
+            des trames restent en file
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job = TransmitJob(remote, list(frames), loop, future)
+        future.add_done_callback(lambda f: job.cancelled.set() if f.cancelled() else None)
+        self._queue_for(remote.ir_pin).put(job)
+        return future
+
+    async def send(self, remote, frames: Sequence[list]) -> int:
+        """Émet et attend que la dernière trame ait quitté la LED"""
+        return await self.submit(remote, frames)
+
+    def pending(self, pin: int) -> int:
+        """Commandes en file sur un pin (hors commande en cours)"""
+        q = self._queues.get(pin)
+        return q.qsize() if q is not None else 0
+
+    def _worker(self, q: "queue.SimpleQueue[Optional[TransmitJob]]"):
+        while True:
+            job = q.get()
+            if job is None:
+                return
+            if job.cancelled.is_set():
+                continue
+            try:
+                for n, frame in enumerate(job.frames):
+                    if job.cancelled.is_set():
+                        break
+                    if n:
+                        time.sleep(self.gap_s)
+                    job.remote.send_ir_signal(frame)
+                    job.sent += 1
+            except Exception as e:
+                self._resolve(job, error=e)
+            else:
+                self._resolve(job, result=job.sent)
+
+    @staticmethod
+    def _resolve(job: TransmitJob, result: Optional[int] = None,
+                 error: Optional[BaseException] = None):
+        def done():
+            if job.future.done():
+                return
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+        try:
+            job.loop.call_soon_threadsafe(done)
+        except RuntimeError:
+            pass  # Boucle fermée: plus personne n'attend
+
+    def close(self, wait: bool = True):
+        """Termine les threads après les commandes déjà en file"""
+        with self._lock:
+            self._closed = True
+            queues = list(self._queues.values())
+            threads = list(self._threads.values())
+        for q in queues:
+            q.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+_shared: Optional[AsyncTransmitter] = None
+_shared_lock = threading.Lock()
+
+
+def shared_transmitter() -> AsyncTransmitter:
+    """Émetteur commun du processus (utilisé par les télécommandes, remote.send)"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = AsyncTransmitter()
+        return _shared
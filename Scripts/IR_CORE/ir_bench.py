@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Banc de non-régression de l'émission IR (résultats JSON comparables)
+
+Chaque backend d'émission est exercé sur N trames à travers la couche
+lgpio enregistreuse (gpio_record.py), sur la machine courante:
+- retard de chaque front d'enveloppe par rapport au train prévu
+- fréquence et rapport cyclique mesurés de la porteuse (porteuse logicielle)
+- temps CPU et nombre d'écritures GPIO par trame
+et chaque encodeur en débit (trames encodées par seconde).
+
+Le résultat JSON se compare à une référence enregistrée: une métrique qui se
+dégrade au-delà du seuil (relatif, avec une marge absolue par métrique pour
+ignorer le bruit) est une régression, et le code de sortie vaut 1.
+
+Par défaut rien n'atteint le matériel (sysfs PWM simulé); --hardware
+transmet aussi les écritures au lgpio réel et utilise /sys/class/pwm.
+
+Exemples:
+    python ir_bench.py --frames 50 --save-baseline bench_baseline.json
+    python ir_bench.py --frames 50 --baseline bench_baseline.json --threshold 25
+    python ir_bench.py --backends software-yamaha,fanout --json
+"""
+
+from contextlib import ExitStack, contextmanager, redirect_stdout
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _sub in ("IR_CORE", "IR_YAMAHA", "IR_OSRAM"):
+    _path = os.path.join(SCRIPTS_DIR, _sub)
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from gpio_record import RecordingGpio, carrier_stats, edge_lateness, envelope, patched
+
+import fanout
+import ir_osram
+import pwm_carrier
+import yamaha_remote_rpi
+
+CARRIER_HZ = 38000
+DUTY_CYCLE = 0.33
+FRAME_GAP_S = 0.108
+
+# Sens des métriques comparées (feuille du chemin) et marge absolue sous
+# laquelle un écart est du bruit de mesure
+LOWER_IS_BETTER = {
+    "p50": 5.0, "p99": 20.0, "max": 200.0,      # écart de front (µs)
+    "cpu_ms_per_frame": 2.0,
+    "gpio_writes_per_frame": 1.0,
+    "carrier_error_pct": 0.5,
+    "duty_error_pts": 1.0,
+}
+HIGHER_IS_BETTER = {"frames_per_s": 0.0}
+
+
+class BenchTarget:
+    """Backend prêt à émettre: send(trames par pin), pins mesurés, libération"""
+
+    def __init__(self, send: Callable[[Dict[int, List[int]]], None], frames: Dict[int, List[int]],
+                 pins: List[int], carrier: bool, close: Callable[[], None]):
+        self.send = send
+        self.frames = frames
+        self.pins = pins
+        self.carrier = carrier  # porteuse logicielle mesurable sur les pins
+        self.close = close
+
+
+def _software(remote_cls, pin: int, command: str) -> BenchTarget:
+    remote = remote_cls(pin)
+    frames = {pin: remote.render_frames(command)[0]}
+    return BenchTarget(lambda f: remote.send_ir_signal(f[pin]), frames, [pin], True,
+                       remote.cleanup)
+
+
+def _pwm_gate(gate_pin: int = 23) -> BenchTarget:
+    remote = yamaha_remote_rpi.YamahaRemote(18, pwm_carrier={"gate_pin": gate_pin})
+    frames = {gate_pin: remote.render_frames("VOL_UP")[0]}
+    return BenchTarget(lambda f: remote.send_ir_signal(f[gate_pin]), frames, [gate_pin], False,
+                       remote.cleanup)
+
+
+def _fanout() -> BenchTarget:
+    yamaha = yamaha_remote_rpi.YamahaRemote(18, init_gpio=False)
+    osram = ir_osram.OsramRGBWRemote(17, init_gpio=False)
+    frames = {18: yamaha.render_frames("VOL_UP")[0], 17: osram.render_frames("RED")[0]}
+    transmitter = fanout.FanoutTransmitter([18, 17])
+    program = fanout.compile_fanout(frames)
+    return BenchTarget(lambda f: transmitter.transmit(program), frames, [18, 17], True,
+                       transmitter.close)
+
+
+# Backends d'émission: nom -> constructeur (appelé avec lgpio déjà remplacé)
+BACKENDS: Dict[str, Callable[[], BenchTarget]] = {
+    "software-yamaha": lambda: _software(yamaha_remote_rpi.YamahaRemote, 18, "VOL_UP"),
+    "software-osram": lambda: _software(ir_osram.OsramRGBWRemote, 17, "RED"),
+    "pwm-gate": _pwm_gate,
+    "fanout": _fanout,
+}
+
+# Modules dont le lgpio est remplacé par l'enregistreur
+PATCHED_MODULES = (yamaha_remote_rpi, ir_osram, fanout, pwm_carrier)
+
+
+def _percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda p: values[min(len(values) - 1, int(p * len(values)))]
+    return {"p50": round(pick(0.5), 2), "p99": round(pick(0.99), 2), "max": round(values[-1], 2)}
+
+
+def run_backend(name: str, frames: int, recorder: RecordingGpio) -> Dict[str, Any]:
+    """Émet `frames` trames sur un backend et agrège les mesures"""
+    with redirect_stdout(io.StringIO()):  # messages d'initialisation des télécommandes
+        target = BACKENDS[name]()
+    errors: List[float] = []
+    cpu = wall = 0.0
+    writes = 0
+    freq: List[float] = []
+    duty: List[float] = []
+    try:
+        for _ in range(frames):
+            recorder.clear()
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            target.send(target.frames)
+            cpu += time.process_time() - cpu_start
+            wall += time.perf_counter() - wall_start
+            writes += recorder.writes()
+            for pin in target.pins:
+                marks = envelope(recorder.records, pin)
+                errors += [abs(v) / 1000 for v in edge_lateness(marks, target.frames[pin])]
+                if target.carrier:
+                    stats = carrier_stats(recorder.records, pin, marks)
+                    if stats:
+                        freq.append(stats["frequency_hz"])
+                        duty.append(stats["duty_cycle"])
+            time.sleep(FRAME_GAP_S)
+    finally:
+        with redirect_stdout(io.StringIO()):
+            target.close()
+
+    result: Dict[str, Any] = {
+        "frames": frames,
+        "pins": target.pins,
+        "wall_ms_per_frame": round(wall * 1000 / frames, 2),
+        "cpu_ms_per_frame": round(cpu * 1000 / frames, 2),
+        "gpio_writes_per_frame": round(writes / frames, 1),
+        "edge_error_us": _percentiles(errors),
+        "carrier_hz": None, "carrier_error_pct": None,
+        "duty_cycle": None, "duty_error_pts": None,
+    }
+    if freq:
+        mean_freq = sum(freq) / len(freq)
+        mean_duty = sum(duty) / len(duty)
+        result.update({
+            "carrier_hz": round(mean_freq, 1),
+            "carrier_error_pct": round(abs(mean_freq - CARRIER_HZ) / CARRIER_HZ * 100, 3),
+            "duty_cycle": round(mean_duty, 4),
+            "duty_error_pts": round(abs(mean_duty - DUTY_CYCLE) * 100, 2),
+        })
+    return result
+
+
+def run_encoders(iterations: int) -> Dict[str, Any]:
+    """Débit d'encodage NEC brut et de render_frames (codebook + encodage)"""
+    out: Dict[str, Any] = {}
+    for name, remote, command in (
+            ("yamaha", yamaha_remote_rpi.YamahaRemote(init_gpio=False), "VOL+"),
+            ("osram", ir_osram.OsramRGBWRemote(init_gpio=False), "red")):
+        code = remote.codebook.get(command)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            remote.nec_encode(code.address, code.command)
+        encode = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(iterations):
+            remote.render_frames(command)
+        render = time.perf_counter() - start
+        out[f"{name}.nec_encode"] = {"frames_per_s": round(iterations / encode)}
+        out[f"{name}.render_frames"] = {"frames_per_s": round(iterations / render)}
+    return out
+
+
+@contextmanager
+def _sysfs_root(root: str):
+    """Racine sysfs PWM remplacée le temps du bloc (simulation)"""
+    original = pwm_carrier.SYSFS_PWM
+    pwm_carrier.SYSFS_PWM = root
+    try:
+        yield
+    finally:
+        pwm_carrier.SYSFS_PWM = original
+
+
+def run(frames: int, backends: List[str], hardware: bool = False,
+        encode_iterations: int = 20000) -> Dict[str, Any]:
+    """Exécute le banc; sysfs PWM simulé et GPIO non transmis sauf `hardware`"""
+    results: Dict[str, Any] = {
+        "machine": {"platform": platform.platform(), "machine": platform.machine(),
+                    "python": platform.python_version()},
+        "hardware": hardware,
+        "frames": frames,
+        "backends": {},
+    }
+    with ExitStack() as stack:
+        recorder = RecordingGpio(yamaha_remote_rpi.lgpio if hardware else None)
+        for module in PATCHED_MODULES:
+            stack.enter_context(patched(module, recorder))
+        if not hardware:
+            sim_root = pwm_carrier.simulated_sysfs()
+            stack.callback(shutil.rmtree, sim_root, True)
+            stack.enter_context(_sysfs_root(sim_root))
+        for name in backends:
+            results["backends"][name] = run_backend(name, frames, recorder)
+    results["encoders"] = run_encoders(encode_iterations)
+    return results
+
+
+def _flatten(data: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    out = {}
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            out.update(_flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[path] = value
+    return out
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any],
+            threshold_pct: float) -> List[Dict[str, Any]]:
+    """
+    Régressions par rapport à la référence
+
+    Args:
+        threshold_pct: Dégradation relative tolérée (%)
+
+    Returns:
+        Une entrée par métrique dégradée: chemin, référence, valeur, variation (%)
+    """
+    current = _flatten({"backends": results["backends"], "encoders": results["encoders"]})
+    reference = _flatten({"backends": baseline.get("backends", {}),
+                          "encoders": baseline.get("encoders", {})})
+    regressions = []
+    for path, base in sorted(reference.items()):
+        if path not in current:
+            continue
+        leaf = path.rsplit(".", 1)[-1]
+        value = current[path]
+        if leaf in LOWER_IS_BETTER:
+            worse = value - base
+            slack = LOWER_IS_BETTER[leaf]
+        elif leaf in HIGHER_IS_BETTER:
+            worse = base - value
+            slack = HIGHER_IS_BETTER[leaf]
+        else:
+            continue
+        if worse > max(abs(base) * threshold_pct / 100, slack):
+            regressions.append({"metric": path, "baseline": base, "value": value,
+                                "change_pct": round(worse / base * 100, 1) if base else None})
+    return regressions
+
+
+def print_results(results: Dict[str, Any]):
+    hw = "matériel" if results["hardware"] else "enregistrement seul"
+    print(f"=== BANC IR: {results['frames']} trames par backend ({hw}, "
+          f"{results['machine']['machine']}, Python {results['machine']['python']}) ===")
+    print(f"{'backend':<16} {'écrit./trame':>12} {'CPU/trame':>10} {'front p50':>10} "
+          f"{'front p99':>10} {'porteuse':>10} {'rapport':>8}")
+    for name, r in results["backends"].items():
+        err = r["edge_error_us"] or {"p50": 0.0, "p99": 0.0}
+        carrier = f"{r['carrier_hz']:8.0f}Hz" if r["carrier_hz"] else f"{'PWM':>10}"
+        duty = f"{r['duty_cycle'] * 100:7.1f}%" if r["duty_cycle"] else f"{'-':>8}"
+        print(f"{name:<16} {r['gpio_writes_per_frame']:>12} {r['cpu_ms_per_frame']:8.2f}ms "
+              f"{err['p50']:8.2f}µs {err['p99']:8.2f}µs {carrier} {duty}")
+    print("Encodeurs:")
+    for name, r in results["encoders"].items():
+        print(f"  {name:<22} {r['frames_per_s']:>10} trames/s")
+    if "regressions" in results:
+        if results["regressions"]:
+            print(f"\nRÉGRESSIONS (seuil {results['threshold_pct']}%):")
+            for reg in results["regressions"]:
+                change = f"{reg['change_pct']:+.1f}%" if reg["change_pct"] is not None else ""
+                print(f"  {reg['metric']:<40} {reg['baseline']} -> {reg['value']} {change}")
+        else:
+            print(f"\nAucune régression par rapport à la référence (seuil {results['threshold_pct']}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de non-régression de l'émission IR")
+    parser.add_argument("--frames", type=int, default=30, help="Trames par backend (défaut: 30)")
+    parser.add_argument("--backends", default=",".join(BACKENDS),
+                        help=f"Backends séparés par des virgules (défaut: {','.join(BACKENDS)})")
+    parser.add_argument("--encode-iterations", type=int, default=20000)
+    parser.add_argument("--hardware", action="store_true",
+                        help="Écritures transmises au lgpio réel, /sys/class/pwm réel")
+    parser.add_argument("--output", help="Écrit les résultats JSON dans ce fichier")
+    parser.add_argument("--save-baseline", help="Enregistre les résultats comme référence")
+    parser.add_argument("--baseline", help="Référence JSON à comparer")
+    parser.add_argument("--threshold", type=float, default=25.0,
+                        help="Dégradation relative tolérée en %% (défaut: 25)")
+    parser.add_argument("--json", action="store_true", help="Sortie JSON")
+    args = parser.parse_args()
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    unknown = [b for b in backends if b not in BACKENDS]
+    if unknown:
+        parser.error(f"Backends inconnus: {', '.join(unknown)} (disponibles: {', '.join(BACKENDS)})")
+
+    results = run(args.frames, backends, args.hardware, args.encode_iterations)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        results["threshold_pct"] = args.threshold
+        results["regressions"] = compare(results, baseline, args.threshold)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        print_results(results)
+    if results.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
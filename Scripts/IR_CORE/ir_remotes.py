@@ -0,0 +1,51 @@
+"""
+Éléments communs aux télécommandes IR (Yamaha, Osram)
+
+- métriques d'émission, déclarées une seule fois pour les deux télécommandes
+- accès différé aux classes de télécommandes: les télécommandes importent
+  IR_CORE, et les outils d'IR_CORE qui en ont besoin (auto-tests, fanout,
+  SPI, Arduino) passent par ce module plutôt que de dupliquer chemins et imports
+"""
+
+import os
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_COMMON = os.path.join(SCRIPTS_DIR, "COMMON")
+if _COMMON not in sys.path:
+    sys.path.insert(0, _COMMON)
+
+from metrics import REGISTRY
+
+REMOTE_TYPES = ("yamaha", "osram")
+
+# Métriques d'émission (registre partagé, voir COMMON/metrics.py), étiquetées
+# par télécommande et par pin
+IR_FRAMES = REGISTRY.counter("ir_frames_sent_total", "Trames IR émises", ["remote", "pin"])
+IR_TRANSMIT_SECONDS = REGISTRY.histogram(
+    "ir_transmit_seconds", "Durée d'émission d'un train d'impulsions", ["remote", "pin"])
+IR_OVERRUN_SECONDS = REGISTRY.histogram(
+    "ir_transmit_overrun_seconds", "Dépassement de la durée théorique du train (retard de timing)",
+    ["remote", "pin"],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025))
+IR_CPU_SECONDS = REGISTRY.histogram(
+    "ir_transmit_cpu_seconds", "Temps CPU du thread émetteur par train d'impulsions", ["remote", "pin"])
+IR_ERRORS = REGISTRY.counter("ir_transmit_errors_total", "Échecs d'émission IR", ["remote", "pin"])
+
+
+def remote_class(remote_type: str):
+    """Classe de télécommande (import différé: lgpio n'est requis que pour l'IR)"""
+    for sub in ("IR_YAMAHA", "IR_OSRAM"):
+        path = os.path.join(SCRIPTS_DIR, sub)
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    if remote_type == "yamaha":
+        from yamaha_remote_rpi import YamahaRemote
+        return YamahaRemote
+    from ir_osram import OsramRGBWRemote
+    return OsramRGBWRemote
+
+
+def offline_remote(remote_type: str):
+    """Télécommande sans GPIO (codebook, encodage et render_frames)"""
+    return remote_class(remote_type)(init_gpio=False)
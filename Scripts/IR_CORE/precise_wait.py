@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Attente hybride calibrée: sommeil puis spin jusqu'à l'échéance
+
+Les espaces OFF d'une trame NEC (560 µs à 4,5 ms pour l'AGC) et les fronts
+d'enveloppe de la porteuse PWM étaient attendus en busy-wait: un cœur à
+100 % pendant toute l'émission. HybridWaiter dort jusqu'à une marge avant
+l'échéance, puis ne spinne que sur le reste:
+- la marge est mesurée au démarrage (calibrate): dépassement de time.sleep
+  sur la plateforme (p90, les valeurs aberrantes isolées sont écartées),
+  plus une garde
+- un réveil après l'échéance (machine chargée) élargit aussitôt la marge
+  (au plus du double: une préemption isolée pénaliserait aussi le spin);
+  chaque attente la ramène ensuite vers la valeur calibrée
+- sous la marge (périodes de porteuse de 26 µs), seul le spin reste
+
+Le front qui suit une attente part toujours de la boucle de spin: la
+précision des fronts est celle du busy-wait, le CPU en moins.
+
+Exemples:
+    python precise_wait.py                 # calibration + comparaison spin/hybride
+    python precise_wait.py --frames 20 --json
+"""
+
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence
+import argparse
+import json
+import time
+
+CALIBRATION_SAMPLES = 40
+CALIBRATION_REQUEST_S = 0.0002
+GUARD_NS = 20_000           # Ajoutée au dépassement mesuré
+MIN_MARGIN_NS = 50_000
+MAX_MARGIN_NS = 2_000_000   # Au-delà, autant spinner (machine saturée)
+
+
+def calibrate(samples: int = CALIBRATION_SAMPLES, request_s: float = CALIBRATION_REQUEST_S,
+              clock: Callable[[], int] = time.perf_counter_ns) -> Dict[str, int]:
+    """
+    Mesure le dépassement de time.sleep sur la plateforme
+
+    Args:
+        samples: Nombre de sommeils mesurés (~10 ms au total par défaut)
+        request_s: Durée demandée à chaque sommeil
+
+    Returns:
+        Dépassements médian, p90 et max (ns), marge retenue (ns)
+    """
+    overshoots: List[int] = []
+    for _ in range(samples):
+        start = clock()
+        time.sleep(request_s)
+        overshoots.append(clock() - start - int(request_s * 1e9))
+    overshoots.sort()
+    p90 = overshoots[min(len(overshoots) - 1, int(len(overshoots) * 0.9))]
+    margin = min(MAX_MARGIN_NS, max(MIN_MARGIN_NS, int(p90 * 1.25) + GUARD_NS))
+    return {"median_ns": overshoots[len(overshoots) // 2], "p90_ns": p90,
+            "max_ns": overshoots[-1], "margin_ns": margin}
+
+
+class HybridWaiter:
+    """Attente jusqu'à une échéance absolue (ns): sommeil puis spin"""
+
+    def __init__(self, margin_ns: Optional[int] = None,
+                 clock: Callable[[], int] = time.perf_counter_ns,
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            margin_ns: Marge avant l'échéance réservée au spin; None: calibrée
+            clock: Horloge monotone en ns (celle des échéances)
+            sleep: Sommeil en secondes
+        """
+        self.clock = clock
+        self.sleep = sleep
+        self.calibration = calibrate(clock=clock) if margin_ns is None else None
+        self.margin_ns = margin_ns if margin_ns is not None else self.calibration["margin_ns"]
+        self.base_margin_ns = self.margin_ns
+        self.reset()
+
+    def reset(self):
+        """Remet les compteurs à zéro (la marge est conservée)"""
+        self.waits = 0
+        self.sleeps = 0
+        self.slept_ns = 0
+        self.spun_ns = 0
+        self.late_wakeups = 0
+
+    def wait_until(self, deadline_ns: int) -> int:
+        """
+        Attend l'échéance
+
+        Returns:
+            Instant de sortie (>= deadline_ns), pour mesurer le retard du front
+        """
+        self.waits += 1
+        if self.margin_ns > self.base_margin_ns:
+            self.margin_ns -= (self.margin_ns - self.base_margin_ns) // 32
+        now = self.clock()
+        remaining = deadline_ns - now
+        if remaining > self.margin_ns:
+            self.sleep((remaining - self.margin_ns) / 1e9)
+            woke = self.clock()
+            self.sleeps += 1
+            self.slept_ns += woke - now
+            if woke > deadline_ns:
+                # Réveil trop tardif: la marge suit le dépassement observé
+                self.late_wakeups += 1
+                overshoot = woke - (deadline_ns - self.margin_ns)
+                self.margin_ns = min(MAX_MARGIN_NS, 2 * self.margin_ns,
+                                     max(self.margin_ns, overshoot + GUARD_NS))
+            now = woke
+        spin_start = now
+        while now < deadline_ns:
+            now = self.clock()
+        self.spun_ns += now - spin_start
+        return now
+
+    def stats(self) -> Dict[str, float]:
+        return {"margin_us": self.margin_ns / 1000, "waits": self.waits, "sleeps": self.sleeps,
+                "slept_ms": self.slept_ns / 1e6, "spun_ms": self.spun_ns / 1e6,
+                "late_wakeups": self.late_wakeups}
+
+
+@lru_cache(maxsize=1)
+def default_waiter() -> HybridWaiter:
+    """Attente partagée du processus, calibrée au premier appel"""
+    return HybridWaiter()
+
+
+class SpinWaiter:
+    """Busy-wait pur (ancienne attente), pour comparaison"""
+
+    def __init__(self, clock: Callable[[], int] = time.perf_counter_ns):
+        self.clock = clock
+
+    def wait_until(self, deadline_ns: int) -> int:
+        now = self.clock()
+        while now < deadline_ns:
+            now = self.clock()
+        return now
+
+
+def run_schedule(waiter, pulses: Sequence[int]) -> Dict[str, float]:
+    """
+    Attend chaque front d'un train (µs) sans rien émettre
+
+    Returns:
+        Temps CPU du thread et retard des fronts (max, moyen) en µs
+    """
+    cpu_start = time.thread_time_ns()
+    start = waiter.clock()
+    target = start
+    lags: List[int] = []
+    for duration in pulses:
+        target += duration * 1000
+        lags.append(waiter.wait_until(target) - target)
+    return {"cpu_ms": (time.thread_time_ns() - cpu_start) / 1e6,
+            "wall_ms": (waiter.clock() - start) / 1e6,
+            "max_lag_us": max(lags) / 1000, "mean_lag_us": sum(lags) / len(lags) / 1000}
+
+
+def compare(frames: int = 10) -> Dict[str, Dict[str, float]]:
+    """Spin pur et attente hybride sur les espaces d'une trame NEC"""
+    frame = [9000, 4500] + [560, 1690, 560, 560] * 16 + [560]
+    results = {}
+    for name, waiter in (("spin", SpinWaiter()), ("hybride", HybridWaiter())):
+        runs = [run_schedule(waiter, frame) for _ in range(frames)]
+        results[name] = {
+            "cpu_ms_per_frame": round(sum(r["cpu_ms"] for r in runs) / frames, 2),
+            "wall_ms_per_frame": round(sum(r["wall_ms"] for r in runs) / frames, 2),
+            "max_lag_us": round(max(r["max_lag_us"] for r in runs), 1),
+            "mean_lag_us": round(sum(r["mean_lag_us"] for r in runs) / frames, 2),
+        }
+        if isinstance(waiter, HybridWaiter):
+            results[name]["margin_us"] = waiter.margin_ns / 1000
+            results[name]["calibration"] = waiter.calibration
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibration de l'attente hybride sommeil/spin")
+    parser.add_argument("--frames", type=int, default=10, help="Trames NEC simulées par mode")
+    parser.add_argument("--json", action="store_true", help="Résultats en JSON")
+    args = parser.parse_args()
+
+    results = compare(args.frames)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    calibration = results["hybride"]["calibration"]
+    print(f"Dépassement de sleep: médian {calibration['median_ns'] / 1000:.0f}µs, "
+          f"p90 {calibration['p90_ns'] / 1000:.0f}µs, max {calibration['max_ns'] / 1000:.0f}µs "
+          f"-> marge {calibration['margin_ns'] / 1000:.0f}µs")
+    print(f"{'mode':<10} {'CPU/trame':>10} {'durée':>9} {'retard max':>11} {'moyen':>8}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['cpu_ms_per_frame']:8.2f}ms {r['wall_ms_per_frame']:7.2f}ms "
+              f"{r['max_lag_us']:9.1f}µs {r['mean_lag_us']:6.2f}µs")
+
+
+if __name__ == "__main__":
+    main()
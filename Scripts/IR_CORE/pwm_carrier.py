@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Porteuse 38 kHz matérielle (PWM) et enveloppe pilotée par logiciel
+
+En mode logiciel, send_ir_burst synthétise la porteuse en Python: deux
+écritures GPIO par période de 26,3 µs, soit des milliers d'écritures par
+trame NEC, un cœur bloqué en busy-wait et de la gigue à chaque période.
+
+Ici, un canal PWM matériel génère la porteuse en continu (sysfs,
+/sys/class/pwm); le logiciel ne fait que valider ou couper l'enveloppe aux
+67 fronts d'une trame NEC, de deux façons:
+- gate="pin": porte ET entre la sortie PWM et une broche de validation
+  (ex: 74LVC1G08, ou transistor de la LED commandé par les deux signaux);
+  une écriture GPIO par front
+- gate="enable": pas de matériel supplémentaire, le canal PWM est
+  activé/désactivé à chaque front (écriture dans `enable`); plus lent
+  (appel système), la sortie retombe à 0 quand le canal est désactivé
+
+Sur Raspberry Pi 5, `dtoverlay=pwm-2chan` dans /boot/firmware/config.txt
+route GPIO18/19 vers pwmchip0 canaux 2/3 (le pin IR n'est alors plus un
+GPIO: il ne doit pas être réservé avec gpio_claim_output).
+
+Exemples:
+    python pwm_carrier.py --bench --frames 20 --simulate     # sans matériel
+    python pwm_carrier.py --bench --gate-pin 23              # sur le Pi
+"""
+
+from typing import Dict, List, Optional, Sequence
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from precise_wait import default_waiter
+
+try:
+    import lgpio
+except ImportError:
+    lgpio = None
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYSFS_PWM = "/sys/class/pwm"
+
+
+class SysfsPwm:
+    """Canal PWM matériel via sysfs (export, période, rapport cyclique, activation)"""
+
+    def __init__(self, chip: int = 0, channel: int = 2, root: Optional[str] = None):
+        """
+        Args:
+            chip: Numéro de pwmchip
+            channel: Canal du pwmchip (GPIO18 = canal 2 sur Pi 5)
+            root: Racine sysfs (défaut: SYSFS_PWM; autre valeur pour la simulation)
+        """
+        root = root if root is not None else SYSFS_PWM
+        self.chip_path = os.path.join(root, f"pwmchip{chip}")
+        self.path = os.path.join(self.chip_path, f"pwm{channel}")
+        self.channel = channel
+        self._enable_fd: Optional[int] = None
+
+    def _write(self, name: str, value):
+        with open(os.path.join(self.path, name), "w") as f:
+            f.write(str(value))
+
+    def open(self, frequency: int, duty_cycle: float):
+        """
+        Exporte le canal et règle la porteuse (désactivée)
+
+        Raises:
+            RuntimeError: pwmchip absent (overlay PWM non chargé)
+        """
+        if not os.path.isdir(self.chip_path):
+            raise RuntimeError(f"{self.chip_path} absent: ajouter dtoverlay=pwm-2chan "
+                               "dans /boot/firmware/config.txt")
+        if not os.path.isdir(self.path):
+            with open(os.path.join(self.chip_path, "export"), "w") as f:
+                f.write(str(self.channel))
+            # udev applique les droits après l'export
+            for _ in range(50):
+                if os.access(os.path.join(self.path, "enable"), os.W_OK):
+                    break
+                time.sleep(0.01)
+        period_ns = round(1e9 / frequency)
+        self._write("enable", 0)
+        self._write("duty_cycle", 0)  # duty_cycle <= période à tout instant
+        self._write("period", period_ns)
+        self._write("duty_cycle", round(period_ns * duty_cycle))
+        self._enable_fd = os.open(os.path.join(self.path, "enable"), os.O_WRONLY)
+
+    def enable(self, on: bool):
+        # Fichier gardé ouvert: un pwrite par front, sans open/close
+        os.pwrite(self._enable_fd, b"1" if on else b"0", 0)
+
+    def close(self):
+        if self._enable_fd is not None:
+            self.enable(False)
+            os.close(self._enable_fd)
+            self._enable_fd = None
+
+
+class PwmCarrier:
+    """Émission d'un train d'impulsions: porteuse PWM, enveloppe logicielle"""
+
+    def __init__(self, handle: int, pwm: SysfsPwm, gate_pin: Optional[int] = None,
+                 frequency: int = 38000, duty_cycle: float = 0.33, gpio=None, waiter=None):
+        """
+        Args:
+            handle: Handle lgpio (gpiochip) de la télécommande
+            pwm: Canal PWM de la porteuse
+            gate_pin: Broche de validation (porte ET); None: gate="enable"
+            frequency: Fréquence de la porteuse
+            duty_cycle: Rapport cyclique de la porteuse
+            gpio: Module lgpio (ou RecordingGpio); défaut: lgpio
+            waiter: Attente des fronts (precise_wait.py); défaut: partagée, calibrée
+        """
+        self.gpio = gpio if gpio is not None else lgpio
+        self.waiter = waiter if waiter is not None else default_waiter()
+        self.h = handle
+        self.pwm = pwm
+        self.gate_pin = gate_pin
+        self.gate = "pin" if gate_pin is not None else "enable"
+        self.edges: List[int] = []  # instants réels (ns) des fronts de la dernière trame
+        pwm.open(frequency, duty_cycle)
+        if gate_pin is not None:
+            self.gpio.gpio_claim_output(handle, gate_pin, 0)
+            pwm.enable(True)  # Porteuse permanente, masquée par la porte ET
+
+    def _set(self, level: int):
+        if self.gate_pin is not None:
+            self.gpio.gpio_write(self.h, self.gate_pin, level)
+        else:
+            self.pwm.enable(bool(level))
+
+    def send(self, pulses: Sequence[int]) -> Dict[str, float]:
+        """
+        Émet le train (µs, [ON, OFF, ...]): une opération par front
+
+        Returns:
+            Durée (s), nombre d'opérations GPIO/PWM et retard max d'un front (s)
+        """
+        ops = 0
+        worst = 0
+        edges = self.edges = []
+        start = self.waiter.clock()
+        target = start
+        for i, duration in enumerate(pulses):
+            now = self.waiter.wait_until(target)
+            worst = max(worst, now - target)
+            edges.append(now)
+            self._set(1 if i % 2 == 0 else 0)
+            ops += 1
+            target += duration * 1000
+        now = self.waiter.wait_until(target)
+        if len(pulses) % 2 == 1:
+            edges.append(now)
+            self._set(0)
+            ops += 1
+        return {"elapsed_s": (self.waiter.clock() - start) / 1e9, "ops": ops,
+                "max_edge_lag_s": worst / 1e9}
+
+    def close(self):
+        if self.gate_pin is not None:
+            self.gpio.gpio_write(self.h, self.gate_pin, 0)
+        self.pwm.close()
+
+
+def simulated_sysfs(chip: int = 0, channel: int = 2) -> str:
+    """Arborescence sysfs factice (fichiers ordinaires) pour --simulate"""
+    root = tempfile.mkdtemp(prefix="pwm-sim-")
+    path = os.path.join(root, f"pwmchip{chip}", f"pwm{channel}")
+    os.makedirs(path)
+    for name in ("export", "unexport"):
+        open(os.path.join(root, f"pwmchip{chip}", name), "w").close()
+    for name in ("enable", "period", "duty_cycle"):
+        with open(os.path.join(path, name), "w") as f:
+            f.write("0")
+    return root
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def bench(frames: int, gate_pin: Optional[int], ir_pin: int = 18, command: str = "VOL_UP",
+          simulate: bool = False, pwm_chip: int = 0, pwm_channel: int = 2) -> Dict[str, object]:
+    """
+    Compare la précision d'enveloppe: porteuse logicielle vs PWM + enveloppe
+
+    Les écritures GPIO sont horodatées par la couche enregistreuse
+    (gpio_record.py); en mode PWM, les fronts sont ceux relevés par
+    PwmCarrier (valable aussi pour gate="enable"). En simulation rien
+    n'atteint le matériel et le sysfs PWM est un répertoire temporaire.
+    """
+    sys.path.insert(0, os.path.join(SCRIPTS_DIR, "IR_YAMAHA"))
+    import yamaha_remote_rpi
+    from gpio_record import RecordingGpio, edge_lateness, envelope, patched, planned_edges
+
+    recorder = RecordingGpio(None if simulate else yamaha_remote_rpi.lgpio)
+    root = simulated_sysfs(pwm_chip, pwm_channel) if simulate else SYSFS_PWM
+    gate = gate_pin if gate_pin is not None else (24 if simulate else None)
+    report: Dict[str, object] = {"frames": frames, "command": command, "simulate": simulate}
+    try:
+        with patched(yamaha_remote_rpi, recorder):
+            with contextlib.redirect_stdout(io.StringIO()):  # sortie --json intacte
+                remote = yamaha_remote_rpi.YamahaRemote(ir_pin)
+            pulses = remote.render_frames(command)[0]
+            modes = {}
+            for mode in ("software", "pwm"):
+                carrier = None
+                if mode == "pwm":
+                    carrier = PwmCarrier(remote.h, SysfsPwm(pwm_chip, pwm_channel, root), gate,
+                                         gpio=recorder)
+                lateness: List[float] = []
+                ops = cpu = 0.0
+                for _ in range(frames):
+                    recorder.clear()
+                    cpu_start = time.process_time()
+                    if carrier is None:
+                        remote.send_ir_signal(pulses)
+                    else:
+                        stats = carrier.send(pulses)
+                    cpu += time.process_time() - cpu_start
+                    if carrier is None:
+                        ops += recorder.writes()
+                        errors = edge_lateness(envelope(recorder.records, ir_pin), pulses)
+                    else:
+                        ops += stats["ops"]
+                        errors = [(t - carrier.edges[0]) - e
+                                  for t, e in zip(carrier.edges, planned_edges(pulses))]
+                    lateness += [abs(v) / 1000 for v in errors]
+                    time.sleep(0.108)
+                if carrier is not None:
+                    carrier.close()
+                lateness.sort()
+                modes[mode] = {
+                    "gpio_ops_per_frame": round(ops / frames, 1),
+                    "cpu_ms_per_frame": round(cpu * 1000 / frames, 2),
+                    "edge_error_us": {"p50": round(_percentile(lateness, 0.5), 2),
+                                      "p99": round(_percentile(lateness, 0.99), 2),
+                                      "max": round(lateness[-1], 2)} if lateness else None,
+                }
+            remote.cleanup()
+        report["modes"] = modes
+    finally:
+        if simulate:
+            shutil.rmtree(root, ignore_errors=True)
+    return report
+
+
+def print_bench(report: Dict[str, object]):
+    sim = " (simulation)" if report["simulate"] else ""
+    print(f"=== PORTEUSE: {report['command']}, {report['frames']} trames{sim} ===")
+    print(f"{'mode':<10} {'écritures/trame':>16} {'CPU/trame':>10} "
+          f"{'écart p50':>10} {'écart p99':>10} {'écart max':>10}")
+    for mode, r in report["modes"].items():
+        err = r["edge_error_us"] or {"p50": 0, "p99": 0, "max": 0}
+        print(f"{mode:<10} {r['gpio_ops_per_frame']:>16} {r['cpu_ms_per_frame']:8.2f}ms "
+              f"{err['p50']:8.2f}µs {err['p99']:8.2f}µs {err['max']:8.2f}µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Porteuse PWM matérielle, enveloppe logicielle")
+    parser.add_argument("--bench", action="store_true",
+                        help="Compare porteuse logicielle et PWM sur la précision d'enveloppe")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--command", default="VOL_UP", help="Commande Yamaha émise (défaut: VOL_UP)")
+    parser.add_argument("--pin", type=int, default=18, help="Pin IR (sortie PWM)")
+    parser.add_argument("--gate-pin", type=int, default=None,
+                        help="Broche de validation (porte ET); absente: activation du canal PWM")
+    parser.add_argument("--pwm-chip", type=int, default=0)
+    parser.add_argument("--pwm-channel", type=int, default=2)
+    parser.add_argument("--simulate", action="store_true",
+                        help="Sans matériel: GPIO enregistrés seulement, sysfs PWM factice")
+    parser.add_argument("--json", action="store_true", help="Sortie JSON")
+    args = parser.parse_args()
+
+    if not args.bench:
+        parser.print_help()
+        return
+    report = bench(args.frames, args.gate_pin, args.pin, args.command, args.simulate,
+                   args.pwm_chip, args.pwm_channel)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_bench(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Émission IR par flux de bits SPI (sans gigue d'ordonnancement)
+
+La trame, porteuse comprise, est rendue en un flux de bits suréchantillonné
+(38 kHz x 8 échantillons = horloge SPI de 304 kHz: un octet par période de
+porteuse) puis envoyée sur la broche MOSI en un seul transfert spidev, pris
+en charge par le DMA du contrôleur: le timing ne dépend plus du noyau.
+
+- chaque impulsion ON est un nombre entier de périodes de porteuse, phase
+  remise à zéro au début de l'impulsion; les fronts restent placés sur leur
+  instant absolu (arrondi à l'échantillon, 3,3 µs), sans dérive
+- le rendu est mis en cache par train d'impulsions (donc par commande)
+- decode() relit les octets produits en durées ON/OFF: le générateur se
+  vérifie hors ligne (--selftest), sans Raspberry Pi
+
+Câblage: LED IR (via transistor) sur MOSI, GPIO10 pour SPI0 (dtparam=spi=on).
+Une trame NEC fait ~2,6 Ko, sous la taille de tampon spidev par défaut
+(4096 octets); les trames d'une même commande sont envoyées séparément,
+séparées du gap NEC. Au-delà (suréchantillonnage plus fin), spidev découpe
+le transfert et peut insérer des trous: augmenter spidev.bufsiz dans
+/boot/firmware/cmdline.txt.
+
+Exemples:
+    python spi_bitstream.py --selftest
+    python spi_bitstream.py yamaha VOL+ --dry-run --decode
+    python spi_bitstream.py osram RED
+"""
+
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+import argparse
+import sys
+import time
+
+from ir_remotes import REMOTE_TYPES, offline_remote
+
+try:
+    import spidev
+except ImportError:  # Rendu et décodage hors ligne sans spidev
+    spidev = None
+
+CARRIER_HZ = 38000
+SAMPLES_PER_CYCLE = 8
+SPIDEV_BUFSIZ = "/sys/module/spidev/parameters/bufsiz"
+DUTY_CYCLE = 0.33
+NEC_FRAME_GAP_S = 0.108
+
+
+def _cycle_pattern(samples_per_cycle: int, duty_cycle: float) -> str:
+    ones = max(1, min(samples_per_cycle - 1, round(samples_per_cycle * duty_cycle)))
+    return "1" * ones + "0" * (samples_per_cycle - ones)
+
+
+@lru_cache(maxsize=256)
+def render(pulses: Tuple[int, ...], carrier_hz: int = CARRIER_HZ,
+           samples_per_cycle: int = SAMPLES_PER_CYCLE, duty_cycle: float = DUTY_CYCLE) -> bytes:
+    """
+    Flux de bits SPI (MSB en premier) d'un train d'impulsions
+
+    Args:
+        pulses: Durées en µs [ON, OFF, ON, ...] (tuple: clé du cache)
+        carrier_hz: Fréquence de la porteuse
+        samples_per_cycle: Échantillons par période (horloge SPI = produit)
+        duty_cycle: Rapport cyclique (arrondi à l'échantillon)
+
+    Returns:
+        Octets à transférer, complétés par des zéros jusqu'à l'octet entier
+    """
+    rate = carrier_hz * samples_per_cycle
+    cycle = _cycle_pattern(samples_per_cycle, duty_cycle)
+    chunks: List[str] = []
+    position = 0  # échantillons déjà écrits
+    t_us = 0
+    for i, duration in enumerate(pulses):
+        start = round(t_us * rate / 1e6)
+        t_us += duration
+        if i % 2 == 1 or duration <= 0:
+            continue
+        end = round(t_us * rate / 1e6)
+        if start > position:
+            chunks.append("0" * (start - position))
+            position = start
+        cycles = max(1, round((end - position) / samples_per_cycle))
+        chunks.append(cycle * cycles)
+        position += cycles * samples_per_cycle
+    total = max(position, round(t_us * rate / 1e6))
+    total += -total % 8
+    chunks.append("0" * (total - position))
+    bits = "".join(chunks)
+    return int(bits, 2).to_bytes(total // 8, "big") if bits else b""
+
+
+def decode(data: bytes, carrier_hz: int = CARRIER_HZ,
+           samples_per_cycle: int = SAMPLES_PER_CYCLE) -> List[int]:
+    """
+    Relit un flux de bits en durées µs [ON, OFF, ON, ...]
+
+    Une impulsion commence au premier échantillon à 1 et se termine à la fin
+    de la dernière période de porteuse qui contient un 1; un silence plus
+    long qu'une période sépare deux impulsions.
+    """
+    bits = bin(int.from_bytes(data, "big"))[2:].zfill(len(data) * 8) if data else ""
+    sample_us = 1e6 / (carrier_hz * samples_per_cycle)
+    edges: List[int] = []  # échantillons de début et de fin des impulsions
+    index = bits.find("1")
+    while index != -1:
+        start = index
+        last = index
+        while True:
+            following = bits.find("1", last + 1)
+            if following == -1 or following - last > samples_per_cycle:
+                break
+            last = following
+        # Fin de la période entamée par le dernier front montant
+        cycle_start = start + ((last - start) // samples_per_cycle) * samples_per_cycle
+        edges += [start, cycle_start + samples_per_cycle]
+        index = following
+    return [round((b - a) * sample_us) for a, b in zip(edges, edges[1:])]
+
+
+def max_error_us(pulses: Sequence[int], data: bytes, carrier_hz: int = CARRIER_HZ,
+                 samples_per_cycle: int = SAMPLES_PER_CYCLE) -> float:
+    """Plus grand écart (µs) entre un front décodé et le front prévu"""
+    decoded = decode(data, carrier_hz, samples_per_cycle)
+    if len(decoded) != len(pulses):
+        return float("inf")
+    worst = 0.0
+    planned = actual = 0
+    for expected, got in zip(pulses, decoded):
+        planned += expected
+        actual += got
+        worst = max(worst, abs(actual - planned))
+    return worst
+
+
+class SpiTransmitter:
+    """Émetteur IR sur MOSI: même interface que les télécommandes (send_ir_signal)"""
+
+    def __init__(self, bus: int = 0, device: int = 0, carrier_hz: int = CARRIER_HZ,
+                 samples_per_cycle: int = SAMPLES_PER_CYCLE, duty_cycle: float = DUTY_CYCLE):
+        """
+        Args:
+            bus: Bus SPI (/dev/spidev<bus>.<device>)
+            device: Chip select
+            carrier_hz: Fréquence de la porteuse
+            samples_per_cycle: Suréchantillonnage (horloge SPI = carrier_hz x samples)
+            duty_cycle: Rapport cyclique de la porteuse
+        """
+        if spidev is None:
+            raise RuntimeError("spidev requis pour émettre (sudo apt install python3-spidev)")
+        self.carrier_hz = carrier_hz
+        self.samples_per_cycle = samples_per_cycle
+        self.duty_cycle = duty_cycle
+        self.spi = spidev.SpiDev()
+        self.spi.open(bus, device)
+        self.spi.mode = 0
+        self.spi.max_speed_hz = carrier_hz * samples_per_cycle
+        try:
+            with open(SPIDEV_BUFSIZ, "r") as f:
+                self.bufsiz = int(f.read())
+        except (OSError, ValueError):
+            self.bufsiz = 4096
+
+    def send_ir_signal(self, pulses: Sequence[int]):
+        """Un transfert SPI par train (rendu mis en cache)"""
+        data = render(tuple(pulses), self.carrier_hz, self.samples_per_cycle, self.duty_cycle)
+        if len(data) > self.bufsiz:
+            print(f"Attention: {len(data)} octets > spidev.bufsiz ({self.bufsiz}), "
+                  "transfert découpé")
+        self.spi.writebytes2(data)
+
+    def send_frames(self, frames: Sequence[Sequence[int]]):
+        """Trames d'une commande, séparées du gap NEC"""
+        for n, frame in enumerate(frames):
+            if n:
+                time.sleep(NEC_FRAME_GAP_S)
+            self.send_ir_signal(frame)
+
+    def close(self):
+        self.spi.close()
+
+
+def selftest() -> bool:
+    """Rendu puis décodage de toutes les commandes des deux codebooks"""
+    ok = True
+    for remote_type in REMOTE_TYPES:
+        encoder = offline_remote(remote_type)
+        worst = 0.0
+        start = time.perf_counter()
+        for name in encoder.commands:
+            for frame in encoder.render_frames(name):
+                error = max_error_us(frame, render(tuple(frame)))
+                worst = max(worst, error)
+                if error > 1e6 / CARRIER_HZ:
+                    ok = False
+                    print(f"  {remote_type} {name}: écart {error}µs")
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{remote_type}: {len(encoder.commands)} commandes, écart max {worst:.0f}µs "
+              f"(tolérance une période, {1e6 / CARRIER_HZ:.1f}µs), {elapsed:.1f}ms")
+    print("Auto-test " + ("réussi" if ok else "ÉCHOUÉ"))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Émission IR par flux de bits SPI")
+    parser.add_argument("remote", nargs="?", choices=REMOTE_TYPES)
+    parser.add_argument("command", nargs="?")
+    parser.add_argument("--bus", type=int, default=0)
+    parser.add_argument("--device", type=int, default=0)
+    parser.add_argument("--samples", type=int, default=SAMPLES_PER_CYCLE,
+                        help="Échantillons par période de porteuse (défaut: 8)")
+    parser.add_argument("--dry-run", action="store_true", help="Rendu sans émettre")
+    parser.add_argument("--decode", action="store_true", help="Affiche le train décodé du flux")
+    parser.add_argument("--selftest", action="store_true",
+                        help="Vérifie rendu + décodage de toutes les commandes (hors ligne)")
+    args = parser.parse_args()
+
+    if args.selftest:
+        sys.exit(0 if selftest() else 1)
+    if not args.remote or not args.command:
+        parser.error("télécommande et commande requises (ou --selftest)")
+
+    encoder = offline_remote(args.remote)
+    frames = encoder.render_frames(args.command)
+    if frames is None:
+        parser.error(f"Commande {args.remote} inconnue: {args.command}")
+    for frame in frames:
+        start = time.perf_counter()
+        data = render(tuple(frame), samples_per_cycle=args.samples)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"Trame: {len(frame)} impulsions, {sum(frame) / 1000:.1f}ms -> {len(data)} octets "
+              f"à {CARRIER_HZ * args.samples / 1000:.0f} kHz (rendu {elapsed:.2f}ms), "
+              f"écart max {max_error_us(frame, data, samples_per_cycle=args.samples):.0f}µs")
+        if args.decode:
+            print(f"  prévu:   {list(frame[:12])}...")
+            print(f"  décodé:  {decode(data, samples_per_cycle=args.samples)[:12]}...")
+    if args.dry_run:
+        return
+    transmitter = SpiTransmitter(args.bus, args.device, samples_per_cycle=args.samples)
+    try:
+        transmitter.send_frames(frames)
+    finally:
+        transmitter.close()
+    print(f"Émis sur /dev/spidev{args.bus}.{args.device}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,112 +6,101 @@ Utilise lgpio avec timing ameliore pour compatibilite Arduino
 Base sur les codes IR reverse-engineered des ampoules Osram LED Star+ RGBW
 """
 
-import lgpio
 import time
+_T0 = time.perf_counter()  # Origine du profilage (--profile), avant les imports
+
+try:
+    import lgpio
+except ImportError:  # Encodage seul (init_gpio=False, --dry-run des scenes) hors Raspberry Pi
+    lgpio = None
+import asyncio
+import os
 import sys
 import threading
 from typing import Dict, Optional
 
+_COMMON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "COMMON")
+if _COMMON not in sys.path:
+    sys.path.insert(0, _COMMON)
+_IR_CORE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "IR_CORE")
+if _IR_CORE not in sys.path:
+    sys.path.insert(0, _IR_CORE)
+
+from animation import Animation, AnimationPlayer, Step, print_report
+from arduino_link import ArduinoError, ArduinoLink
+from codebook import install_completer, load_codebook
+from hold_keys import HOLD_DELAY_S, run_hold_mode
+from ir_async import shared_transmitter
+from ir_remotes import IR_CPU_SECONDS, IR_ERRORS, IR_FRAMES, IR_OVERRUN_SECONDS, IR_TRANSMIT_SECONDS
+from precise_wait import default_waiter
+from pwm_carrier import PwmCarrier, SysfsPwm
+from profiling import NULL_PROFILER, PhaseProfiler
+
+
 class OsramRGBWRemote:
-    def __init__(self, ir_pin: int = 18):
+    # Mode touches: touche (caractere ou fleche) -> commande
+    HOLD_KEYS = {
+        'UP': 'BRIGHT+', '+': 'BRIGHT+', 'DOWN': 'BRIGHT-', '-': 'BRIGHT-',
+        'o': 'ON', 'f': 'OFF', 'r': 'RED', 'g': 'GREEN', 'b': 'BLUE', 'w': 'WHITE',
+        'm': 'MODE', 's': 'SMOOTH',
+    }
+    
+    def __init__(self, ir_pin: int = 18, init_gpio: bool = True,
+                 pwm_carrier: Optional[dict] = None, arduino: Optional[dict] = None):
         """
         Initialise la telecommande Osram RGBW
         
         Args:
             ir_pin: Pin GPIO pour la LED IR (defaut: 18)
+            init_gpio: False pour n'utiliser que l'encodage (pin non reserve)
+            pwm_carrier: Porteuse PWM materielle {gate_pin, chip, channel}
+                (voir use_pwm_carrier), None: porteuse logicielle
+            arduino: Emission deleguee a un Arduino {port, baud} (voir
+                use_arduino); le GPIO n'est alors pas reserve
         """
         self.ir_pin = ir_pin
         self.h = None
-        self.OSRAM_ADDRESS = 0x00  # L'adresse est ignoree par les ampoules Osram
-        
-        # Dictionnaire des commandes Osram RGBW (codes hexadecimaux)
-        # Base sur l'analyse des telecommandes Osram RGBW 24 touches
-        self.commands = {
-            # Controles principaux
-            'ON': 0x07,
-            'OFF': 0x06,
-            'BRIGHT_UP': 0x00,
-            'BRIGHT_DOWN': 0x02,
-            
-            # Couleurs principales
-            'RED': 0x08,
-            'GREEN': 0x09,
-            'BLUE': 0x0A,
-            'WHITE': 0x03,
-            
-            # Couleurs etendues - Rangee 1
-            'RED1': 0x0C,
-            'GREEN1': 0x0D,
-            'BLUE1': 0x0E,
-            'FLASH': 0x0F,
-            
-            # Couleurs etendues - Rangee 2  
-            'RED2': 0x10,
-            'GREEN2': 0x11,
-            'BLUE2': 0x12,
-            'STROBE': 0x13,
-            
-            # Couleurs etendues - Rangee 3
-            'RED3': 0x14,
-            'GREEN3': 0x15,
-            'BLUE3': 0x16,
-            'SMOOTH': 0x17,
-            
-            # Couleurs etendues - Rangee 4
-            'RED4': 0x18,
-            'GREEN4': 0x19,
-            'BLUE4': 0x1A,
-            'MODE': 0x1B
-        }
-        
-        # Aliases pour faciliter l'utilisation
-        self.aliases = {
-            'POWER_ON': 'ON',
-            'POWER_OFF': 'OFF',
-            'POWER': 'ON',  # Par defaut ON, utilisateur peut specifier OFF
-            'BRIGHT+': 'BRIGHT_UP',
-            'BRIGHT-': 'BRIGHT_DOWN',
-            'BRIGHTER': 'BRIGHT_UP',
-            'DIMMER': 'BRIGHT_DOWN',
-            'LIGHT_UP': 'BRIGHT_UP',
-            'LIGHT_DOWN': 'BRIGHT_DOWN',
-            
-            # Couleurs principales
-            'R': 'RED',
-            'G': 'GREEN',
-            'B': 'BLUE',
-            'W': 'WHITE',
-            
-            # Effets
-            'BLINK': 'FLASH',
-            'STROBOSCOPE': 'STROBE',
-            'TRANSITION': 'FADE',
-            'GRADUAL': 'SMOOTH',
-            
-            # Couleurs numerotees alternatives
-            'ORANGE': 'RED1',
-            'CYAN': 'BLUE1', 
-            'PURPLE': 'RED2',
-            'YELLOW': 'GREEN2',
-            'PINK': 'RED3',
-            'LIME': 'GREEN3',
-            'VIOLET': 'BLUE3',
-            'MAGENTA': 'RED4'
-        }
-        
-        self.init_gpio()
+        self.carrier = None
+        self.arduino = None
+        if arduino is not None:
+            init_gpio = False
+        
+        # Codes, alias et table de recherche partages (IR_CORE/codebooks.json),
+        # construits une fois par processus
+        self.codebook = load_codebook("osram")
+        self.OSRAM_ADDRESS = self.codebook.address
+        self.commands = self.codebook.commands
+        self.aliases = self.codebook.aliases
+        
+        self._m_frames = IR_FRAMES.labels("osram", ir_pin)
+        self._m_seconds = IR_TRANSMIT_SECONDS.labels("osram", ir_pin)
+        self._m_overrun = IR_OVERRUN_SECONDS.labels("osram", ir_pin)
+        self._m_cpu = IR_CPU_SECONDS.labels("osram", ir_pin)
+        self._m_errors = IR_ERRORS.labels("osram", ir_pin)
+        self.waiter = None
+        self.last_cpu_s = 0.0
+        if init_gpio:
+            self.init_gpio()
         
         # Optimisations timing identiques au code Yamaha
         self.carrier_freq = 38000
         self.duty_cycle = 0.33  # 33% comme Arduino
+        if pwm_carrier is not None and init_gpio:
+            self.use_pwm_carrier(**pwm_carrier)
+        if arduino is not None:
+            self.use_arduino(**arduino)
         
     def init_gpio(self):
         """Initialise la connexion GPIO avec lgpio"""
         try:
+            if lgpio is None:
+                raise RuntimeError("module lgpio absent")
             self.h = lgpio.gpiochip_open(0)  # Chip 0 pour Pi 5
             
             # Configure le pin en sortie avec priorite haute
             lgpio.gpio_claim_output(self.h, self.ir_pin, 0)
+            # Marge sommeil/spin des espaces OFF, calibree une fois par processus
+            self.waiter = default_waiter()
             
             print(f"GPIO initialise avec lgpio - Pin IR: {self.ir_pin}")
             
@@ -177,6 +166,34 @@ class OsramRGBWRemote:
             data.append(560)  # OFF supplementaire
         return data
     
+    def use_pwm_carrier(self, gate_pin: Optional[int] = None, chip: int = 0, channel: int = 2):
+        """
+        Porteuse generee par un canal PWM materiel, le logiciel ne pilote plus
+        que l'enveloppe (67 fronts par trame au lieu de milliers d'ecritures)
+        Le pin IR devient la sortie PWM: sa reservation GPIO est liberee
+        
+        Args:
+            gate_pin: Broche de validation (porte ET), None: activation du canal PWM
+            chip: pwmchip sysfs
+            channel: Canal PWM (GPIO18 = canal 2 sur Pi 5, dtoverlay=pwm-2chan)
+        """
+        lgpio.gpio_free(self.h, self.ir_pin)
+        self.carrier = PwmCarrier(self.h, SysfsPwm(chip, channel), gate_pin,
+                                  self.carrier_freq, self.duty_cycle, gpio=lgpio)
+        print(f"Porteuse PWM materielle: pwmchip{chip}/pwm{channel}, enveloppe par "
+              f"{'gpio ' + str(gate_pin) if gate_pin is not None else 'activation du canal'}")
+    
+    def use_arduino(self, port: str, baud: int = 115200):
+        """
+        Delegue l'emission a un Arduino (IR_CORE/arduino_link.py): send_command
+        et send envoient adresse et commande, le firmware gere le timing
+        
+        Args:
+            port: Port serie (/dev/ttyACM0)
+            baud: Debit du firmware
+        """
+        self.arduino = ArduinoLink(port, baud)
+    
     def send_ir_burst(self, duration_us: int):
         """
         Genere une rafale IR modulee a 38kHz avec duty cycle correct
@@ -225,6 +242,33 @@ class OsramRGBWRemote:
         Args:
             pulses: Liste des durees des impulsions (microsecondes)
         """
+        if self.arduino is not None:
+            # Emission deleguee (mode touches, repetitions): train redecode en NEC
+            try:
+                self.arduino.send_pulses(pulses).result()
+            except (ArduinoError, ValueError) as e:
+                self._m_errors.inc()
+                print(f"Erreur Arduino: {e}")
+                return
+            self._m_frames.inc()
+            return
+        
+        cpu_start = time.thread_time_ns()
+        if self.carrier is not None:
+            # Porteuse materielle: seuls les fronts d'enveloppe sont emis
+            try:
+                stats = self.carrier.send(pulses)
+            except Exception as e:
+                self._m_errors.inc()
+                print(f"Erreur lors de l'envoi IR: {e}")
+                return
+            self._m_frames.inc()
+            self._m_seconds.observe(stats["elapsed_s"])
+            self._m_overrun.observe(max(0.0, stats["elapsed_s"] - sum(pulses) / 1e6))
+            self.last_cpu_s = (time.thread_time_ns() - cpu_start) / 1e9
+            self._m_cpu.observe(self.last_cpu_s)
+            return
+        
         try:
             # Augmentation de priorite du processus
             import os
@@ -233,7 +277,8 @@ class OsramRGBWRemote:
             except:
                 pass  # Ignore si pas de droits sudo
             
-            start_time = time.time_ns()
+            waiter = self.waiter or default_waiter()
+            start_time = waiter.clock()
             
             for i, duration in enumerate(pulses):
                 if i % 2 == 0:  # Impulsion ON (modulee a 38kHz)
@@ -242,15 +287,50 @@ class OsramRGBWRemote:
                     lgpio.gpio_write(self.h, self.ir_pin, 0)
                     # Delai precis
                     target_time = start_time + sum(pulses[:i+1]) * 1000
-                    while time.time_ns() < target_time:
-                        pass
+                    waiter.wait_until(target_time)
             
             # Final OFF state
             lgpio.gpio_write(self.h, self.ir_pin, 0)
+            elapsed = (waiter.clock() - start_time) / 1e9
+            self.last_cpu_s = (time.thread_time_ns() - cpu_start) / 1e9
+            self._m_cpu.observe(self.last_cpu_s)
+            self._m_frames.inc()
+            self._m_seconds.observe(elapsed)
+            self._m_overrun.observe(max(0.0, elapsed - sum(pulses) / 1e6))
             
         except Exception as e:
+            self._m_errors.inc()
             print(f"Erreur lors de l'envoi IR: {e}")
     
+    def resolve_command(self, command_name: str) -> str:
+        """
+        Resout un alias vers le nom canonique de la commande
+        
+        Args:
+            command_name: Nom ou alias (insensible a la casse)
+            
+        Returns:
+            Nom canonique (a verifier dans self.commands)
+        """
+        return self.codebook.resolve(command_name)
+    
+    def render_frames(self, command_name: str, repeat_count: int = 0) -> Optional[list]:
+        """
+        Pre-calcule les trames d'une commande, sans emettre
+        
+        Args:
+            command_name: Nom ou alias de la commande
+            repeat_count: Nombre de repetitions
+            
+        Returns:
+            Liste de trames (listes d'impulsions), None si commande inconnue
+        """
+        code = self.codebook.get(command_name)
+        if code is None:
+            return None
+        pulses = self.nec_encode(code.address, code.command)
+        return [pulses] * (1 + repeat_count)
+    
     def send_command(self, command_name: str, repeat_count: int = 0):
         """
         Envoie une commande IR Osram
@@ -260,21 +340,26 @@ class OsramRGBWRemote:
             repeat_count: Nombre de repetitions (pour maintenir une couleur)
         """
         # Resout les aliases
-        if command_name.upper() in self.aliases:
-            command_name = self.aliases[command_name.upper()]
-        else:
-            command_name = command_name.upper()
+        code = self.codebook.get(command_name)
         
-        if command_name not in self.commands:
-            print(f"Commande inconnue: {command_name}")
+        if code is None:
+            print(f"Commande inconnue: {command_name.strip().upper()}")
             return False
         
-        command_code = self.commands[command_name]
+        print(f"Envoi: {code.name} (Address=0x{code.address:02X}, Command=0x{code.command:02X})")
         
-        print(f"Envoi: {command_name} (Address=0x{self.OSRAM_ADDRESS:02X}, Command=0x{command_code:02X})")
+        if self.arduino is not None:
+            # Emission deleguee: timing et repetitions assures par le firmware
+            try:
+                result = self.arduino.submit(code.address, code.command, repeat_count).result()
+            except ArduinoError as e:
+                print(f"Erreur Arduino: {e}")
+                return False
+            print(f"  Emise par l'Arduino (ACK {result['ack_ms']}ms, fin {result['done_ms']}ms)")
+            return True
         
         # Encode et envoie
-        pulses = self.nec_encode(self.OSRAM_ADDRESS, command_code)
+        pulses = self.nec_encode(code.address, code.command)
         
         # Debug: affiche le timing total
         total_time = sum(pulses) / 1000  # en millisecondes
@@ -290,6 +375,30 @@ class OsramRGBWRemote:
         
         return True
     
+    async def send(self, command_name: str, repeat_count: int = 0) -> int:
+        """
+        Version asyncio de send_command: les trames pre-calculees partent sur
+        le thread d'emission du pin (IR_CORE/ir_async.py), la boucle asyncio
+        n'est pas bloquee
+        
+        Args:
+            command_name: Nom ou alias de la commande
+            repeat_count: Nombre de repetitions
+            
+        Returns:
+            Nombre de trames emises (moins si l'attente a ete annulee)
+            
+        Raises:
+            KeyError: Commande inconnue
+        """
+        frames = self.render_frames(command_name, repeat_count)
+        if frames is None:
+            raise KeyError(f"Commande inconnue: {command_name}")
+        if self.arduino is not None:
+            await asyncio.wrap_future(self.arduino.send_command(self, command_name, repeat_count))
+            return len(frames)
+        return await shared_transmitter().send(self, frames)
+    
     def send_nec_repeat(self, times: int = 1):
         """
         Envoie un signal de repetition NEC
@@ -304,74 +413,95 @@ class OsramRGBWRemote:
             self.send_ir_signal(repeat_pulses)
             time.sleep(0.108)  # 108ms gap
     
-    def demo_sequence(self):
-        """Sequence de demonstration des couleurs Osram RGBW"""
-        print("=== DEMONSTRATION OSRAM RGBW ===")
+    def key_mode(self, hold_delay: float = HOLD_DELAY_S):
+        """
+        Mode touches: appui maintenu = trame puis repetitions NEC (IR_CORE/hold_keys.py)
         
-        print("\n1. Allumage de l'ampoule...")
-        self.send_command('ON')
-        time.sleep(2)
+        Args:
+            hold_delay: Delai d'auto-repetition du clavier en secondes
+        """
+        try:
+            run_hold_mode(self, self.HOLD_KEYS, hold_delay)
+        except RuntimeError as e:
+            print(f"Erreur: {e}")
+    
+    def demo_sequence(self, policy: str = 'skip'):
+        """
+        Sequence de demonstration des couleurs Osram RGBW
         
-        print("\n2. Test des couleurs principales...")
-        colors = ['RED', 'GREEN', 'BLUE', 'WHITE']
-        for color in colors:
-            print(f"   Couleur: {color}")
-            self.send_command(color)
-            time.sleep(1.5)
-        
-        print("\n3. Test luminosite...")
-        self.send_command('BRIGHT_UP')
-        time.sleep(1)
-        self.send_command('BRIGHT_DOWN')
-        time.sleep(1)
-        
-        print("\n4. Test des effets...")
-        effects = ['FLASH', 'STROBE', 'FADE', 'SMOOTH']
-        for effect in effects:
-            print(f"   Effet: {effect}")
-            self.send_command(effect)
-            time.sleep(3)
-        
-        print("\n5. Retour au blanc...")
-        self.send_command('WHITE')
-        time.sleep(2)
-        
-        print("\n6. Extinction...")
-        self.send_command('OFF')
+        Args:
+            policy: Comportement en retard ('skip' ou 'compress', voir IR_CORE/animation.py)
+        """
+        print("=== DEMONSTRATION OSRAM RGBW ===")
         
+        # Echeances absolues depuis le depart (memes durees que l'ancienne sequence)
+        steps = [Step(0.0, 'ON', "\n1. Allumage de l'ampoule...", required=True)]
+        colors = ['RED', 'GREEN', 'BLUE', 'WHITE']
+        for i, color in enumerate(colors):
+            label = f"   Couleur: {color}"
+            if i == 0:
+                label = "\n2. Test des couleurs principales...\n" + label
+            steps.append(Step(2.0 + 1.5 * i, color, label))
+        steps.append(Step(8.0, 'BRIGHT_UP', "\n3. Test luminosite..."))
+        steps.append(Step(9.0, 'BRIGHT_DOWN'))
+        effects = ['FLASH', 'STROBE', 'SMOOTH', 'MODE']
+        for i, effect in enumerate(effects):
+            label = f"   Effet: {effect}"
+            if i == 0:
+                label = "\n4. Test des effets...\n" + label
+            steps.append(Step(10.0 + 3.0 * i, effect, label))
+        steps.append(Step(22.0, 'WHITE', "\n5. Retour au blanc...", required=True))
+        steps.append(Step(24.0, 'OFF', "\n6. Extinction...", required=True))
+        
+        report = AnimationPlayer(self).play(Animation("demo", steps), policy)
         print("\nDemonstration terminee.")
+        print_report(report)
+        return report
     
-    def color_cycle(self, duration: int = 30):
+    def color_cycle(self, duration: int = 30, period: float = 2.0, policy: str = 'skip'):
         """
-        Cycle automatique de couleurs
+        Cycle automatique de couleurs, cadence sur des echeances absolues
+        (la duree d'emission ne s'accumule pas, la derniere couleur ne
+        deborde pas de `duration`)
         
         Args:
             duration: Duree du cycle en secondes
+            period: Secondes par couleur
+            policy: Comportement en retard ('skip' ou 'compress')
         """
         print(f"=== CYCLE DE COULEURS ({duration}s) ===")
         
-        # Allume l'ampoule
-        self.send_command('ON')
-        time.sleep(1)
-        
         # Liste des couleurs pour le cycle
         colors = ['RED', 'RED1', 'RED2', 'RED3', 'RED4',
                  'GREEN', 'GREEN1', 'GREEN2', 'GREEN3', 'GREEN4',
                  'BLUE', 'BLUE1', 'BLUE2', 'BLUE3', 'BLUE4',
                  'WHITE']
         
-        start_time = time.time()
-        color_index = 0
-        
-        while (time.time() - start_time) < duration:
-            color = colors[color_index]
-            print(f"Couleur: {color}")
-            self.send_command(color)
-            
-            time.sleep(2)  # 2 secondes par couleur
-            color_index = (color_index + 1) % len(colors)
+        # Allume l'ampoule, premiere couleur 1s apres
+        cycle = Animation.cycle(colors, period, duration, start=1.0)
+        steps = [Step(0.0, 'ON', "Allumage", required=True)] + cycle.steps
+        report = AnimationPlayer(self).play(Animation("cycle", steps, duration), policy)
         
         print("Cycle termine.")
+        print_report(report)
+        return report
+    
+    def fade(self, direction: str = 'DOWN', count: int = 5, duration: float = 5.0,
+             policy: str = 'skip'):
+        """
+        Fondu par paliers de luminosite (les ampoules n'ont pas de code FADE)
+        
+        Args:
+            direction: 'UP' ou 'DOWN'
+            count: Nombre de paliers
+            duration: Duree totale du fondu en secondes
+            policy: Comportement en retard ('skip' ou 'compress')
+        """
+        command = 'BRIGHT_UP' if direction.upper() == 'UP' else 'BRIGHT_DOWN'
+        print(f"=== FONDU {direction.upper()} ({count} paliers, {duration}s) ===")
+        report = AnimationPlayer(self).play(Animation.fade(command, count, duration), policy)
+        print_report(report)
+        return report
     
     def debug_signal(self, command_name: str):
         """
@@ -380,22 +510,19 @@ class OsramRGBWRemote:
         Args:
             command_name: Commande a debugger
         """
-        if command_name.upper() in self.aliases:
-            command_name = self.aliases[command_name.upper()]
-        else:
-            command_name = command_name.upper()
+        code = self.codebook.get(command_name)
         
-        if command_name not in self.commands:
-            print(f"Commande inconnue: {command_name}")
+        if code is None:
+            print(f"Commande inconnue: {command_name.strip().upper()}")
             return
         
-        command_code = self.commands[command_name]
-        pulses = self.nec_encode(self.OSRAM_ADDRESS, command_code)
+        command_code = code.command
+        pulses = self.nec_encode(code.address, command_code)
         
-        print(f"\n=== DEBUG: {command_name} ===")
-        print(f"Address: 0x{self.OSRAM_ADDRESS:02X} ({self.OSRAM_ADDRESS:08b})")
+        print(f"\n=== DEBUG: {code.name} ===")
+        print(f"Address: 0x{code.address:02X} ({code.address:08b})")
         print(f"Command: 0x{command_code:02X} ({command_code:08b})")
-        print(f"~Address: 0x{(~self.OSRAM_ADDRESS)&0xFF:02X}")
+        print(f"~Address: 0x{(~code.address)&0xFF:02X}")
         print(f"~Command: 0x{(~command_code)&0xFF:02X}")
         print(f"Nombre d'impulsions: {len(pulses)}")
         print(f"Duree totale: {sum(pulses)/1000:.1f}ms")
@@ -409,8 +536,7 @@ class OsramRGBWRemote:
             print("  ...")
         
         # Calcule et affiche le code NEC complet
-        nec_code = (self.OSRAM_ADDRESS << 24) | ((~self.OSRAM_ADDRESS & 0xFF) << 16) | (command_code << 8) | (~command_code & 0xFF)
-        print(f"Code NEC complet: 0x{nec_code:08X}")
+        print(f"Code NEC complet: 0x{code.word:08X}")
     
     def print_help(self):
         """Affiche l'aide"""
@@ -436,13 +562,15 @@ class OsramRGBWRemote:
         print("EFFETS LUMINEUX:")
         print("  FLASH/BLINK    - Clignotement rapide")
         print("  STROBE         - Effet stroboscope")
-        print("  FADE           - Transition douce")
-        print("  SMOOTH         - Changement graduel")
+        print("  SMOOTH/GRADUAL - Changement graduel")
+        print("  FADE UP|DOWN [duree] - Fondu par paliers de luminosite")
+        print("  MODE           - Changement de mode")
         print("")
         print("COMMANDES SPECIALES:")
         print("  DEMO           - Demonstration complete")
         print("  CYCLE [duree]  - Cycle de couleurs")
         print("  DEBUG <cmd>    - Debug d'une commande")
+        print("  KEYS           - Mode touches (maintenir = repeter)")
         print("  HELP           - Cette aide")
         print("  QUIT/EXIT      - Quitter")
         print("=========================================\n")
@@ -453,7 +581,8 @@ class OsramRGBWRemote:
         print("Compatible avec ampoules Osram LED Star+ RGBW")
         print("Protocole NEC optimise pour Raspberry Pi 5")
         print("Tapez 'HELP' pour voir les commandes disponibles")
-        print("Tapez 'QUIT' ou 'EXIT' pour quitter")
+        print("Tapez 'QUIT' ou 'EXIT' pour quitter (Tab complete les commandes)")
+        install_completer(self.codebook, ['HELP', 'QUIT', 'EXIT', 'DEMO', 'CYCLE', 'FADE', 'DEBUG', 'KEYS'])
         
         while True:
             try:
@@ -478,6 +607,17 @@ class OsramRGBWRemote:
                         except ValueError:
                             print("Duree invalide, utilisation de 30s par defaut")
                     self.color_cycle(duration)
+                elif cmd_parts[0].upper() == 'FADE':
+                    direction = cmd_parts[1] if len(cmd_parts) > 1 else 'DOWN'
+                    duration = 5.0
+                    if len(cmd_parts) > 2:
+                        try:
+                            duration = float(cmd_parts[2])
+                        except ValueError:
+                            print("Duree invalide, utilisation de 5s par defaut")
+                    self.fade(direction, duration=duration)
+                elif cmd_parts[0].upper() == 'KEYS':
+                    self.key_mode()
                 elif cmd_parts[0].upper() == 'DEBUG':
                     if len(cmd_parts) > 1:
                         self.debug_signal(cmd_parts[1])
@@ -499,12 +639,19 @@ class OsramRGBWRemote:
     
     def cleanup(self):
         """Nettoie les ressources"""
+        if self.arduino is not None:
+            self.arduino.close()
         if self.h is not None:
-            lgpio.gpio_write(self.h, self.ir_pin, 0)
+            if self.carrier is not None:
+                self.carrier.close()
+            else:
+                lgpio.gpio_write(self.h, self.ir_pin, 0)
             lgpio.gpiochip_close(self.h)
 
 # Fonctions utilitaires
-def send_single_command(command: str, ir_pin: int = 18, repeat_count: int = 0):
+def send_single_command(command: str, ir_pin: int = 18, repeat_count: int = 0,
+                        profiler=NULL_PROFILER, pwm_carrier: Optional[dict] = None,
+                        arduino: Optional[dict] = None):
     """
     Envoie une seule commande et quitte
     
@@ -512,12 +659,21 @@ def send_single_command(command: str, ir_pin: int = 18, repeat_count: int = 0):
         command: Commande a envoyer
         ir_pin: Pin GPIO pour IR
         repeat_count: Nombre de repetitions
+        profiler: PhaseProfiler pour --profile (phases GPIO, encodage, emission)
+        pwm_carrier: Porteuse PWM materielle (voir OsramRGBWRemote.use_pwm_carrier)
+        arduino: Emission par Arduino (voir OsramRGBWRemote.use_arduino)
     """
-    remote = OsramRGBWRemote(ir_pin)
+    with profiler.phase("init GPIO"):
+        remote = OsramRGBWRemote(ir_pin, pwm_carrier=pwm_carrier, arduino=arduino)
     try:
-        remote.send_command(command, repeat_count)
+        # Mesure a part: send_command re-encode la trame avant l'emission
+        with profiler.phase("encodage NEC"):
+            remote.render_frames(command, repeat_count)
+        with profiler.phase("emission"):
+            remote.send_command(command, repeat_count)
     finally:
-        remote.cleanup()
+        with profiler.phase("liberation GPIO"):
+            remote.cleanup()
 
 def main():
     """Fonction principale"""
@@ -534,33 +690,86 @@ def main():
                        help='Lance la demonstration complete')
     parser.add_argument('--cycle', type=int, default=0,
                        help='Lance un cycle de couleurs (duree en secondes)')
+    parser.add_argument('--fade', choices=['up', 'down'],
+                       help='Fondu par paliers de luminosite')
+    parser.add_argument('--fade-steps', type=int, default=5,
+                       help='Nombre de paliers du fondu (defaut: 5)')
+    parser.add_argument('--fade-duration', type=float, default=5.0,
+                       help='Duree du fondu en secondes (defaut: 5)')
+    parser.add_argument('--period', type=float, default=2.0,
+                       help='Secondes par couleur du cycle (defaut: 2)')
+    parser.add_argument('--policy', choices=['skip', 'compress'], default='skip',
+                       help='En retard: sauter les etapes depassees ou les enchainer (defaut: skip)')
     parser.add_argument('--debug', type=str,
                        help='Debug une commande specifique')
+    parser.add_argument('--keys', action='store_true',
+                       help='Mode touches: maintenir une touche repete la commande')
+    parser.add_argument('--hold-delay', type=float, default=HOLD_DELAY_S,
+                       help="Delai d'auto-repetition du clavier pour --keys (defaut: 0.55)")
+    parser.add_argument('--arduino', type=str, metavar='PORT',
+                       help="Emission par un Arduino (firmware yamaha_remote_arduino.c) sur ce port serie")
+    parser.add_argument('--carrier', choices=['soft', 'pwm'], default='soft',
+                       help='Porteuse logicielle ou PWM materielle (defaut: soft)')
+    parser.add_argument('--gate-pin', type=int, default=None,
+                       help='Broche de validation de la porte ET (--carrier pwm)')
+    parser.add_argument('--pwm-chip', type=int, default=0,
+                       help='pwmchip sysfs (--carrier pwm, defaut: 0)')
+    parser.add_argument('--pwm-channel', type=int, default=2,
+                       help='Canal PWM (--carrier pwm, defaut: 2 = GPIO18 sur Pi 5)')
+    parser.add_argument('--profile', nargs='?', const='table', choices=['table', 'json'],
+                       help='Profil par phases de --command (table ou json)')
+    parser.add_argument('--profile-trace', type=str,
+                       help='Ecrit une trace Chrome (chrome://tracing, Perfetto)')
     
     args = parser.parse_args()
+    pwm_carrier = None
+    if args.carrier == 'pwm':
+        pwm_carrier = {'gate_pin': args.gate_pin, 'chip': args.pwm_chip,
+                       'channel': args.pwm_channel}
+    arduino = {'port': args.arduino} if args.arduino else None
     
     if args.command:
-        send_single_command(args.command, args.pin, args.repeat)
+        if args.profile or args.profile_trace:
+            profiler = PhaseProfiler(origin=_T0)
+            profiler.mark("imports + arguments")
+            try:
+                send_single_command(args.command, args.pin, args.repeat, profiler, pwm_carrier, arduino)
+            finally:
+                profiler.output(args.profile or 'table', args.profile_trace)
+        else:
+            send_single_command(args.command, args.pin, args.repeat, pwm_carrier=pwm_carrier, arduino=arduino)
     elif args.demo:
-        remote = OsramRGBWRemote(args.pin)
+        remote = OsramRGBWRemote(args.pin, pwm_carrier=pwm_carrier, arduino=arduino)
         try:
-            remote.demo_sequence()
+            remote.demo_sequence(args.policy)
         finally:
             remote.cleanup()
     elif args.cycle > 0:
-        remote = OsramRGBWRemote(args.pin)
+        remote = OsramRGBWRemote(args.pin, pwm_carrier=pwm_carrier, arduino=arduino)
+        try:
+            remote.color_cycle(args.cycle, args.period, args.policy)
+        finally:
+            remote.cleanup()
+    elif args.fade:
+        remote = OsramRGBWRemote(args.pin, pwm_carrier=pwm_carrier, arduino=arduino)
+        try:
+            remote.fade(args.fade, args.fade_steps, args.fade_duration, args.policy)
+        finally:
+            remote.cleanup()
+    elif args.keys:
+        remote = OsramRGBWRemote(args.pin, pwm_carrier=pwm_carrier, arduino=arduino)
         try:
-            remote.color_cycle(args.cycle)
+            remote.key_mode(args.hold_delay)
         finally:
             remote.cleanup()
     elif args.debug:
-        remote = OsramRGBWRemote(args.pin)
+        remote = OsramRGBWRemote(args.pin, pwm_carrier=pwm_carrier, arduino=arduino)
         try:
             remote.debug_signal(args.debug)
         finally:
             remote.cleanup()
     else:
-        remote = OsramRGBWRemote(args.pin)
+        remote = OsramRGBWRemote(args.pin, pwm_carrier=pwm_carrier, arduino=arduino)
         try:
             remote.interactive_mode()
         finally:
@@ -1,18 +1,38 @@
 import lgpio
+import os
+import sys
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "COMMON"))
+from metrics import REGISTRY, serve as serve_metrics
+
 # === Configuration ===
 IR_GPIO = 11  # Numéro BCM du GPIO connecté au récepteur IR
 MAX_IDLE = 0.1  # Temps max (s) sans impulsion  fin du signal
+METRICS_PORT = int(os.environ.get("IR_METRICS_PORT", "0"))  # 0 = pas d'endpoint /metrics
+METRICS_HOST = os.environ.get("IR_METRICS_HOST", "127.0.0.1")  # 0.0.0.0 = accessible du réseau
+
+# === Métriques ===
+CAPTURED = REGISTRY.counter("ir_signals_captured_total", "Signaux IR captés")
+DECODED = REGISTRY.counter("ir_decode_total", "Décodages NEC par résultat", ["result"])
+DECODE_OK = DECODED.labels("ok")
+DECODE_SHORT = DECODED.labels("trop_court")
+DECODE_PREAMBLE = DECODED.labels("preambule")
+DECODE_TIMING = DECODED.labels("timing")
+DECODE_CHECKSUM = DECODED.labels("inversion")
+SIGNAL_SECONDS = REGISTRY.histogram("ir_signal_seconds", "Durée des signaux IR captés",
+                                    buckets=(0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5))
 
 # === Fonction de décodage NEC ===
 def decode_nec(pulses):
     if len(pulses) < 66:
+        DECODE_SHORT.inc()
         print(" Signal trop court pour du NEC.")
         return None
 
     # Vérifie le préambule (approximatif)
     if not (8500 <= pulses[0] <= 9500 and 4000 <= pulses[1] <= 5000):
+        DECODE_PREAMBLE.inc()
         print(" Préambule invalide : pas un signal NEC.")
         return None
 
@@ -22,6 +42,7 @@ def decode_nec(pulses):
         high = pulses[i + 1]
 
         if not (400 <= low <= 700):
+            DECODE_TIMING.inc()
             print(f" Durée LOW invalide : {low}")
             return None
 
@@ -30,6 +51,7 @@ def decode_nec(pulses):
         elif 1500 <= high <= 1800:
             bits.append(1)
         else:
+            DECODE_TIMING.inc()
             print(f" Durée HIGH invalide : {high}")
             return None
 
@@ -43,9 +65,11 @@ def decode_nec(pulses):
     cmd_inv = bits_to_byte(bits[24:32])
 
     if addr ^ addr_inv != 0xFF or cmd ^ cmd_inv != 0xFF:
+        DECODE_CHECKSUM.inc()
         print(" Incohérence entre données et inversion.")
         return None
 
+    DECODE_OK.inc()
     full_code = (addr << 24) | (addr_inv << 16) | (cmd << 8) | cmd_inv
     return {
         "adresse": addr,
@@ -58,6 +82,10 @@ def decode_nec(pulses):
 h = lgpio.gpiochip_open(0)
 lgpio.gpio_claim_input(h, IR_GPIO)
 
+if METRICS_PORT:
+    serve_metrics(METRICS_PORT, host=METRICS_HOST)
+    print(f" Métriques exposées sur http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
 print(" Prêt. Appuie sur un bouton de la télécommande... (Ctrl+C pour quitter)")
 
 try:
@@ -87,6 +115,9 @@ try:
             if time.time() - last_time > MAX_IDLE:
                 break
 
+        CAPTURED.inc()
+        SIGNAL_SECONDS.observe(sum(timings) / 1_000_000)
+
         # Affichage brut
         print(f"\n Signal capté ({len(timings)} impulsions) :")
         print(timings)
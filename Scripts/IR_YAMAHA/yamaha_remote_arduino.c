@@ -52,8 +52,48 @@
 #define DISPLAY    0x4E
 #define VOL_DOWN   0x1F
 
+// Protocole binaire (IR_CORE/arduino_link.py): commandes pipelinées de l'hôte
+// Trame: 0xA5 | LEN | SEQ | TYPE | charge | CRC-8 (poly 0x07, de LEN à la charge)
+// (constantes et non #define: les #define de ce fichier forment le codebook Yamaha)
+const uint8_t FRAME_SYNC = 0xA5;
+const uint8_t MAX_PAYLOAD = 8;
+const uint8_t PROTOCOL_VER = 2;
+const uint8_t MSG_SEND = 0x01;        // protocole, adresse (u16 LE), commande, répétitions, gap ms (u16 LE)
+const uint8_t MSG_PING = 0x02;        // réinitialise la file, prochain SEQ = SEQ + 1
+const uint8_t MSG_READY = 0x81;
+const uint8_t MSG_ACK = 0x82;         // SEND reçu et mis en file
+const uint8_t MSG_DONE = 0x83;        // dernière trame émise
+const uint8_t MSG_NAK = 0x84;
+const uint8_t PROTO_NEC = 1;
+const uint8_t PROTO_NEC_REPEAT = 2;  // code de répétition NEC (adresse et commande ignorées)
+const uint8_t ERR_PROTOCOL = 1;
+const uint8_t ERR_QUEUE_FULL = 2;
+const uint8_t ERR_LENGTH = 3;
+const uint8_t QUEUE_SIZE = 4;         // 4 x 12 octets: tient dans le tampon série de 64 octets
+const unsigned long RX_TIMEOUT_MS = 50;  // trame incomplète abandonnée
+
+struct IrJob {
+  uint8_t seq;
+  uint8_t protocol;
+  uint16_t address;
+  uint8_t command;
+  uint8_t repeats;
+  uint16_t gapMs;
+  uint8_t sent;
+};
+
+IrJob jobs[QUEUE_SIZE];
+uint8_t jobHead = 0;
+uint8_t jobCount = 0;
+uint8_t expectedSeq = 0;
+unsigned long nextSendAt = 0;
+
+uint8_t rxBuf[MAX_PAYLOAD + 5];
+uint8_t rxPos = 0;
+unsigned long rxLastByte = 0;
+
 void setup() {
-  Serial.begin(9600);
+  Serial.begin(115200);
   Serial.println("Télécommande IR Yamaha - Démarrage");
   
   // Initialisation IR
@@ -74,13 +114,151 @@ void loop() {
     delay(500);
   }
   
-  // Interface série
-  if (Serial.available() > 0) {
-    String command = Serial.readStringUntil('\n');
-    command.trim();
-    command.toUpperCase();
+  // Interface série: trames binaires de l'hôte, ou lignes texte (moniteur série)
+  if (rxPos > 0 && millis() - rxLastByte > RX_TIMEOUT_MS) {
+    rxPos = 0;
+  }
+  while (Serial.available() > 0) {
+    if (rxPos == 0 && Serial.peek() != FRAME_SYNC) {
+      String command = Serial.readStringUntil('\n');
+      command.trim();
+      command.toUpperCase();
+      
+      if (command.length() > 0) {
+        processCommand(command);
+      }
+      continue;
+    }
+    rxFeed(Serial.read());
+  }
+  
+  serviceQueue();
+}
+
+// --- Protocole binaire ---
+
+uint8_t crc8(const uint8_t *data, uint8_t len) {
+  uint8_t crc = 0;
+  for (uint8_t i = 0; i < len; i++) {
+    crc ^= data[i];
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+    }
+  }
+  return crc;
+}
+
+void sendReply(uint8_t seq, uint8_t type, const uint8_t *payload, uint8_t len) {
+  uint8_t frame[MAX_PAYLOAD + 5];
+  frame[0] = FRAME_SYNC;
+  frame[1] = len;
+  frame[2] = seq;
+  frame[3] = type;
+  for (uint8_t i = 0; i < len; i++) {
+    frame[4 + i] = payload[i];
+  }
+  frame[4 + len] = crc8(frame + 1, 3 + len);
+  Serial.write(frame, 5 + len);
+}
+
+// a précède b (SEQ modulo 256)
+bool seqBefore(uint8_t a, uint8_t b) {
+  uint8_t diff = b - a;
+  return diff > 0 && diff < 128;
+}
+
+bool jobQueued(uint8_t seq) {
+  for (uint8_t i = 0; i < jobCount; i++) {
+    if (jobs[(jobHead + i) % QUEUE_SIZE].seq == seq) {
+      return true;
+    }
+  }
+  return false;
+}
+
+void rxFeed(uint8_t b) {
+  rxLastByte = millis();
+  rxBuf[rxPos++] = b;
+  if (rxPos == 2 && rxBuf[1] > MAX_PAYLOAD) {
+    rxPos = 0;  // longueur impossible: resynchronisation
+    return;
+  }
+  if (rxPos >= 2 && rxPos == 5 + rxBuf[1]) {
+    uint8_t len = rxBuf[1];
+    if (crc8(rxBuf + 1, 3 + len) == rxBuf[4 + len]) {
+      handleFrame(rxBuf[2], rxBuf[3], rxBuf + 4, len);
+    }
+    // CRC faux: trame ignorée, l'hôte la renverra faute d'ACK
+    rxPos = 0;
+  }
+}
+
+void handleFrame(uint8_t seq, uint8_t type, const uint8_t *payload, uint8_t len) {
+  if (type == MSG_PING) {
+    jobCount = 0;
+    expectedSeq = seq + 1;
+    uint8_t ready[2] = {PROTOCOL_VER, QUEUE_SIZE};
+    sendReply(seq, MSG_READY, ready, 2);
+    return;
+  }
+  if (type != MSG_SEND) {
+    return;
+  }
+  
+  if (seq == expectedSeq) {
+    uint8_t error = 0;
+    if (len != 7) {
+      error = ERR_LENGTH;
+    } else if (jobCount >= QUEUE_SIZE) {
+      error = ERR_QUEUE_FULL;
+      sendReply(seq, MSG_NAK, &error, 1);
+      return;  // SEQ non consommé: l'hôte renverra
+    } else if (payload[0] != PROTO_NEC && payload[0] != PROTO_NEC_REPEAT) {
+      error = ERR_PROTOCOL;
+    }
     
-    processCommand(command);
+    if (error) {
+      sendReply(seq, MSG_NAK, &error, 1);
+    } else {
+      IrJob &job = jobs[(jobHead + jobCount) % QUEUE_SIZE];
+      job.seq = seq;
+      job.protocol = payload[0];
+      job.address = payload[1] | (payload[2] << 8);
+      job.command = payload[3];
+      job.repeats = payload[4];
+      job.gapMs = payload[5] | (payload[6] << 8);
+      job.sent = 0;
+      jobCount++;
+      sendReply(seq, MSG_ACK, NULL, 0);
+    }
+    expectedSeq++;
+  } else if (seqBefore(seq, expectedSeq)) {
+    // Doublon (ACK perdu): ré-acquitté, et signalé émis s'il a quitté la file
+    sendReply(seq, MSG_ACK, NULL, 0);
+    if (!jobQueued(seq)) {
+      sendReply(seq, MSG_DONE, NULL, 0);
+    }
+  }
+  // Hors séquence: ignorée (go-back-N, l'hôte renvoie dans l'ordre)
+}
+
+// Une trame par passage: la liaison série est lue entre deux trames
+void serviceQueue() {
+  if (jobCount == 0 || (long)(millis() - nextSendAt) < 0) {
+    return;
+  }
+  IrJob &job = jobs[jobHead];
+  if (job.protocol == PROTO_NEC_REPEAT) {
+    IrSender.sendNECRepeat();  // bloquant ~12 ms
+  } else {
+    IrSender.sendNEC(job.address, job.command, 0);  // bloquant ~68 ms
+  }
+  job.sent++;
+  nextSendAt = millis() + job.gapMs;
+  if (job.sent > job.repeats) {
+    sendReply(job.seq, MSG_DONE, NULL, 0);
+    jobHead = (jobHead + 1) % QUEUE_SIZE;
+    jobCount--;
   }
 }
 
@@ -6,106 +6,100 @@ Protocole NEC avec Custom Code 0x78
 Utilise lgpio avec timing amélioré pour compatibilité Arduino
 """
 
-import lgpio
 import time
+_T0 = time.perf_counter()  # Origine du profilage (--profile), avant les imports
+
+try:
+    import lgpio
+except ImportError:  # Encodage seul (init_gpio=False, --dry-run des scènes) hors Raspberry Pi
+    lgpio = None
+import asyncio
+import os
 import sys
 import threading
 from typing import Dict, Optional
 
+_COMMON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "COMMON")
+if _COMMON not in sys.path:
+    sys.path.insert(0, _COMMON)
+_IR_CORE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "IR_CORE")
+if _IR_CORE not in sys.path:
+    sys.path.insert(0, _IR_CORE)
+
+from arduino_link import ArduinoError, ArduinoLink
+from codebook import install_completer, load_codebook
+from hold_keys import HOLD_DELAY_S, run_hold_mode
+from ir_async import shared_transmitter
+from ir_remotes import IR_CPU_SECONDS, IR_ERRORS, IR_FRAMES, IR_OVERRUN_SECONDS, IR_TRANSMIT_SECONDS
+from precise_wait import default_waiter
+from pwm_carrier import PwmCarrier, SysfsPwm
+from profiling import NULL_PROFILER, PhaseProfiler
+
+
 class YamahaRemote:
-    def __init__(self, ir_pin: int = 18):
+    # Mode touches: touche (caractère ou flèche) -> commande
+    HOLD_KEYS = {
+        'UP': 'VOL+', '+': 'VOL+', 'DOWN': 'VOL-', '-': 'VOL-',
+        'RIGHT': 'FF', 'LEFT': 'REW', ' ': 'PLAY', 's': 'STOP', 'a': 'PAUSE',
+        'p': 'POWER', 'd': 'DISPLAY', **{d: d for d in '0123456789'},
+    }
+    
+    def __init__(self, ir_pin: int = 18, init_gpio: bool = True,
+                 pwm_carrier: Optional[dict] = None, arduino: Optional[dict] = None):
         """
         Initialise la télécommande Yamaha
         
         Args:
             ir_pin: Pin GPIO pour la LED IR (défaut: 18)
+            init_gpio: False pour n'utiliser que l'encodage (pin non réservé)
+            pwm_carrier: Porteuse PWM matérielle {gate_pin, chip, channel}
+                (voir use_pwm_carrier), None: porteuse logicielle
+            arduino: Émission déléguée à un Arduino {port, baud} (voir
+                use_arduino); le GPIO n'est alors pas réservé
         """
         self.ir_pin = ir_pin
         self.h = None
-        self.YAMAHA_ADDRESS = 0x78
-        
-        # Dictionnaire des commandes
-        self.commands = {
-            'POWER': 0x0F,
-            'DIGIT_0': 0x10,
-            'DIGIT_1': 0x11,
-            'DIGIT_2': 0x12,
-            'DIGIT_3': 0x13,
-            'DIGIT_4': 0x14,
-            'DIGIT_5': 0x15,
-            'DIGIT_6': 0x16,
-            'DIGIT_7': 0x17,
-            'DIGIT_8': 0x18,
-            'DIGIT_9': 0x19,
-            'MODE_10': 0x1A,
-            'START_100': 0x1D,
-            'REP_A': 0x0C,
-            'RANDOM_B': 0x07,
-            'PROG_C': 0x0B,
-            'D_KEY': 0x09,
-            'PAUSE': 0x0A,
-            'TIME': 0x08,
-            'PLAY': 0x02,
-            'REW': 0x04,
-            'STOP': 0x01,
-            'FF': 0x03,
-            'TAPE_DIR': 0x43,
-            'PRESET_DN': 0x1C,
-            'TUNER': 0x4B,
-            'PRESET_UP': 0x1B,
-            'MD': 0x57,
-            'DVD': 0x4A,
-            'TAPE': 0x41,
-            'AUX': 0x49,
-            'MD_REC': 0x58,
-            'TAPE_REC': 0x46,
-            'MODE': 0x05,
-            'START': 0x06,
-            'SLEEP': 0x4F,
-            'VOL_UP': 0x1E,
-            'DISPLAY': 0x4E,
-            'VOL_DOWN': 0x1F
-        }
-        
-        # Aliases pour faciliter l'utilisation
-        self.aliases = {
-            'PWR': 'POWER',
-            'VOL+': 'VOL_UP',
-            'VOLUP': 'VOL_UP',
-            'VOL-': 'VOL_DOWN',
-            'VOLDOWN': 'VOL_DOWN',
-            'FORWARD': 'FF',
-            'REWIND': 'REW',
-            'RADIO': 'TUNER',
-            'CD': 'MODE',
-            'DISC': 'MODE',
-            'RANDOM': 'RANDOM_B',
-            'REPEAT': 'REP_A',
-            '0': 'DIGIT_0',
-            '1': 'DIGIT_1',
-            '2': 'DIGIT_2',
-            '3': 'DIGIT_3',
-            '4': 'DIGIT_4',
-            '5': 'DIGIT_5',
-            '6': 'DIGIT_6',
-            '7': 'DIGIT_7',
-            '8': 'DIGIT_8',
-            '9': 'DIGIT_9'
-        }
-        
-        self.init_gpio()
+        self.carrier = None
+        self.arduino = None
+        if arduino is not None:
+            init_gpio = False
+        
+        # Codes, alias et table de recherche partagés (IR_CORE/codebooks.json),
+        # construits une fois par processus
+        self.codebook = load_codebook("yamaha")
+        self.YAMAHA_ADDRESS = self.codebook.address
+        self.commands = self.codebook.commands
+        self.aliases = self.codebook.aliases
+        
+        self._m_frames = IR_FRAMES.labels("yamaha", ir_pin)
+        self._m_seconds = IR_TRANSMIT_SECONDS.labels("yamaha", ir_pin)
+        self._m_overrun = IR_OVERRUN_SECONDS.labels("yamaha", ir_pin)
+        self._m_cpu = IR_CPU_SECONDS.labels("yamaha", ir_pin)
+        self._m_errors = IR_ERRORS.labels("yamaha", ir_pin)
+        self.waiter = None
+        self.last_cpu_s = 0.0
+        if init_gpio:
+            self.init_gpio()
         
         # Optimisations timing
         self.carrier_freq = 38000
         self.duty_cycle = 0.33  # 33% comme Arduino
+        if pwm_carrier is not None and init_gpio:
+            self.use_pwm_carrier(**pwm_carrier)
+        if arduino is not None:
+            self.use_arduino(**arduino)
         
     def init_gpio(self):
         """Initialise la connexion GPIO avec lgpio"""
         try:
+            if lgpio is None:
+                raise RuntimeError("module lgpio absent")
             self.h = lgpio.gpiochip_open(0)  # Chip 0 pour Pi 5
             
             # Configure le pin en sortie avec priorité haute
             lgpio.gpio_claim_output(self.h, self.ir_pin, 0)
+            # Marge sommeil/spin des espaces OFF, calibrée une fois par processus
+            self.waiter = default_waiter()
             
             print(f"GPIO initialisé avec lgpio - Pin IR: {self.ir_pin}")
             
@@ -167,6 +161,34 @@ class YamahaRemote:
         
         return data
     
+    def use_pwm_carrier(self, gate_pin: Optional[int] = None, chip: int = 0, channel: int = 2):
+        """
+        Porteuse générée par un canal PWM matériel, le logiciel ne pilote plus
+        que l'enveloppe (67 fronts par trame au lieu de milliers d'écritures)
+        Le pin IR devient la sortie PWM: sa réservation GPIO est libérée
+        
+        Args:
+            gate_pin: Broche de validation (porte ET), None: activation du canal PWM
+            chip: pwmchip sysfs
+            channel: Canal PWM (GPIO18 = canal 2 sur Pi 5, dtoverlay=pwm-2chan)
+        """
+        lgpio.gpio_free(self.h, self.ir_pin)
+        self.carrier = PwmCarrier(self.h, SysfsPwm(chip, channel), gate_pin,
+                                  self.carrier_freq, self.duty_cycle, gpio=lgpio)
+        print(f"Porteuse PWM matérielle: pwmchip{chip}/pwm{channel}, enveloppe par "
+              f"{'gpio ' + str(gate_pin) if gate_pin is not None else 'activation du canal'}")
+    
+    def use_arduino(self, port: str, baud: int = 115200):
+        """
+        Délègue l'émission à un Arduino (IR_CORE/arduino_link.py): send_command
+        et send envoient adresse et commande, le firmware gère le timing
+        
+        Args:
+            port: Port série (/dev/ttyACM0)
+            baud: Débit du firmware
+        """
+        self.arduino = ArduinoLink(port, baud)
+    
     def send_ir_burst(self, duration_us: int):
         """
         Génère une rafale IR modulée à 38kHz avec duty cycle correct
@@ -214,6 +236,33 @@ class YamahaRemote:
         Args:
             pulses: Liste des durées des impulsions (microsecondes)
         """
+        if self.arduino is not None:
+            # Émission déléguée (mode touches, répétitions, test): train redécodé en NEC
+            try:
+                self.arduino.send_pulses(pulses).result()
+            except (ArduinoError, ValueError) as e:
+                self._m_errors.inc()
+                print(f"Erreur Arduino: {e}")
+                return
+            self._m_frames.inc()
+            return
+        
+        cpu_start = time.thread_time_ns()
+        if self.carrier is not None:
+            # Porteuse matérielle: seuls les fronts d'enveloppe sont émis
+            try:
+                stats = self.carrier.send(pulses)
+            except Exception as e:
+                self._m_errors.inc()
+                print(f"Erreur lors de l'envoi IR: {e}")
+                return
+            self._m_frames.inc()
+            self._m_seconds.observe(stats["elapsed_s"])
+            self._m_overrun.observe(max(0.0, stats["elapsed_s"] - sum(pulses) / 1e6))
+            self.last_cpu_s = (time.thread_time_ns() - cpu_start) / 1e9
+            self._m_cpu.observe(self.last_cpu_s)
+            return
+        
         try:
             # Augmentation de priorité du processus
             import os
@@ -222,7 +271,8 @@ class YamahaRemote:
             except:
                 pass  # Ignore si pas de droits sudo
             
-            start_time = time.time_ns()
+            waiter = self.waiter or default_waiter()
+            start_time = waiter.clock()
             
             for i, duration in enumerate(pulses):
                 if i % 2 == 0:  # Impulsion ON (modulée à 38kHz)
@@ -231,15 +281,52 @@ class YamahaRemote:
                     lgpio.gpio_write(self.h, self.ir_pin, 0)
                     # Délai précis
                     target_time = start_time + sum(pulses[:i+1]) * 1000
-                    while time.time_ns() < target_time:
-                        pass
+                    waiter.wait_until(target_time)
             
             # Final OFF state
             lgpio.gpio_write(self.h, self.ir_pin, 0)
+            elapsed = (waiter.clock() - start_time) / 1e9
+            self.last_cpu_s = (time.thread_time_ns() - cpu_start) / 1e9
+            self._m_cpu.observe(self.last_cpu_s)
+            self._m_frames.inc()
+            self._m_seconds.observe(elapsed)
+            self._m_overrun.observe(max(0.0, elapsed - sum(pulses) / 1e6))
             
         except Exception as e:
+            self._m_errors.inc()
             print(f"Erreur lors de l'envoi IR: {e}")
     
+    def resolve_command(self, command_name: str) -> str:
+        """
+        Résout un alias vers le nom canonique de la commande
+        
+        Args:
+            command_name: Nom ou alias (insensible à la casse)
+            
+        Returns:
+            Nom canonique (à vérifier dans self.commands)
+        """
+        return self.codebook.resolve(command_name)
+    
+    def render_frames(self, command_name: str) -> Optional[list]:
+        """
+        Pré-calcule les trames d'une commande, sans émettre
+        POWER est doublé comme dans send_power()
+        
+        Args:
+            command_name: Nom ou alias de la commande
+            
+        Returns:
+            Liste de trames (listes d'impulsions), None si commande inconnue
+        """
+        code = self.codebook.get(command_name)
+        if code is None:
+            return None
+        pulses = self.nec_encode(code.address, code.command)
+        if code.name == 'POWER':
+            return [pulses, pulses]
+        return [pulses]
+    
     def send_command(self, command_name: str, double_send: bool = False):
         """
         Envoie une commande IR
@@ -249,21 +336,27 @@ class YamahaRemote:
             double_send: Envoie deux fois la commande (pour POWER)
         """
         # Résout les aliases
-        if command_name.upper() in self.aliases:
-            command_name = self.aliases[command_name.upper()]
-        else:
-            command_name = command_name.upper()
+        code = self.codebook.get(command_name)
         
-        if command_name not in self.commands:
-            print(f"Commande inconnue: {command_name}")
+        if code is None:
+            print(f"Commande inconnue: {command_name.strip().upper()}")
             return False
         
-        command_code = self.commands[command_name]
+        print(f"Envoi: {code.name} (Address=0x{code.address:02X}, Command=0x{code.command:02X})")
         
-        print(f"Envoi: {command_name} (Address=0x{self.YAMAHA_ADDRESS:02X}, Command=0x{command_code:02X})")
+        if self.arduino is not None:
+            # Émission déléguée: timing et double envoi assurés par le firmware
+            try:
+                result = self.arduino.submit(code.address, code.command,
+                                             1 if double_send else 0).result()
+            except ArduinoError as e:
+                print(f"Erreur Arduino: {e}")
+                return False
+            print(f"  Émise par l'Arduino (ACK {result['ack_ms']}ms, fin {result['done_ms']}ms)")
+            return True
         
         # Encode et envoie
-        pulses = self.nec_encode(self.YAMAHA_ADDRESS, command_code)
+        pulses = self.nec_encode(code.address, code.command)
         
         # Debug: affiche le timing total
         total_time = sum(pulses) / 1000  # en millisecondes
@@ -278,6 +371,32 @@ class YamahaRemote:
         
         return True
     
+    async def send(self, command_name: str, repeat_count: int = 0) -> int:
+        """
+        Version asyncio de send_command: les trames pré-calculées partent sur
+        le thread d'émission du pin (IR_CORE/ir_async.py), la boucle asyncio
+        n'est pas bloquée. POWER est doublé comme dans send_power()
+        
+        Args:
+            command_name: Nom ou alias de la commande
+            repeat_count: Répétitions de la dernière trame
+            
+        Returns:
+            Nombre de trames émises (moins si l'attente a été annulée)
+            
+        Raises:
+            KeyError: Commande inconnue
+        """
+        frames = self.render_frames(command_name)
+        if frames is None:
+            raise KeyError(f"Commande inconnue: {command_name}")
+        if repeat_count:
+            frames = frames + [frames[-1]] * repeat_count
+        if self.arduino is not None:
+            await asyncio.wrap_future(self.arduino.send_command(self, command_name, repeat_count))
+            return len(frames)
+        return await shared_transmitter().send(self, frames)
+    
     def send_power(self):
         """Envoie la commande POWER avec double envoi"""
         return self.send_command('POWER', double_send=True)
@@ -296,6 +415,18 @@ class YamahaRemote:
             self.send_ir_signal(repeat_pulses)
             time.sleep(0.108)  # 108ms gap
     
+    def key_mode(self, hold_delay: float = HOLD_DELAY_S):
+        """
+        Mode touches: appui maintenu = trame puis répétitions NEC (IR_CORE/hold_keys.py)
+        
+        Args:
+            hold_delay: Délai d'auto-répétition du clavier en secondes
+        """
+        try:
+            run_hold_mode(self, self.HOLD_KEYS, hold_delay)
+        except RuntimeError as e:
+            print(f"Erreur: {e}")
+    
     def test_sequence(self):
         """Séquence de test étendue"""
         print("=== SÉQUENCE DE TEST ÉTENDUE ===")
@@ -326,22 +457,19 @@ class YamahaRemote:
         Args:
             command_name: Commande à debugger
         """
-        if command_name.upper() in self.aliases:
-            command_name = self.aliases[command_name.upper()]
-        else:
-            command_name = command_name.upper()
+        code = self.codebook.get(command_name)
         
-        if command_name not in self.commands:
-            print(f"Commande inconnue: {command_name}")
+        if code is None:
+            print(f"Commande inconnue: {command_name.strip().upper()}")
             return
         
-        command_code = self.commands[command_name]
-        pulses = self.nec_encode(self.YAMAHA_ADDRESS, command_code)
+        command_code = code.command
+        pulses = self.nec_encode(code.address, command_code)
         
-        print(f"\n=== DEBUG: {command_name} ===")
-        print(f"Address: 0x{self.YAMAHA_ADDRESS:02X} ({self.YAMAHA_ADDRESS:08b})")
+        print(f"\n=== DEBUG: {code.name} ===")
+        print(f"Address: 0x{code.address:02X} ({code.address:08b})")
         print(f"Command: 0x{command_code:02X} ({command_code:08b})")
-        print(f"~Address: 0x{(~self.YAMAHA_ADDRESS)&0xFF:02X}")
+        print(f"~Address: 0x{(~code.address)&0xFF:02X}")
         print(f"~Command: 0x{(~command_code)&0xFF:02X}")
         print(f"Nombre d'impulsions: {len(pulses)}")
         print(f"Durée totale: {sum(pulses)/1000:.1f}ms")
@@ -378,6 +506,7 @@ class YamahaRemote:
         print("1-9, 0       - Chiffres")
         print("TEST         - Séquence de test")
         print("DEBUG <cmd>  - Debug d'une commande")
+        print("KEYS         - Mode touches (maintenir = répéter)")
         print("HELP         - Cette aide")
         print("QUIT/EXIT    - Quitter")
         print("=============================\n")
@@ -387,7 +516,8 @@ class YamahaRemote:
         print("Télécommande IR Yamaha - Mode interactif optimisé")
         print("Timing amélioré pour compatibilité Arduino")
         print("Tapez 'HELP' pour voir les commandes disponibles")
-        print("Tapez 'QUIT' ou 'EXIT' pour quitter")
+        print("Tapez 'QUIT' ou 'EXIT' pour quitter (Tab complète les commandes)")
+        install_completer(self.codebook, ['HELP', 'QUIT', 'EXIT', 'TEST', 'DEBUG', 'KEYS'])
         
         while True:
             try:
@@ -404,6 +534,8 @@ class YamahaRemote:
                     self.print_help()
                 elif cmd_parts[0].upper() == 'TEST':
                     self.test_sequence()
+                elif cmd_parts[0].upper() == 'KEYS':
+                    self.key_mode()
                 elif cmd_parts[0].upper() == 'DEBUG':
                     if len(cmd_parts) > 1:
                         self.debug_signal(cmd_parts[1])
@@ -422,27 +554,43 @@ class YamahaRemote:
     
     def cleanup(self):
         """Nettoie les ressources"""
+        if self.arduino is not None:
+            self.arduino.close()
         if self.h is not None:
-            lgpio.gpio_write(self.h, self.ir_pin, 0)
+            if self.carrier is not None:
+                self.carrier.close()
+            else:
+                lgpio.gpio_write(self.h, self.ir_pin, 0)
             lgpio.gpiochip_close(self.h)
 
 # Fonctions utilitaires
-def send_single_command(command: str, ir_pin: int = 18):
+def send_single_command(command: str, ir_pin: int = 18, profiler=NULL_PROFILER,
+                        pwm_carrier: Optional[dict] = None,
+                        arduino: Optional[dict] = None):
     """
     Envoie une seule commande et quitte
     
     Args:
         command: Commande à envoyer
         ir_pin: Pin GPIO pour IR
+        profiler: PhaseProfiler pour --profile (phases GPIO, encodage, émission)
+        pwm_carrier: Porteuse PWM matérielle (voir YamahaRemote.use_pwm_carrier)
+        arduino: Émission par Arduino (voir YamahaRemote.use_arduino)
     """
-    remote = YamahaRemote(ir_pin)
+    with profiler.phase("init GPIO"):
+        remote = YamahaRemote(ir_pin, pwm_carrier=pwm_carrier, arduino=arduino)
     try:
-        if command.upper() in ['POWER', 'PWR']:
-            remote.send_power()
-        else:
-            remote.send_command(command)
+        # Mesuré à part: send_command ré-encode la trame avant l'émission
+        with profiler.phase("encodage NEC"):
+            remote.render_frames(command)
+        with profiler.phase("émission"):
+            if command.upper() in ['POWER', 'PWR']:
+                remote.send_power()
+            else:
+                remote.send_command(command)
     finally:
-        remote.cleanup()
+        with profiler.phase("libération GPIO"):
+            remote.cleanup()
 
 def main():
     """Fonction principale"""
@@ -457,25 +605,62 @@ def main():
                        help='Lance la séquence de test')
     parser.add_argument('--debug', type=str,
                        help='Debug une commande spécifique')
+    parser.add_argument('--keys', action='store_true',
+                       help='Mode touches: maintenir une touche répète la commande')
+    parser.add_argument('--hold-delay', type=float, default=HOLD_DELAY_S,
+                       help="Délai d'auto-répétition du clavier pour --keys (défaut: 0.55)")
+    parser.add_argument('--arduino', type=str, metavar='PORT',
+                       help="Émission par un Arduino (firmware yamaha_remote_arduino.c) sur ce port série")
+    parser.add_argument('--carrier', choices=['soft', 'pwm'], default='soft',
+                       help='Porteuse logicielle ou PWM matérielle (défaut: soft)')
+    parser.add_argument('--gate-pin', type=int, default=None,
+                       help='Broche de validation de la porte ET (--carrier pwm)')
+    parser.add_argument('--pwm-chip', type=int, default=0,
+                       help='pwmchip sysfs (--carrier pwm, défaut: 0)')
+    parser.add_argument('--pwm-channel', type=int, default=2,
+                       help='Canal PWM (--carrier pwm, défaut: 2 = GPIO18 sur Pi 5)')
+    parser.add_argument('--profile', nargs='?', const='table', choices=['table', 'json'],
+                       help='Profil par phases de --command (table ou json)')
+    parser.add_argument('--profile-trace', type=str,
+                       help='Écrit une trace Chrome (chrome://tracing, Perfetto)')
     
     args = parser.parse_args()
+    pwm_carrier = None
+    if args.carrier == 'pwm':
+        pwm_carrier = {'gate_pin': args.gate_pin, 'chip': args.pwm_chip,
+                       'channel': args.pwm_channel}
+    arduino = {'port': args.arduino} if args.arduino else None
     
     if args.command:
-        send_single_command(args.command, args.pin)
+        if args.profile or args.profile_trace:
+            profiler = PhaseProfiler(origin=_T0)
+            profiler.mark("imports + arguments")
+            try:
+                send_single_command(args.command, args.pin, profiler, pwm_carrier, arduino)
+            finally:
+                profiler.output(args.profile or 'table', args.profile_trace)
+        else:
+            send_single_command(args.command, args.pin, pwm_carrier=pwm_carrier, arduino=arduino)
     elif args.test:
-        remote = YamahaRemote(args.pin)
+        remote = YamahaRemote(args.pin, pwm_carrier=pwm_carrier, arduino=arduino)
         try:
             remote.test_sequence()
         finally:
             remote.cleanup()
+    elif args.keys:
+        remote = YamahaRemote(args.pin, pwm_carrier=pwm_carrier, arduino=arduino)
+        try:
+            remote.key_mode(args.hold_delay)
+        finally:
+            remote.cleanup()
     elif args.debug:
-        remote = YamahaRemote(args.pin)
+        remote = YamahaRemote(args.pin, pwm_carrier=pwm_carrier, arduino=arduino)
         try:
             remote.debug_signal(args.debug)
         finally:
             remote.cleanup()
     else:
-        remote = YamahaRemote(args.pin)
+        remote = YamahaRemote(args.pin, pwm_carrier=pwm_carrier, arduino=arduino)
         try:
             remote.interactive_mode()
         finally:
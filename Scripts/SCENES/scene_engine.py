@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Moteur de scènes multi-appareils (Tapo + télécommandes IR)
+
+Une scène est un fichier YAML déclaratif: chaque action cible soit un
+appareil Tapo (config.yaml de BT_TAPO), soit une télécommande IR (Yamaha ou
+Osram) déclarée dans la section `remotes`. Les dépendances (`after`)
+forment un graphe:
+- les actions réseau (Tapo) s'exécutent en parallèle dès que leurs
+  dépendances sont terminées
+- les actions IR qui partagent un même émetteur (pin GPIO) sont fusionnées
+  en une seule transmission pré-calculée avant le lancement de la scène
+
+Exemple: python scene_engine.py movie_night.yaml
+"""
+
+from typing import Dict, List, Optional, Set, Union
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import yaml
+from pydantic import BaseModel, ValidationError, field_validator, model_validator
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _sub in ("BT_TAPO", "IR_OSRAM", "IR_YAMAHA", "IR_CORE"):
+    _path = os.path.join(SCRIPTS_DIR, _sub)
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from ir_remotes import REMOTE_TYPES, remote_class
+
+NEC_FRAME_GAP_MS = 108  # Gap standard NEC entre deux trames
+
+
+class SceneError(Exception):
+    """Scène invalide (dépendance inconnue, cycle, commande IR inconnue, ...)"""
+
+
+# Modèles Pydantic
+class RemoteModel(BaseModel):
+    type: str
+    pin: int = 18
+
+    @field_validator('type')
+    def validate_type(cls, v):
+        if v not in REMOTE_TYPES:
+            raise ValueError("Type de télécommande doit être 'yamaha' ou 'osram'")
+        return v
+
+
+class SceneActionModel(BaseModel):
+    id: str
+    tapo: Optional[str] = None
+    ir: Optional[str] = None
+    command: str
+    args: List[Union[int, str]] = []
+    repeat: int = 0
+    gap_ms: int = NEC_FRAME_GAP_MS
+    after: List[str] = []
+
+    @field_validator('command', mode='before')
+    def validate_command(cls, v):
+        # YAML 1.1 lit on/off/ON/OFF non quotés comme des booléens
+        if isinstance(v, bool):
+            return "on" if v else "off"
+        return v
+
+    @model_validator(mode='after')
+    def validate_target(self):
+        if (self.tapo is None) == (self.ir is None):
+            raise ValueError(f"Action {self.id}: préciser exactement une cible ('tapo' ou 'ir')")
+        return self
+
+
+class SceneModel(BaseModel):
+    name: str
+    remotes: Dict[str, RemoteModel] = {}
+    actions: List[SceneActionModel]
+
+    @model_validator(mode='after')
+    def validate_pins(self):
+        # Un émetteur par pin: ses trames sont encodées par chaque télécommande,
+        # mais émises par une seule instance (celle du premier type rencontré)
+        types_by_pin: Dict[int, Set[str]] = {}
+        for remote in self.remotes.values():
+            types_by_pin.setdefault(remote.pin, set()).add(remote.type)
+        shared = {pin: types for pin, types in types_by_pin.items() if len(types) > 1}
+        if shared:
+            details = ", ".join(f"gpio{pin} ({' + '.join(sorted(types))})"
+                                for pin, types in sorted(shared.items()))
+            raise ValueError(f"Télécommandes de types différents sur un même pin: {details}")
+        return self
+
+
+def load_scene(path: str) -> SceneModel:
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    return SceneModel(**data)
+
+
+class PlanNode:
+    """Étape exécutable: une action Tapo, ou une transmission IR (une ou plusieurs actions)"""
+
+    def __init__(self, node_id: str, kind: str, actions: List[SceneActionModel],
+                 pin: Optional[int] = None):
+        self.id = node_id
+        self.kind = kind
+        self.actions = actions
+        self.pin = pin
+        self.deps: Set[str] = set()
+        self.pulses: List[int] = []
+        # id d'action -> (début de sa première trame, durée) en µs dans la transmission
+        self.offsets: Dict[str, tuple] = {}
+
+
+def _topological(ids: List[str], deps: Dict[str, Set[str]]) -> List[str]:
+    """Tri topologique stable (ordre de déclaration); SceneError si cycle"""
+    remaining = {i: set(deps[i]) for i in ids}
+    order = []
+    while remaining:
+        ready = [i for i in ids if i in remaining and not remaining[i]]
+        if not ready:
+            raise SceneError(f"Cycle de dépendances entre: {', '.join(sorted(remaining))}")
+        for i in ready:
+            order.append(i)
+            del remaining[i]
+        for pending in remaining.values():
+            pending.difference_update(ready)
+    return order
+
+
+def _append_frame(train: List[int], frame: List[int], gap_us: int):
+    """Ajoute une trame à un train d'impulsions [ON, OFF, ...] avec un silence préalable"""
+    if train:
+        if len(train) % 2 == 1:
+            train.append(gap_us)
+        else:
+            train[-1] += gap_us
+    train.extend(frame)
+
+
+def build_plan(scene: SceneModel, encoders: Dict[str, object]) -> List[PlanNode]:
+    """
+    Construit le graphe d'exécution et pré-calcule les transmissions IR
+
+    Les actions IR d'un même pin sont fusionnées dans l'ordre topologique.
+    Une nouvelle transmission est commencée quand une action dépend (même
+    indirectement) d'une action externe qui attend elle-même la transmission
+    en cours, ce qui créerait un cycle.
+
+    Args:
+        scene: Scène validée
+        encoders: Nom de télécommande -> instance (YamahaRemote/OsramRGBWRemote)
+
+    Returns:
+        Étapes dans un ordre topologique
+    """
+    actions = {a.id: a for a in scene.actions}
+    if len(actions) != len(scene.actions):
+        raise SceneError("Identifiants d'action en double")
+    for a in scene.actions:
+        for dep in a.after:
+            if dep not in actions:
+                raise SceneError(f"Action {a.id}: dépendance inconnue {dep}")
+        if a.ir is not None and a.ir not in scene.remotes:
+            raise SceneError(f"Action {a.id}: télécommande inconnue {a.ir}")
+
+    ids = [a.id for a in scene.actions]
+    order = _topological(ids, {a.id: set(a.after) for a in scene.actions})
+    ancestors: Dict[str, Set[str]] = {}
+    for i in order:
+        anc = set(actions[i].after)
+        for dep in actions[i].after:
+            anc |= ancestors[dep]
+        ancestors[i] = anc
+
+    nodes: Dict[str, PlanNode] = {}
+    node_of: Dict[str, str] = {}
+    segments_by_pin: Dict[int, List[PlanNode]] = {}
+    for i in order:
+        action = actions[i]
+        if action.tapo is not None:
+            nodes[i] = PlanNode(i, "tapo", [action])
+            node_of[i] = i
+            continue
+        pin = scene.remotes[action.ir].pin
+        segments = segments_by_pin.setdefault(pin, [])
+        current = segments[-1] if segments else None
+        if current is not None:
+            members = {m.id for m in current.actions}
+            for anc in ancestors[i] - members:
+                if actions[anc].ir is None or scene.remotes[actions[anc].ir].pin != pin:
+                    if ancestors[anc] & members:
+                        current = None
+                        break
+        if current is None:
+            current = PlanNode(f"ir{pin}#{len(segments) + 1}", "ir", [], pin)
+            if segments:
+                current.deps.add(segments[-1].id)
+            segments.append(current)
+            nodes[current.id] = current
+        current.actions.append(action)
+        node_of[i] = current.id
+
+    for node in nodes.values():
+        for action in node.actions:
+            node.deps.update(node_of[d] for d in action.after)
+        node.deps.discard(node.id)
+
+    # Pré-rendu des transmissions IR
+    for node in nodes.values():
+        if node.kind != "ir":
+            continue
+        for action in node.actions:
+            remote = encoders[action.ir]
+            if scene.remotes[action.ir].type == "osram":
+                frames = remote.render_frames(action.command, action.repeat)
+            else:
+                frames = remote.render_frames(action.command)
+                if frames is not None and action.repeat:
+                    frames = frames + [frames[-1]] * action.repeat
+            if frames is None:
+                raise SceneError(f"Action {action.id}: commande IR inconnue {action.command}")
+            start = None
+            for n, frame in enumerate(frames):
+                _append_frame(node.pulses, frame,
+                              (action.gap_ms if n == 0 else NEC_FRAME_GAP_MS) * 1000)
+                if start is None:
+                    start = sum(node.pulses) - sum(frame)
+            node.offsets[action.id] = (start, sum(node.pulses) - start)
+
+    node_order = _topological(list(nodes), {n.id: n.deps for n in nodes.values()})
+    return [nodes[n] for n in node_order]
+
+
+class ActionTiming:
+    def __init__(self, action_id: str, target: str, status: str, start_ms: float,
+                 duration_ms: float, error: Optional[str] = None):
+        self.action_id = action_id
+        self.target = target
+        self.status = status
+        self.start_ms = start_ms
+        self.duration_ms = duration_ms
+        self.error = error
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+class SceneExecutor:
+    """Exécute un plan: Tapo en parallèle (asyncio), IR sur un thread dédié"""
+
+    def __init__(self, controller=None, transmitters: Optional[Dict[int, object]] = None):
+        """
+        Args:
+            controller: TapoController (sessions persistantes) pour les actions Tapo
+            transmitters: Pin -> télécommande initialisée (GPIO réservé) pour l'émission
+        """
+        self.controller = controller
+        self.transmitters = transmitters or {}
+        # Un seul thread IR: deux boucles busy-wait concurrentes se gêneraient (GIL)
+        self._ir_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ir-tx")
+
+    async def _run_node(self, node: PlanNode):
+        if node.kind == "tapo":
+            action = node.actions[0]
+            return await self.controller.execute(action.tapo, action.command,
+                                                 [str(a) for a in action.args])
+        transmitter = self.transmitters[node.pin]
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._ir_thread, transmitter.send_ir_signal, node.pulses)
+
+    async def run(self, plan: List[PlanNode]) -> Dict[str, object]:
+        """
+        Exécute le plan; les dépendants d'une étape en échec sont annulés
+
+        Returns:
+            Rapport: latence totale et détail par action
+        """
+        origin = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+        timings: List[ActionTiming] = []
+
+        def elapsed_ms(t: float) -> float:
+            return (t - origin) * 1000
+
+        async def run(node: PlanNode):
+            for dep in node.deps:
+                ok = await tasks[dep]
+                if not ok:
+                    for action in node.actions:
+                        timings.append(ActionTiming(action.id, action.tapo or action.ir,
+                                                    "annulé", elapsed_ms(time.perf_counter()), 0.0,
+                                                    f"dépendance {dep} en échec"))
+                    return False
+            start = time.perf_counter()
+            error = None
+            try:
+                await self._run_node(node)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            end = time.perf_counter()
+            status = "ok" if error is None else "échec"
+            if node.kind == "tapo":
+                action = node.actions[0]
+                timings.append(ActionTiming(action.id, action.tapo, status, elapsed_ms(start),
+                                            (end - start) * 1000, error))
+            else:
+                for action in node.actions:
+                    offset_us, length_us = node.offsets[action.id]
+                    timings.append(ActionTiming(action.id, f"{action.ir}@gpio{node.pin}", status,
+                                                elapsed_ms(start) + offset_us / 1000,
+                                                length_us / 1000, error))
+            return error is None
+
+        for node in plan:
+            tasks[node.id] = asyncio.create_task(run(node))
+        results = await asyncio.gather(*tasks.values())
+        total_ms = elapsed_ms(time.perf_counter())
+        timings.sort(key=lambda t: t.start_ms)
+        return {
+            "total_ms": round(total_ms, 1),
+            "ok": all(results),
+            "actions": [t.to_dict() for t in timings],
+        }
+
+    def close(self):
+        self._ir_thread.shutdown(wait=True)
+
+
+def print_plan(plan: List[PlanNode]):
+    print("=== PLAN ===")
+    for node in plan:
+        deps = ", ".join(sorted(node.deps)) or "-"
+        if node.kind == "tapo":
+            action = node.actions[0]
+            print(f"  [{node.id}] tapo {action.tapo} {action.command} {action.args}  (après: {deps})")
+        else:
+            ids = " + ".join(a.id for a in node.actions)
+            print(f"  [{node.id}] IR gpio{node.pin}: {ids} - {len(node.pulses)} impulsions, "
+                  f"{sum(node.pulses) / 1000:.1f}ms  (après: {deps})")
+
+
+def print_report(report: Dict[str, object]):
+    print("\n=== RAPPORT ===")
+    print(f"{'action':<20} {'cible':<24} {'statut':<8} {'début':>9} {'durée':>9}")
+    for t in report["actions"]:
+        print(f"{t['action_id']:<20} {t['target']:<24} {t['status']:<8} "
+              f"{t['start_ms']:8.1f}ms {t['duration_ms']:8.1f}ms")
+        if t["error"]:
+            print(f"    {t['error']}")
+    print(f"Latence totale de la scène: {report['total_ms']:.1f}ms")
+
+
+async def run_scene(scene: SceneModel, plan: List[PlanNode], config_path: str,
+                    transmitters: Dict[int, object]) -> Dict[str, object]:
+    controller = None
+    if any(node.kind == "tapo" for node in plan):
+        from bt_tapo_strict_2 import load_config
+        from tapo_backend import make_backend
+        from tapo_controller import TapoController
+        from tapo_discovery import AddressTable
+        from tapo_resilience import ResiliencePolicy
+
+        # Un appareil hors ligne échoue vite au lieu de bloquer les actions qui en dépendent
+        config = load_config(path=config_path)
+        controller = TapoController(config, make_backend(config), ResiliencePolicy.load(),
+                                    AddressTable.load())
+    executor = SceneExecutor(controller, transmitters)
+    try:
+        return await executor.run(plan)
+    finally:
+        executor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exécution de scènes Tapo + IR")
+    parser.add_argument("scene", help="Fichier YAML de la scène")
+    parser.add_argument("--config", default=None,
+                        help="config.yaml des appareils Tapo (défaut: celui de BT_TAPO)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Affiche le plan sans rien exécuter")
+    parser.add_argument("--json", action="store_true", help="Rapport au format JSON")
+    args = parser.parse_args()
+
+    try:
+        scene = load_scene(args.scene)
+    except ValidationError as e:
+        print("Erreur de validation de la scène:", e)
+        sys.exit(1)
+
+    encoders = {
+        name: remote_class(remote.type)(remote.pin, init_gpio=False)
+        for name, remote in scene.remotes.items()
+    }
+    try:
+        plan = build_plan(scene, encoders)
+    except SceneError as e:
+        print("Scène invalide:", e)
+        sys.exit(1)
+
+    if not args.json:
+        print_plan(plan)
+    if args.dry_run:
+        return
+
+    config_path = args.config
+    if config_path is None:
+        from bt_tapo_strict_2 import CONFIG_PATH
+        config_path = CONFIG_PATH
+
+    transmitters = {}
+    for node in plan:
+        if node.kind == "ir" and node.pin not in transmitters:
+            remote = scene.remotes[node.actions[0].ir]
+            transmitters[node.pin] = remote_class(remote.type)(remote.pin)
+    try:
+        report = asyncio.run(run_scene(scene, plan, config_path, transmitters))
+    finally:
+        for transmitter in transmitters.values():
+            transmitter.cleanup()
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+    if not report["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
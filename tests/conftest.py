@@ -0,0 +1,10 @@
+import os
+import sys
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Scripts")
+
+# Les scripts s'importent entre voisins (pas de paquet): mêmes chemins qu'à l'exécution
+for name in ("COMMON", "IR_CORE", "IR_YAMAHA", "IR_OSRAM", "BT_TAPO", "SCENES", "GATEWAY"):
+    path = os.path.join(SCRIPTS_DIR, name)
+    if path not in sys.path:
+        sys.path.insert(0, path)
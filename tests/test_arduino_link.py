@@ -0,0 +1,84 @@
+import pytest
+
+from arduino_link import ArduinoError, ArduinoLink, FirmwareEmulator, nec_decode
+from ir_remotes import offline_remote
+
+REPEAT_CODE = [9000, 2250, 560]
+
+
+@pytest.fixture
+def link_pair():
+    pairs = []
+
+    def start(drop=(), max_retries=5):
+        emulator = FirmwareEmulator(0.005, drop=drop).start()
+        link = ArduinoLink(emulator.path, ready_timeout=2.0, ack_timeout=0.15,
+                           max_retries=max_retries)
+        pairs.append((link, emulator))
+        return link, emulator
+
+    yield start
+    for link, emulator in pairs:
+        link.close()
+        emulator.close()
+
+
+def test_dropped_sends_are_retransmitted_in_order(link_pair):
+    link, emulator = link_pair(drop=(1, 3))
+    remote = offline_remote("yamaha")
+    names = ["VOL+", "VOL-", "1", "2", "DISPLAY"]
+    futures = [link.send_command(remote, name) for name in names]
+    for future in futures:
+        future.result(timeout=10)
+    assert link.stats["retransmits"] > 0
+    planned = []
+    for name in names:
+        planned += [remote.codebook.get(name).command] * len(remote.render_frames(name))
+    assert [command for _, _, command, _ in emulator.emitted] == planned
+
+
+def test_link_resyncs_after_giving_up_on_a_send(link_pair):
+    link, emulator = link_pair(drop=range(3), max_retries=2)
+    with pytest.raises(ArduinoError):
+        link.submit(0x78, 0x1E).result(timeout=5)
+    link.submit(0x78, 0x1F).result(timeout=5)
+    assert [command for _, _, command, _ in emulator.emitted] == [0x1F]
+    assert link.stats["resyncs"] == 1
+
+
+def test_commands_behind_an_abandoned_send_are_renumbered(link_pair):
+    # Deux SEND en vol, trois envois perdus chacun: seule la première est abandonnée
+    link, emulator = link_pair(drop=range(6), max_retries=2)
+    first = link.submit(0x78, 0x1E)
+    second = link.submit(0x78, 0x1F)
+    with pytest.raises(ArduinoError):
+        first.result(timeout=5)
+    assert second.result(timeout=5)["seq"] != 2
+    assert [command for _, _, command, _ in emulator.emitted] == [0x1F]
+
+
+@pytest.mark.parametrize("remote_type, name", [("yamaha", "VOL+"), ("osram", "ON")])
+def test_pulse_trains_become_frame_then_repeat_codes(link_pair, remote_type, name):
+    link, emulator = link_pair()
+    remote = offline_remote(remote_type)
+    for pulses in [remote.render_frames(name)[0]] + [REPEAT_CODE] * 3:
+        link.send_pulses(pulses).result(timeout=5)
+    code = remote.codebook.get(name)
+    assert [(address, command) for _, address, command, _ in emulator.emitted] == [
+        (code.address, code.command)]
+    assert emulator.repeat_codes == 3
+
+
+def test_unknown_protocol_is_refused_and_link_stays_usable(link_pair):
+    link, _ = link_pair()
+    with pytest.raises(ArduinoError):
+        link.submit(0x78, 0x1E, protocol=9).result(timeout=5)
+    link.submit(0x78, 0x1E).result(timeout=5)
+
+
+def test_non_nec_train_is_rejected(link_pair):
+    link, _ = link_pair()
+    assert nec_decode(REPEAT_CODE) == (2, 0, 0)
+    assert nec_decode([100, 200, 300]) is None
+    with pytest.raises(ValueError):
+        link.send_pulses([100, 200, 300])
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime
+
+from automation import AutomationScheduler, FadeModel, RuleModel, _fade
+from bt_tapo_strict_2 import ConfigModel
+from gateway import Gateway
+from tapo_backend import SimProfile, SimulatedBackend
+from tapo_controller import TapoController
+from tapo_resilience import ResiliencePolicy
+
+ACTIONS = [{"tapo": "salon", "command": "on"}]
+
+
+def test_one_shot_pop_due_consumes_entry():
+    now = 1_700_000_000.0
+
+    async def noop(rule):
+        return True
+
+    scheduler = AutomationScheduler(noop, clock=lambda: now)
+    scheduler.add(RuleModel(id="once", at=datetime.fromtimestamp(now), actions=ACTIONS))
+    fired = scheduler.pop_due(now + 0.5)
+    assert [entry.rule.id for entry, _, _ in fired] == ["once"]
+    assert scheduler.pop_due(now + 1.0) == []
+    assert scheduler.next_due() is None
+
+
+def test_one_shot_rule_dispatched_once():
+    calls = []
+
+    async def dispatch(rule):
+        calls.append(rule.id)
+        return True
+
+    async def scenario():
+        scheduler = AutomationScheduler(dispatch)
+        scheduler.add(RuleModel(id="once", at=datetime.now(), actions=ACTIONS))
+        await scheduler.run(duration=0.3)
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert calls == ["once"]
+    assert scheduler.describe()["rules"]["once"]["fired"] == 1
+
+
+def test_cron_rule_fires_every_second():
+    virtual = [datetime(2025, 1, 6, 7, 0, 0).timestamp()]
+
+    async def noop(rule):
+        return True
+
+    scheduler = AutomationScheduler(noop, clock=lambda: virtual[0])
+    scheduler.add(RuleModel(id="tick", cron="* * * * * *", actions=ACTIONS))
+    origin = virtual[0]
+    fired = 0
+    for second in range(1, 11):
+        virtual[0] = origin + second
+        fired += len(scheduler.pop_due(virtual[0]))
+    assert fired == 10
+    assert scheduler.next_due() == origin + 11
+
+
+def test_fade_holds_the_device_and_goes_through_the_policy():
+    config = ConfigModel(credentials={"email": "test@example.com", "password": "x"},
+                         devices={"chambre": {"type": "L530", "ip": "10.0.0.3"}})
+    backend = SimulatedBackend(SimProfile(latency_ms=2, jitter_ms=0, handshake_ms=2), seed=1)
+    policy = ResiliencePolicy()
+    gateway = Gateway(TapoController(config, backend, policy))
+
+    async def scenario():
+        fading = asyncio.create_task(_fade(gateway, FadeModel(
+            tapo="chambre", brightness=80, duration=0.3)))
+        await asyncio.sleep(0.05)
+        # Commande concurrente: exécutée seulement après la fin du fondu
+        await gateway.controller.execute("chambre", "set_brightness", ["10"])
+        assert fading.done()
+        return await fading
+
+    try:
+        assert asyncio.run(scenario())
+    finally:
+        gateway.close()
+    assert backend.devices["10.0.0.3"].state["brightness"] == 10
+    assert policy.stats("chambre").successes > 3
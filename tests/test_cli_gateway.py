@@ -0,0 +1,44 @@
+import asyncio
+import socket
+
+import pytest
+from aiohttp.test_utils import TestServer
+
+from bt_tapo_strict_2 import ConfigModel, GatewayUnavailable, forward_to_gateway
+from gateway import Gateway, make_app
+from tapo_backend import SimProfile, SimulatedBackend
+from tapo_controller import TapoController
+
+CONFIG = ConfigModel(credentials={"email": "test@example.com", "password": "x"},
+                     devices={"salon_lampe": {"type": "L530", "ip": "10.0.0.2"}})
+
+
+def test_cli_commands_reuse_the_gateway_session():
+    backend = SimulatedBackend(SimProfile(latency_ms=1, jitter_ms=0, handshake_ms=5), seed=1)
+
+    async def scenario():
+        server = TestServer(make_app(Gateway(TapoController(CONFIG, backend)), token="secret"))
+        await server.start_server()
+        url = str(server.make_url(""))
+        try:
+            replies = [await asyncio.to_thread(forward_to_gateway, url, "salon_lampe", command,
+                                               args, "secret")
+                       for command, args in (("on", []), ("set_brightness", ["40"]))]
+            refused = await asyncio.to_thread(forward_to_gateway, url, "salon_lampe", "on", [])
+            return replies, refused
+        finally:
+            await server.close()
+
+    replies, refused = asyncio.run(scenario())
+    assert [reply["ok"] for reply in replies] == [True, True]
+    assert backend.handshakes == 1
+    assert backend.devices["10.0.0.2"].state["brightness"] == 40
+    assert refused["ok"] is False
+
+
+def test_unreachable_gateway_is_reported_before_anything_runs():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    with pytest.raises(GatewayUnavailable):
+        forward_to_gateway(f"http://127.0.0.1:{port}", "salon_lampe", "on", [], timeout=2)
@@ -0,0 +1,61 @@
+import json
+import os
+
+import pytest
+
+from codebook import SCRIPTS_DIR, Codebook, CodebookError, load_codebook, parse_defines
+
+ARDUINO_SOURCE = "IR_YAMAHA/yamaha_remote_arduino.c"
+
+
+def write_codebook(tmp_path, address="0x78", **entry):
+    path = tmp_path / "codebooks.json"
+    path.write_text(json.dumps({"yamaha": {"address": address, **entry}}), encoding="utf-8")
+    return str(path)
+
+
+def test_dangling_alias_is_rejected():
+    with pytest.raises(CodebookError, match="inexistantes: MUTE -> SILENCE"):
+        Codebook("test", 0x78, {"POWER": 0x0F}, {"mute": "silence"})
+
+
+def test_alias_shadowing_a_command_is_rejected():
+    with pytest.raises(CodebookError, match="masquant une commande: POWER"):
+        Codebook("test", 0x78, {"POWER": 0x0F, "STOP": 0x01}, {"power": "STOP"})
+
+
+def test_out_of_range_code_is_rejected():
+    with pytest.raises(CodebookError, match="hors plage"):
+        Codebook("test", 0x78, {"POWER": 0x100}, {})
+
+
+def test_defines_are_merged_from_the_arduino_sketch(tmp_path):
+    path = write_codebook(tmp_path, defines=ARDUINO_SOURCE, address_define="YAMAHA_ADDRESS",
+                          commands={"POWER": "0x0F"}, aliases={"PWR": "POWER"})
+    codes = load_codebook("yamaha", path)
+    assert codes.get("DIGIT_0").command == 0x10      # absent du JSON, repris du croquis
+    assert codes.get("pwr").word == 0x78870FF0
+    assert not any(k.endswith("_PIN") for k in codes.commands)
+    assert "YAMAHA_ADDRESS" not in codes.commands
+
+
+def test_define_conflicting_with_json_is_rejected(tmp_path):
+    path = write_codebook(tmp_path, defines=ARDUINO_SOURCE, address_define="YAMAHA_ADDRESS",
+                          commands={"POWER": "0x10"})
+    with pytest.raises(CodebookError, match=r"diverge: POWER=0x0F \(JSON 0x10\)"):
+        load_codebook("yamaha", path)
+
+
+def test_address_define_conflicting_with_json_is_rejected(tmp_path):
+    path = write_codebook(tmp_path, address="0x79", defines=ARDUINO_SOURCE,
+                          address_define="YAMAHA_ADDRESS")
+    with pytest.raises(CodebookError, match=r"YAMAHA_ADDRESS=0x78 \(JSON 0x79\)"):
+        load_codebook("yamaha", path)
+
+
+def test_shipped_codebook_matches_the_sketch():
+    codes = load_codebook("yamaha")
+    defines = parse_defines(os.path.join(SCRIPTS_DIR, ARDUINO_SOURCE))
+    assert codes.address == defines["YAMAHA_ADDRESS"]
+    assert all(codes.commands[k] == v for k, v in defines.items()
+               if not k.endswith("_PIN") and k != "YAMAHA_ADDRESS")
@@ -0,0 +1,55 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from gateway import Gateway, is_loopback, make_app
+
+
+def _statuses(token, requests):
+    async def scenario():
+        client = TestClient(TestServer(make_app(Gateway(), token=token)))
+        await client.start_server()
+        try:
+            statuses = []
+            for path, headers in requests:
+                response = await client.get(path, headers=headers)
+                statuses.append(response.status)
+            return statuses
+        finally:
+            await client.close()
+    return asyncio.run(scenario())
+
+
+def test_token_required_when_configured():
+    assert _statuses("secret", [
+        ("/state", {}),
+        ("/state", {"Authorization": "Bearer faux"}),
+        ("/state", {"Authorization": "Bearer secret"}),
+        ("/state?token=secret", {}),
+    ]) == [401, 401, 200, 200]
+
+
+def test_no_token_keeps_open_access():
+    assert _statuses(None, [("/state", {})]) == [200]
+
+
+def test_loopback_detection():
+    assert is_loopback("127.0.0.1") and is_loopback("::1") and is_loopback("localhost")
+    assert not is_loopback("0.0.0.0") and not is_loopback("192.168.1.10")
+
+
+def test_non_object_bodies_are_rejected():
+    async def scenario():
+        client = TestClient(TestServer(make_app(Gateway())))
+        await client.start_server()
+        try:
+            statuses = []
+            for path, body in (("/tapo/lampe/on", "[]"), ("/ir/ampli/POWER", '"x"'),
+                               ("/batch", "42"), ("/batch", "[1]")):
+                response = await client.post(path, data=body,
+                                             headers={"Content-Type": "application/json"})
+                statuses.append(response.status)
+            return statuses
+        finally:
+            await client.close()
+    assert asyncio.run(scenario()) == [400, 400, 400, 400]
@@ -0,0 +1,22 @@
+from ir_bench import compare, run_encoders
+
+
+def test_compare_flags_only_degradations_beyond_threshold_and_noise():
+    baseline = {"backends": {"software": {"edge_error_us": {"p99": 40.0, "max": 300.0},
+                                          "cpu_ms_per_frame": 10.0}},
+                "encoders": {"yamaha.nec_encode": {"frames_per_s": 1000}}}
+    results = {"backends": {"software": {"edge_error_us": {"p99": 80.0, "max": 450.0},
+                                         "cpu_ms_per_frame": 8.0}},
+               "encoders": {"yamaha.nec_encode": {"frames_per_s": 700}}}
+    regressions = compare(results, baseline, threshold_pct=20)
+    # max: +150µs reste sous la marge de bruit (200µs); le CPU s'améliore
+    assert [(r["metric"], r["change_pct"]) for r in regressions] == [
+        ("backends.software.edge_error_us.p99", 100.0),
+        ("encoders.yamaha.nec_encode.frames_per_s", 30.0)]
+
+
+def test_encoders_run_without_gpio():
+    out = run_encoders(10)
+    assert set(out) == {"yamaha.nec_encode", "yamaha.render_frames",
+                        "osram.nec_encode", "osram.render_frames"}
+    assert all(entry["frames_per_s"] > 0 for entry in out.values())
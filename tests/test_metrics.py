@@ -0,0 +1,26 @@
+import urllib.request
+
+from metrics import Registry, serve
+from tapo_resilience import ResiliencePolicy
+
+
+def test_shared_policy_renders_each_family_once():
+    registry = Registry()
+    policy = ResiliencePolicy()
+    for _ in range(3):
+        registry.register_collector(policy.collect)
+    assert registry.render().count("# TYPE tapo_breaker_open gauge") == 1
+
+
+def test_serve_listens_on_loopback_by_default():
+    registry = Registry()
+    registry.counter("demo_total", "Démo").inc()
+    server = serve(0, registry)
+    try:
+        host, port = server.server_address
+        assert host == "127.0.0.1"
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+            assert b"demo_total 1" in resp.read()
+    finally:
+        server.shutdown()
+        server.server_close()
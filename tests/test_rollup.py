@@ -0,0 +1,62 @@
+import os
+import shutil
+
+from tapo_rollup import HOUR_MS, MINUTE_MS, RollupEngine
+from tapo_telemetry import TelemetryStore
+
+T0 = 1_700_000_000_000 - 1_700_000_000_000 % HOUR_MS
+
+
+def _fill(store, start_ms, minutes, devices=("salon", "bureau")):
+    for i in range(minutes * 6):
+        for n, device in enumerate(devices):
+            store.add_sample(start_ms + i * 10_000, device, 10.0 * (n + 1))
+
+
+def _rows(engine, resolution):
+    return [(b.ts_ms, b.device, b.count) for b in engine.buckets(resolution)]
+
+
+def test_replay_after_lost_state_writes_no_duplicates(tmp_path):
+    path = str(tmp_path / "store")
+    store = TelemetryStore(path)
+    engine = RollupEngine(store)
+    _fill(store, T0, 30)
+    engine.update(now_ms=T0 + 30 * MINUTE_MS)
+    state_path = os.path.join(path, "rollup_state.json")
+    shutil.copy(state_path, str(tmp_path / "old_state.json"))
+
+    _fill(store, T0 + 30 * MINUTE_MS, 45)
+    engine.update(now_ms=T0 + 2 * HOUR_MS)
+    expected = {res: _rows(engine, res) for res in ("1m", "1h")}
+    for table in engine.tables.values():
+        table.close()
+
+    # Arrêt brutal entre l'écriture des tables et celle de l'état: ancien état
+    shutil.copy(str(tmp_path / "old_state.json"), state_path)
+    replay = RollupEngine(store)
+    replay.update(now_ms=T0 + 2 * HOUR_MS)
+    for res in ("1m", "1h"):
+        rows = _rows(replay, res)
+        assert rows == expected[res]
+        assert len(rows) == len(set(rows))
+    assert sum(count for _, _, count in _rows(replay, "1h")) == 2 * 75 * 6
+    replay.close()
+    store.close()
+
+
+def test_state_lost_entirely_rebuilds_watermarks(tmp_path):
+    path = str(tmp_path / "store")
+    store = TelemetryStore(path)
+    engine = RollupEngine(store)
+    _fill(store, T0, 10)
+    engine.update(now_ms=T0 + HOUR_MS)
+    first = _rows(engine, "1m")
+    engine.close()
+
+    os.remove(os.path.join(path, "rollup_state.json"))
+    replay = RollupEngine(store)
+    replay.update(now_ms=T0 + HOUR_MS)
+    assert _rows(replay, "1m") == first
+    replay.close()
+    store.close()
@@ -0,0 +1,25 @@
+import pytest
+from pydantic import ValidationError
+
+from scene_engine import SceneModel, build_plan, remote_class
+
+ACTIONS = [
+    {"id": "osram_on", "ir": "ruban", "command": "ON"},
+    {"id": "ampli_on", "ir": "ampli", "command": "POWER", "after": ["osram_on"]},
+]
+
+
+def test_mixed_remote_types_on_one_pin_rejected():
+    with pytest.raises(ValidationError, match="gpio18"):
+        SceneModel(name="x", actions=ACTIONS, remotes={
+            "ampli": {"type": "yamaha", "pin": 18}, "ruban": {"type": "osram", "pin": 18}})
+
+
+def test_plan_builds_without_gpio():
+    scene = SceneModel(name="x", actions=ACTIONS, remotes={
+        "ampli": {"type": "yamaha", "pin": 18}, "ruban": {"type": "osram", "pin": 17}})
+    encoders = {name: remote_class(remote.type)(remote.pin, init_gpio=False)
+                for name, remote in scene.remotes.items()}
+    plan = build_plan(scene, encoders)
+    assert [(node.kind, node.pin) for node in plan] == [("ir", 17), ("ir", 18)]
+    assert plan[1].deps == {plan[0].id}
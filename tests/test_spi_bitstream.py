@@ -0,0 +1,25 @@
+import pytest
+
+from ir_remotes import offline_remote
+from spi_bitstream import CARRIER_HZ, decode, max_error_us, render, selftest
+
+
+@pytest.mark.parametrize("remote_type", ["yamaha", "osram"])
+def test_every_command_round_trips_within_one_carrier_period(remote_type):
+    encoder = offline_remote(remote_type)
+    for name in encoder.commands:
+        for frame in encoder.render_frames(name):
+            data = render(tuple(frame))
+            assert len(decode(data)) == len(frame), name
+            assert max_error_us(frame, data) <= 1e6 / CARRIER_HZ, name
+
+
+def test_single_bit_train_round_trips():
+    data = render((560, 1690, 560))
+    assert decode(data) == pytest.approx([560, 1690, 560], abs=1e6 / CARRIER_HZ)
+    assert render(()) == b""
+
+
+def test_selftest_passes(capsys):
+    assert selftest()
+    assert "réussi" in capsys.readouterr().out
@@ -0,0 +1,35 @@
+import pytest
+
+from tapo_export import CsvExportWriter
+
+
+def test_resume_appends_after_last_commit(tmp_path):
+    path = str(tmp_path / "energy.csv")
+    writer = CsvExportWriter(path)
+    writer.write([(0, "prise", 1.0)])
+    writer.commit("prise", 0)
+    writer.write([(3600000, "prise", 2.0)])  # non validée: réécrite à la reprise
+    writer.close()
+
+    writer = CsvExportWriter(path, resume=True)
+    assert writer.resume_points() == {"prise": 0}
+    writer.close()
+    with open(path, encoding="utf-8") as f:
+        assert f.read().splitlines() == ["ts_ms,timestamp_utc,device,energy_wh",
+                                         "0,1970-01-01T00:00:00Z,prise,1.0"]
+
+
+@pytest.mark.parametrize("resume", [False, True])
+def test_csv_without_state_is_never_truncated(tmp_path, resume):
+    path = tmp_path / "energy.csv"
+    path.write_text("ts_ms,timestamp_utc,device,energy_wh\n0,x,prise,1.0\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="sans"):
+        CsvExportWriter(str(path), resume=resume)
+    assert path.read_text(encoding="utf-8").count("\n") == 2
+
+
+def test_existing_export_requires_resume(tmp_path):
+    path = str(tmp_path / "energy.csv")
+    CsvExportWriter(path).close()
+    with pytest.raises(ValueError, match="--resume"):
+        CsvExportWriter(path)
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from tapo_resilience import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, ResiliencePolicy
+
+
+async def fail():
+    raise OSError("injoignable")
+
+
+async def ok():
+    return "ok"
+
+
+def open_breaker(policy):
+    with pytest.raises(OSError):
+        asyncio.run(policy.call("lampe", fail))
+    assert policy.stats("lampe").breaker.state == OPEN
+
+
+def make_policy(cooldown=0.0):
+    return ResiliencePolicy(attempts=1, failure_threshold=1, cooldown=cooldown)
+
+
+def test_cancelled_probe_lets_next_probe_through():
+    policy = make_policy()
+    open_breaker(policy)
+
+    async def cancelled_probe():
+        task = asyncio.create_task(policy.call("lampe", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelled_probe())
+    assert policy.stats("lampe").breaker.state == HALF_OPEN
+    assert asyncio.run(policy.call("lampe", ok)) == "ok"
+    assert policy.stats("lampe").breaker.state == CLOSED
+
+
+def test_non_retryable_probe_lets_next_probe_through():
+    policy = make_policy()
+    open_breaker(policy)
+
+    async def invalid():
+        raise ValueError("luminosité hors bornes")
+
+    with pytest.raises(ValueError):
+        asyncio.run(policy.call("lampe", invalid))
+    assert asyncio.run(policy.call("lampe", ok)) == "ok"
+    assert policy.stats("lampe").breaker.state == CLOSED
+
+
+def test_open_breaker_short_circuits_until_cooldown():
+    policy = make_policy(cooldown=60.0)
+    open_breaker(policy)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(policy.call("lampe", ok))
+    assert policy.stats("lampe").short_circuits == 1
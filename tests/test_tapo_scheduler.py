@@ -0,0 +1,18 @@
+import random
+
+from tapo_scheduler import PollJob, PollScheduler
+
+
+async def _poll():
+    return None
+
+
+def test_backoff_stays_capped_after_long_outage():
+    scheduler = PollScheduler(max_backoff=300.0, rng=random.Random(1))
+    job = PollJob("prise", _poll, interval=10.0)
+    for _ in range(5000):
+        delay = scheduler.next_delay(job, ok=False)
+        assert 0 < delay <= 300.0
+    assert job.failures == 5000
+    assert scheduler.next_delay(job, ok=True, value=1) > 0
+    assert job.failures == 0
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+from tapo_telemetry import BLOCK_ROWS, EnergyPoller, TelemetryStore
+
+
+def fill(store, rows):
+    for i in range(rows):
+        store.add_sample(1000 * i, "prise" if i % 2 else "bureau", float(i), i / 10)
+
+
+def test_compaction_drops_whole_blocks_and_keeps_row_numbers(tmp_path):
+    store = TelemetryStore(str(tmp_path), fsync_every=10_000)
+    fill(store, BLOCK_ROWS * 3 + 10)
+    store.flush()
+    assert (store.base, store.end) == (0, BLOCK_ROWS * 3 + 10)
+
+    # Coupure au milieu du deuxième bloc: seul le premier est supprimé
+    assert store.compact_before(1000 * (BLOCK_ROWS + BLOCK_ROWS // 2)) == BLOCK_ROWS
+    assert (store.base, store.end) == (BLOCK_ROWS, BLOCK_ROWS * 3 + 10)
+    first = next(store.scan())
+    assert first[0] == 1000 * BLOCK_ROWS
+
+    # Les numéros de ligne absolus restent valides (reprise d'export)
+    resumed = list(store.scan(from_row=BLOCK_ROWS * 3))
+    assert [row[0] for row in resumed] == [1000 * i for i in range(BLOCK_ROWS * 3, BLOCK_ROWS * 3 + 10)]
+    store.close()
+
+    reopened = TelemetryStore(str(tmp_path))
+    assert (reopened.base, reopened.end) == (BLOCK_ROWS, BLOCK_ROWS * 3 + 10)
+    assert [s.device for s in reopened.samples(end_ms=1000 * (BLOCK_ROWS + 2))] == [
+        "bureau", "prise"]
+    assert (tmp_path / "ts.1.col").exists() and not (tmp_path / "ts.0.col").exists()
+    reopened.close()
+
+
+def test_compaction_before_first_block_end_is_noop(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    fill(store, BLOCK_ROWS + 5)
+    assert store.compact_before(1000 * (BLOCK_ROWS - 1)) == 0
+    assert (store.base, store.end) == (0, BLOCK_ROWS + 5)
+    store.close()
+
+
+def test_flush_job_runs_maintenance_off_the_event_loop(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_maintenance():
+        started.set()
+        release.wait(5)       # fsync sur carte SD lente
+
+    async def scenario():
+        poller = EnergyPoller(None, {}, store, on_cycle=slow_maintenance)
+        flush = asyncio.create_task(poller._flush())
+        while not started.is_set():
+            await asyncio.sleep(0.001)
+        # La boucle reste disponible: les échantillons continuent d'arriver
+        for i in range(BLOCK_ROWS + 5):
+            store.add_sample(1000 * i, "prise", float(i))
+        assert not flush.done()
+        release.set()
+        await flush
+
+    asyncio.run(scenario())
+    store.flush()
+    assert store.end == BLOCK_ROWS + 5
+    store.close()